@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+import hubblestack.modules.iptables as iptables
+
+FIXTURE = os.path.join(os.path.dirname(__file__), '..', 'tests', 'unittests', 'resources', 'iptables-save.txt')
+
+def get_args(*a):
+    parser = argparse.ArgumentParser(description='nova firewall benchmark: compares checking rules '
+        'one iptables process at a time (iptables.check) with checking them against a single '
+        'iptables-save snapshot (iptables.check snapshot=...)')
+    parser.add_argument('-f', '--fixture', default=FIXTURE,
+        help='iptables-save output to use as the running ruleset')
+    parser.add_argument('-n', '--rules', type=int, default=500,
+        help='number of rules to check (half present, half absent)')
+    args = parser.parse_args(*a)
+    return args
+
+def load_rules(fixture, count):
+    rules = list()
+    table = None
+    with open(fixture) as fh:
+        for line in fh:
+            if line.startswith('*'):
+                table = line[1:].strip()
+            elif line.startswith('-A '):
+                _, chain, rule = line.strip().split(None, 2)
+                rules.append((table, chain, rule))
+    step = max(1, len(rules) // (count // 2 or 1))
+    present = rules[::step][:count // 2]
+    absent = [ (t, c, r.replace('-j ', '-m comment --comment absent -j ', 1)) for t, c, r in present ]
+    return present + absent
+
+def make_cmd_run(fixture):
+    """ stand-in for cmd.run: one process per iptables invocation, like the real thing """
+    def cmd_run(cmd, **kw):
+        if cmd.endswith('--help'):
+            return subprocess.run(['echo', '--check'], stdout=subprocess.PIPE,
+                universal_newlines=True).stdout
+        if cmd.endswith('-save'):
+            return subprocess.run(['cat', fixture], stdout=subprocess.PIPE,
+                universal_newlines=True).stdout
+        # <ipt> -t <table> -C <chain> <rule>
+        _, _, _, _, chain, rule = cmd.split(None, 5)
+        found = subprocess.run(['grep', '-qxF', '-e', '-A {0} {1}'.format(chain, rule), fixture])
+        return '' if found.returncode == 0 else 'iptables: Bad rule (does a matching rule exist in that chain?).'
+    return cmd_run
+
+def main(args):
+    iptables.__mods__ = {'cmd.run': make_cmd_run(args.fixture)}
+    iptables._iptables_cmd = lambda family='ipv4': 'iptables'
+    rules = load_rules(args.fixture, args.rules)
+
+    t0 = time.time()
+    per_rule = [ iptables.check(table=t, chain=c, rule=r) is True for t, c, r in rules ]
+    t1 = time.time()
+    snap = iptables.snapshot()
+    t2 = time.time()
+    snapped = [ iptables.check(table=t, chain=c, rule=r, snapshot=snap) is True for t, c, r in rules ]
+    t3 = time.time()
+
+    print('rules checked:      {0} ({1} present)'.format(len(rules), sum(snapped)))
+    print('per-rule processes: {0:0.3f}s'.format(t1 - t0))
+    print('snapshot capture:   {0:0.3f}s'.format(t2 - t1))
+    print('snapshot checks:    {0:0.3f}s'.format(t3 - t2))
+    print('speed-up:           {0:0.1f}x'.format((t1 - t0) / (t3 - t1)))
+    if per_rule != snapped:
+        print('MISMATCH between the two paths on {0} rules'.format(
+            sum(1 for a, b in zip(per_rule, snapped) if a != b)))
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    try:
+        sys.exit(main(get_args()))
+    except KeyboardInterrupt:
+        sys.exit(1)
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+import hubblestack.config
+import hubblestack.loader
+
+def get_args(*a):
+    parser = argparse.ArgumentParser(description='hubble loader startup benchmark: '
+        'compares building the utils/modules/returners loaders (and loading every module) '
+        'with and without the loader_snapshot option')
+    parser.add_argument('-c', '--configfile', default=hubblestack.config.DEFAULT_OPTS['conf_file'])
+    parser.add_argument('-n', '--rounds', type=int, default=3,
+        help='number of warm (snapshot) startups to time')
+    parser.add_argument('--cachedir', default=None,
+        help='where to put the snapshots (default: a temporary directory)')
+    args = parser.parse_args(*a)
+    return args
+
+def startup(opts):
+    t0 = time.time()
+    opts['grains'] = hubblestack.loader.grains(opts)
+    t1 = time.time()
+    utils = hubblestack.loader.utils(opts)
+    mods = hubblestack.loader.modules(opts, utils=utils)
+    rets = hubblestack.loader.returners(opts, mods)
+    for loader in (utils, mods, rets):
+        len(loader) # load everything, the worst case for a one-shot cli
+    hubblestack.loader.save_snapshots()
+    t2 = time.time()
+    return t1 - t0, t2 - t1
+
+def main(args):
+    cachedir = args.cachedir or tempfile.mkdtemp(prefix='hubble-loader-bench-')
+    opts = hubblestack.config.get_config(args.configfile)
+    opts['cachedir'] = cachedir
+    opts['extension_modules'] = os.path.join(cachedir, 'extmods')
+    try:
+        grains_t, cold = startup(dict(opts, loader_snapshot=False))
+        print('grains:             {:0.3f}s'.format(grains_t))
+        print('loaders (no snap):  {:0.3f}s'.format(cold))
+        _, first = startup(dict(opts, loader_snapshot=True))
+        print('loaders (1st snap): {:0.3f}s'.format(first))
+        for i in range(args.rounds):
+            _, warm = startup(dict(opts, loader_snapshot=True))
+            print('loaders (warm #{}):  {:0.3f}s  ({:0.1f}x)'.format(i + 1, warm, cold / warm))
+    finally:
+        if args.cachedir is None:
+            shutil.rmtree(cachedir, ignore_errors=True)
+
+if __name__ == '__main__':
+    try:
+        main(get_args())
+    except KeyboardInterrupt:
+        sys.exit(1)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import sys
+import time
+import random
+import argparse
+
+import hubblestack.utils.data
+
+def get_args(*a):
+    parser = argparse.ArgumentParser(description='pulsar returner dedup benchmark: compares the '
+        'quadratic "item not in input_list[idx + 1:]" dedup with hubblestack.utils.data.dedup_list '
+        'on batches of fake pulsar events')
+    parser.add_argument('-n', '--events', type=int, nargs='+', default=[10000, 100000],
+        help='batch sizes to time')
+    parser.add_argument('-d', '--dup-ratio', type=float, default=0.3,
+        help='fraction of each batch that repeats an earlier event')
+    parser.add_argument('--max-quadratic', type=int, default=10000,
+        help="don't time the quadratic dedup on batches bigger than this (it takes minutes)")
+    args = parser.parse_args(*a)
+    return args
+
+def make_events(count, dup_ratio):
+    events = list()
+    for i in range(count):
+        if events and random.random() < dup_ratio:
+            events.append(dict(random.choice(events)))
+            continue
+        events.append({'path': '/var/lib/dpkg/info/pkg{0}.list'.format(i), 'name': 'pkg{0}.list'.format(i),
+            'tag': '/var/lib/dpkg/info', 'change': random.choice(['IN_MODIFY', 'IN_CREATE', 'IN_DELETE']),
+            'pulsar_config': 'hubblestack_pulsar_config.yaml',
+            'stats': {'inode': i, 'mode': '0644', 'ctime': 1553102100 + i, 'mtime': 1553102100 + i,
+                      'size': i * 7, 'user': 'root', 'group': 'root'},
+            'checksum': '{0:064x}'.format(i), 'checksum_type': 'sha256'})
+    return events
+
+def quadratic_dedup(input_list):
+    deduped = []
+    for idx, item in enumerate(input_list):
+        if item not in input_list[idx + 1:]:
+            deduped.append(item)
+    return deduped
+
+def main(args):
+    ret = 0
+    for count in args.events:
+        events = make_events(count, args.dup_ratio)
+        t0 = time.time()
+        fast = hubblestack.utils.data.dedup_list(events)
+        t1 = time.time()
+        print('{0:>7} events: dedup_list {1:0.3f}s ({2} kept)'.format(count, t1 - t0, len(fast)))
+        if count <= args.max_quadratic:
+            slow = quadratic_dedup(events)
+            t2 = time.time()
+            print('{0:>7} events: quadratic  {1:0.3f}s ({2:0.1f}x)'.format(count, t2 - t1,
+                (t2 - t1) / max(t1 - t0, 1e-9)))
+            if slow != fast:
+                print('MISMATCH between the two dedups on {0} events'.format(count))
+                ret = 1
+    return ret
+
+if __name__ == '__main__':
+    try:
+        sys.exit(main(get_args()))
+    except KeyboardInterrupt:
+        sys.exit(1)
@@ -125,6 +125,7 @@ check_id:
 import logging
 
 import hubblestack.module_runner.comparator
+from hubblestack.module_runner.comparator import cached as _cached
 
 log = logging.getLogger(__name__)
 
@@ -135,7 +136,7 @@ def _compare_dictionary_values(audit_id, result_to_compare, args, errors):
             _compare_dictionary_values(audit_id, value, args, errors)
         else:
             if 'type' in args:
-                ret_status, ret_val = hubblestack.extmods.module_runner.comparator.run(audit_id, args, int(value))
+                ret_status, ret_val = hubblestack.module_runner.comparator.run(audit_id, args, int(value))
                 if not ret_status:
                     errors.append(ret_val)
 
@@ -253,7 +254,7 @@ def match_any_if_key_matches(audit_id, result_to_compare, args):
         log.debug("Required key '%s' is not found in '%s' for audit_id '%s'", key_name, result_to_compare, audit_id)
         return True, "pass_as_key_not_found"
     key_found_once = False
-    for to_match_dict in args['match_any_if_key_matches']['args']:
+    for to_match_dict in _candidates(args, key_name, result_to_compare[key_name]):
         errors = []
         if result_to_compare[key_name] == to_match_dict[key_name]:
             key_found_once = True
@@ -277,6 +278,28 @@ def match_any_if_key_matches(audit_id, result_to_compare, args):
         return False, error_message
 
 
+def _candidates(args, key_name, key_value):
+    """
+    The args of match_any_if_key_matches that may have key_value under key_name:
+    only the first of them is ever compared, so it's looked up by value
+    """
+    def _index():
+        index = {}
+        for to_match_dict in args['match_any_if_key_matches']['args']:
+            try:
+                index.setdefault(to_match_dict[key_name], [to_match_dict])
+            except TypeError:
+                return None
+        return index
+    index = _cached(args, 'key_index', _index)
+    if index is not None:
+        try:
+            return index.get(key_value, [])
+        except TypeError:
+            pass
+    return args['match_any_if_key_matches']['args']
+
+
 def match_key_any(audit_id, result_to_compare, args):
     """
     Match dictionary elements dynamically. True for any key found from a list of keys
@@ -108,6 +108,8 @@ check_id:
 
 import logging
 import hubblestack.module_runner.comparator
+from hubblestack.module_runner.comparator import cached as _cached
+from hubblestack.module_runner.comparator import compile_args as _compile_args
 
 log = logging.getLogger(__name__)
 
@@ -126,7 +128,7 @@ def size(audit_id, result_to_compare, args):
     # Use Number comparator to do this comparison
     ret_status, ret_val = hubblestack.module_runner.comparator.run(
         audit_id,
-        {"type": "number", "match": args['size']},
+        _cached(args, 'size', lambda: _compile_args({"type": "number", "match": args['size']})),
         len(result_to_compare))
 
     if ret_status:
@@ -138,7 +140,7 @@ def is_integer(value):
     try:
         int(value)
         return True
-    except ValueError:
+    except (TypeError, ValueError):
         return False
 
 
@@ -160,26 +162,75 @@ def match(audit_id, result_to_compare, args):
         log.error("empty list received in list::match for audit_id: {0}".format(audit_id))
         return False, "list::match failure. {0} is not an instance of list".format(result_to_compare)
     if is_integer(result_to_compare[0]):
-        ret_status, ret_val = hubblestack.extmods.module_runner.comparator.run(
+        ret_status, ret_val = hubblestack.module_runner.comparator.run(
             audit_id,
-            {"type": "number", "match": expected_list[0]},
+            _cached(args, 'match', lambda: _compile_args({"type": "number", "match": expected_list[0]})),
             int(result_to_compare[0]))
         if ret_status:
             return True, "Check Passed"
     if isinstance(result_to_compare[0], dict):
         # If list to compare has dict, it uses first key of dict to sort list
-        sort_key = list(result_to_compare[0].keys())[0]
-        result_to_compare.sort(key=lambda i: i[sort_key])
-        expected_list.sort(key=lambda i: i[sort_key])
+        sort_key = next(iter(result_to_compare[0]))
+        result_to_compare = sorted(result_to_compare, key=lambda i: i[sort_key])
+        expected_list = _cached(args, ('match', sort_key),
+                                lambda: sorted(expected_list, key=lambda i: i[sort_key]))
     else:
         # Other data types. Simply sort the list
-        result_to_compare.sort()
-        expected_list.sort()
+        result_to_compare = sorted(result_to_compare)
+        expected_list = _cached(args, ('match', None), lambda: sorted(expected_list))
     if result_to_compare == expected_list:
         return True, "Check Passed"
     return False, "list::match failure. Got={0}".format(result_to_compare)
 
 
+def _custom_comparator(to_compare):
+    """
+    The comparator args of an entry such as {name: {type: string, match: abc}},
+    None for other entries
+    """
+    if isinstance(to_compare, dict) and to_compare:
+        comparator_args = next(iter(to_compare.values()))
+        if isinstance(comparator_args, dict) and 'type' in comparator_args:
+            return comparator_args
+    return None
+
+
+def _hashable_set(values):
+    """
+    The hashable values as a set, and the others as a list
+    """
+    hashable, unhashable = set(), list()
+    for value in values:
+        try:
+            hashable.add(value)
+        except TypeError:
+            unhashable.append(value)
+    return hashable, unhashable
+
+
+def _contains(values, value):
+    """
+    value in values (as built by _hashable_set)
+    """
+    hashable, unhashable = values
+    try:
+        if value in hashable:
+            return True
+    except TypeError:
+        pass
+    return any(value == other for other in unhashable)
+
+
+def _compile_match_any(args):
+    expected = args['match_any']
+    custom = [comparator_args for comparator_args in map(_custom_comparator, expected) if comparator_args]
+    primitives = _hashable_set(to_compare for to_compare in expected if not isinstance(to_compare, dict))
+    return {'number': _compile_args({"type": "number", "match_any": expected}),
+            'dict': _compile_args({"type": "dict", "match_any": expected}),
+            'custom': [_compile_args(comparator_args) for comparator_args in custom],
+            'primitives': primitives}
+
+
 def match_any(audit_id, result_to_compare, args):
     """
     Match any of dictionary mentioned. Match only mentioned attributes
@@ -192,11 +243,12 @@ def match_any(audit_id, result_to_compare, args):
     """
     log.debug('Running list::match_any for check: {0}'.format(audit_id))
 
+    compiled = _cached(args, 'match_any', lambda: _compile_match_any(args))
     for r_compare in result_to_compare:
         if is_integer(r_compare):
-            ret_status, ret_val = hubblestack.extmods.module_runner.comparator.run(
+            ret_status, ret_val = hubblestack.module_runner.comparator.run(
                 audit_id,
-                {"type": "number", "match_any": args['match_any']},
+                compiled['number'],
                 int(r_compare))
             if ret_status:
                 return True, "Check Passed"
@@ -204,32 +256,37 @@ def match_any(audit_id, result_to_compare, args):
             # using dict::match_any
             ret_status, ret_val = hubblestack.module_runner.comparator.run(
                 audit_id,
-                {"type": "dict", "match_any": args['match_any']},
+                compiled['dict'],
                 r_compare)
             if ret_status:
                 return True, "Check Passed"
         else:
-            # direct compare
-            for to_compare in args['match_any']:
-                # check if it has specified any custom comparator
-                if isinstance(to_compare, dict):
-                    dict_key = list(to_compare.keys())[0]
-                    if 'type' in to_compare[dict_key]:
-                        # Lets hand-over this new specific comparison to comparator orchestrator
-                        ret_status, ret_val = hubblestack.module_runner.comparator.run(
-                            audit_id,
-                            to_compare[dict_key],
-                            r_compare)
-                        if ret_status:
-                            return True, "Check Passed"
-                else:
-                    # primitive datatype comparison
-                    if to_compare == r_compare:
-                        return True, "Check Passed"
+            # primitive datatype comparison
+            if _contains(compiled['primitives'], r_compare):
+                return True, "Check Passed"
+            # check if it has specified any custom comparator
+            for comparator_args in compiled['custom']:
+                # Lets hand-over this new specific comparison to comparator orchestrator
+                ret_status, ret_val = hubblestack.module_runner.comparator.run(
+                    audit_id,
+                    comparator_args,
+                    r_compare)
+                if ret_status:
+                    return True, "Check Passed"
 
     return False, "list::match_any failure. Got={0}".format(result_to_compare)
 
 
+def _compile_match_all(args):
+    compiled = []
+    for to_compare in args['match_all']:
+        custom = _custom_comparator(to_compare)
+        compiled.append({'to_compare': to_compare,
+                         'dict': _compile_args({"type": "dict", "match": to_compare}),
+                         'custom': _compile_args(custom) if custom else None})
+    return compiled
+
+
 def match_all(audit_id, result_to_compare, args):
     """
     Match all of dictionary mentioned. Match only mentioned attributes
@@ -243,32 +300,35 @@ def match_all(audit_id, result_to_compare, args):
     """
     log.debug('Running list::match_all for check: {0}'.format(audit_id))
 
-    for to_compare in args['match_all']:
+    dict_results = [r_compare for r_compare in result_to_compare if isinstance(r_compare, dict)]
+    other_results = [r_compare for r_compare in result_to_compare if not isinstance(r_compare, dict)]
+    other_set = _hashable_set(other_results)
+    for expected in _cached(args, 'match_all', lambda: _compile_match_all(args)):
+        to_compare = expected['to_compare']
         found_match = False
-        for r_compare in result_to_compare:
-            ret_status = False
-
-            if isinstance(r_compare, dict):
-                # using dict::match
-                ret_status, ret_val = hubblestack.module_runner.comparator.run(
-                    audit_id,
-                    {"type": "dict", "match": to_compare},
-                    r_compare)
-            elif isinstance(to_compare, dict):
-                dict_key = list(to_compare.keys())[0]
-                if 'type' in to_compare[dict_key]:
-                    # Lets hand-over this new specific comparison to comparator orchestrator
+        for r_compare in dict_results:
+            # using dict::match
+            ret_status, ret_val = hubblestack.module_runner.comparator.run(
+                audit_id,
+                expected['dict'],
+                r_compare)
+            if ret_status:
+                found_match = True
+                break
+        if not found_match and other_results:
+            if expected['custom'] is not None:
+                # Lets hand-over this new specific comparison to comparator orchestrator
+                for r_compare in other_results:
                     ret_status, ret_val = hubblestack.module_runner.comparator.run(
                         audit_id,
-                        to_compare[dict_key],
+                        expected['custom'],
                         r_compare)
-            else:
+                    if ret_status:
+                        found_match = True
+                        break
+            elif not isinstance(to_compare, dict):
                 # simple comparison between primitive data types
-                ret_status = r_compare == to_compare
-
-            if ret_status:
-                found_match = True
-                break
+                found_match = _contains(other_set, to_compare)
         if not found_match:
             return False, "Check failed, got={0}".format(result_to_compare)
     return True, "Check Passed"
@@ -314,10 +374,12 @@ def match_any_if_key_matches(audit_id, result_to_compare, args):
 
     key_name = args['match_any_if_key_matches']['match_key']
     failed_once = False
+    dict_args = _cached(args, 'match_any_if_key_matches', lambda: _compile_args(
+        {"type": "dict", "match_any_if_key_matches": args['match_any_if_key_matches']}))
     for r_compare in result_to_compare:
         ret_status, ret_val = hubblestack.module_runner.comparator.run(
             audit_id,
-            {"type": "dict", "match_any_if_key_matches": args['match_any_if_key_matches']},
+            dict_args,
             r_compare)
         if ret_status and ret_val != "pass_as_key_not_found":
             return True, "Check Passed"
@@ -342,19 +404,23 @@ def filter_compare(audit_id, result_to_compare, args):
     """
     log.debug('Running list::filter_compare for check: {0}'.format(audit_id))
 
-    filter_dict_args = args['filter_compare']['filter']
+    filter_dict_args = _cached(args, 'filter', lambda: _compile_args(
+        {"type": "dict", "match": args['filter_compare']['filter']}))
     filtered_list = []
     for r_compare in result_to_compare:
         ret_status, ret_val = hubblestack.module_runner.comparator.run(
             audit_id,
-            {"type": "dict", "match": filter_dict_args},
+            filter_dict_args,
             r_compare)
         if ret_status:
             filtered_list.append(r_compare)
 
     # Lets hand-over this new specific comparison to comparator orchestrator
-    filter_comparator_args = {"type": "list"}
-    filter_comparator_args.update(args['filter_compare']['compare'])
+    def _compare_args():
+        compare_args = {"type": "list"}
+        compare_args.update(args['filter_compare']['compare'])
+        return _compile_args(compare_args)
+    filter_comparator_args = _cached(args, 'compare', _compare_args)
     return hubblestack.module_runner.comparator.run(
         audit_id,
         filter_comparator_args,
@@ -40,11 +40,16 @@ Complete Example
             user: root
 """
 
+import functools
 import logging
+import operator
 
 from hubblestack.exceptions import HubbleCheckValidationError
 
 log = logging.getLogger(__name__)
+# longest prefixes first
+OPERATORS = (('<=', operator.le), ('>=', operator.ge), ('<', operator.lt), ('>', operator.gt),
+             ('==', operator.eq), ('!=', operator.ne))
 
 
 def match(audit_id, result_to_compare, args):
@@ -95,23 +100,22 @@ def _match(result_to_compare, expected_result):
     """
     compare a number
     """
+    compare, expected_value = _parse(expected_result)
+    return compare(result_to_compare, expected_value)
+
+
+@functools.lru_cache(maxsize=1024)
+def _parse(expected_result):
+    """
+    The operator and the value of an expected result such as 10 or "> 10"
+    """
     if isinstance(expected_result, int):
-        return result_to_compare == expected_result
+        return operator.eq, expected_result
 
     # got string having some comparison operators
     expected_result_value = expected_result.strip()
-    if expected_result_value.startswith('<='):
-        return result_to_compare <= int(expected_result_value[2:].strip())
-    elif expected_result_value.startswith('>='):
-        return result_to_compare >= int(expected_result_value[2:].strip())
-    elif expected_result_value.startswith('<'):
-        return result_to_compare < int(expected_result_value[1:].strip())
-    elif expected_result_value.startswith('>'):
-        return result_to_compare > int(expected_result_value[1:].strip())
-    elif expected_result_value.startswith('=='):
-        return result_to_compare == int(expected_result_value[2:].strip())
-    elif expected_result_value.startswith('!='):
-        return result_to_compare != int(expected_result_value[2:].strip())
-    else:
-        raise HubbleCheckValidationError('Unknown operator in number::match arg: {0}'
-                                         .format(expected_result_value))
+    for prefix, compare in OPERATORS:
+        if expected_result_value.startswith(prefix):
+            return compare, int(expected_result_value[len(prefix):].strip())
+    raise HubbleCheckValidationError('Unknown operator in number::match arg: {0}'
+                                     .format(expected_result_value))
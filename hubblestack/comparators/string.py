@@ -29,6 +29,8 @@ String comparator exposes various commands:
 import logging
 import re
 
+from hubblestack.module_runner.comparator import cached as _cached
+
 log = logging.getLogger(__name__)
 
 
@@ -43,7 +45,8 @@ def match(audit_id, result_to_compare, args):
     """
     log.debug('Running string::match for check: {0}'.format(audit_id))
 
-    if _compare(result_to_compare, str(args['match']), args):
+    matcher = _cached(args, 'match', lambda: _compile([str(args['match'])], args))
+    if matcher(result_to_compare):
         return True, "Check Passed"
     return False, "string::match failure. Expected={0} Got={1}".format(result_to_compare, str(args['match']))
 
@@ -59,27 +62,41 @@ def match_any(audit_id, result_to_compare, args):
     """
     log.debug('Running string::match_any for check: {0}'.format(audit_id))
 
-    for option_to_match in args['match_any']:
-        if _compare(result_to_compare, option_to_match, args):
-            return True, "Check passed"
+    matcher = _cached(args, 'match_any', lambda: _compile(args['match_any'], args))
+    if matcher(result_to_compare):
+        return True, "Check passed"
 
     # did not match
     return False, "string::match_any failure. Could not find {0} in list: {1}".format(result_to_compare,
                                                                                       str(args['match_any']))
 
 
-def _compare(result_to_compare, expected_string, args):
+def _compile(expected_strings, args):
     """
-    Compare two strings, by processing different options
-        (is_regex)
+    Return a function telling whether a result matches any of the expected
+    strings, by processing different options
+        (is_regex, is_multiline)
     """
-
     # process is_regex
     is_regex = args.get('is_regex', False)
     if is_regex:
-        is_multiline = args.get('is_multiline', True)
-        if is_multiline:
-            return re.search(expected_string, result_to_compare, re.MULTILINE)
-        return re.search(expected_string, result_to_compare)
-    else:
-        return result_to_compare == expected_string
+        flags = re.MULTILINE if args.get('is_multiline', True) else 0
+        regexes = [re.compile(expected_string, flags) for expected_string in expected_strings]
+
+        def _match(result_to_compare):
+            return any(regex.search(result_to_compare) for regex in regexes)
+        return _match
+
+    try:
+        expected_set = frozenset(expected_strings)
+    except TypeError:
+        expected_set = None
+
+    def _match(result_to_compare):
+        if expected_set is not None:
+            try:
+                return result_to_compare in expected_set
+            except TypeError:
+                pass
+        return any(result_to_compare == expected_string for expected_string in expected_strings)
+    return _match
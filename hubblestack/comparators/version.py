@@ -29,6 +29,15 @@ Version comparator exposes various commands:
             - >= 4.28.0-1.el7
             - < 5.28.0-1.el7
 
+Versions are compared as LooseVersions. Set "format" to deb or rpm to order
+them the way dpkg or rpm does instead (see
+hubblestack.utils.versions.compare_many):
+
+    comparator:
+        type: version
+        format: deb
+        match: < 1.0.2g-1ubuntu4.16
+
 Complete Example
 
     comparator:
@@ -48,10 +57,19 @@ Complete Example
 """
 
 import logging
-from distutils.version import LooseVersion
+
+import hubblestack.utils.versions
 
 log = logging.getLogger(__name__)
 
+# checked in order: <= before <
+OPERATORS = (('<=', lambda cmp: cmp <= 0),
+             ('>=', lambda cmp: cmp >= 0),
+             ('<', lambda cmp: cmp < 0),
+             ('>', lambda cmp: cmp > 0),
+             ('==', lambda cmp: cmp == 0),
+             ('!=', lambda cmp: cmp != 0))
+
 
 def match(audit_id, result_to_compare, args):
     """
@@ -64,7 +82,7 @@ def match(audit_id, result_to_compare, args):
     """
     log.debug('Running version::match for audit_id: {0}'.format(audit_id))
 
-    if _match(result_to_compare, args['match']):
+    if _match_all(result_to_compare, [args['match']], _format(args))[0]:
         return True, "Check Passed"
     return False, "version::match failure. Got={0} Expected={1}".format(result_to_compare, str(args['match']))
 
@@ -80,35 +98,40 @@ def match_any(audit_id, result_to_compare, args):
     """
     log.debug('Running version::match_any for check: {0}'.format(audit_id))
 
-    for option_to_match in args['match_any']:
-        if _match(result_to_compare, option_to_match):
-            return True, "Check passed"
+    if any(_match_all(result_to_compare, args['match_any'], _format(args))):
+        return True, "Check passed"
 
     # did not match
     return False, "version::match_any failure. Could not find {0} in list: {1}".format(result_to_compare,
                                                                                        str(args['match_any']))
 
 
-def _match(result_to_compare, expected_result):
+def _format(args):
+    """
+    The version format to compare with: the comparator's "format" (deb or
+    rpm), LooseVersion if there's none
+    """
+    return args.get('format')
+
+
+def _match_all(result_to_compare, expected_results, fmt=None):
     """
-    compare versions
+    compare a version to every expected result (optionally prefixed with an
+    operator) at once; returns a list of booleans
     """
-    # got string having some comparison operators
-    expected_result_value = expected_result.strip()
-    result_version_to_compare = LooseVersion(result_to_compare)
-
-    if expected_result_value.startswith('<='):
-        return result_version_to_compare <= LooseVersion(expected_result_value[2:].strip())
-    elif expected_result_value.startswith('>='):
-        return result_version_to_compare >= LooseVersion(expected_result_value[2:].strip())
-    elif expected_result_value.startswith('<'):
-        return result_version_to_compare < LooseVersion(expected_result_value[1:].strip())
-    elif expected_result_value.startswith('>'):
-        return result_version_to_compare > LooseVersion(expected_result_value[1:].strip())
-    elif expected_result_value.startswith('=='):
-        return result_version_to_compare == LooseVersion(expected_result_value[2:].strip())
-    elif expected_result_value.startswith('!='):
-        return result_version_to_compare != LooseVersion(expected_result_value[2:].strip())
-    else:
-        # direct comparison
-        return result_version_to_compare == LooseVersion(expected_result_value.strip())
+    checks = []
+    versions = []
+    for expected_result in expected_results:
+        expected_result_value = str(expected_result).strip()
+        for operator, check in OPERATORS:
+            if expected_result_value.startswith(operator):
+                expected_result_value = expected_result_value[len(operator):].strip()
+                break
+        else:
+            # direct comparison
+            check = dict(OPERATORS)['==']
+        checks.append(check)
+        versions.append(expected_result_value)
+    # compare_many gives cmp(expected, result); the operators want cmp(result, expected)
+    results = hubblestack.utils.versions.compare_many(str(result_to_compare), versions, fmt=fmt)
+    return [result is not None and check(-result) for check, result in zip(checks, results)]
@@ -219,6 +219,9 @@ VALID_OPTS = {
     "fileserver_update_frequency": int,
     "grains_refresh_frequency": int,
     "scheduler_sleep_frequency": float,
+    "event_loop": bool,
+    "event_loop_max_sleep": float,
+    "pulsar_coalesce_window": float,
     "default_include": str,
     "logfile_maxbytes": int,
     "logfile_backups": int,
@@ -481,6 +484,8 @@ VALID_OPTS = {
     # Update intervals
     "roots_update_interval": int,
     "azurefs_update_interval": int,
+    # Number of threads azurefs downloads blobs with
+    "azurefs_sync_workers": int,
     "gitfs_update_interval": int,
     "hgfs_update_interval": int,
     "minionfs_update_interval": int,
@@ -907,6 +912,9 @@ DEFAULT_OPTS = {
     "fileserver_update_frequency": 43200, # 12 hours
     "grains_refresh_frequency": 3600, # 1 hour
     "scheduler_sleep_frequency": 0.5, # 500ms
+    "event_loop": False, # sleep in a selector instead of polling the scheduler
+    "event_loop_max_sleep": 60.0,
+    "pulsar_coalesce_window": 0.5, # with event_loop, gather inotify events this long
     "default_include": 'hubble.d/*.conf',
     "logfile_maxbytes": 100000000, # 100MB kindof
     "logfile_backups": 1, # max rotated logs
@@ -933,6 +941,7 @@ DEFAULT_OPTS = {
     # Update intervals
     "roots_update_interval": DEFAULT_INTERVAL,
     "azurefs_update_interval": DEFAULT_INTERVAL,
+    "azurefs_sync_workers": 8,
     "gitfs_update_interval": DEFAULT_INTERVAL,
     "hgfs_update_interval": DEFAULT_INTERVAL,
     "minionfs_update_interval": DEFAULT_INTERVAL,
@@ -5,7 +5,6 @@ Main entry point for the hubble daemon
 
 # import lockfile
 import argparse
-import copy
 import json
 import logging
 import math
@@ -14,6 +13,7 @@ import os
 import pprint
 import re
 import random
+import selectors
 import signal
 import socket
 import sys
@@ -35,19 +35,22 @@ import hubblestack.loader
 import hubblestack.utils.signing
 import hubblestack.log
 import hubblestack.log.splunk
+import hubblestack.hec.obj
 import hubblestack.hec.opt
 import hubblestack.utils.stdrec
 from hubblestack import __version__
 from hubblestack.hangtime import hangtime_wrapper
 import hubblestack.status
+import hubblestack.metrics
 import hubblestack.fileclient
 import hubblestack.saltoverrides
 import hubblestack.module_runner.runner
 import hubblestack.module_runner.audit_runner
 import hubblestack.module_runner.fdg_runner
+import hubblestack.runtime
 
 log = logging.getLogger(__name__)
-HSS = hubblestack.status.HubbleStatus(__name__, 'schedule', 'refresh_grains')
+HSS = hubblestack.status.HubbleStatus(__name__, 'schedule', 'refresh_grains', 'refresh_loaders')
 
 # Importing syslog fails on windows
 if not hubblestack.utils.platform.is_windows():
@@ -56,6 +59,8 @@ if not hubblestack.utils.platform.is_windows():
 __opts__ = {}
 # This should work fine until we go to multiprocessing
 SESSION_UUID = str(uuid.uuid4())
+# with event_loop, how often to retry HEC disk queues that haven't drained
+HEC_RETRY_INTERVAL = 60
 
 def run():
     """
@@ -161,8 +166,13 @@ def main():
     # Check for single function run
     if __opts__['function']:
         run_function()
+        hubblestack.loader.save_snapshots()
         sys.exit(0)
     last_grains_refresh = time.time() - __opts__['grains_refresh_frequency']
+    hubblestack.metrics.start()
+    if __opts__.get('event_loop', False):
+        log.info('Starting main loop (event driven)')
+        _event_loop(file_client, last_fc_update, last_grains_refresh)
     log.info('Starting main loop')
     pidfile_count = 0
     # pidfile_refresh in seconds, our scheduler deals in half-seconds
@@ -180,6 +190,7 @@ def main():
         try:
             log.debug('Executing schedule')
             sf_count = schedule()
+            hubblestack.loader.save_snapshots()
         except Exception as exc:
             log.exception('Error executing schedule: %s', exc)
             if isinstance(exc, KeyboardInterrupt):
@@ -187,6 +198,99 @@ def main():
         time.sleep(__opts__.get('scheduler_sleep_frequency', 0.5))
 
 
+def _event_loop(file_client, last_fc_update, last_grains_refresh):
+    """
+    Event driven version of the main loop, enabled with ``event_loop: True``
+
+    Instead of waking every scheduler_sleep_frequency, sleep in a selector
+    until the next scheduled job, fileserver update, grains refresh, pidfile
+    refresh or HEC disk queue retry is due (at most event_loop_max_sleep), or
+    until pulsar's inotify fd turns readable. Inotify events are left to
+    gather for pulsar_coalesce_window seconds and then the pulsar.process
+    jobs run right away, rather than on their next scheduled turn.
+
+    Signals need no registration: select() is interrupted for their handlers.
+    """
+    selector = selectors.DefaultSelector()
+    pulsar_fd = None
+    max_sleep = float(__opts__.get('event_loop_max_sleep', 60))
+    coalesce = float(__opts__.get('pulsar_coalesce_window', 0.5))
+    pidfile_refresh = int(__opts__.get('pidfile_refresh', 60))
+    last_pidfile = last_hec_retry = time.time()
+    while True:
+        now = time.time()
+        if now - last_fc_update >= __opts__['fileserver_update_frequency']:
+            last_fc_update = _update_fileserver(file_client)
+        if __opts__['daemonize'] and now - last_pidfile >= pidfile_refresh:
+            last_pidfile = now
+            create_pidfile()
+        if now - last_grains_refresh >= __opts__['grains_refresh_frequency']:
+            last_grains_refresh = _emit_and_refresh_grains()
+        if now - last_hec_retry >= HEC_RETRY_INTERVAL:
+            last_hec_retry = now
+            hubblestack.hec.obj.HEC.retry_queues()
+        try:
+            log.debug('Executing schedule')
+            schedule()
+            hubblestack.loader.save_snapshots()
+        except Exception as exc:
+            log.exception('Error executing schedule: %s', exc)
+            if isinstance(exc, KeyboardInterrupt):
+                raise exc
+        pulsar_fd = _select_pulsar_fd(selector, pulsar_fd)
+
+        due = [last_fc_update + __opts__['fileserver_update_frequency'],
+               last_grains_refresh + __opts__['grains_refresh_frequency'],
+               last_hec_retry + HEC_RETRY_INTERVAL,
+               time.time() + max_sleep]
+        if __opts__['daemonize']:
+            due.append(last_pidfile + pidfile_refresh)
+        due.extend(jobdata['next_run'] for jobdata in _schedule_config().values()
+                   if isinstance(jobdata, dict) and 'next_run' in jobdata)
+        timeout = max(0, min(due) - time.time())
+        if pulsar_fd is None:
+            # nothing to watch (select() of no fds fails on windows)
+            time.sleep(timeout)
+        elif selector.select(timeout):
+            # let the rest of the burst arrive, then hand it all to pulsar
+            time.sleep(coalesce)
+            if not _run_now('pulsar.process'):
+                log.warning('inotify events arrived but no pulsar.process job is scheduled')
+                selector.unregister(pulsar_fd)
+                pulsar_fd = None
+
+
+def _select_pulsar_fd(selector, pulsar_fd):
+    """
+    Keep the pulsar inotify fd (pulsar.notifier in __context__, set up by the
+    first pulsar run) registered with the selector; returns the registered fd
+    """
+    notifier = __context__.get('pulsar.notifier')
+    fd = notifier._watch_manager.get_fd() if notifier is not None else None
+    if fd == pulsar_fd:
+        return pulsar_fd
+    if pulsar_fd is not None:
+        try:
+            selector.unregister(pulsar_fd)
+        except (KeyError, ValueError):
+            pass
+    if fd is not None:
+        selector.register(fd, selectors.EVENT_READ)
+    return fd
+
+
+def _run_now(func):
+    """
+    Make the scheduled jobs running ``func`` due; returns how many there are
+    """
+    count = 0
+    for jobdata in _schedule_config().values():
+        if isinstance(jobdata, dict) and jobdata.get('function') == func:
+            jobdata['last_run'] = 0
+            count += 1
+    return count
+
+
 def getsecondsbycronexpression(base, cron_exp):
     """
     this function will return the seconds according to the cron
@@ -305,9 +409,7 @@ def schedule():
     """
     sf_count = 0
     base = datetime(2018, 1, 1, 0, 0)
-    schedule_config = __opts__.get('schedule', {})
-    if 'user_schedule' in __opts__ and isinstance(__opts__['user_schedule'], dict):
-        schedule_config.update(__opts__['user_schedule'])
+    schedule_config = _schedule_config()
     for jobname, jobdata in schedule_config.items():
         try:
             # Error handling galore
@@ -318,7 +420,7 @@ def schedule():
                 log.error('Scheduled job %s is missing a ``function`` or ``seconds`` argument', jobname)
                 continue
             func = jobdata['function']
-            if func not in __mods__:
+            if func not in hubblestack.runtime.current().mods:
                 log.error('Scheduled job %s has a function %s which could not be found.', jobname, func)
                 continue
             try:
@@ -344,30 +446,41 @@ def schedule():
             if run:
                 _execute_function(jobdata, func, returners, args, kwargs)
                 sf_count += 1
+            jobdata['next_run'] = jobdata['last_run'] + seconds
         except:
             log.error("Exception in running job: %s; continuing with next job...", jobname, exc_info=True)
     return sf_count
 
 
+def _schedule_config():
+    """ the schedule, with the user_schedule merged in """
+    schedule_config = __opts__.get('schedule', {})
+    if 'user_schedule' in __opts__ and isinstance(__opts__['user_schedule'], dict):
+        schedule_config.update(__opts__['user_schedule'])
+    return schedule_config
+
+
 def _execute_function(jobdata, func, returners, args, kwargs):
     """ Run the scheduled function """
     log.debug('Executing scheduled function %s', func)
+    # the job runs with the context of its start, whatever refreshes meanwhile
+    ctx = hubblestack.runtime.current()
     jobdata['last_run'] = time.time()
-    ret = __mods__[func](*args, **kwargs)
-    if __opts__['log_level'] == 'debug':
+    ret = ctx.mods[func](*args, **kwargs)
+    if ctx.opts['log_level'] == 'debug':
         log.debug('Job returned:\n%s', ret)
     for returner in returners:
         returner = '{0}.returner'.format(returner)
-        if returner not in __returners__:
+        if returner not in ctx.returners:
             log.error('Could not find %s returner.', returner)
             continue
         log.debug('Returning job data to %s', returner)
-        returner_ret = {'id': __grains__['id'],
-                        'jid': hubblestack.utils.jid.gen_jid(__opts__),
+        returner_ret = {'id': ctx.grains['id'],
+                        'jid': hubblestack.utils.jid.gen_jid(ctx.opts),
                         'fun': func,
                         'fun_args': args + ([kwargs] if kwargs else []),
                         'return': ret}
-        __returners__[returner](returner_ret)
+        ctx.returners[returner](returner_ret)
 
 
 def _process_job(jobdata, splay, seconds, min_splay, base):
@@ -418,23 +531,24 @@ def run_function():
             args.append(arg)
     log.debug('Parsed args: %s | Parsed kwargs: %s', args, kwargs)
     log.info('Executing user-requested function %s', __opts__['function'])
+    ctx = hubblestack.runtime.current()
     try:
-        ret = __mods__[__opts__['function']](*args, **kwargs)
+        ret = ctx.mods[__opts__['function']](*args, **kwargs)
     except KeyError:
         log.error('Function %s is not available, or not valid.', __opts__['function'])
         sys.exit(1)
     if __opts__['return']:
         returner = '{0}.returner'.format(__opts__['return'])
-        if returner not in __returners__:
+        if returner not in ctx.returners:
             log.error('Could not find %s returner.', returner)
         else:
             log.info('Returning job data to %s', returner)
-            returner_ret = {'id': __grains__['id'],
-                            'jid': hubblestack.utils.jid.gen_jid(__opts__),
+            returner_ret = {'id': ctx.grains['id'],
+                            'jid': hubblestack.utils.jid.gen_jid(ctx.opts),
                             'fun': __opts__['function'],
                             'fun_args': args + ([kwargs] if kwargs else []),
                             'return': ret}
-            __returners__[returner](returner_ret)
+            ctx.returners[returner](returner_ret)
     # TODO instantiate the salt outputter system?
     if __opts__['json_print']:
         print(json.dumps(ret))
@@ -680,6 +794,11 @@ def _setup_dirs():
 def refresh_grains(initial=False):
     """
     Refresh the grains, pillar, utils, modules, and returners
+
+    The results are published as a new hubblestack.runtime context in one
+    go; jobs that already captured the previous context keep using its opts,
+    grains and pillar (and its loaders, unless incremental_loader_refresh
+    refreshes them in place).
     """
     global __opts__
     global __grains__
@@ -691,7 +810,9 @@ def refresh_grains(initial=False):
 
     persist, old_grains = {}, {}
     if not initial:
-        old_grains = copy.deepcopy(__grains__)
+        # grains that fail to load this time keep their previous value; the
+        # previous generation's grains are never modified, so no copy is needed
+        old_grains = __grains__
         for grain in __opts__.get('grains_persist', []):
             if grain in __grains__:
                 persist[grain] = __grains__[grain]
@@ -701,13 +822,13 @@ def refresh_grains(initial=False):
 
     if initial:
         __context__ = {}
-    if 'grains' in __opts__:
-        __opts__.pop('grains')
-    if 'pillar' in __opts__:
-        __opts__.pop('pillar')
-    __grains__ = hubblestack.loader.grains(__opts__)
-    __grains__.update(persist)
-    __grains__['session_uuid'] = SESSION_UUID
+    # the grains loader sets opts['grains'] while it works: give it a copy
+    grains_opts = dict(__opts__)
+    grains_opts.pop('grains', None)
+    grains_opts.pop('pillar', None)
+    new_grains = hubblestack.loader.grains(grains_opts)
+    new_grains.update(persist)
+    new_grains['session_uuid'] = SESSION_UUID
 
     # This was a weird one. In older versions of hubble the version and
     # buildinfo were not persisted automatically which means that if you
@@ -715,60 +836,38 @@ def refresh_grains(initial=False):
     # cause that old daemon to report grains as if it were the new version.
     # Now if this hubble_marker_3 grain is present you know you can trust the
     # hubble_version and buildinfo.
-    __grains__['hubble_marker_3'] = True
+    new_grains['hubble_marker_3'] = True
 
-    old_grains.update(__grains__)
-    __grains__ = old_grains
+    grains = dict(old_grains)
+    grains.update(new_grains)
 
     # Check for default gateway and fall back if necessary
-    if __grains__.get('ip_gw', None) is False and 'fallback_fileserver_backend' in __opts__:
+    if grains.get('ip_gw', None) is False and 'fallback_fileserver_backend' in __opts__:
         log.info('No default gateway detected; using fallback_fileserver_backend.')
         __opts__['fileserver_backend'] = __opts__['fallback_fileserver_backend']
 
-    __opts__['hubble_uuid'] = __grains__.get('hubble_uuid', None)
-    __opts__['system_uuid'] = __grains__.get('system_uuid', None)
-    __pillar__ = {}
-    __opts__['grains'] = __grains__
-    __opts__['pillar'] = __pillar__
-    __utils__ = hubblestack.loader.utils(__opts__)
-    __mods__ = hubblestack.loader.modules(__opts__, utils=__utils__, context=__context__)
-    __returners__ = hubblestack.loader.returners(__opts__, __mods__)
+    pillar = {}
+    __opts__['hubble_uuid'] = grains.get('hubble_uuid', None)
+    __opts__['system_uuid'] = grains.get('system_uuid', None)
+    __opts__['grains'] = grains
+    __opts__['pillar'] = pillar
+    if not initial and __opts__.get('incremental_loader_refresh', False):
+        _refresh_loaders()
+        utils, mods, returners = __utils__, __mods__, __returners__
+    else:
+        utils = hubblestack.loader.utils(__opts__)
+        mods = hubblestack.loader.modules(__opts__, utils=utils, context=__context__)
+        returners = hubblestack.loader.returners(__opts__, mods)
 
     # the only things that turn up in here (and that get preserved)
     # are pulsar.queue, pulsar.notifier and cp.fileclient_###########
     # log.debug('keys in __context__: {}'.format(list(__context__)))
 
-    hubblestack.utils.stdrec.__grains__ = __grains__
-    hubblestack.utils.stdrec.__opts__ = __opts__
-
-    hubblestack.hec.opt.__grains__ = __grains__
-    hubblestack.hec.opt.__mods__ = __mods__
-    hubblestack.hec.opt.__opts__ = __opts__
-
-    hubblestack.log.splunk.__grains__ = __grains__
-    hubblestack.log.splunk.__mods__ = __mods__
-    hubblestack.log.splunk.__opts__ = __opts__
-
-    hubblestack.status.__opts__ = __opts__
-    hubblestack.status.__mods__ = __mods__
-
-    hubblestack.utils.signing.__opts__ = __opts__
-    hubblestack.utils.signing.__mods__ = __mods__
-
-    hubblestack.module_runner.runner.__mods__ = __mods__
-    hubblestack.module_runner.runner.__grains__ = __grains__
-    hubblestack.module_runner.runner.__opts__ = __opts__
-
-    hubblestack.module_runner.audit_runner.__mods__ = __mods__
-    hubblestack.module_runner.audit_runner.__grains__ = __grains__
-    hubblestack.module_runner.audit_runner.__opts__ = __opts__
-
-    hubblestack.module_runner.fdg_runner.__mods__ = __mods__
-    hubblestack.module_runner.fdg_runner.__grains__ = __grains__
-    hubblestack.module_runner.fdg_runner.__opts__ = __opts__
-    hubblestack.module_runner.fdg_runner.__returners__ = __returners__
-
-    hubblestack.utils.signing.__mods__ = __mods__
+    ctx = hubblestack.runtime.publish(_context_opts(), grains, pillar=pillar, utils=utils,
+                                      mods=mods, returners=returners)
+    __grains__, __pillar__ = ctx.grains, ctx.pillar
+    __utils__, __mods__, __returners__ = ctx.utils, ctx.mods, ctx.returners
+    log.debug('published runtime context generation %d', ctx.generation)
 
     HSS.start_sigusr1_signal_handler()
     hubblestack.log.refresh_handler_std_info()
@@ -778,6 +877,36 @@ def refresh_grains(initial=False):
         hubblestack.log.emit_to_splunk(__grains__, 'INFO', 'hubblestack.grains_report')
 
 
+def _context_opts():
+    """
+    A copy of __opts__ for the runtime context: shallow, without the grains
+    and pillar (the context has those), but with copies of the schedule's jobs,
+    which schedule() keeps marking with last_run and next_run
+    """
+    opts = {key: val for key, val in __opts__.items() if key not in ('grains', 'pillar')}
+    for key in ('schedule', 'user_schedule'):
+        if isinstance(opts.get(key), dict):
+            opts[key] = {name: dict(job) if isinstance(job, dict) else job
+                         for name, job in opts[key].items()}
+    return opts
+
+
+@HSS.watch('refresh_loaders')
+def _refresh_loaders():
+    """
+    Update the existing utils, modules and returners loaders with the new
+    __opts__ and __grains__ instead of rebuilding them. Only modules whose
+    source changed on disk or whose __virtual__ depends on a grain that
+    changed get loaded again (see LazyLoader.refresh_pack).
+
+    Enabled with the ``incremental_loader_refresh`` option.
+    """
+    for loader in (__utils__, __mods__, __returners__):
+        stale = loader.refresh_pack(__opts__)
+        if stale:
+            log.info('Reloading %s %s modules: %s', len(stale), loader.tag, ', '.join(stale))
+
+
 def emit_to_syslog(grains_to_emit):
     """
     Emit grains and their values to syslog
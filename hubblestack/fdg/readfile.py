@@ -4,9 +4,14 @@ Flexible Data Gathering: readfile
 
 This fdg module allows for reading in the contents of files, with various
 options for format and filtering.
+
+The parsed contents of json, yaml and config files are cached by path and
+parse arguments, and reused for as long as the file's inode, mtime and size
+stay the same, so fdg blocks reading the same file parse it only once.
 """
 
 
+import copy
 import json as _json
 import logging
 import os
@@ -18,6 +23,9 @@ from hubblestack.utils.encoding import encode_base64
 
 log = logging.getLogger(__name__)
 
+_PARSED = dict()
+_PARSED_MAX = 256
+
 
 def json(path, subkey=None, sep=None, chained=None, chained_status=None):
     """
@@ -52,12 +60,7 @@ def json(path, subkey=None, sep=None, chained=None, chained_status=None):
         log.error('Path %s not found.', path)
         return False, None
 
-    ret = None
-    try:
-        with open(path, 'r') as jfile:
-            ret = _json.load(jfile)
-    except Exception:
-        log.error('Error reading file %s.', path, exc_info=True)
+    ret = _cached_parse(path, ('json',), _load_json)
 
     if subkey:
         if sep is not None:
@@ -75,7 +78,7 @@ def json(path, subkey=None, sep=None, chained=None, chained_status=None):
             log.error('Error traversing dict.', exc_info=True)
             return False, None
 
-    return True, ret
+    return True, copy.deepcopy(ret)
 
 
 def yaml(path, subkey=None, sep=None, chained=None, chained_status=None):
@@ -111,12 +114,7 @@ def yaml(path, subkey=None, sep=None, chained=None, chained_status=None):
         log.error('Path %s not found.', path)
         return False, None
 
-    ret = None
-    try:
-        with open(path, 'r') as yaml_file:
-            ret = _yaml.safe_load(yaml_file)
-    except Exception:
-        log.error('Error reading file %s.', path, exc_info=True)
+    ret = _cached_parse(path, ('yaml',), _load_yaml)
 
     if subkey:
         if sep is not None:
@@ -134,7 +132,7 @@ def yaml(path, subkey=None, sep=None, chained=None, chained_status=None):
             log.error('Error traversing dict.', exc_info=True)
             return False, None
 
-    return True, ret
+    return True, copy.deepcopy(ret)
 
 
 def config(path,
@@ -238,12 +236,66 @@ def config(path,
         return False, None
 
     if dictsep is None:
-        ret = _lines_as_list(path, pattern, ignore_pattern)
+        ret = _cached_parse(path, ('list', pattern, ignore_pattern),
+                            lambda path: _lines_as_list(path, pattern, ignore_pattern))
     else:
         # Lines as key/value pairs in a dict
-        ret = _lines_as_dict(path, pattern, ignore_pattern, dictsep, valsep, subsep)
+        ret = _cached_parse(path, ('dict', pattern, ignore_pattern, dictsep, valsep, subsep),
+                            lambda path: _lines_as_dict(path, pattern, ignore_pattern,
+                                                        dictsep, valsep, subsep))
 
-    return ret is not None, ret
+    return ret is not None, copy.deepcopy(ret)
+
+
+def _cached_parse(path, params, parse):
+    """
+    Return ``parse(path)``, from the cache if the file at ``path`` was parsed
+    with the same ``params`` and hasn't changed since (same inode, mtime and
+    size). Failed parses (None) aren't cached.
+
+    The returned object is the cached one; copy it before handing it out.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return parse(path)
+    stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    key = (path, params)
+    cached = _PARSED.get(key)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    ret = parse(path)
+    _PARSED.pop(key, None)
+    if ret is not None:
+        if len(_PARSED) >= _PARSED_MAX:
+            # forget the oldest
+            _PARSED.pop(next(iter(_PARSED)))
+        _PARSED[key] = (stamp, ret)
+    return ret
+
+
+def _load_json(path):
+    """
+    Helper function for json. Parse the file, or log why not and return None.
+    """
+    try:
+        with open(path, 'r') as jfile:
+            return _json.load(jfile)
+    except Exception:
+        log.error('Error reading file %s.', path, exc_info=True)
+    return None
+
+
+def _load_yaml(path):
+    """
+    Helper function for yaml. Parse the file, or log why not and return None.
+    """
+    try:
+        with open(path, 'r') as yaml_file:
+            return _yaml.safe_load(yaml_file)
+    except Exception:
+        log.error('Error reading file %s.', path, exc_info=True)
+    return None
 
 
 def _lines_as_list(path, pattern, ignore_pattern):
@@ -258,6 +310,7 @@ def _lines_as_list(path, pattern, ignore_pattern):
                 ret = [s.strip() for s in ret]
                 return ret
         # Some lines as a list of strings
+        pattern, ignore_pattern = _compile_patterns(pattern, ignore_pattern)
         ret = []
         with open(path, 'r') as input_file:
             for line in input_file:
@@ -281,6 +334,7 @@ def _lines_as_dict(path, pattern, ignore_pattern, dictsep, valsep, subsep):
     processed_keys = set()
 
     try:
+        pattern, ignore_pattern = _compile_patterns(pattern, ignore_pattern)
         with open(path, 'r') as input_file:
             for line in input_file:
                 line = line.strip()
@@ -307,10 +361,18 @@ def _lines_as_dict(path, pattern, ignore_pattern, dictsep, valsep, subsep):
     return ret
 
 
+def _compile_patterns(pattern, ignore_pattern):
+    """
+    Compile the pattern and ignore_pattern once for all the lines of a file
+    """
+    return tuple(None if pat is None else re.compile(pat) for pat in (pattern, ignore_pattern))
+
+
 def _check_pattern(line, pattern, ignore_pattern):
     """
     Check a given line against both a pattern and an ignore_pattern and return
-    True or False based on whether that line should be used.
+    True or False based on whether that line should be used. The patterns can
+    be strings or compiled patterns.
     """
     keep = False
 
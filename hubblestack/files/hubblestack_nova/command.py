@@ -72,6 +72,8 @@ import hubblestack.utils
 
 log = logging.getLogger(__name__)
 
+__nova_sections__ = ('command',)
+
 
 def __virtual__():
     return True
@@ -54,6 +54,8 @@ import copy
 from hubblestack.exceptions import CommandExecutionError
 
 log = logging.getLogger(__name__)
+
+__nova_sections__ = ('fdg',)
 default_consolidation_operator = "and"
 
 def audit(data_list, tags, labels, debug=False, **kwargs):
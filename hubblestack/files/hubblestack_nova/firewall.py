@@ -35,6 +35,10 @@ firewall:
 A few words about the auditing logic
 The audit function uses the iptables.build_rule salt
 execution module to build the actual iptables rule to be checked.
+Each rule is checked by asking iptables about it (iptables -C). Set
+nova_firewall_snapshot: True to capture the running ruleset once per family
+with iptables-save (iptables.snapshot) and check every rule against that
+copy instead.
 How the rules are built?
 The elements in the rule dictionary will be used to build the iptables rule.
 
@@ -86,6 +90,8 @@ import hubblestack.utils.path
 
 log = logging.getLogger(__name__)
 
+__nova_sections__ = ('firewall',)
+
 __tags__ = None
 __data__ = None
 
@@ -132,6 +138,8 @@ def audit(data_list, tags, labels, debug=False, **kwargs):
         log.debug(__tags__)
 
     ret = {'Success': [], 'Failure': [], 'Controlled': []}
+    use_snapshot = __opts__.get('nova_firewall_snapshot', False)
+    snapshots = {}
     for tag in __tags__:
         if fnmatch.fnmatch(tag, tags):
             for tag_data in __tags__[tag]:
@@ -165,7 +173,10 @@ def audit(data_list, tags, labels, debug=False, **kwargs):
                 tag_data['rule'] = rule
 
                 # checking the existence of the rule
-                salt_ret = __mods__['iptables.check'](table=table, chain=chain, rule=rule, family=family)
+                if use_snapshot and family not in snapshots:
+                    snapshots[family] = __mods__['iptables.snapshot'](family=family) or None
+                salt_ret = __mods__['iptables.check'](table=table, chain=chain, rule=rule, family=family,
+                                                      snapshot=snapshots.get(family))
 
                 if salt_ret not in (True, False):
                     log.error(salt_ret)
@@ -66,6 +66,8 @@ from hubblestack.exceptions import CommandExecutionError
 
 log = logging.getLogger(__name__)
 
+__nova_sections__ = ('grep',)
+
 
 def __virtual__():
     if hubblestack.utils.platform.is_windows():
@@ -50,6 +50,8 @@ from collections import Counter
 
 log = logging.getLogger(__name__)
 
+__nova_sections__ = ('misc',)
+
 
 def __virtual__():
     return True
@@ -361,13 +363,12 @@ def test_mount_attrs(mount_name, attribute, check_type='hard'):
         return True if check_type == "soft" else (mount_name + " folder does not exist")
 
     # if the path exits, proceed with following code
-    output = __mods__['cmd.run']('cat /proc/mounts')
-    if not re.search(mount_name, output, re.M):
+    mounts = __mods__['mount.active']()
+    if mount_name not in mounts:
         return True if check_type == "soft" else (mount_name + " is not mounted")
-    else:
-        for line in output.splitlines():
-            if mount_name in line and attribute not in line:
-                return str(line)
+    info = mounts[mount_name]
+    if attribute not in info['opts']:
+        return ' '.join([info['device'], mount_name, info['fstype'], ','.join(info['opts'])])
     return True
 
 
@@ -40,6 +40,8 @@ from distutils.version import LooseVersion
 
 log = logging.getLogger(__name__)
 
+__nova_sections__ = ('mount',)
+
 
 def __virtual__():
     if hubblestack.utils.platform.is_windows():
@@ -24,6 +24,8 @@ import hubblestack.utils
 
 log = logging.getLogger(__name__)
 
+__nova_sections__ = ('netstat',)
+
 
 def __virtual__():
     if 'network.netstat' in __mods__:
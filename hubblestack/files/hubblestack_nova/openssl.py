@@ -86,6 +86,8 @@ except ImportError:
 
 log = logging.getLogger(__name__)
 
+__nova_sections__ = ('openssl',)
+
 __tags__ = None
 __data__ = None
 
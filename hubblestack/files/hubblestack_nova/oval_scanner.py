@@ -37,16 +37,28 @@ references based on OVAL test reference data of the definition, and then makes
 a comparison to the local packages installed on the system to identify potential
 vulnerabilities.
 
+The source is parsed in a single streaming pass and the resulting dictionary is
+cached in cachedir/oval, keyed by the sha256 of the source file; as long as the
+source doesn't change, later runs don't parse it again.
+
 This scanner currently only supports the Linux platform.
 """
 
 
 
 import xml.etree.ElementTree as ET
+import hashlib
 import json
+import os
 import requests
 import logging
+import tempfile
 import hubblestack.utils.platform
+import hubblestack.utils.versions
+
+__nova_sections__ = ('oval_scanner',)
+
+CHUNK_SIZE = 64 * 1024
 
 
 def __virtual__():
@@ -74,10 +86,8 @@ def audit(data_list, tags, labels, debug=False, **kwargs):
             opt_local_sourcefile = data['oval_scanner']['opt_local_sourcefile']
             opt_output_file = data['oval_scanner']['opt_output_file']
             # Build report
-            source_content = get_source_content(distro_name, distro_release, distro_codename, opt_baseurl, opt_remote_sourcefile, opt_local_sourcefile)
-            oval_definition = build_oval(source_content)
-            oval_and_maps = map_oval_ids(oval_definition)
-            vulns = create_vulns(oval_and_maps)
+            vulns = get_vulns(distro_name, distro_release, distro_codename, opt_baseurl, opt_remote_sourcefile, opt_local_sourcefile)
+            vulns = filter_vulns(vulns, local_pkgs)
             report = get_impact_report(vulns, local_pkgs, distro_name)
             # Write report to file if specified
             if opt_output_file:
@@ -88,8 +98,10 @@ def audit(data_list, tags, labels, debug=False, **kwargs):
     return ret
 
 
-def parse_impact_report(report, local_pkgs, hubble_format, impacted_pkgs=[]):
+def parse_impact_report(report, local_pkgs, hubble_format, impacted_pkgs=None):
     """Parse into Hubble friendly format"""
+    if impacted_pkgs is None:
+        impacted_pkgs = []
     for key, value in report.items():
         pkg_desc = 'Vulnerable Package(s): '
         for pkg in value['installed']:
@@ -122,9 +134,12 @@ def get_impact_report(vulns, local_pkgs, distro_name):
 
 
 # Build an impact report
-def build_impact(vulns, local_pkgs, distro_name, result={}):
+def build_impact(vulns, local_pkgs, distro_name, result=None):
     """Build impacts based on pkg comparisons"""
     logging.debug('build_impact')
+    if result is None:
+        result = {}
+    newer = compare_pkg_versions(vulns, local_pkgs)
     for data in vulns.values():
         for pkg in data['pkg']:
             name = pkg['name']
@@ -143,15 +158,18 @@ def build_impact(vulns, local_pkgs, distro_name, result={}):
                       advisory = data['advisories']
                     else:
                       advisory = cve
-                impact = get_impact(local_pkgs[name], name, ver, title, cve, advisory, severity)
+                impact = get_impact(local_pkgs[name], name, ver, title, cve, advisory, severity,
+                                    cmp_result=newer.get((name, ver)))
                 if impact:
-                    result = build_impact_report(impact)
+                    result = build_impact_report(impact, result)
     return result
 
 
-def build_impact_report(impact, report={}):
+def build_impact_report(impact, report=None):
     """Build a report based on impacts"""
     logging.debug('build_impact_report')
+    if report is None:
+        report = {}
     for adv, detail in impact.items():
         if adv not in report:
             report[adv] = {
@@ -166,11 +184,34 @@ def build_impact_report(impact, report={}):
     return report
 
 
-def get_impact(local_ver, name, ver, title, cve, advisory, severity):
+def compare_pkg_versions(vulns, local_pkgs):
+    """Compare the fixed versions of every vulnerable package to the installed
+    version, all the advisories of a package at once; returns {(name, ver): cmp}"""
+    logging.debug('compare_pkg_versions')
+    candidates = {}
+    for data in vulns.values():
+        for pkg in data['pkg']:
+            if pkg['name'] in local_pkgs:
+                candidates.setdefault(pkg['name'], set()).add(pkg['version'])
+    fmt = hubblestack.utils.versions.version_format(__grains__.get('os_family'))
+    ret = {}
+    for name, versions in candidates.items():
+        versions = sorted(versions)
+        if fmt:
+            results = hubblestack.utils.versions.compare_many(local_pkgs[name], versions, fmt=fmt)
+        else:
+            results = [__mods__['pkg.version_cmp'](ver, local_pkgs[name]) for ver in versions]
+        ret.update(((name, ver), result) for ver, result in zip(versions, results))
+    return ret
+
+
+def get_impact(local_ver, name, ver, title, cve, advisory, severity, cmp_result=None):
     """Compare local package ver to vulnerability ver in rpm distros"""
     logging.debug('get_rpm_impact')
     impact = {}
-    if __mods__['pkg.version_cmp'](ver, local_ver) > 0:
+    if cmp_result is None:
+        cmp_result = __mods__['pkg.version_cmp'](ver, local_ver)
+    if cmp_result is not None and cmp_result > 0:
         impact[title] = {
             'updated_pkg': {'name': name, 'version': ver},
             'installed': {'name': name, 'version': local_ver},
@@ -181,235 +222,220 @@ def get_impact(local_ver, name, ver, title, cve, advisory, severity):
     return impact
 
 
-# Create vulnerability dictionary
-def create_vulns(oval_and_maps, vulns={}):
-    """Create vuln dict that maps definitions directly to objects and states"""
-    logging.debug('create_vulns')
-    id_maps = oval_and_maps[0]
-    oval = oval_and_maps[1]
-    for definition, data in id_maps.items():
-        if definition in oval['definitions']:
-            vulns[definition] = oval['definitions'][definition]
-            vulns[definition]['pkg'] = []
-            vuln_pkg = vulns[definition]['pkg']
-            objects = data['objects']
-            for obj in objects:
-                pkg_group = None
-                if 'name' in oval['objects'][obj['object_id']]:
-                    name = oval['objects'][obj['object_id']]['name']
-                    if name in oval['vars']:
-                        pkg_group = oval['vars'][name]['pkg_names']
-                else:
-                    continue
-                if 'version' in oval['states'][obj['state_id']]:
-                    version = oval['states'][obj['state_id']]['version']
-                else:
-                    continue
-                if name not in oval['vars']:
-                    vuln_pkg.append({'name': name, 'version': version})
-                if pkg_group:
-                    for pkg in pkg_group:
-                        vuln_pkg.append({'name': pkg, 'version': version})
+def filter_vulns(vulns, local_pkgs):
+    """Keep only the definitions (and their packages) that are installed"""
+    logging.debug('filter_vulns')
+    ret = {}
+    for definition, data in vulns.items():
+        pkgs = [pkg for pkg in data['pkg'] if pkg['name'] in local_pkgs]
+        if pkgs:
+            ret[definition] = dict(data, pkg=pkgs)
+    return ret
+
+
+# Get the vulnerability dictionary of the oval source
+def get_vulns(distro_name, distro_release, distro_codename, base_url, source_file, local_file=None):
+    """Get the vuln dict of the source, parsing the source only when its hash
+    isn't in the cache (cachedir/oval/<source>.<sha256>.json) yet"""
+    logging.debug('get_vulns')
+    cache_dir = os.path.join(__opts__.get('cachedir'), 'oval')
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    if local_file:
+        logging.info('Found local file: {0}'.format(local_file))
+        source_name = os.path.basename(local_file)
+        path, digest = local_file, hash_file(local_file)
+    else:
+        url = get_definition_source(base_url, source_file, distro_name, distro_release, distro_codename)
+        logging.info('Reading remote file: {0}, this could take some time...'.format(url))
+        source_name = url.rstrip('/').rsplit('/', 1)[-1]
+        path, digest = fetch_source(url, cache_dir)
+    cache_file = os.path.join(cache_dir, '{0}.{1}.json'.format(source_name, digest))
+    try:
+        vulns = read_vulns_cache(cache_file)
+        if vulns is None:
+            logging.info('Parsing oval source {0}'.format(source_name))
+            vulns = parse_oval(path)
+            write_vulns_cache(cache_file, vulns)
+    finally:
+        if not local_file:
+            os.remove(path)
     return vulns
 
 
-# Map oval definitions to oval objects and states
-def map_oval_ids(oval, id_maps={}):
-    """For every test, grab only tests with both state and obj references"""
-    logging.debug('map_oval_ids')
-    for definition, data in oval['definitions'].items():
-        id_maps[definition] = {'objects': []}
-        objects = id_maps[definition]['objects']
-        tests = data['tests']
-        for test in tests:
-            test_def = oval['tests'][test]
-            if 'state_ref' in test_def:
-                state_id = test_def['state_ref']
-            else:
+def read_vulns_cache(cache_file):
+    """Read a cached vuln dict, None if there isn't one"""
+    try:
+        with open(cache_file, 'r') as infile:
+            vulns = json.load(infile)
+    except (IOError, OSError, ValueError):
+        return None
+    logging.debug('Using cached oval vulns {0}'.format(cache_file))
+    return vulns
+
+
+def write_vulns_cache(cache_file, vulns):
+    """Write the vuln dict to the cache, replacing the ones of older versions of the source"""
+    cache_dir, cache_name = os.path.split(cache_file)
+    source_name = cache_name.rsplit('.', 2)[0]
+    for name in os.listdir(cache_dir):
+        if name != cache_name and name.endswith('.json') and name.rsplit('.', 2)[0] == source_name:
+            os.remove(os.path.join(cache_dir, name))
+    tmp_file = cache_file + '.tmp'
+    try:
+        with open(tmp_file, 'w') as outfile:
+            json.dump(vulns, outfile)
+        os.replace(tmp_file, cache_file)
+    except (IOError, OSError) as exc:
+        logging.error('Unable to cache oval vulns to {0}: {1}'.format(cache_file, exc))
+
+
+def hash_file(path):
+    """sha256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as infile:
+        for chunk in iter(lambda: infile.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fetch_source(url, cache_dir):
+    """Stream the remote source to a temporary file, hashing it on the way;
+    returns the path and the sha256"""
+    logging.debug('fetch_source')
+    digest = hashlib.sha256()
+    fd, path = tempfile.mkstemp(dir=cache_dir, suffix='.xml')
+    try:
+        with os.fdopen(fd, 'wb') as outfile:
+            resp = requests.get(url, stream=True)
+            for chunk in resp.iter_content(chunk_size=CHUNK_SIZE):
+                digest.update(chunk)
+                outfile.write(chunk)
+    except Exception:
+        os.remove(path)
+        raise
+    return path, digest.hexdigest()
+
+
+# Parse oval from source
+def parse_oval(source):
+    """Parse the oval source (a path or file object) in a single pass, clearing
+    elements as they're read, into a vuln dict that maps definitions directly to
+    the package names and versions of their tests' objects and states"""
+    logging.debug('parse_oval')
+    records = {'definitions': {}, 'tests': {}, 'objects': {}, 'states': {}, 'variables': {}}
+    parsers = {'definitions': parse_definition, 'tests': parse_test, 'objects': parse_object,
+               'states': parse_state, 'variables': parse_variable}
+    stack = []
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            stack.append(elem)
+            continue
+        stack.pop()
+        if len(stack) == 2:
+            # a definition, test, object, state or variable: keep what we need of it
+            section = local_name(stack[1].tag)
+            if section in parsers and 'id' in elem.attrib:
+                records[section][elem.attrib['id']] = parsers[section](elem)
+            stack[1].remove(elem)
+        elif len(stack) == 1:
+            stack[0].remove(elem)
+    return create_vulns(records)
+
+
+def create_vulns(records):
+    """Create vuln dict that maps definitions directly to objects and states,
+    leaving out definitions without packages"""
+    logging.debug('create_vulns')
+    vulns = {}
+    for definition, data in records['definitions'].items():
+        pkgs = []
+        for test_ref in data.pop('tests'):
+            refs = records['tests'].get(test_ref)
+            if not refs:
                 continue
-            if 'object_ref' in test_def:
-                object_id = test_def['object_ref']
-            else:
+            name = records['objects'].get(refs[0])
+            version = records['states'].get(refs[1])
+            if name is None or version is None:
                 continue
-            objects.append({'object_id': object_id, 'state_id': state_id})
-    oval_and_maps = (id_maps, oval)
-    return oval_and_maps
-
-
-# Build oval from source
-def build_oval(source_content, oval={}):
-    """Build oval dict from ElementTree content"""
-    logging.debug('build_oval')
-    namespace = {
-        'oval': 'http://oval.mitre.org/XMLSchema/oval-definitions-5',
-        'linux': 'http://oval.mitre.org/XMLSchema/oval-definitions-5#linux',
-        'common': 'http://oval.mitre.org/XMLSchema/oval-common-5'
-    }
-    root = build_element_tree(source_content)
-    oval['generator'] = build_generator(root, namespace)
-    oval['definitions'] = build_definitions(root, namespace)
-    oval['tests'] = build_tests(root, namespace)
-    oval['objects'] = build_objects(root, namespace)
-    oval['states'] = build_states(root, namespace)
-    oval['vars'] = build_vars(root, namespace)
-    return oval
-
-
-def build_generator(root, namespace, gen={}):
-    """Build generator dict from oval source"""
-    logging.debug('build_generator')
-    generator = root.find('oval:generator', namespace)
-    if is_et(generator):
-        prod_name = generator.find('common:product_name', namespace)
-        prod_version = generator.find('common:product_version', namespace)
-        schema_version = generator.find('common:schema_version', namespace)
-        timestamp = generator.find('common:timestamp', namespace)
-        if is_et(prod_name):
-            gen['product_name'] = prod_name.text
-        if is_et(prod_version):
-            gen['product_version'] = prod_version.text
-        if is_et(schema_version):
-            gen['schema_version'] = schema_version.text
-        if is_et(timestamp):
-            gen['timestamp'] = timestamp.text
-    return gen
-
-
-def build_definitions(root, namespace, defs={}):
-    """Build element definitions from source into oval dict"""
-    logging.debug('build_definitions')
-    definitions = root.find('oval:definitions', namespace)
-    if is_et(definitions):
-        for definition in definitions:
-            primary_key = definition.attrib['id']
-            metadata = definition.find('oval:metadata', namespace)
-            title = metadata.find('oval:title', namespace).text
-            defs[primary_key] = {}
-            definition_data = defs[primary_key]
-            definition_data['title'] = title
-            definition_data['cve'] = []
-            definition_data['tests'] = []
-            references = metadata.findall('oval:reference', namespace)
-            for reference in references:
-                ref_id = reference.attrib['ref_id']
-                ref_url = reference.attrib['ref_url']
-                source = reference.attrib['source']
+            if name in records['variables']:
+                pkgs.extend({'name': pkg, 'version': version} for pkg in records['variables'][name])
+            else:
+                pkgs.append({'name': name, 'version': version})
+        if pkgs:
+            data['pkg'] = pkgs
+            vulns[definition] = data
+    return vulns
+
+
+def parse_definition(definition):
+    """Title, references, advisory and test references of a definition"""
+    data = {'title': None, 'cve': [], 'tests': []}
+    for metadata in definition:
+        if local_name(metadata.tag) != 'metadata':
+            continue
+        for item in metadata:
+            tag = local_name(item.tag)
+            if tag == 'title':
+                data['title'] = item.text
+            elif tag == 'reference':
+                source = item.get('source')
+                reference = {item.get('ref_id'): item.get('ref_url')}
                 if source in ('RHSA', 'RHBA', 'RHEA'):
-                    definition_data['rhsa'] = {ref_id: ref_url}
-                elif source in ('CVE'):
-                    definition_data['cve'].append({ref_id: ref_url})
-            advisory = metadata.find('oval:advisory', namespace)
-            if is_et(advisory):
-                severity = advisory.find('oval:severity', namespace).text
-                definition_data['severity'] = severity
-                adv_refs = advisory.findall('oval:ref', namespace)
-                advisories = []
-                for ref in adv_refs:
-                    advisories.append(ref.text)
-                definition_data['advisories'] = advisories
-            for criterion in definition.iter():
-                if is_et(criterion) and 'test_ref' in criterion.attrib:
-                    definition_data['tests'].append(criterion.attrib['test_ref'])
-    return defs
-
-
-def build_tests(root, namespace, tsts={}):
-    """Build element tests from source into oval dict"""
-    logging.debug('build_tests')
-    tests = root.find('oval:tests', namespace)
-    if is_et(tests):
-        for test in tests:
-            primary_key = test.attrib['id']
-            comment = test.attrib['comment']
-            test_object = test.find('linux:object', namespace)
-            test_state = test.find('linux:state', namespace)
-            tsts[primary_key] = {}
-            test_data = tsts[primary_key]
-            test_data['comment'] = comment
-            if is_et(test_object) and 'object_ref' in test_object.attrib:
-                test_data['object_ref'] = test_object.attrib['object_ref']
-            if is_et(test_state) and 'state_ref' in test_state.attrib:
-                test_data['state_ref'] = test_state.attrib['state_ref']
-    return tsts
-
-
-def build_objects(root, namespace, objs={}):
-    """Build element objects from source into oval dict"""
-    logging.debug('build_objects')
-    objects = root.find('oval:objects', namespace)
-    if is_et(objects):
-        for obj in objects:
-            primary_key = obj.attrib['id']
-            objs[primary_key] = {}
-            build_data = objs[primary_key]
-            object_name = obj.find('linux:name', namespace)
-            if is_et(object_name):
-                if object_name.text:
-                    name = object_name.text
-                elif object_name.attrib['var_ref']:
-                    name = object_name.attrib['var_ref']
-                build_data['name'] = name
-    return objs
-
-
-def build_states(root, namespace, stes={}):
-    """Build element states from source into oval dict"""
-    logging.debug('build_states')
-    states = root.find('oval:states', namespace)
-    if is_et(states):
-        for state in states:
-            primary_key = state.attrib['id']
-            stes[primary_key] = {}
-            state_data = stes[primary_key]
-            evr = state.find('linux:evr', namespace)
-            if is_et(evr):
-                state_data['version'] = evr.text
-                if 'operation' in evr.attrib:
-                    state_data['operation'] = evr.attrib['operation']
-    return stes
-
-
-def build_vars(root, namespace, vrs={}):
-    """Build element vars from source into oval dict (aka Ubuntu pkg names)"""
-    logging.debug('build_vars')
-    vars = root.find('oval:variables', namespace)
-    if is_et(vars):
-        for vr in vars:
-            primary_key = vr.attrib['id']
-            vrs[primary_key] = {}
-            var_data = vrs[primary_key]
-            var_data['pkg_names'] = []
-            for names in vr:
-                name_elements = names.iter()
-                for value in name_elements:
-                    var_data['pkg_names'].append(value.text)
-    return vrs
-
-
-def is_et(item):
-    """Determine if specific item is a valid ElementTree element"""
-    return isinstance(item, ET.Element)
-
-
-def build_element_tree(source_content):
-    """Build an element tree from source content"""
-    logging.debug('build_element_tree')
-    return ET.fromstring(source_content)
-
-
-# Get oval source
-def get_source_content(distro_name, distro_release, distro_codename, base_url, source_file, local_file=None):
-    """Get content from the source"""
-    logging.debug('get_source_content')
-    if not local_file:
-        url = get_definition_source(base_url, source_file, distro_name, distro_release, distro_codename)
-        logging.info('Reading remote file: {0}, this could take some time...'.format(url))
-        source = requests.get(url).content
-        return source
-    else:
-        logging.info('Found local file: {0}'.format(local_file))
-        with open(local_file, 'rb') as f:
-            return f.read()
+                    data['rhsa'] = reference
+                elif source == 'CVE':
+                    data['cve'].append(reference)
+            elif tag == 'advisory':
+                data['advisories'] = []
+                for advisory in item:
+                    if local_name(advisory.tag) == 'severity':
+                        data['severity'] = advisory.text
+                    elif local_name(advisory.tag) == 'ref':
+                        data['advisories'].append(advisory.text)
+    for criterion in definition.iter():
+        if 'test_ref' in criterion.attrib:
+            data['tests'].append(criterion.attrib['test_ref'])
+    return data
+
+
+def parse_test(test):
+    """(object_ref, state_ref) of a test, None unless it has both"""
+    object_ref = state_ref = None
+    for ref in test:
+        tag = local_name(ref.tag)
+        if tag == 'object':
+            object_ref = ref.get('object_ref')
+        elif tag == 'state':
+            state_ref = ref.get('state_ref')
+    if object_ref and state_ref:
+        return object_ref, state_ref
+    return None
+
+
+def parse_object(obj):
+    """Package name (or the variable holding the names) of an object"""
+    for name in obj:
+        if local_name(name.tag) == 'name':
+            return name.text or name.get('var_ref')
+    return None
+
+
+def parse_state(state):
+    """Version of a state"""
+    for evr in state:
+        if local_name(evr.tag) == 'evr':
+            return evr.text
+    return None
+
+
+def parse_variable(variable):
+    """Package names of a variable (aka Ubuntu pkg names)"""
+    return [value.text for names in variable for value in names.iter()]
+
+
+def local_name(tag):
+    """Tag without its namespace"""
+    return tag.rsplit('}', 1)[-1]
 
 
 def get_definition_source(base_url, source_file, distro_name, distro_release, distro_codename):
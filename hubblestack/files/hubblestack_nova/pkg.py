@@ -68,6 +68,8 @@ from distutils.version import LooseVersion
 
 log = logging.getLogger(__name__)
 
+__nova_sections__ = ('pkg',)
+
 
 def __virtual__():
     if hubblestack.utils.platform.is_windows():
@@ -7,6 +7,8 @@ import logging
 
 log = logging.getLogger(__name__)
 
+__nova_sections__ = ('pkgng_audit',)
+
 
 def __virtual__():
     if 'FreeBSD' not in __grains__['os']:
@@ -61,6 +61,8 @@ from distutils.version import LooseVersion
 
 log = logging.getLogger(__name__)
 
+__nova_sections__ = ('service',)
+
 
 def __virtual__():
     return True
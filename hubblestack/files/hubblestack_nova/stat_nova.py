@@ -57,6 +57,7 @@ from distutils.version import LooseVersion
 log = logging.getLogger(__name__)
 
 __virtualname__ = 'stat'
+__nova_sections__ = ('stat',)
 
 def __virtual__():
     if hubblestack.utils.platform.is_windows():
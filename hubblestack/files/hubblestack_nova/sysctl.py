@@ -38,6 +38,8 @@ from distutils.version import LooseVersion
 
 log = logging.getLogger(__name__)
 
+__nova_sections__ = ('sysctl',)
+
 
 def __virtual__():
     if hubblestack.utils.platform.is_windows():
@@ -39,6 +39,8 @@ from distutils.version import LooseVersion
 
 log = logging.getLogger(__name__)
 
+__nova_sections__ = ('systemctl',)
+
 
 def __virtual__():
     if hubblestack.utils.platform.is_windows():
@@ -27,6 +27,8 @@ import vulners
 
 log = logging.getLogger(__name__)
 
+__nova_sections__ = ('vulners_scanner', 'vulners_api_key')
+
 
 def __virtual__():
     return not sys.platform.startswith('win')
@@ -14,6 +14,7 @@ import hubblestack.utils.platform
 
 log = logging.getLogger(__name__)
 __virtualname__ = 'win_auditpol'
+__nova_sections__ = (__virtualname__,)
 
 
 def __virtual__():
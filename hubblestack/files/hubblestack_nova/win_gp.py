@@ -12,6 +12,7 @@ import hubblestack.utils.platform
 
 log = logging.getLogger(__name__)
 __virtualname__ = 'win_gp'
+__nova_sections__ = (__virtualname__,)
 
 
 def __virtual__():
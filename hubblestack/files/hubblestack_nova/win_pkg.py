@@ -15,6 +15,7 @@ from distutils.version import LooseVersion
 
 log = logging.getLogger(__name__)
 __virtualname__ = 'win_pkg'
+__nova_sections__ = (__virtualname__,)
 
 
 def __virtual__():
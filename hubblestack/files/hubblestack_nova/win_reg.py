@@ -17,6 +17,7 @@ __mods__ = {
 
 log = logging.getLogger(__name__)
 __virtualname__ = 'win_reg'
+__nova_sections__ = (__virtualname__,)
 
 
 def __virtual__():
@@ -19,6 +19,7 @@ except ImportError:
 
 log = logging.getLogger(__name__)
 __virtualname__ = 'win_secedit'
+__nova_sections__ = (__virtualname__,)
 
 
 def __virtual__():
@@ -1,9 +1,11 @@
 import os
 import re
 import time
+import bisect
 import logging
 import fnmatch
 import errno
+import threading
 
 import hubblestack.loader
 import hubblestack.payload
@@ -296,6 +298,192 @@ def write_file_list_cache(opts, data, list_cache, w_lock):
         log.trace('Lockfile %s removed', w_lock)
 
 
+class FileIndex(object):
+    '''
+    Persistent file_list/dir_list index of a fileserver backend
+
+    The backend refreshes it from its update() (where it walks or lists its
+    sources anyway) and answers file_list/dir_list from it in between,
+    without walking its cache (roots, whose sources are local, also rewalks
+    them once its index is older than fileserver_list_cache_time). The index is kept msgpack serialized in
+    ``<cachedir>/file_lists/<backend>/index.idx``, so other processes (and
+    the next start) see it, as, per saltenv:
+
+        files
+            the sorted relative file paths
+        stamps
+            the mtime (roots) or etag (s3fs, azurefs) of each file, in the
+            same order
+        dirs
+            the sorted relative directories; the parents of every file plus
+            any explicit (empty) dirs the backend knows about
+
+    .. code-block:: python
+
+        index = get_file_index(__opts__, 'roots')
+        changes = index.update('base', {'top.nebula': 1553102100.0})
+        index.save()
+        index.file_list('base', prefix='hubblestack_nova_profiles')
+    '''
+
+    def __init__(self, opts, backend):
+        self.path = os.path.join(opts['cachedir'], 'file_lists', backend, 'index.idx')
+        self.serial = hubblestack.payload.Serial('msgpack')
+        self.envs = {}
+        self.dirty = False
+        self.lock = threading.RLock()
+        self._stat = None
+
+    def _load(self):
+        '''
+        (Re)read the index if it changed on disk since we last looked
+        '''
+        try:
+            stat = os.stat(self.path)
+            stat = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        except OSError:
+            return
+        if stat == self._stat or self.dirty:
+            return
+        try:
+            with hubblestack.utils.files.fopen(self.path, 'rb') as fp_:
+                data = self.serial.loads(fp_.read(), encoding='utf-8')
+            self.envs = dict((saltenv, self._env(entry['files'], entry['stamps'], entry['dirs']))
+                             for saltenv, entry in data.items())
+        except Exception as exc:
+            log.warning('Ignoring unreadable fileserver index %s: %s', self.path, exc)
+            self.envs = {}
+        self._stat = stat
+
+    @staticmethod
+    def _env(files, stamps, dirs):
+        return {'files': files, 'stamps': dict(zip(files, stamps)), 'dirs': dirs,
+                'file_set': frozenset(files), 'dir_set': frozenset(dirs)}
+
+    def has_env(self, saltenv):
+        '''
+        Whether the index has been built for saltenv
+        '''
+        with self.lock:
+            self._load()
+            return saltenv in self.envs
+
+    def update(self, saltenv, stamps, dirs=()):
+        '''
+        Replace the files of saltenv with ``stamps`` (relative path => mtime
+        or etag). Returns the added, removed and changed paths.
+        '''
+        with self.lock:
+            self._load()
+            old = self.envs.get(saltenv, {}).get('stamps', {})
+            changes = {'added': sorted(set(stamps) - set(old)),
+                       'removed': sorted(set(old) - set(stamps)),
+                       'changed': sorted(path for path in stamps
+                                         if path in old and old[path] != stamps[path])}
+            all_dirs = set(dir_ for dir_ in dirs if dir_)
+            for path in stamps:
+                parent = os.path.dirname(path)
+                while parent and parent not in all_dirs:
+                    all_dirs.add(parent)
+                    parent = os.path.dirname(parent)
+            env = self.envs.get(saltenv)
+            if env is None or any(changes.values()) or all_dirs != env['dir_set']:
+                files = sorted(stamps)
+                self.envs[saltenv] = self._env(files, [stamps[path] for path in files],
+                                               sorted(all_dirs))
+                self.dirty = True
+            return changes
+
+    def prune(self, saltenvs):
+        '''
+        Drop the saltenvs that aren't in ``saltenvs`` any more
+        '''
+        with self.lock:
+            self._load()
+            for saltenv in set(self.envs) - set(saltenvs):
+                del self.envs[saltenv]
+                self.dirty = True
+
+    def save(self):
+        '''
+        Write the index out, if it changed
+        '''
+        with self.lock:
+            if not self.dirty:
+                return
+            data = dict((saltenv, {'files': env['files'], 'dirs': env['dirs'],
+                                   'stamps': [env['stamps'][path] for path in env['files']]})
+                        for saltenv, env in self.envs.items())
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                tmp_fn = self.path + '.tmp'
+                with hubblestack.utils.files.fopen(tmp_fn, 'wb') as fp_:
+                    fp_.write(self.serial.dumps(data, use_bin_type=True))
+                os.replace(tmp_fn, self.path)
+                stat = os.stat(self.path)
+                self._stat = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+            except (IOError, OSError) as exc:
+                log.error('Failed to write the fileserver index %s: %s', self.path, exc)
+            self.dirty = False
+
+    def _list(self, saltenv, form, prefix):
+        with self.lock:
+            self._load()
+            paths = self.envs.get(saltenv, {}).get(form, [])
+        prefix = prefix.strip('/')
+        if not prefix:
+            return list(paths)
+        # the paths are sorted, so the ones starting with prefix are a slice
+        start = bisect.bisect_left(paths, prefix)
+        end = start
+        while end < len(paths) and paths[end].startswith(prefix):
+            end += 1
+        return paths[start:end]
+
+    def file_list(self, saltenv, prefix=''):
+        '''
+        The sorted files of saltenv (under prefix)
+        '''
+        return self._list(saltenv, 'files', prefix)
+
+    def dir_list(self, saltenv, prefix=''):
+        '''
+        The sorted directories of saltenv (under prefix)
+        '''
+        return self._list(saltenv, 'dirs', prefix)
+
+    def has_file(self, saltenv, path):
+        with self.lock:
+            self._load()
+            return path in self.envs.get(saltenv, {}).get('file_set', ())
+
+    def has_dir(self, saltenv, path):
+        with self.lock:
+            self._load()
+            return path.rstrip('/') in self.envs.get(saltenv, {}).get('dir_set', ())
+
+    def stamp(self, saltenv, path):
+        '''
+        The mtime or etag recorded for path (None if it isn't indexed)
+        '''
+        with self.lock:
+            self._load()
+            return self.envs.get(saltenv, {}).get('stamps', {}).get(path)
+
+
+_FILE_INDEXES = {}
+
+
+def get_file_index(opts, backend):
+    '''
+    Return the FileIndex of backend (one per cachedir and backend)
+    '''
+    key = (opts['cachedir'], backend)
+    if key not in _FILE_INDEXES:
+        _FILE_INDEXES[key] = FileIndex(opts, backend)
+    return _FILE_INDEXES[key]
+
+
 def clear_lock(clear_func, role, remote=None, lock_type='update'):
     '''
     Function to allow non-fileserver functions to clear update locks
@@ -44,14 +44,27 @@ permissions. Proxy can also be provided in the configuration.
 .. note::
 
     Do not include the leading ? for sas_token if generated from the web
+
+Blobs are downloaded by a pool of ``azurefs_sync_workers`` threads (default
+8). Next to each container's cache dir, a ``.manifest`` file records the
+etag, last_modified and md5 of every cached blob (and the file hashes served
+from it), so unchanged blobs aren't re-hashed or fetched again and deleted
+blobs are found without walking the cache.
+
+.. code-block:: yaml
+
+    azurefs_sync_workers: 16
 """
 
 import base64
+import binascii
+import concurrent.futures
 import json
 import logging
 import os
 import os.path
 import shutil
+import threading
 
 import hubblestack.fileserver
 import hubblestack.utils.files
@@ -70,6 +83,11 @@ __virtualname__ = 'azurefs'
 
 log = logging.getLogger()
 
+AZUREFS_SYNC_WORKERS = 8
+# container cache path -> manifest ({blob name: {etag, last_modified, md5, size, mtime, hsum}})
+_MANIFESTS = {}
+_MANIFESTS_LOCK = threading.Lock()
+
 
 def __virtual__():
     """
@@ -173,14 +191,18 @@ def update():
     """
     Update caches of the storage containers.
 
-    Compares the md5 of the files on disk to the md5 of the blobs in the
-    container, and only updates if necessary.
+    Blobs whose etag and last_modified match the container manifest (and
+    whose cached copy is untouched) are skipped; otherwise the md5 of the
+    file on disk is compared to the md5 of the blob, and only changed blobs
+    are downloaded, several at a time.
 
-    Also processes deletions by walking the container caches and comparing
-    with the list of blobs in the container
+    Also processes deletions: blobs in the manifest that are no longer in
+    the container are removed from the cache
     """
+    env_stamps = {}
     for container in __opts__['azurefs']:
         path = _get_container_path(container)
+        stamps = env_stamps.setdefault(container.get('saltenv', 'base'), {})
         try:
             if not os.path.exists(path):
                 os.makedirs(path)
@@ -189,109 +211,59 @@ def update():
                 os.makedirs(path)
         except Exception as exc:
             log.exception('Error occurred creating cache directory for azurefs')
+            stamps.update(dict.fromkeys(_read_list(path)))
             continue
         blob_service = _get_container_service(container)
         name = container['container_name']
         try:
-            blob_list = blob_service.list_blobs(name)
+            blob_list = list(blob_service.list_blobs(name))
         except Exception as exc:
             log.exception('Error occurred fetching blob list for azurefs')
 
-            if not __opts__['delete_inaccessible_azure_containers'] \
-               or ( not "<class 'azure.common.AzureHttpError'>" in str(type(exc)) \
-                    and \
-                    not "<class 'azure.common.AzureMissingResourceHttpError'>" in str(type(exc))
-                    ):
+            if not _is_inaccessible(exc):
+                stamps.update(dict.fromkeys(_read_list(path)))
                 continue
 
-            if '<Code>AuthenticationFailed</Code>' in str(exc) \
-                or \
-                '<Code>AuthorizationPermissionMismatch</Code>' in str(exc) \
-                or \
-                '<Code>ContainerNotFound</Code>' in str(exc):
-
-                log.debug('Could not connect to azure container "{0}"'.format(name))
-                container_cache_folder = _get_container_path(container)
-                log.debug('Trying to delete the cache of container "{0}"'.format(name))
-                try:
-                    container_cachedir = os.path.join(__opts__['cachedir'], 'azurefs',container_cache_folder)
-                    container_filelist = container_cachedir + '.list'
-                    if os.path.exists(container_cachedir):
-                        shutil.rmtree(container_cachedir)
-                    if os.path.exists(container_filelist):
-                        os.remove(container_filelist)
-                except Exception:
-                    log.exception('Problem occurred trying to invalidate cache for container "{0}"'.format(name))
+            log.debug('Could not connect to azure container "{0}"'.format(name))
+            container_cache_folder = _get_container_path(container)
+            log.debug('Trying to delete the cache of container "{0}"'.format(name))
+            try:
+                container_cachedir = os.path.join(__opts__['cachedir'], 'azurefs',container_cache_folder)
+                container_filelist = container_cachedir + '.list'
+                if os.path.exists(container_cachedir):
+                    shutil.rmtree(container_cachedir)
+                for fname in (container_filelist, container_cachedir + '.manifest'):
+                    if os.path.exists(fname):
+                        os.remove(fname)
+                _MANIFESTS.pop(container_cachedir, None)
+            except Exception:
+                log.exception('Problem occurred trying to invalidate cache for container "{0}"'.format(name))
+            # whatever is still cached (nothing, if the cache was invalidated) is still served
+            stamps.update(dict.fromkeys(_read_list(path)))
             continue
 
-        # Walk the cache directory searching for deletions
+        manifest = _get_manifest(path)
         blob_names = [blob.name for blob in blob_list]
         blob_set = set(blob_names)
-        for root, dirs, files in os.walk(path):
-            for f in files:
-                fname = os.path.join(root, f)
-                relpath = os.path.relpath(fname, path)
-                if relpath not in blob_set:
-                    hubblestack.fileserver.wait_lock(fname + '.lk', fname)
-                    try:
-                        os.unlink(fname)
-                    except Exception:
-                        pass
-            if not dirs and not files:
-                shutil.rmtree(root)
 
-        for blob in blob_list:
-            fname = os.path.join(path, blob.name)
-            update = False
-            if os.path.exists(fname):
-                # File exists, check the hashes
-                source_md5 = blob.properties.content_settings.content_md5
-                local_md5_hex = hubblestack.utils.hashutils.get_hash(fname, 'md5')
-                local_md5 = base64.b64encode(bytes.fromhex(local_md5_hex))
-                if local_md5 != source_md5:
-                    update = True
+        # Process deletions; the first sync (no manifest yet) has to look at what's on disk
+        cached = set(manifest) if os.path.isfile(path + '.manifest') else _walk_cache(path)
+        for blob_name in cached - blob_set:
+            _remove_cached(path, blob_name)
+            manifest.pop(blob_name, None)
+
+        fetch = [blob for blob in blob_list if not _is_current(manifest, path, blob)]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=_get_sync_workers()) as pool:
+            fetched = dict(zip([blob.name for blob in fetch],
+                               pool.map(lambda blob: _fetch_blob(blob_service, name, path, blob),
+                                        fetch)))
+        for blob in fetch:
+            if fetched[blob.name]:
+                _set_manifest_entry(manifest, path, blob)
             else:
-                update = True
-
-            if update:
-                if not os.path.exists(os.path.dirname(fname)):
-                    os.makedirs(os.path.dirname(fname))
-                # Lock writes
-                lk_fn = fname + '.lk'
-                hubblestack.fileserver.wait_lock(lk_fn, fname)
-                with hubblestack.utils.files.fopen(lk_fn, 'w+') as fp_:
-                    fp_.write('')
-
-                try:
-                    blob_service.get_blob_to_path(name, blob.name, fname)
-                except Exception as exc:
-                    log.exception('Error occurred fetching blob from azurefs')
-
-                    if not __opts__['delete_inaccessible_azure_containers'] \
-                       or ( not "<class 'azure.common.AzureHttpError'>" in str(type(exc)) and \
-                            not "<class 'azure.common.AzureMissingResourceHttpError'>" in str(type(exc))
-                            ):
-                        continue
-
-                    if '<Code>AuthenticationFailed</Code>' in str(exc) \
-                        or \
-                       '<Code>AuthorizationPermissionMismatch</Code>' in str(exc) \
-                        or \
-                       '<Code>ContainerNotFound</Code>' in str(exc):
-
-                        try:
-                            if os.path.exists(fname):
-                                os.remove(fname)
-                                os.unlink(lk_fn)
-                        except Exception:
-                            log.exception('Problem occurred trying to delete the corrupt file "{0}"'.format(fname))
-                    continue
-
-                # Unlock writes
-                try:
-                    os.unlink(lk_fn)
-                except Exception:
-                    pass
+                manifest.pop(blob.name, None)
+        log.debug('azurefs container %s: %d blobs, %d downloaded', name, len(blob_list),
+                  sum(1 for ok in fetched.values() if ok))
 
         # Write out file list
         container_list = path + '.list'
@@ -305,13 +277,214 @@ def update():
             os.unlink(lk_fn)
         except Exception:
             pass
+        _write_manifest(path, manifest)
+        for blob in blob_list:
+            if blob.name in manifest:
+                stamps.setdefault(blob.name, manifest[blob.name]['etag'])
+
+    index = hubblestack.fileserver.get_file_index(__opts__, 'azurefs')
+    for saltenv, stamps in env_stamps.items():
+        index.update(saltenv, stamps)
+    index.prune(env_stamps)
+    index.save()
+
+    try:
+        # file hashes live in the manifests now; drop the old per-file hash cache
+        hash_cachedir = os.path.join(__opts__['cachedir'], 'azurefs', 'hashes')
+        if os.path.exists(hash_cachedir):
+            shutil.rmtree(hash_cachedir)
+    except Exception:
+        log.exception('Problem occurred trying to remove the old hash cache for azurefs')
+
+
+def _read_list(path):
+    """
+    Return the blob names in the file list of the container cached at path
+    """
+    try:
+        with hubblestack.utils.files.fopen(path + '.list', 'r') as fp_:
+            return json.load(fp_)
+    except (IOError, OSError, ValueError):
+        return []
+
+
+def _is_inaccessible(exc):
+    """
+    Whether exc means the container can't be reached with our credentials
+    (and delete_inaccessible_azure_containers says to drop its cache)
+    """
+    if not __opts__['delete_inaccessible_azure_containers'] \
+       or ( not "<class 'azure.common.AzureHttpError'>" in str(type(exc)) \
+            and \
+            not "<class 'azure.common.AzureMissingResourceHttpError'>" in str(type(exc))
+            ):
+        return False
+    return '<Code>AuthenticationFailed</Code>' in str(exc) \
+        or '<Code>AuthorizationPermissionMismatch</Code>' in str(exc) \
+        or '<Code>ContainerNotFound</Code>' in str(exc)
+
+
+def _get_sync_workers():
+    """
+    Return the number of blob download threads
+    """
+    try:
+        return max(1, int(__opts__.get('azurefs_sync_workers', AZUREFS_SYNC_WORKERS)))
+    except (TypeError, ValueError):
+        return AZUREFS_SYNC_WORKERS
+
+
+def _walk_cache(path):
+    """
+    Return the relative paths of the files in a container cache dir
+    """
+    ret = set()
+    for root, _dirs, files in os.walk(path):
+        for f in files:
+            if not f.endswith('.lk'):
+                ret.add(os.path.relpath(os.path.join(root, f), path).replace(os.sep, '/'))
+    return ret
+
+
+def _remove_cached(path, blob_name):
+    """
+    Remove a deleted blob from the cache, and the dirs it leaves empty
+    """
+    fname = os.path.join(path, blob_name)
+    hubblestack.fileserver.wait_lock(fname + '.lk', fname)
+    try:
+        os.unlink(fname)
+    except Exception:
+        pass
+    root = os.path.dirname(fname)
+    while os.path.normpath(root) != os.path.normpath(path):
         try:
-            #Do not move this statement above 'delete_inaccessible_azure_containers' logic.
-            hash_cachedir = os.path.join(__opts__['cachedir'], 'azurefs', 'hashes')
-            if os.path.exists(hash_cachedir):
-                shutil.rmtree(hash_cachedir)
+            os.rmdir(root)
+        except OSError:
+            break
+        root = os.path.dirname(root)
+
+
+def _blob_md5(blob):
+    """
+    Return the hex md5 azure has for the blob (None if it has none)
+    """
+    content_md5 = blob.properties.content_settings.content_md5
+    if not content_md5:
+        return None
+    try:
+        return binascii.hexlify(base64.b64decode(content_md5)).decode()
+    except (binascii.Error, ValueError, TypeError):
+        return None
+
+
+def _is_current(manifest, path, blob):
+    """
+    Whether the cached copy of blob is up to date
+    """
+    fname = os.path.join(path, blob.name)
+    entry = _get_manifest_entry(manifest, path, blob.name)
+    if entry and entry['etag'] == str(blob.properties.etag) \
+            and entry['last_modified'] == str(blob.properties.last_modified):
+        return True
+    source_md5 = _blob_md5(blob)
+    if source_md5 and os.path.isfile(fname) \
+            and hubblestack.utils.hashutils.get_hash(fname, 'md5') == source_md5:
+        _set_manifest_entry(manifest, path, blob)
+        return True
+    return False
+
+
+def _fetch_blob(blob_service, name, path, blob):
+    """
+    Download one blob into the container cache; returns True on success
+    """
+    fname = os.path.join(path, blob.name)
+    if not os.path.exists(os.path.dirname(fname)):
+        os.makedirs(os.path.dirname(fname), exist_ok=True)
+    # Lock writes
+    lk_fn = fname + '.lk'
+    hubblestack.fileserver.wait_lock(lk_fn, fname)
+    with hubblestack.utils.files.fopen(lk_fn, 'w+') as fp_:
+        fp_.write('')
+
+    try:
+        blob_service.get_blob_to_path(name, blob.name, fname)
+    except Exception as exc:
+        log.exception('Error occurred fetching blob from azurefs')
+
+        if _is_inaccessible(exc):
+            try:
+                if os.path.exists(fname):
+                    os.remove(fname)
+            except Exception:
+                log.exception('Problem occurred trying to delete the corrupt file "{0}"'.format(fname))
+        return False
+    finally:
+        # Unlock writes
+        try:
+            os.unlink(lk_fn)
         except Exception:
-            log.exception('Problem occurred trying to invalidate hash cach for azurefs')
+            pass
+    return True
+
+
+def _get_manifest(path):
+    """
+    Return the manifest of the container cached at path, reading it from
+    disk the first time
+    """
+    with _MANIFESTS_LOCK:
+        if path not in _MANIFESTS:
+            manifest = {}
+            try:
+                with hubblestack.utils.files.fopen(path + '.manifest', 'r') as fp_:
+                    manifest = json.load(fp_)
+            except (IOError, OSError, ValueError):
+                pass
+            _MANIFESTS[path] = manifest if isinstance(manifest, dict) else {}
+        return _MANIFESTS[path]
+
+
+def _write_manifest(path, manifest):
+    """
+    Write the manifest of the container cached at path
+    """
+    with _MANIFESTS_LOCK:
+        tmp_fn = path + '.manifest.tmp'
+        with hubblestack.utils.files.fopen(tmp_fn, 'w') as fp_:
+            json.dump(manifest, fp_, separators=(',', ':'))
+        os.replace(tmp_fn, path + '.manifest')
+        _MANIFESTS[path] = manifest
+
+
+def _get_manifest_entry(manifest, path, blob_name):
+    """
+    Return the manifest entry for blob_name if its cached file is untouched
+    """
+    entry = manifest.get(blob_name)
+    if not entry:
+        return None
+    try:
+        stat = os.stat(os.path.join(path, blob_name))
+    except OSError:
+        return None
+    if stat.st_size != entry['size'] or stat.st_mtime_ns != entry['mtime']:
+        return None
+    return entry
+
+
+def _set_manifest_entry(manifest, path, blob):
+    """
+    Record the cached copy of blob in the manifest
+    """
+    stat = os.stat(os.path.join(path, blob.name))
+    manifest[blob.name] = {'etag': str(blob.properties.etag),
+                           'last_modified': str(blob.properties.last_modified),
+                           'md5': _blob_md5(blob),
+                           'size': stat.st_size,
+                           'mtime': stat.st_mtime_ns,
+                           'hsum': {}}
 
 
 def file_hash(load, fnd):
@@ -320,31 +493,36 @@ def file_hash(load, fnd):
     """
     if not all(x in load for x in ('path', 'saltenv')):
         return '', None
-    ret = {'hash_type': __opts__['hash_type']}
+    hash_type = __opts__['hash_type']
+    ret = {'hash_type': hash_type}
     relpath = fnd['rel']
     path = fnd['path']
-    hash_cachedir = os.path.join(__opts__['cachedir'], 'azurefs', 'hashes')
-    hashdest = hubblestack.utils.path.join(hash_cachedir,
-                                    load['saltenv'],
-                                    '{0}.hash.{1}'.format(relpath,
-                                                          __opts__['hash_type']))
-    if not os.path.isfile(hashdest):
-        if not os.path.exists(os.path.dirname(hashdest)):
-            os.makedirs(os.path.dirname(hashdest))
-        ret['hsum'] = hubblestack.utils.hashutils.get_hash(path, __opts__['hash_type'])
-        with hubblestack.utils.files.fopen(hashdest, 'w+') as fp_:
-            fp_.write(ret['hsum'])
-        return ret
-    else:
-        with hubblestack.utils.files.fopen(hashdest, 'rb') as fp_:
-            ret['hsum'] = fp_.read()
-        return ret
+    container_path = path[:-len(relpath)].rstrip('/\\') if relpath and path.endswith(relpath) else None
+    entry = None
+    if container_path:
+        entry = _get_manifest_entry(_get_manifest(container_path), container_path,
+                                    relpath.replace(os.sep, '/'))
+    if entry:
+        if hash_type == 'md5' and entry.get('md5'):
+            ret['hsum'] = entry['md5']
+            return ret
+        if hash_type in entry['hsum']:
+            ret['hsum'] = entry['hsum'][hash_type]
+            return ret
+    ret['hsum'] = hubblestack.utils.hashutils.get_hash(path, hash_type)
+    if entry:
+        # kept in memory; written out with the manifest on the next update
+        entry['hsum'][hash_type] = ret['hsum']
+    return ret
 
 
 def file_list(load):
     """
     Return a list of all files in a specified environment
     """
+    index = hubblestack.fileserver.get_file_index(__opts__, 'azurefs')
+    if index.has_env(load['saltenv']):
+        return index.file_list(load['saltenv'], load.get('prefix', ''))
     ret = set()
     try:
         for container in __opts__['azurefs']:
@@ -369,6 +547,9 @@ def dir_list(load):
     """
     Return a list of all directories in a specified environment
     """
+    index = hubblestack.fileserver.get_file_index(__opts__, 'azurefs')
+    if index.has_env(load['saltenv']):
+        return index.dir_list(load['saltenv'], load.get('prefix', ''))
     ret = set()
     files = file_list(load)
     for f in files:
@@ -19,6 +19,7 @@ configuration option.
 import os
 import errno
 import logging
+import time
 
 import hubblestack.fileserver
 import hubblestack.utils.files
@@ -32,6 +33,9 @@ from hubblestack.utils.signing import find_wrapf
 
 log = logging.getLogger(__name__)
 
+# when this process last refreshed the roots index (see _file_lists)
+_INDEX_REFRESHED = 0
+
 @find_wrapf(not_found={'path': '', 'rel': ''})
 def find_file(path, saltenv='base', **kwargs):
     """
@@ -193,6 +197,52 @@ def update():
                 )
             )
 
+    _update_index()
+
+
+def _translate_sep(path):
+    """
+    Translate path separators for Windows masterless minions
+    """
+    return path.replace('\\', '/') if os.path.sep == '\\' else path
+
+
+def _update_index():
+    """
+    Refresh the file_list/dir_list index of every saltenv in file_roots
+    """
+    global _INDEX_REFRESHED
+    _INDEX_REFRESHED = time.time()
+    index = hubblestack.fileserver.get_file_index(__opts__, 'roots')
+    for saltenv, paths in __opts__['file_roots'].items():
+        stamps = {}
+        dirs = set()
+        for path in paths:
+            for root, dirnames, filenames in hubblestack.utils.path.os_walk(
+                    path,
+                    followlinks=__opts__['fileserver_followsymlinks']):
+                for tgt, items in ((dirs, dirnames), (None, filenames)):
+                    for item in items:
+                        abs_path = os.path.join(root, item)
+                        if __opts__['fileserver_ignoresymlinks'] \
+                                and hubblestack.utils.path.islink(abs_path):
+                            continue
+                        rel_path = _translate_sep(os.path.relpath(abs_path, path))
+                        if hubblestack.fileserver.is_file_ignored(__opts__, rel_path):
+                            continue
+                        if tgt is not None:
+                            tgt.add(rel_path)
+                        elif rel_path not in stamps:
+                            # the first root holding a path is the one served
+                            try:
+                                stamps[rel_path] = os.path.getmtime(abs_path)
+                            except OSError:
+                                # dangling symlink
+                                continue
+        index.update(saltenv, stamps, dirs)
+    index.prune(__opts__['file_roots'])
+    index.save()
+
 
 def file_hash(load, fnd):
     """
@@ -281,6 +331,18 @@ def _file_lists(load, form):
     if load['saltenv'] not in __opts__['file_roots']:
         return []
 
+    if form in ('files', 'dirs'):
+        # served from the index update() keeps, once it has run; the roots
+        # are local, so rewalk them once the index is older than the list
+        # cache would be
+        index = hubblestack.fileserver.get_file_index(__opts__, 'roots')
+        if index.has_env(load['saltenv']):
+            if time.time() - _INDEX_REFRESHED >= __opts__.get('fileserver_list_cache_time', 20):
+                _update_index()
+            if form == 'files':
+                return index.file_list(load['saltenv'], load.get('prefix', ''))
+            return index.dir_list(load['saltenv'], load.get('prefix', ''))
+
     list_cachedir = os.path.join(__opts__['cachedir'], 'file_lists', 'roots')
     if not os.path.isdir(list_cachedir):
         try:
@@ -308,12 +370,6 @@ def _file_lists(load, form):
             """
             Add the files to the target set
             """
-            def _translate_sep(path):
-                """
-                Translate path separators for Windows masterless minions
-                """
-                return path.replace('\\', '/') if os.path.sep == '\\' else path
-
             for item in items:
                 abs_path = os.path.join(parent_dir, item)
                 log.trace('roots: Processing %s', abs_path)
@@ -76,18 +76,30 @@ structure::
 
     More info here:
     https://docs.aws.amazon.com/AmazonS3/latest/API/RESTCommonResponseHeaders.html
+
+Bucket listings and object downloads run on a pool of ``s3.sync_workers``
+threads (default 8) sharing one pooled requests session. A sidecar index in
+the s3cache dir records the ETag, size, mtime and md5 of every cached object,
+so an object whose listed ETag and local copy haven't changed since the last
+sync is skipped without a HEAD request or re-hashing the local file.
+
+.. code-block:: yaml
+
+    s3.sync_workers: 16
 """
 
-import datetime
+import concurrent.futures
 import os
 import time
 import pickle
 import logging
+import threading
 
 import hubblestack.fileserver as fs
 import hubblestack.utils.files
 import hubblestack.utils.gzip_util
 import hubblestack.utils.hashutils
+import hubblestack.utils.s3
 
 # pylint: disable=import-error,no-name-in-module,redefined-builtin
 from urllib.parse import quote as _quote
@@ -99,6 +111,10 @@ log = logging.getLogger(__name__)
 
 S3_CACHE_EXPIRE = 1800  # cache for 30 minutes
 S3_SYNC_ON_UPDATE = True  # sync cache on update rather than jit
+S3_SYNC_WORKERS = 8
+
+_SYNC_INDEX = {'mtime': None, 'index': None}
+_SYNC_INDEX_LOCK = threading.Lock()
 
 
 def envs():
@@ -117,20 +133,37 @@ def update():
     """
     metadata = _init()
 
+    if metadata:
+        _update_index(metadata)
+
     if S3_SYNC_ON_UPDATE and metadata:
         # sync the buckets to the local cache
         log.info('Syncing local cache from S3...')
+        index = _get_sync_index()
+        jobs = {}
         for saltenv, env_meta in metadata.items():
-            for bucket_files in _find_files(env_meta):
+            for bucket_files in env_meta:
                 for bucket, files in bucket_files.items():
-                    for file_path in files:
-                        cached_file_path = _get_cached_file_name(bucket, saltenv, file_path)
-                        log.info('%s - %s : %s', bucket, saltenv, file_path)
-
-                        # load the file from S3 if it's not in the cache or it's old
-                        _get_file_from_s3(metadata, saltenv, bucket, file_path, cached_file_path)
+                    for file_meta in files:
+                        if 'Key' not in file_meta or file_meta['Key'].endswith('/'):
+                            continue
+                        cached_file_path = _get_cached_file_name(bucket, saltenv, file_meta['Key'])
+                        jobs[cached_file_path] = (saltenv, bucket, file_meta)
+
+        downloaded = 0
+        with concurrent.futures.ThreadPoolExecutor(max_workers=_get_sync_workers()) as pool:
+            futures = {pool.submit(_sync_file, index, saltenv, bucket, file_meta, cached_file_path):
+                       cached_file_path
+                       for cached_file_path, (saltenv, bucket, file_meta) in jobs.items()}
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    downloaded += 1 if future.result() else 0
+                except Exception:
+                    log.exception('Failed to sync %s from S3', futures[future])
+        _write_sync_index(index)
 
-        log.info('Sync local cache from S3 completed.')
+        log.info('Sync local cache from S3 completed: %d of %d files downloaded.',
+                 downloaded, len(jobs))
 
 
 @find_wrapf(not_found={'bucket': None, 'path': None}, real_path='cpath')
@@ -204,7 +237,11 @@ def file_hash(load, fnd):
         fnd['path'])
 
     if os.path.isfile(cached_file_path):
-        ret['hsum'] = hubblestack.utils.hashutils.get_hash(cached_file_path)
+        entry = _get_index_entry(_get_sync_index(), cached_file_path)
+        if entry and entry.get('md5'):
+            ret['hsum'] = entry['md5']
+        else:
+            ret['hsum'] = hubblestack.utils.hashutils.get_hash(cached_file_path)
         ret['hash_type'] = 'md5'
 
     return ret
@@ -263,6 +300,9 @@ def file_list(load):
         return ret
 
     saltenv = load['saltenv']
+    index = fs.get_file_index(__opts__, 's3fs')
+    if index.has_env(saltenv):
+        return index.file_list(saltenv, load.get('prefix', ''))
     metadata = _init()
 
     if not metadata or saltenv not in metadata:
@@ -299,6 +339,9 @@ def dir_list(load):
         return ret
 
     saltenv = load['saltenv']
+    index = fs.get_file_index(__opts__, 's3fs')
+    if index.has_env(saltenv):
+        return index.dir_list(saltenv, load.get('prefix', ''))
     metadata = _init()
 
     if not metadata or saltenv not in metadata:
@@ -315,6 +358,29 @@ def dir_list(load):
     return ret
 
 
+def _update_index(metadata):
+    """
+    Refresh the file_list/dir_list index from the buckets metadata
+    """
+    index = fs.get_file_index(__opts__, 's3fs')
+    for saltenv, env_meta in metadata.items():
+        stamps = {}
+        for bucket_files in env_meta:
+            for files in bucket_files.values():
+                for file_meta in files:
+                    key = file_meta.get('Key')
+                    if not key or key.endswith('/') or fs.is_file_ignored(__opts__, key):
+                        continue
+                    stamps.setdefault(_trim_env_off_path([key], saltenv)[0], file_meta.get('ETag'))
+        dirs = set()
+        for bucket in _find_dirs(env_meta):
+            for bucket_dirs in bucket.values():
+                dirs.update(_trim_env_off_path(bucket_dirs, saltenv, trim_slash=True))
+        index.update(saltenv, stamps, dirs)
+    index.prune(metadata)
+    index.save()
+
+
 def _get_s3_key():
     """
     Get AWS keys from pillar or config
@@ -329,6 +395,7 @@ def _get_s3_key():
         'keyid': None,
         'key': None,
         'cache_expire': S3_CACHE_EXPIRE,
+        'sync_workers': S3_SYNC_WORKERS,
     }
 
     ret = dict()
@@ -397,7 +464,7 @@ def _get_cached_file_name(bucket_name, saltenv, path):
 
     # make sure bucket and saltenv directories exist
     if not os.path.exists(os.path.dirname(file_path)):
-        os.makedirs(os.path.dirname(file_path))
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
 
     return file_path
 
@@ -438,7 +505,8 @@ def _refresh_buckets_cache_file(cache_file):
                                         return_bin=False,
                                         path_style=s3_key_kwargs['path_style'],
                                         https_enable=s3_key_kwargs['https_enable'],
-                                        params={'marker': marker})
+                                        params={'marker': marker},
+                                        session=_get_session())
             if not tmp:
                 return None
 
@@ -463,8 +531,10 @@ def _refresh_buckets_cache_file(cache_file):
                      - gets passed if there is a single environment per bucket
         """
         bucket_files_list = []
-        for bucket_name in buckets:
-            s3_meta = __get_s3_meta(bucket_name)
+        # list the buckets concurrently (each bucket's pages still come one marker at a time)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=_get_sync_workers()) as pool:
+            s3_metas = list(pool.map(__get_s3_meta, buckets))
+        for bucket_name, s3_meta in zip(buckets, s3_metas):
 
             # s3 query returned nothing
             if not s3_meta:
@@ -669,74 +739,40 @@ def _get_file_from_s3(metadata, saltenv, bucket_name, path, cached_file_path):
     Checks the local cache for the file, if it's old or missing go grab the
     file from S3 and update the cache
     """
-    s3_key_kwargs = _get_s3_key()
+    file_meta = _find_file_meta(metadata, bucket_name, saltenv, path) or {'Key': path}
+    index = _get_sync_index()
+    if _sync_file(index, saltenv, bucket_name, file_meta, cached_file_path):
+        _write_sync_index(index)
 
-    def _get_file():
-        """
-        Helper function that gets the file from S3 and checks if it can be skipped.
-        Returns True if the file was downloaded and False if the download was skipped.
-        """
-        ret = __utils__['s3.query'](
-            key=s3_key_kwargs['key'],
-            keyid=s3_key_kwargs['keyid'],
-            kms_keyid=s3_key_kwargs['keyid'],
-            method='HEAD',
-            bucket=bucket_name,
-            service_url=s3_key_kwargs['service_url'],
-            verify_ssl=s3_key_kwargs['verify_ssl'],
-            location=s3_key_kwargs['location'],
-            path=_quote(path),
-            local_file=cached_file_path,
-            full_headers=True,
-            path_style=s3_key_kwargs['path_style'],
-            https_enable=s3_key_kwargs['https_enable'])
-        if ret:
-            for header_name, header_value in ret['headers'].items():
-                header_name = header_name.strip()
-                header_value = header_value.strip()
-                if str(header_name).lower() == 'last-modified':
-                    s3_file_mtime = datetime.datetime.strptime(
-                        header_value, '%a, %d %b %Y %H:%M:%S %Z')
-                elif str(header_name).lower() == 'content-length':
-                    s3_file_size = int(header_value)
-            if cached_file_data['size'] == s3_file_size and \
-                    cached_file_data['mtime'] > s3_file_mtime:
-                log.info(
-                    '%s - %s : %s skipped download since cached file size '
-                    'equal to and mtime after s3 values',
-                    bucket_name, saltenv, path)
-                return False
-        return True
 
-    # check the local cache...
-    if os.path.isfile(cached_file_path):
-        file_meta = _find_file_meta(metadata, bucket_name, saltenv, path)
-        if file_meta:
-            if file_meta['ETag'].find('-') == -1:
-                cached_md5 = hubblestack.utils.hashutils.get_hash(cached_file_path, 'md5')
-
-                # hashes match we have a cache hit
-                if cached_md5 == file_meta['ETag']:
-                    return
-            else:
-                cached_file_stat = os.stat(cached_file_path)
-                cached_file_data = {
-                    'size': cached_file_stat.st_size,
-                    'mtime': datetime.datetime.fromtimestamp(cached_file_stat.st_mtime),
-                    'lastmod': datetime.datetime.strptime(
-                        file_meta['LastModified'], '%Y-%m-%dT%H:%M:%S.%fZ')}
-
-                if (cached_file_data['size'] == int(file_meta['Size']) and
-                        cached_file_data['mtime'] > cached_file_data['lastmod']):
-                    log.debug('cached file size equal to metadata size and '
-                              'cached file mtime later than metadata last '
-                              'modification time.')
-                    if not _get_file():
-                        # skipped download
-                        return
-
-    # ... or get the file from S3
-    __utils__['s3.query'](
+def _sync_file(index, saltenv, bucket_name, file_meta, cached_file_path):
+    """
+    Download the object described by ``file_meta`` (a bucket listing entry)
+    unless the cached copy is current, and record it in the sync ``index``.
+    Returns True if the file was downloaded.
+
+    A cached copy is current if the index says it was synced from the same
+    ETag and size and it hasn't been touched since, or (for single part
+    uploads, whose ETag is the md5) if its md5 matches the ETag. Multipart
+    ETags aren't md5s; those objects are trusted once the index has them.
+    """
+    path = file_meta['Key']
+    etag = file_meta.get('ETag', '').strip('"')
+    size = int(file_meta.get('Size', -1))
+
+    entry = _get_index_entry(index, cached_file_path)
+    if entry and entry['etag'] == etag and entry['size'] == size:
+        return False
+    if etag and '-' not in etag and os.path.isfile(cached_file_path):
+        cached_md5 = hubblestack.utils.hashutils.get_hash(cached_file_path, 'md5')
+        # hashes match we have a cache hit
+        if cached_md5 == etag:
+            _set_index_entry(index, cached_file_path, etag, size, cached_md5)
+            return False
+
+    log.info('%s - %s : %s', bucket_name, saltenv, path)
+    s3_key_kwargs = _get_s3_key()
+    ret = __utils__['s3.query'](
         key=s3_key_kwargs['key'],
         keyid=s3_key_kwargs['keyid'],
         kms_keyid=s3_key_kwargs['keyid'],
@@ -748,7 +784,114 @@ def _get_file_from_s3(metadata, saltenv, bucket_name, path, cached_file_path):
         local_file=cached_file_path,
         path_style=s3_key_kwargs['path_style'],
         https_enable=s3_key_kwargs['https_enable'],
+        session=_get_session(),
     )
+    if not ret or not os.path.isfile(cached_file_path):
+        index.pop(cached_file_path, None)
+        return False
+    cached_md5 = None
+    if etag and '-' not in etag:
+        cached_md5 = hubblestack.utils.hashutils.get_hash(cached_file_path, 'md5')
+        if cached_md5 != etag:
+            log.warning('%s - %s : %s downloaded with md5 %s but ETag %s',
+                        bucket_name, saltenv, path, cached_md5, etag)
+            index.pop(cached_file_path, None)
+            return True
+    _set_index_entry(index, cached_file_path, etag, size, cached_md5)
+    return True
+
+
+def _get_sync_workers():
+    """
+    Return the number of threads to sync with
+    """
+    try:
+        return max(1, int(_get_s3_key()['sync_workers']))
+    except (TypeError, ValueError):
+        return S3_SYNC_WORKERS
+
+
+def _get_session():
+    """
+    Return the requests session shared by the sync threads
+    """
+    return hubblestack.utils.s3.get_session(pool_size=_get_sync_workers())
+
+
+def _get_sync_index_filename():
+    """
+    Return the filename of the sidecar index of synced files
+    """
+    return os.path.join(_get_cache_dir(), 'sync_index.cache')
+
+
+def _get_sync_index():
+    """
+    Return the sync index ({cached file path: {etag, size, mtime, md5}}),
+    reading it from disk only when the file changed
+    """
+    index_file = _get_sync_index_filename()
+    try:
+        mtime = os.path.getmtime(index_file)
+    except OSError:
+        mtime = None
+    with _SYNC_INDEX_LOCK:
+        if _SYNC_INDEX['index'] is None or _SYNC_INDEX['mtime'] != mtime:
+            index = {}
+            if mtime is not None:
+                try:
+                    with hubblestack.utils.files.fopen(index_file, 'rb') as fp_:
+                        index = pickle.load(fp_)
+                except (OSError, pickle.UnpicklingError, AttributeError, EOFError,
+                        ImportError, IndexError, KeyError) as eobj:
+                    log.info('error reading s3 sync index (%s): %s', index_file, repr(eobj))
+                if not isinstance(index, dict):
+                    index = {}
+            _SYNC_INDEX['index'] = index
+            _SYNC_INDEX['mtime'] = mtime
+        return _SYNC_INDEX['index']
+
+
+def _write_sync_index(index):
+    """
+    Write the sync index next to the cached files
+    """
+    index_file = _get_sync_index_filename()
+    with _SYNC_INDEX_LOCK:
+        tmp_file = index_file + '.tmp'
+        with hubblestack.utils.files.fopen(tmp_file, 'wb') as fp_:
+            pickle.dump(dict(index), fp_)
+        os.replace(tmp_file, index_file)
+        _SYNC_INDEX['index'] = index
+        _SYNC_INDEX['mtime'] = os.path.getmtime(index_file)
+
+
+def _get_index_entry(index, cached_file_path):
+    """
+    Return the index entry of a cached file, if the file still has the size
+    and mtime it had when it was synced
+    """
+    entry = index.get(cached_file_path)
+    if not entry:
+        return None
+    try:
+        stat = os.stat(cached_file_path)
+    except OSError:
+        return None
+    if stat.st_size != entry['size'] or stat.st_mtime_ns != entry['mtime']:
+        return None
+    return entry
+
+
+def _set_index_entry(index, cached_file_path, etag, size, md5):
+    """
+    Record a synced file in the index
+    """
+    stat = os.stat(cached_file_path)
+    if size < 0:
+        size = stat.st_size
+    index[cached_file_path] = {'etag': etag, 'size': size, 'mtime': stat.st_mtime_ns,
+                               'md5': md5}
 
 
 def _trim_env_off_path(paths, saltenv, trim_slash=False):
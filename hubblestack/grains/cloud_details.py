@@ -7,6 +7,9 @@ import logging
 
 log = logging.getLogger(__name__)
 
+# the instance identity does not change for the life of the instance
+__grain_tiers__ = 'static'
+
 def get_cloud_details():
     """
     Gather all cloud details and return them, along with the fieldnames
@@ -22,6 +22,7 @@ __mods__ = {
 }
 
 log = logging.getLogger(__name__)
+__grain_tiers__ = 'slow'
 
 
 def disks():
@@ -11,6 +11,7 @@ __virtualname__ = "docker_details"
 from hubblestack.utils.osquery_lib import query as osquery_util
 
 log = logging.getLogger(__name__)
+__grain_tiers__ = 'slow'
 
 
 def __virtual__():
@@ -11,6 +11,7 @@ import hubblestack.utils.platform
 __virtualname__ = "domain_controller"
 
 log = logging.getLogger(__name__)
+__grain_tiers__ = 'slow'
 
 
 def __virtual__():
@@ -79,6 +79,19 @@ __mods__ = {
 }
 log = logging.getLogger(__name__)
 
+# see hubblestack.loader._grain_tier; everything not listed is 'fast'
+__grain_tiers__ = {
+    'os_data': 'slow',
+    'fqdns': 'slow',
+    'locale_info': 'slow',
+    'get_machine_id': 'static',
+    'path': 'static',
+    'pythonversion': 'static',
+    'pythonpath': 'static',
+    'pythonexecutable': 'static',
+    'saltpath': 'static',
+}
+
 HAS_WMI = False
 if hubblestack.utils.platform.is_windows():
     # attempt to import the python wmi module
@@ -2205,29 +2218,27 @@ def fqdns():
     '''
     Return all known FQDNs for the system by enumerating all interfaces and
     then trying to reverse resolve them (excluding 'lo' interface).
+
+    The lookups run in parallel (``fqdns_workers``) and give up after
+    ``fqdns_timeout`` seconds. Link-local addresses are skipped when
+    ``fqdns_skip_link_local`` is set, and so are the interfaces matching the
+    ``fqdns_skip_interfaces`` globs (e.g. ``['docker*', 'veth*']``); by
+    default every address is resolved.
     '''
     # Provides:
     # fqdns
 
     grains = {}
-    fqdns = set()
-
-    addresses = hubblestack.utils.network.ip_addrs(include_loopback=False,
-                                            interface_data=_INTERFACES)
-    addresses.extend(hubblestack.utils.network.ip_addrs6(include_loopback=False,
-                                                  interface_data=_INTERFACES))
-    err_message = 'An exception occurred resolving address \'%s\': %s'
-    for ip in addresses:
-        try:
-            fqdns.add(socket.getfqdn(socket.gethostbyaddr(ip)[0]))
-        except socket.herror as err:
-            if err.errno == 0:
-                # No FQDN for this IP address, so we don't need to know this all the time.
-                log.debug("Unable to resolve address %s: %s", ip, err)
-            else:
-                log.error(err_message, ip, err)
-        except (socket.error, socket.gaierror, socket.timeout) as err:
-            log.error(err_message, ip, err)
+
+    addresses = hubblestack.utils.dns.resolvable_addresses(
+        interface_data=_INTERFACES,
+        skip_link_local=__opts__.get('fqdns_skip_link_local', False),
+        skip_interfaces=__opts__.get('fqdns_skip_interfaces', []))
+    resolved = hubblestack.utils.dns.reverse_lookup_many(
+        addresses,
+        timeout=__opts__.get('fqdns_timeout', 30),
+        workers=__opts__.get('fqdns_workers', 8))
+    fqdns = set(fqdn for fqdn in resolved.values() if fqdn)
 
     grains['fqdns'] = sorted(list(fqdns))
     return grains
@@ -7,6 +7,7 @@ import logging
 import hubblestack.utils.files
 
 log = logging.getLogger(__name__)
+__grain_tiers__ = 'slow'
 
 def mdadm():
     '''
@@ -5,6 +5,7 @@ import hubblestack.utils.path
 import hubblestack.modules.cmdmod
 
 __mods__ = {'cmd.run': hubblestack.modules.cmdmod._run_quiet}
+__grain_tiers__ = 'slow'
 
 
 def osquerygrain():
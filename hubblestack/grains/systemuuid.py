@@ -9,6 +9,7 @@ import hubblestack.modules.cmdmod
 
 __mods__ = {'cmd.run_stdout': hubblestack.modules.cmdmod.run_stdout}
 log = logging.getLogger(__name__)
+__grain_tiers__ = 'static'
 
 
 def get_system_uuid():
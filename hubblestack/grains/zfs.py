@@ -35,6 +35,7 @@ __utils__ = {
 }
 
 log = logging.getLogger(__name__)
+__grain_tiers__ = 'slow'
 
 
 def __virtual__():
@@ -1,6 +1,5 @@
 # -*- encoding: utf-8 -*-
 
-import socket
 import json
 import time
 import copy
@@ -14,6 +13,7 @@ import logging
 log = logging.getLogger(__name__)
 
 import hubblestack.status
+import hubblestack.utils.dns
 hubble_status = hubblestack.status.HubbleStatus(__name__)
 
 from . dq import DiskQueue, NoQueue, QueueCapacityError
@@ -74,7 +74,7 @@ class Payload(object):
 
     def __init__(self, dat, eventtime='', no_queue=False):
         if self.host is None:
-            self.__class__.host = socket.gethostname()
+            self.__class__.host = hubblestack.utils.dns.gethostname()
 
         self.no_queue = no_queue or dat.pop('_no_queue', False)
 
@@ -130,6 +130,8 @@ class HEC(object):
     direct_logging = False
     outages = dict()
     fails = dict()
+    queues = dict()
+    flushers = dict()
 
     class Server(object):
         bad = False
@@ -206,7 +208,7 @@ class HEC(object):
         if host:
             self.host = host
         else:
-            self.host = socket.gethostname()
+            self.host = hubblestack.utils.dns.gethostname()
 
         Payload.host = self.host
 
@@ -264,6 +266,8 @@ class HEC(object):
             actual_disk_queue = os.path.join(disk_queue, md5.hexdigest())
             log.debug("disk_queue for %s: %s", uril, actual_disk_queue)
             self.queue = DiskQueue(actual_disk_queue, size=disk_queue_size, compression=disk_queue_compression)
+            HEC.queues[actual_disk_queue] = self.queue
+            HEC.flushers[actual_disk_queue] = self
         else:
             self.queue = NoQueue()
 
@@ -339,6 +343,18 @@ class HEC(object):
             log.error('flushing complete eventscount=%d', self.queue.cn)
 
 
+    @classmethod
+    def retry_queues(cls):
+        """ flush the disk queues that still hold events (through the last HEC
+            made for each); otherwise a queue only drains after the next
+            successful send to its endpoint """
+        for hec in list(cls.flushers.values()):
+            if hec.queue.cn > 0:
+                try:
+                    hec.flushQueue()
+                except Exception:
+                    log.exception('failed to retry the disk queue of %s', hec.server_uri)
+
     def _send(self, *payload, **kwargs):
         now = time.time()
         data = ' '.join([ str(x) for x in payload ])
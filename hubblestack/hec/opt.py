@@ -1,6 +1,6 @@
 # -*- encoding: utf-8 -*-
 
-# NOTE: this module receives __mods__, __grains__, etc from daemon.py during refresh_grains
+# NOTE: this module uses the modules of the hubblestack.runtime context
 
 # there's a lot of support below for things like this:
 #   get_splunk_options('hubblestack:returner:splunk', 'hubblestack:nebula:returner:splunk')
@@ -24,6 +24,8 @@
 
 import copy
 
+import hubblestack.runtime
+
 class Required(object):
     pass
 REQUIRED = Required()
@@ -32,10 +34,10 @@ del Required
 MODALITIES = ('grains.get','config.get',) # search in grains first, fallback to config.get
 options_for_grains_config = {'token', 'index', 'port'}
 
-def _get_splunk_options(space, modality, **kw):
+def _get_splunk_options(space, modality, mods, **kw):
     ret = list()
 
-    confg = __mods__['config.get']
+    confg = mods['config.get']
 
     # both index and token must be specified if at all overriding in /etc/hubble/hubble
     # is taking place using the variables splunk_token and splunk_index
@@ -81,7 +83,7 @@ def _get_splunk_options(space, modality, **kw):
 
     req = [ k for k in base_opts if base_opts[k] is REQUIRED ]
 
-    sfr = __mods__[modality](space)
+    sfr = mods[modality](space)
 
     if sfr:
         if not isinstance(sfr, list):
@@ -150,9 +152,10 @@ def get_splunk_options(*spaces, **kw):
     if not spaces:
         spaces = ['hubblestack:returner:splunk']
 
+    mods = hubblestack.runtime.current().mods
     for space in spaces:
         for modality in MODALITIES:
-            ret = _get_splunk_options(space, modality, **copy.deepcopy(kw))
+            ret = _get_splunk_options(space, modality, mods, **copy.deepcopy(kw))
             if ret:
                 return ret
 
@@ -177,15 +180,15 @@ def make_hec_args(opts):
 
 
 def _setup_for_testing():
-    global __mods__, __opts__
     import hubblestack.daemon
     parsed_args = hubblestack.daemon.parse_args()
     import hubblestack.config
     parsed_args['configfile'] = config_file = '/etc/hubble/hubble'
-    __opts__ = hubblestack.config.get_config(config_file)
-    __opts__['conf_file'] = config_file
-    __opts__.update(parsed_args)
+    opts = hubblestack.config.get_config(config_file)
+    opts['conf_file'] = config_file
+    opts.update(parsed_args)
     import hubblestack.loader
-    __grains__ = hubblestack.loader.grains(__opts__)
-    __utils__ = hubblestack.loader.utils(__opts__)
-    __mods__ = hubblestack.loader.moules(__opts__, utils=__utils__)
+    grains = hubblestack.loader.grains(opts)
+    utils = hubblestack.loader.utils(opts)
+    mods = hubblestack.loader.modules(opts, utils=utils)
+    hubblestack.runtime.publish(opts, grains, utils=utils, mods=mods)
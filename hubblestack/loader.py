@@ -8,21 +8,28 @@ plugin interfaces used by Salt.
 import os
 import re
 import sys
+import copy
+import glob
 import time
 import yaml
 import logging
+import json
+import hashlib
 import inspect
 import tempfile
 import functools
 import threading
 import traceback
 import types
+import weakref
 
 from zipimport import zipimporter
 
 import hubblestack.config
+import hubblestack.payload
 import hubblestack.syspaths
 import hubblestack.utils.args
+import hubblestack.utils.atomicfile
 import hubblestack.utils.context
 import hubblestack.utils.data
 import hubblestack.utils.dictupdate
@@ -31,7 +38,9 @@ import hubblestack.utils.lazy
 import hubblestack.utils.odict
 import hubblestack.utils.platform
 import hubblestack.utils.versions
+import hubblestack.status
 
+from hubblestack import __version__
 from hubblestack.exceptions import LoaderError
 from hubblestack.template import check_render_pipe_str
 from hubblestack.utils.decorators import Depends
@@ -44,11 +53,12 @@ import importlib.util
 import pkg_resources
 
 try:
-    from collections.abc import MutableMapping
+    from collections.abc import Mapping, MutableMapping
 except ImportError:
-    from collections import MutableMapping
+    from collections import Mapping, MutableMapping
 
 log = logging.getLogger(__name__)
+HSS = hubblestack.status.HubbleStatus(__name__, 'refresh_pack', 'stale_module')
 
 HUBBLE_BASE_PATH = os.path.abspath(hubblestack.syspaths.INSTALL_DIR)
 LOADED_BASE_NAME = 'hubble.loaded'
@@ -76,6 +86,11 @@ PY3_PRE_EXT = \
 # Will be set to pyximport module at runtime if cython is enabled in config.
 pyximport = None
 
+# Bump this whenever the layout of the loader snapshots changes
+LOADER_SNAPSHOT_VERSION = 1
+# snapshot filename -> LazyLoader that will write it in save_snapshots()
+_SNAPSHOT_LOADERS = weakref.WeakValueDictionary()
+
 def _module_dirs(
         opts,
         ext_type,
@@ -258,6 +273,230 @@ def grain_funcs(opts, proxy=None):
     )
 
 
+GRAIN_TIERS = ('static', 'slow', 'fast')
+# grain function -> (time computed, return value) of the grains in the slow tier
+_SLOW_GRAINS = {}
+# grain function -> return value of the grains in the static tier; loaded from
+# (and saved to) grains.static.p in cachedir
+_STATIC_GRAINS = None
+# signature of the config files -> grains section found in them
+_CONFIG_GRAINS = {}
+
+
+def _grain_tier(func):
+    '''
+    Return the volatility tier of the grain function ``func``.
+
+    Grain modules declare the tier with ``__grain_tiers__``, either a single
+    tier for every function in the module or a dict of function name to tier:
+
+    static
+        computed once, persisted in the grains cache (grains.static.p) and
+        only recomputed after a reboot, an upgrade of hubble or
+        ``grains_static_ttl`` seconds (default one week)
+    slow
+        recomputed at most every ``grains_slow_refresh`` seconds (default 6h)
+    fast
+        recomputed on every grains refresh (the default)
+    '''
+    tiers = getattr(func, '__globals__', {}).get('__grain_tiers__')
+    if isinstance(tiers, dict):
+        tiers = tiers.get(func.__name__)
+    return tiers if tiers in GRAIN_TIERS else 'fast'
+
+
+def _boot_id():
+    try:
+        with hubblestack.utils.files.fopen('/proc/sys/kernel/random/boot_id', 'r') as fh:
+            return fh.read().strip()
+    except Exception:
+        return None
+
+
+def _static_grains(opts):
+    '''
+    Return the static grains cache, reading it from grains.static.p in
+    cachedir the first time
+    '''
+    global _STATIC_GRAINS
+    if _STATIC_GRAINS is None:
+        _STATIC_GRAINS = {'time': time.time(), 'grains': {}}
+        cfn = os.path.join(opts['cachedir'], 'grains.static.p')
+        try:
+            with hubblestack.utils.files.fopen(cfn, 'rb') as fp_:
+                cache = hubblestack.payload.Serial(opts).load(fp_)
+        except Exception:
+            cache = None
+        if isinstance(cache, dict) and cache.get('hubble_version') == __version__ \
+                and cache.get('boot_id') == _boot_id() \
+                and time.time() - cache.get('time', 0) < opts.get('grains_static_ttl', 604800):
+            _STATIC_GRAINS = {'time': cache['time'], 'grains': cache.get('grains', {})}
+    return _STATIC_GRAINS
+
+
+def _write_static_grains(opts):
+    '''
+    Persist the static grains cache to grains.static.p in cachedir
+    '''
+    static = _static_grains(opts)
+    cache = {'hubble_version': __version__, 'boot_id': _boot_id(),
+             'time': static['time'], 'grains': static['grains']}
+    cfn = os.path.join(opts['cachedir'], 'grains.static.p')
+    with hubblestack.utils.files.set_umask(0o077):
+        try:
+            if not os.path.isdir(opts['cachedir']):
+                os.makedirs(opts['cachedir'])
+            fp_ = hubblestack.utils.atomicfile.atomic_open(cfn, 'wb')
+            hubblestack.payload.Serial(opts).dump(cache, fp_)
+        except Exception as exc:
+            log.error('Unable to write to static grains cache file %s: %s', cfn, exc)
+
+
+def _cached_grain(opts, key, tier):
+    '''
+    Return the cached return value of the grain function ``key`` or None if
+    it needs to be computed
+    '''
+    if tier == 'static':
+        static = _static_grains(opts)
+        if time.time() - static['time'] < opts.get('grains_static_ttl', 604800):
+            return static['grains'].get(key)
+        static['grains'].clear()
+        static['time'] = time.time()
+        return None
+    if tier == 'slow' and key in _SLOW_GRAINS:
+        computed, ret = _SLOW_GRAINS[key]
+        if time.time() - computed < opts.get('grains_slow_refresh', 21600):
+            return ret
+    return None
+
+
+def _cache_grain(opts, key, tier, ret):
+    '''
+    Remember the return value of the grain function ``key`` according to its
+    tier. Empty results are never cached (e.g. the cloud metadata endpoint
+    was unreachable this time).
+    '''
+    if not ret or not isinstance(ret, dict):
+        return False
+    if tier == 'static':
+        _static_grains(opts)['grains'][key] = ret
+        return True
+    if tier == 'slow':
+        _SLOW_GRAINS[key] = (time.time(), ret)
+    return False
+
+
+def _config_files(conf_file, includes):
+    '''
+    The config file and the files its include globs point at right now, with
+    their mtimes
+    '''
+    files = [conf_file]
+    for path in includes:
+        path = os.path.expanduser(path)
+        if not os.path.isabs(path):
+            path = os.path.join(os.path.dirname(conf_file), path)
+        files.extend(sorted(glob.glob(path)))
+    return tuple((fn, _file_mtime(fn)) for fn in files)
+
+
+def _config_grains(opts):
+    '''
+    Return the grains section of the config file (and its includes). The
+    files are only parsed again when one of them changed, or an include glob
+    matches different files.
+    '''
+    conf_file = os.environ.get('HUBBLE_CONFIG', opts['conf_file'])
+    cached = _CONFIG_GRAINS.get(conf_file)
+    if cached is not None and _config_files(conf_file, cached['includes']) == cached['files']:
+        return copy.deepcopy(cached['grains'])
+
+    pre_opts = {}
+    pre_opts.update(hubblestack.config.load_config(
+        opts['conf_file'], 'HUBBLE_CONFIG',
+        hubblestack.config.DEFAULT_OPTS['conf_file']
+    ))
+    default_include = pre_opts.get(
+        'default_include', opts['default_include']
+    )
+    include = pre_opts.get('include', [])
+    pre_opts.update(hubblestack.config.include_config(
+        default_include, opts['conf_file'], verbose=False
+    ))
+    pre_opts.update(hubblestack.config.include_config(
+        include, opts['conf_file'], verbose=True
+    ))
+    includes = [default_include] if isinstance(default_include, str) else list(default_include or [])
+    includes += [include] if isinstance(include, str) else list(include or [])
+    config_grains = pre_opts.get('grains', {})
+    _CONFIG_GRAINS[conf_file] = {'includes': includes, 'files': _config_files(conf_file, includes),
+                                 'grains': copy.deepcopy(config_grains)}
+    return config_grains
+
+
+def _run_grain_funcs(calls, workers=1, timeout=None):
+    '''
+    Run the grain functions in ``calls`` (a list of (key, function, kwargs))
+    on up to ``workers`` threads. A function still running ``timeout``
+    seconds after it started is abandoned (and its grains are missing).
+
+    Returns a dict of key -> (return value, start time, end time) for the
+    functions that completed without raising.
+    '''
+    results = {}
+    # even one at a time, they run on a thread, so the timeout holds
+    workers = max(1, workers)
+    cond = threading.Condition()
+    finished = {}
+
+    def _worker(key, func, kwargs):
+        try:
+            ret = (func(**kwargs), None, time.time())
+        except Exception:
+            ret = (None, sys.exc_info(), None)
+        with cond:
+            finished[key] = ret
+            cond.notify()
+
+    pending = list(calls)
+    running = {}
+    with cond:
+        while pending or running:
+            while pending and len(running) < workers:
+                key, func, kwargs = pending.pop(0)
+                thread = threading.Thread(target=_worker, args=(key, func, kwargs),
+                                          name='grain:{0}'.format(key))
+                thread.daemon = True
+                running[key] = (time.time(), func)
+                thread.start()
+            now = time.time()
+            for key, (start, func) in list(running.items()):
+                if key in finished:
+                    del running[key]
+                    ret, exc_info, end = finished[key]
+                    if exc_info is None:
+                        results[key] = (ret, start, end)
+                    else:
+                        log.critical('Failed to load grains defined in grain file %s in '
+                                     'function %s, error:\n', key, func, exc_info=exc_info)
+                elif timeout and now - start >= timeout:
+                    del running[key]
+                    log.error('Grain function %s did not return within %ss, skipping it', key, timeout)
+            if running and not [key for key in running if key in finished]:
+                wait = None
+                if timeout:
+                    wait = max(0, min(start for start, _ in running.values()) + timeout - now)
+                try:
+                    cond.wait(wait)
+                except Exception:
+                    # e.g. the HangTime of the whole grains refresh
+                    log.error('Abandoning grain functions %s and %s', list(running),
+                              [key for key, _, _ in pending], exc_info=True)
+                    break
+    return results
+
+
 def grains(opts, force_refresh=False, proxy=None):
     '''
     Return the functions for the dynamic grains and the values for the static
@@ -268,6 +507,14 @@ def grains(opts, force_refresh=False, proxy=None):
     this function is called with the proxymodule LazyLoader object so grains
     functions can communicate with their controlled device.
 
+    The grain functions run concurrently on ``grains_workers`` threads
+    (default 8, 1 runs them one after another) and each one gets
+    ``grains_timeout`` seconds (default 60) to return. The core grains run
+    first, then the rest, then the grain functions that take a ``grains``
+    argument (they get everything computed before them). Grains in the
+    static and slow tiers (see _grain_tier) are served from cache unless
+    ``force_refresh`` is set.
+
     .. code-block:: python
 
         import hubblestack.config
@@ -289,25 +536,7 @@ def grains(opts, force_refresh=False, proxy=None):
         return {}
     grains_deep_merge = opts.get('grains_deep_merge', False) is True
     if 'conf_file' in opts:
-        pre_opts = {}
-        pre_opts.update(hubblestack.config.load_config(
-            opts['conf_file'], 'HUBBLE_CONFIG',
-            hubblestack.config.DEFAULT_OPTS['conf_file']
-        ))
-        default_include = pre_opts.get(
-            'default_include', opts['default_include']
-        )
-        include = pre_opts.get('include', [])
-        pre_opts.update(hubblestack.config.include_config(
-            default_include, opts['conf_file'], verbose=False
-        ))
-        pre_opts.update(hubblestack.config.include_config(
-            include, opts['conf_file'], verbose=True
-        ))
-        if 'grains' in pre_opts:
-            opts['grains'] = pre_opts['grains']
-        else:
-            opts['grains'] = {}
+        opts['grains'] = _config_grains(opts)
     else:
         opts['grains'] = {}
 
@@ -315,51 +544,70 @@ def grains(opts, force_refresh=False, proxy=None):
     funcs = grain_funcs(opts, proxy=None)
     if force_refresh:  # if we refresh, lets reload grain modules
         funcs.clear()
-    # Run core grains
-    for key in funcs:
-        if not key.startswith('core.'):
-            continue
-        log.trace('Loading %s grain', key)
-        ret = funcs[key]()
-        if not isinstance(ret, dict):
-            continue
-        if grains_deep_merge:
-            hubblestack.utils.dictupdate.update(grains_data, ret)
-        else:
-            grains_data.update(ret)
 
-    # Run the rest of the grains
+    core_keys, rest_keys, dependent_keys = [], [], []
+    parameters = {}
     for key in funcs:
-        if key.startswith('core.') or key == '_errors':
-            continue
-        try:
+        if key.startswith('core.'):
+            core_keys.append(key)
+        elif key != '_errors':
+            parameters[key] = hubblestack.utils.args.get_function_argspec(funcs[key]).args
+            if 'grains' in parameters[key]:
+                dependent_keys.append(key)
+            else:
+                rest_keys.append(key)
+
+    workers = int(opts.get('grains_workers', 8))
+    timeout = opts.get('grains_timeout', 60)
+    static_changed = False
+    # the functions taking grains run one at a time, after the others are
+    # merged, each seeing the grains of the ones before it
+    phases = [(core_keys, workers), (rest_keys, workers)]
+    phases.extend(([key], 1) for key in dependent_keys)
+    for keys, phase_workers in phases:
+        returns = {}
+        calls = []
+        for key in keys:
+            tier = _grain_tier(funcs[key])
+            cached = None if force_refresh else _cached_grain(opts, key, tier)
+            if cached is not None:
+                log.trace('Using %s grain from the %s cache', key, tier)
+                returns[key] = cached
+                continue
             # Grains are loaded too early to take advantage of the injected
             # __proxy__ variable.  Pass an instance of that LazyLoader
             # here instead to grains functions if the grains functions take
             # one parameter.  Then the grains can have access to the
             # proxymodule for retrieving information from the connected
             # device.
-            log.trace('Loading %s grain', key)
-            parameters = hubblestack.utils.args.get_function_argspec(funcs[key]).args
             kwargs = {}
-            if 'proxy' in parameters:
+            if 'proxy' in parameters.get(key, ()):
                 kwargs['proxy'] = proxy
-            if 'grains' in parameters:
-                kwargs['grains'] = grains_data
-            ret = funcs[key](**kwargs)
-        except Exception:
-            log.critical(
-                'Failed to load grains defined in grain file %s in '
-                'function %s, error:\n', key, funcs[key],
-                exc_info=True
-            )
-            continue
-        if not isinstance(ret, dict):
-            continue
-        if grains_deep_merge:
-            hubblestack.utils.dictupdate.update(grains_data, ret)
-        else:
-            grains_data.update(ret)
+            if 'grains' in parameters.get(key, ()):
+                # a copy: an abandoned function mustn't read the grains as they're merged
+                kwargs['grains'] = dict(grains_data)
+            log.trace('Loading %s grain', key)
+            calls.append((key, funcs[key], kwargs))
+
+        for key, (ret, start, end) in _run_grain_funcs(calls, phase_workers, timeout).items():
+            res_id = 'grain.{0}'.format(key)
+            HSS.add_resource(res_id)
+            HSS.mark(res_id, timestamp=start).fin(timestamp=end)
+            static_changed |= _cache_grain(opts, key, _grain_tier(funcs[key]), ret)
+            returns[key] = ret
+
+        # merge in the order of the grain functions, not the order they returned in
+        for key in keys:
+            ret = returns.get(key)
+            if not isinstance(ret, dict):
+                continue
+            if grains_deep_merge:
+                hubblestack.utils.dictupdate.update(grains_data, ret)
+            else:
+                grains_data.update(ret)
+
+    if static_changed:
+        _write_static_grains(opts)
 
     grains_data.update(opts['grains'])
     # Write cache if enabled
@@ -420,6 +668,16 @@ def render(opts, functions):
     return rend
 
 
+def save_snapshots():
+    '''
+    Write the snapshot of every LazyLoader created with the
+    ``loader_snapshot`` option that learned something new since it was
+    created (or since the last save).
+    '''
+    for loader in list(_SNAPSHOT_LOADERS.values()):
+        loader.save_snapshot()
+
+
 def _generate_module(name):
     if name in sys.modules:
         return
@@ -437,6 +695,64 @@ def _mod_type(module_path):
     return 'ext'
 
 
+def _file_mtime(fpath):
+    try:
+        return os.stat(fpath).st_mtime
+    except (OSError, TypeError):
+        return None
+
+
+_MISSING_GRAIN = object()
+
+
+class _GrainsRecorder(MutableMapping):
+    '''
+    Wrap the __grains__ of a module while its __virtual__ runs and record a
+    copy of every grain that was looked at. LazyLoader.refresh_pack() uses
+    this to decide if __virtual__ needs to be re-evaluated.
+    '''
+    def __init__(self, grains):
+        self._grains = grains
+        self.seen = {}
+
+    def _record(self, key):
+        if key not in self.seen:
+            self.seen[key] = copy.deepcopy(self._grains.get(key, _MISSING_GRAIN))
+
+    def __getitem__(self, key):
+        self._record(key)
+        return self._grains[key]
+
+    def __setitem__(self, key, val):
+        self._grains[key] = val
+
+    def __delitem__(self, key):
+        del self._grains[key]
+
+    def __len__(self):
+        return len(self._grains)
+
+    def __iter__(self):
+        # iterating over grains means anything could matter
+        for key in self._grains:
+            self._record(key)
+            yield key
+
+
+def _encode_grains(grains):
+    ''' {key: value} -> {key: [value]} ({key: []} for missing grains) for serialization '''
+    return {key: [] if val is _MISSING_GRAIN else [val] for key, val in grains.items()}
+
+
+def _decode_grains(grains):
+    ''' reverse of _encode_grains() '''
+    return {key: val[0] if val else _MISSING_GRAIN for key, val in grains.items()}
+
+
+def _dir_mtimes(mod_dir):
+    return [mod_dir, _file_mtime(mod_dir), _file_mtime(os.path.join(mod_dir, '__pycache__'))]
+
+
 class LazyLoader(hubblestack.utils.lazy.LazyDict):
     '''
     A pseduo-dictionary which has a set of keys which are the
@@ -519,6 +835,8 @@ class LazyLoader(hubblestack.utils.lazy.LazyDict):
         self.missing_modules = {}  # mapping of name -> error
         self.loaded_modules = {}  # mapping of module_name -> dict_of_functions
         self.loaded_files = set()  # TODO: just remove them from file_mapping?
+        # mapping of file name -> what loading it produced (see refresh_pack)
+        self.module_state = {}
         self.static_modules = static_modules if static_modules else []
 
         if virtual_funcs is None:
@@ -545,7 +863,13 @@ class LazyLoader(hubblestack.utils.lazy.LazyDict):
             self.suffix_order.append(suffix)
 
         self._lock = threading.RLock()
-        self._refresh_file_mapping()
+        self._snapshot = None
+        self._snapshot_dirty = False
+        self._snapshot_providers = {}
+        if self.opts.get('loader_snapshot', False):
+            self._read_snapshot()
+        if not self._use_snapshot_file_mapping():
+            self._refresh_file_mapping()
 
         super(LazyLoader, self).__init__()  # late init the lazy loader
         # create all of the import namespaces
@@ -608,12 +932,132 @@ class LazyLoader(hubblestack.utils.lazy.LazyDict):
                 else:
                     return '\'{0}\' __virtual__ returned False'.format(mod_name)
 
-    def _refresh_file_mapping(self):
+    def _snapshot_filename(self):
         '''
-        refresh the mapping of the FS on disk
+        The file in cachedir holding the snapshot of this loader. The name
+        depends on everything that goes into the file mapping.
+        '''
+        cachedir = self.opts.get('cachedir')
+        if not cachedir:
+            return None
+        key = json.dumps([self.tag, self.module_dirs, sorted(self.disabled),
+                          self.opts.get('optimization_order'), self.static_modules,
+                          self.opts.get('enable_zip_modules', True)], sort_keys=True, default=str)
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(cachedir, 'loader_snapshot', '{0}-{1}.p'.format(self.tag, digest))
+
+    def _read_snapshot(self):
+        '''
+        Load the snapshot written by a previous process (see save_snapshot).
+        Snapshots from other hubble versions or older than
+        ``loader_snapshot_ttl`` seconds are ignored.
+        '''
+        fname = self._snapshot_filename()
+        if fname is None:
+            return
+        _SNAPSHOT_LOADERS[fname] = self
+        try:
+            with hubblestack.utils.files.fopen(fname, 'rb') as fh:
+                snapshot = hubblestack.payload.Serial('msgpack').load(fh)
+        except Exception as exc:
+            log.debug('unable to read loader snapshot %s: %s', fname, exc)
+            return
+        if not isinstance(snapshot, dict) \
+                or snapshot.get('snapshot_version') != LOADER_SNAPSHOT_VERSION \
+                or snapshot.get('hubble_version') != __version__ \
+                or time.time() - snapshot.get('time', 0) > self.opts.get('loader_snapshot_ttl', 86400):
+            log.debug('ignoring stale loader snapshot %s', fname)
+            return
+        self._snapshot = snapshot
+        for name, entry in snapshot['modules'].items():
+            if entry['ok'] and _file_mtime(entry['fpath']) == entry['mtime']:
+                for mod_name in entry['names']:
+                    self._snapshot_providers.setdefault(mod_name, []).append(name)
+
+    def _use_snapshot_file_mapping(self):
+        '''
+        Use the file mapping from the snapshot if none of the module dirs
+        changed since it was taken. Returns True if it was used.
+        '''
+        if self._snapshot is None:
+            return False
+        if self._snapshot['dirs'] != [_dir_mtimes(mod_dir) for mod_dir in self.module_dirs]:
+            return False
+        file_mapping = self._snapshot['file_mapping']
+        if any(ext == '.pyx' for _, _, ext, _ in file_mapping):
+            # let _refresh_file_mapping() set up pyximport
+            return False
+        self._prep_suffix_map(cython=False)
+        self.file_mapping = hubblestack.utils.odict.OrderedDict()
+        for f_noext, fpath, ext, opt_index in file_mapping:
+            self.file_mapping[f_noext] = (fpath, ext, opt_index)
+        log.debug('using snapshot file mapping for %s loader', self.tag)
+        return True
+
+    def _snapshot_result(self, name, fpath, mtime):
+        '''
+        Return the snapshot entry for the module file ``name`` if it is still
+        valid: same file, same mtime and the grains __virtual__ looked at
+        have not changed.
+        '''
+        if self._snapshot is None:
+            return None
+        entry = self._snapshot['modules'].get(name)
+        if entry is None or entry['fpath'] != fpath or entry['mtime'] != mtime:
+            return None
+        grains = self.pack['__grains__']
+        for key, val in _decode_grains(entry['grains']).items():
+            if grains.get(key, _MISSING_GRAIN) != val:
+                return None
+        return entry
+
+    def save_snapshot(self):
+        '''
+        Persist the file mapping and the __virtual__ outcomes of this loader
+        to cachedir so the next process can skip the directory scans and
+        avoid importing modules that are not meant for this system.
+        '''
+        fname = self._snapshot_filename()
+        if fname is None or not self._snapshot_dirty:
+            return
+        with self._lock:
+            modules = {}
+            if self._snapshot is not None:
+                modules.update(self._snapshot['modules'])
+            for name, state in self.module_state.items():
+                if state['virtual'] is None:
+                    continue
+                modules[name] = {'fpath': state['fpath'], 'mtime': state['mtime'],
+                                 'grains': _encode_grains(state['grains']),
+                                 'names': sorted(state['names'], key=str), 'ok': state['virtual']['ok'],
+                                 'error': state['virtual']['error']}
+            snapshot = {
+                'snapshot_version': LOADER_SNAPSHOT_VERSION,
+                'hubble_version': __version__,
+                'time': time.time(),
+                'dirs': [_dir_mtimes(mod_dir) for mod_dir in self.module_dirs],
+                'file_mapping': [[f_noext, fpath, ext, opt_index]
+                                 for f_noext, (fpath, ext, opt_index) in self.file_mapping.items()],
+                'modules': modules,
+            }
+        try:
+            if not os.path.isdir(os.path.dirname(fname)):
+                os.makedirs(os.path.dirname(fname))
+            with hubblestack.utils.files.set_umask(0o077):
+                fh = hubblestack.utils.atomicfile.atomic_open(fname, 'wb')
+                hubblestack.payload.Serial('msgpack').dump(snapshot, fh)
+        except Exception as exc:
+            log.error('Unable to write loader snapshot %s: %s', fname, exc)
+            return
+        self._snapshot = snapshot
+        self._snapshot_dirty = False
+
+    def _prep_suffix_map(self, cython=True):
+        '''
+        Add the optional (cython, zip) and package directory suffixes
         '''
         # map of suffix to description for imp
-        if self.opts.get('cython_enable', True) is True:
+        if cython and self.opts.get('cython_enable', True) is True:
             try:
                 global pyximport
                 pyximport = __import__('pyximport')  # pylint: disable=import-error
@@ -629,6 +1073,13 @@ class LazyLoader(hubblestack.utils.lazy.LazyDict):
         # allow for module dirs
         self.suffix_map[''] = ('', '', MODULE_KIND_PKG_DIRECTORY)
 
+    def _refresh_file_mapping(self):
+        '''
+        refresh the mapping of the FS on disk
+        '''
+        self._prep_suffix_map()
+        self._snapshot_dirty = True
+
         # create mapping of filename (without suffix) to (path, suffix)
         # The files are added in order of priority, so order *must* be retained.
         self.file_mapping = hubblestack.utils.odict.OrderedDict()
@@ -763,6 +1214,7 @@ class LazyLoader(hubblestack.utils.lazy.LazyDict):
             self.loaded_files = set()
             self.missing_modules = {}
             self.loaded_modules = {}
+            self.module_state = {}
             # if we have been loaded before, lets clear the file mapping since
             # we obviously want a re-do
             if hasattr(self, 'opts'):
@@ -788,10 +1240,89 @@ class LazyLoader(hubblestack.utils.lazy.LazyDict):
             mod_opts[key] = val
         return mod_opts
 
+    @HSS.watch
+    def refresh_pack(self, opts, pack=None):
+        '''
+        Update the opts, grains and pillar (and optionally any other dunders
+        in ``pack``) of this loader and of every module it already loaded,
+        without throwing the loader away.
+
+        Modules are only forgotten (and re-imported/re-evaluated on next
+        access) when their source file changed on disk or when a grain their
+        __virtual__ function looked at has a different value now.
+
+        Returns the list of module file names that were forgotten.
+        '''
+        with self._lock:
+            mod_opts = self.__prep_mod_opts(opts)
+            if 'grains' in self.context_dict:
+                self.context_dict['grains'] = opts.get('grains', {})
+            if 'pillar' in self.context_dict:
+                self.context_dict['pillar'] = opts.get('pillar', {})
+            grains = self.pack['__grains__']
+
+            self.opts.clear()
+            self.opts.update(mod_opts)
+            if pack:
+                self.pack.update(pack)
+
+            stale = [name for name, state in self.module_state.items()
+                     if self._module_is_stale(state, grains)]
+            vanished = [name for name in stale
+                        if not os.path.exists(self.module_state[name]['fpath'])]
+            for name in stale:
+                self._forget_module(name)
+            if vanished:
+                self._refresh_file_mapping()
+
+            for state in self.module_state.values():
+                mod = state['mod']
+                if mod is None:
+                    continue
+                if mod.__opts__ is not self.opts:
+                    mod.__opts__.update(self.opts)
+                if pack:
+                    for p_name, p_value in pack.items():
+                        setattr(mod, p_name, p_value)
+            return stale
+
+    def _module_is_stale(self, state, grains):
+        '''
+        Whether the module described by ``state`` (see _load_module) needs to
+        be loaded again.
+        '''
+        if _file_mtime(state['fpath']) != state['mtime']:
+            return True
+        for key, val in state['grains'].items():
+            if grains.get(key, _MISSING_GRAIN) != val:
+                return True
+        return False
+
+    def _forget_module(self, name):
+        '''
+        Remove everything loading the file ``name`` put into this loader so the
+        next access loads it from scratch.
+        '''
+        state = self.module_state.pop(name)
+        for full_funcname in state['funcs']:
+            self._dict.pop(full_funcname, None)
+        for mod_name in state['names']:
+            self.missing_modules.pop(mod_name, None)
+            self.loaded_modules.pop(mod_name, None)
+        self.loaded_files.discard(name)
+        self.loaded = False
+        HSS.mark('stale_module')
+        log.debug('%s loader forgot module %s', self.tag, name)
+
     def _iter_files(self, mod_name):
         '''
         Iterate over all file_mapping files in order of closeness to mod_name
         '''
+        # files that provided mod_name last time (see save_snapshot)
+        for name in self._snapshot_providers.get(mod_name, ()):
+            if name in self.file_mapping:
+                yield name
+
         # do we have an exact match?
         if mod_name in self.file_mapping:
             yield mod_name
@@ -823,6 +1354,18 @@ class LazyLoader(hubblestack.utils.lazy.LazyDict):
         mod = None
         fpath, suffix = self.file_mapping[name][:2]
         self.loaded_files.add(name)
+        state = self.module_state[name] = {'name': name, 'mod': None, 'fpath': fpath,
+                                           'mtime': _file_mtime(fpath), 'grains': {}, 'names': {name},
+                                           'funcs': [], 'virtual': None}
+        snapshot = self._snapshot_result(name, fpath, state['mtime'])
+        if snapshot is not None and not snapshot['ok']:
+            # __virtual__ said no last time and nothing it depends on changed
+            for mod_name in snapshot['names']:
+                self.missing_modules[mod_name] = snapshot['error']
+            state['names'].update(snapshot['names'])
+            state['grains'] = _decode_grains(snapshot['grains'])
+            state['virtual'] = {'ok': False, 'error': snapshot['error']}
+            return False
         fpath_dirname = os.path.dirname(fpath)
         try:
             sys.path.append(fpath_dirname)
@@ -951,6 +1494,7 @@ class LazyLoader(hubblestack.utils.lazy.LazyDict):
         # pack whatever other globals we were asked to
         for p_name, p_value in self.pack.items():
             setattr(mod, p_name, p_value)
+        state['mod'] = mod
 
         module_name = mod.__name__.rsplit('.', 1)[-1]
         if callable(self.xlate_modnames):
@@ -972,6 +1516,7 @@ class LazyLoader(hubblestack.utils.lazy.LazyDict):
                 )
                 self.missing_modules[module_name] = err_string
                 self.missing_modules[name] = err_string
+                state['names'].add(module_name)
                 return False
 
         # if virtual modules are enabled, we need to look for the
@@ -980,7 +1525,7 @@ class LazyLoader(hubblestack.utils.lazy.LazyDict):
             virtual_funcs_to_process = ['__virtual__'] + self.virtual_funcs
             for virtual_func in virtual_funcs_to_process:
                 virtual_ret, module_name, virtual_err, virtual_aliases = \
-                    self._process_virtual(mod, module_name, virtual_func)
+                    self._process_virtual(mod, module_name, virtual_func, state=state)
                 if virtual_err is not None:
                     log.trace(
                         'Error loading %s.%s: %s',
@@ -993,6 +1538,8 @@ class LazyLoader(hubblestack.utils.lazy.LazyDict):
                     # If a module has information about why it could not be loaded, record it
                     self.missing_modules[module_name] = virtual_err
                     self.missing_modules[name] = virtual_err
+                    state['names'].add(module_name)
+                    self._record_virtual(state, False, virtual_err)
                     return False
         else:
             virtual_aliases = ()
@@ -1044,6 +1591,7 @@ class LazyLoader(hubblestack.utils.lazy.LazyDict):
                 # Careful not to overwrite existing (higher priority) functions
                 if full_funcname not in self._dict:
                     self._dict[full_funcname] = func
+                    state['funcs'].append(full_funcname)
                 if funcname not in mod_dict[tgt_mod]:
                     setattr(mod_dict[tgt_mod], funcname, func)
                     mod_dict[tgt_mod][funcname] = func
@@ -1060,8 +1608,26 @@ class LazyLoader(hubblestack.utils.lazy.LazyDict):
 
         for tgt_mod in mod_names:
             self.loaded_modules[tgt_mod] = mod_dict[tgt_mod]
+        state['names'].update(mod_names)
+        self._record_virtual(state, True)
         return True
 
+    def _record_virtual(self, state, ok, error=None):
+        '''
+        Remember the __virtual__ outcome of a module for save_snapshot()
+        '''
+        if error is not None and not isinstance(error, str):
+            error = str(error)
+        state['virtual'] = {'ok': ok, 'error': error}
+        if self._snapshot is None:
+            self._snapshot_dirty = True
+            return
+        entry = self._snapshot['modules'].get(state['name'])
+        if entry is None or entry['ok'] != ok or entry['mtime'] != state['mtime'] \
+                or entry['names'] != sorted(state['names'], key=str) \
+                or entry['grains'] != _encode_grains(state['grains']):
+            self._snapshot_dirty = True
+
     def _load(self, key):
         '''
         Load a single item if you have it
@@ -1141,7 +1707,7 @@ class LazyLoader(hubblestack.utils.lazy.LazyDict):
             if func.__name__ in outp:
                 func.__outputter__ = outp[func.__name__]
 
-    def _process_virtual(self, mod, module_name, virtual_func='__virtual__'):
+    def _process_virtual(self, mod, module_name, virtual_func='__virtual__', state=None):
         '''
         Given a loaded module and its default name determine its virtual name
 
@@ -1171,6 +1737,10 @@ class LazyLoader(hubblestack.utils.lazy.LazyDict):
         try:
             error_reason = None
             if hasattr(mod, '__virtual__') and inspect.isfunction(mod.__virtual__):
+                grains_recorder = None
+                if state is not None and isinstance(getattr(mod, '__grains__', None), Mapping):
+                    grains_recorder = _GrainsRecorder(mod.__grains__)
+                    mod.__grains__ = grains_recorder
                 try:
                     start = time.time()
                     virtual = getattr(mod, virtual_func)()
@@ -1189,6 +1759,10 @@ class LazyLoader(hubblestack.utils.lazy.LazyDict):
                             mod.__name__, exc))
                     log.error(error_reason, exc_info_on_loglevel=logging.DEBUG)
                     virtual = None
+                finally:
+                    if grains_recorder is not None:
+                        mod.__grains__ = grains_recorder._grains
+                        state['grains'].update(grains_recorder.seen)
                 # Get the module's virtual name
                 virtualname = getattr(mod, '__virtualname__', virtual)
                 if not virtual:
@@ -1370,6 +1944,83 @@ def _nova_xlate_funcnames(name, fpath, suffix, tgt_mod, funcname, full_funcname,
         new_funcname = 'py'
     return new_funcname, '.'.join([name, new_funcname])
 
+_NOVA_PROFILE_CACHE = {}
+
+
+class NovaProfiles(Mapping):
+    '''
+    The nova yaml profiles found under the given directories, by name (e.g.,
+    '/cis/debian-9.yaml'). A profile is only parsed when it's accessed and the
+    result is kept (across loaders) until the file changes on disk.
+
+    Items are copies; use sections() and get_sections() to look at the parts
+    of a profile a nova module is interested in without copying the rest.
+    '''
+
+    def __init__(self, dirs, missing=None):
+        self.paths = dict()
+        self.missing = dict() if missing is None else missing
+        for mod_dir in dirs:
+            for path, _, filenames in os.walk(mod_dir):
+                for filename in filenames:
+                    if filename.endswith('.yaml'):
+                        pathname = os.path.join(path, filename)
+                        self.paths[pathname[len(mod_dir):]] = pathname
+        found = set(self.paths.values())
+        for pathname in list(_NOVA_PROFILE_CACHE):
+            if pathname not in found and any(pathname.startswith(d) for d in dirs):
+                _NOVA_PROFILE_CACHE.pop(pathname, None)
+
+    def _load(self, name):
+        pathname = self.paths[name]
+        try:
+            st = os.stat(pathname)
+        except OSError as exc:
+            self.missing[name] = str(exc)
+            raise KeyError(name)
+        stamp = (st.st_mtime, st.st_size, st.st_ino)
+        cached = _NOVA_PROFILE_CACHE.get(pathname)
+        if cached is None or cached[0] != stamp:
+            data = error = None
+            try:
+                with open(pathname, 'r') as fh:
+                    data = yaml.safe_load(fh)
+            except Exception as exc:
+                error = str(exc)
+                log.exception('Error loading yaml from %s', pathname)
+            cached = _NOVA_PROFILE_CACHE[pathname] = (stamp, data, error)
+        if cached[2] is not None:
+            self.missing[name] = cached[2]
+            raise KeyError(name)
+        self.missing.pop(name, None)
+        return cached[1]
+
+    def __getitem__(self, name):
+        return copy.deepcopy(self._load(name))
+
+    def __iter__(self):
+        return iter(self.paths)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def sections(self, name):
+        '''
+        The top level keys of the named profile (e.g., {'stat', 'grep'})
+        '''
+        data = self._load(name)
+        return set(data) if isinstance(data, dict) else set()
+
+    def get_sections(self, name, sections):
+        '''
+        A copy of the given top level sections of the named profile
+        '''
+        data = self._load(name)
+        if not isinstance(data, dict):
+            return dict()
+        return dict((key, copy.deepcopy(data[key])) for key in sections if key in data)
+
+
 def nova(hubble_dir, opts, modules, context=None):
     '''
     Return a nova (!lazy) loader.
@@ -1401,6 +2052,10 @@ def nova(hubble_dir, opts, modules, context=None):
     before anyway, which seems to be the reason for the special sync() section
     of the hubble.audit.
 
+    loader.__data__ is a NovaProfiles mapping, so the yaml is only read when
+    a profile is actually used (and re-read only when it changes);
+    loader.__missing_data__ fills in as broken profiles are encountered.
+
     '''
 
     loader = LazyLoader(
@@ -1413,19 +2068,6 @@ def nova(hubble_dir, opts, modules, context=None):
         pack={ '__context__': context, '__mods__': modules }
     )
 
-    loader.__data__ = d = dict()
     loader.__missing_data__ = md = dict()
-
-    for mod_dir in hubble_dir:
-        for path, _, filenames in os.walk(mod_dir):
-            for filename in filenames:
-                pathname = os.path.join(path, filename)
-                name = pathname[len(mod_dir):]
-                if filename.endswith('.yaml'):
-                    try:
-                        with open(pathname, 'r') as fh:
-                            d[name] = yaml.safe_load(fh)
-                    except Exception as exc:
-                        md[name] = str(exc)
-                        log.exception('Error loading yaml from %s', pathnmame)
+    loader.__data__ = NovaProfiles(hubble_dir, missing=md)
     return loader
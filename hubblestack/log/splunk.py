@@ -33,16 +33,28 @@ pillar values with complex values or they will be skipped:
             custom_fields:
               - site
               - product_group
+
+Records are not sent on the thread that logged them. They are queued and a
+background thread sends them in batches of up to ``splunk_log_batch_size``
+records (default 100), at least every ``splunk_log_flush_interval`` seconds
+(default 2). When more than ``splunk_log_queue_size`` records (default 10000)
+are waiting, new records are dropped (and counted) rather than blocking the
+caller. Whatever is still queued is sent when the handler is closed, which
+logging does at exit.
 """
-import socket
+import os
+import queue
+import threading
 
 # Imports for http event forwarder
-import copy
 import time
 import logging
 from hubblestack.hec import http_event_collector, get_splunk_options, make_hec_args
+import hubblestack.runtime
 import hubblestack.utils.stdrec
 
+log = logging.getLogger(__name__)
+
 
 class SplunkHandler(logging.Handler):
     """
@@ -52,6 +64,16 @@ class SplunkHandler(logging.Handler):
     def __init__(self):
         super(SplunkHandler, self).__init__()
 
+        ctx = hubblestack.runtime.current()
+        self.queue = queue.Queue(ctx.opts.get('splunk_log_queue_size', 10000))
+        self.batch_size = ctx.opts.get('splunk_log_batch_size', 100)
+        self.flush_interval = ctx.opts.get('splunk_log_flush_interval', 2)
+        self.sent = self.dropped = 0
+        self._send_lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._thread_pid = None
+
         self.opts_list = get_splunk_options()
         self.endpoint_list = []
 
@@ -62,7 +84,7 @@ class SplunkHandler(logging.Handler):
             # Note that these fields will also still be available in the event data
             index_extracted_fields = []
             try:
-                index_extracted_fields.extend(__opts__.get('splunk_index_extracted_fields', []))
+                index_extracted_fields.extend(ctx.opts.get('splunk_index_extracted_fields', []))
             except TypeError:
                 pass
 
@@ -70,14 +92,14 @@ class SplunkHandler(logging.Handler):
             args, kwargs = make_hec_args(opts)
             hec = http_event_collector(*args, **kwargs)
 
-            fqdn = hubblestack.utils.stdrec.get_fqdn()
+            fqdn = hubblestack.utils.stdrec.get_fqdn(ctx)
 
             event = {}
-            event.update(hubblestack.utils.stdrec.std_info())
+            event.update(hubblestack.utils.stdrec.std_info(ctx))
 
             for custom_field in custom_fields:
                 custom_field_name = 'custom_' + custom_field
-                custom_field_value = __mods__['config.get'](custom_field, '')
+                custom_field_value = ctx.mods['config.get'](custom_field, '')
                 if isinstance(custom_field_value, str):
                     event.update({custom_field_name: custom_field_value})
                 elif isinstance(custom_field_value, list):
@@ -101,8 +123,8 @@ class SplunkHandler(logging.Handler):
 
     def emit(self, record):
         """
-        Emit a single record using the hec/event template/payload template
-        generated in __init__()
+        Queue a single record for the flusher, which sends it using the
+        hec/event template/payload template generated in __init__()
         """
 
         # NOTE: poor man's filtering ... goal: prevent logging loops and
@@ -126,24 +148,115 @@ class SplunkHandler(logging.Handler):
             if i in rpn:
                 return False
 
-        log_entry = SplunkHandler.format_record(record)
-        for hec, event, payload in self.endpoint_list:
-            event = copy.deepcopy(event)
-            payload = copy.deepcopy(payload)
-            event.update(log_entry)
-            payload['event'] = event
-            # no_queue tells the hec never to queue the data to disk
-            hec.batchEvent(payload, eventtime=time.time(), no_queue=True)
-            hec.flushBatch()
+        entry = (SplunkHandler.format_record(record), time.time())
+        if self._stop.is_set():
+            # closed (e.g. during shutdown); nothing will flush the queue anymore
+            self._send_batch([entry])
+            return True
+        self._start_flusher()
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+            return False
         return True
 
+    def _start_flusher(self):
+        """
+        Start the background flusher if it isn't running in this process
+        (threads do not survive a fork)
+        """
+        if self._thread_pid == os.getpid() or self._stop.is_set():
+            return
+        with self._send_lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread = threading.Thread(target=self._flush_loop, name='splunk-log-flusher')
+            self._thread.daemon = True
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def _flush_loop(self):
+        """
+        Collect queued records into batches and send them until the handler
+        is closed
+        """
+        while not self._stop.is_set():
+            batch = []
+            deadline = time.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+                if self._stop.is_set():
+                    break
+            if batch:
+                self._send_batch(batch)
+
+    def _send_batch(self, batch):
+        """
+        Send a list of (log_entry, eventtime) to every endpoint, one POST per
+        endpoint
+        """
+        with self._send_lock:
+            dropped, self.dropped = self.dropped, 0
+            for hec, event_template, payload_template in self.endpoint_list:
+                try:
+                    for log_entry, eventtime in batch:
+                        event = dict(event_template)
+                        event.update(log_entry)
+                        payload = dict(payload_template)
+                        payload['event'] = event
+                        # no_queue tells the hec never to queue the data to disk
+                        hec.batchEvent(payload, eventtime=eventtime, no_queue=True)
+                    hec.flushBatch()
+                except Exception:
+                    # this logger is filtered from splunk, so this can't loop
+                    log.error('failed to send %d log records to splunk', len(batch), exc_info=True)
+            self.sent += len(batch)
+        if dropped:
+            log.warning('splunk log queue full, dropped %d log records', dropped)
+
+    def flush(self):
+        """
+        Send everything currently queued, on the calling thread
+        """
+        batch = []
+        while True:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.batch_size:
+                self._send_batch(batch)
+                batch = []
+        if batch:
+            self._send_batch(batch)
+
+    def close(self):
+        """
+        Stop the flusher and drain the queue
+        """
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and self._thread_pid == os.getpid():
+            thread.join(self.flush_interval + 1)
+        self.flush()
+        super(SplunkHandler, self).close()
+
     def update_event_std_info(self):
         """
         Update the `event` template in the `endpoint_list` object. This allows
         grains and other values that were updated to be updated here.
         """
-        for entry in self.endpoint_list:
-            entry[1].update(hubblestack.utils.stdrec.std_info())
+        std_info = hubblestack.utils.stdrec.std_info()
+        with self._send_lock:
+            for entry in self.endpoint_list:
+                entry[1].update(std_info)
 
     @staticmethod
     def format_record(record):
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+hubblestack.metrics serves the HubbleStatus counters (see hubblestack.status),
+the HEC disk queue and outage state and the other registered gauges (e.g., the
+pulsar watch count) on a local endpoint, so they can be looked at without
+signalling the process.
+
+.. code-block:: shell
+    curl -s http://127.0.0.1:9099/metrics     # prometheus text exposition
+    curl -s http://127.0.0.1:9099/status.json # the status.json document, live
+    curl -s --unix-socket /var/run/hubble-metrics.sock http://x/metrics
+
+The server is off by default. It runs in its own (daemon) threads, so
+rendering never happens on, or blocks, the scheduler.
+
+hubblestack.metrics options:
+
+    hubble:status:metrics_socket
+        Serve on this Unix socket (mode 0600). Takes precedence over metrics_port.
+
+    hubble:status:metrics_port
+        Serve on this port on 127.0.0.1.
+"""
+
+import http.server
+import json
+import logging
+import os
+import re
+import socketserver
+import threading
+import time
+
+import hubblestack.status
+from hubblestack.status import HubbleStatus, get_hubble_status_opt
+
+log = logging.getLogger(__name__)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+JSON_CONTENT_TYPE = 'application/json'
+
+_SERVER = None
+_SERVER_LOCK = threading.Lock()
+
+
+def _snapshot(func, tries=3):
+    """ call func(), retrying if the main thread mutated the counters while
+        we were iterating them
+    """
+    for attempt in range(tries):
+        try:
+            return func()
+        except RuntimeError:
+            if attempt + 1 == tries:
+                raise
+            time.sleep(0.01)
+
+
+def hec_stats():
+    """ return the disk queue sizes, the configured servers and their fail and outage
+        state of the HEC objects; empty if the HEC was never used
+    """
+    try:
+        from hubblestack.hec.obj import HEC
+    except ImportError:
+        return dict()
+    queues = dict((k, {'count': v.cn, 'bytes': v.sz}) for k, v in list(HEC.queues.items()))
+    outages = dict((k, v.age) for k, v in list(HEC.outages.items()))
+    fails = dict(HEC.fails)
+    servers = set(fails) | set(outages)
+    for hec in list(HEC.flushers.values()):
+        servers.update(x.uri for x in hec.server_uri)
+    return {'queues': queues, 'servers': sorted(servers), 'fails': fails, 'outages': outages}
+
+
+def collect():
+    """ gather HubbleStatus.stats() plus the GAUGES and HEC sections """
+    try:
+        ret = _snapshot(HubbleStatus.stats)
+    except ValueError:
+        # stats() can't compute HEALTH before anything was marked
+        ret = dict()
+    ret['GAUGES'] = dict(HubbleStatus.gauges)
+    ret['HEC'] = hec_stats()
+    return ret
+
+
+def _metric_name(name):
+    return 'hubble_' + re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+
+def _label(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def as_prometheus(stats=None):
+    """ render the collected stats as a prometheus text exposition """
+    if stats is None:
+        stats = collect()
+    out = list()
+
+    def metric(name, mtype, helptext, samples):
+        samples = [ (labels, value) for labels, value in samples if value is not None ]
+        if not samples:
+            return
+        out.append('# HELP {0} {1}'.format(name, helptext))
+        out.append('# TYPE {0} {1}'.format(name, mtype))
+        for labels, value in samples:
+            if labels:
+                labels = '{' + ','.join('{0}="{1}"'.format(k, _label(v))
+                                        for k, v in sorted(labels.items())) + '}'
+            out.append('{0}{1} {2}'.format(name, labels or '', float(value)))
+
+    resources = sorted((k, v) for k, v in stats.items()
+                       if k not in ('HEALTH', '__doc__', 'GAUGES', 'HEC'))
+    for key, mtype, helptext in (
+            ('count', 'gauge', 'number of times the counter was called in the current bucket'),
+            ('dt', 'gauge', 'seconds since the last call of the counter'),
+            ('ema_dt', 'gauge', 'average seconds between calls'),
+            ('dur', 'gauge', 'duration of the last call in seconds'),
+            ('ema_dur', 'gauge', 'average duration of the calls in seconds')):
+        name = 'hubble_status_' + key + ('' if key == 'count' else '_seconds')
+        metric(name, mtype, helptext,
+               [ ({'resource': k}, v.get(key)) for k, v in resources ])
+    metric('hubble_status_dur_quantile_seconds', 'gauge',
+           'duration percentiles of the calls in the current bucket',
+           [ ({'resource': k, 'quantile': '0.{0:02d}'.format(pct).rstrip('0')}, v.get('p{0}_dur'.format(pct)))
+             for k, v in resources for pct in hubblestack.status.PERCENTILES ])
+
+    health = stats.get('HEALTH', {})
+    if 'alive' in health:
+        metric('hubble_alive', 'gauge', 'estimated process health (see status.json __doc__)',
+               [ ({'state': state}, 1 if health['alive'] == state else 0)
+                 for state in ('yes', 'warn', 'hung', 'unknown') ])
+        metric('hubble_last_activity_seconds', 'gauge', 'seconds since any counter was called',
+               [ ({}, health['last_activity']['dt']) ])
+
+    for name, value in sorted(stats.get('GAUGES', {}).items()):
+        metric(_metric_name(name), 'gauge', name, [ ({}, value) ])
+
+    hec = stats.get('HEC', {})
+    queues = sorted(hec.get('queues', {}).items())
+    metric('hubble_hec_queue_events', 'gauge', 'events waiting in the HEC disk queue',
+           [ ({'queue': k}, v['count']) for k, v in queues ])
+    metric('hubble_hec_queue_bytes', 'gauge', 'bytes waiting in the HEC disk queue',
+           [ ({'queue': k}, v['bytes']) for k, v in queues ])
+    fails = hec.get('fails', {})
+    outages = hec.get('outages', {})
+    servers = hec.get('servers') or sorted(set(fails) | set(outages))
+    metric('hubble_hec_fails', 'gauge', 'consecutive failed posts to the HEC server',
+           [ ({'uri': k}, fails.get(k, 0)) for k in servers ])
+    metric('hubble_hec_outage', 'gauge', 'whether the HEC server is flagged as out',
+           [ ({'uri': k}, 1 if k in outages else 0) for k in servers ])
+    metric('hubble_hec_outage_seconds', 'gauge', 'age of the HEC server outage',
+           [ ({'uri': k}, v) for k, v in sorted(outages.items()) ])
+
+    return '\n'.join(out) + '\n'
+
+
+def as_json(stats=None, indent=2):
+    """ render the collected stats as json """
+    if stats is None:
+        stats = collect()
+    return json.dumps(stats, indent=indent, default=str)
+
+
+class MetricsRequestHandler(http.server.BaseHTTPRequestHandler):
+    """ GET /metrics (prometheus) or /status.json (json) """
+    routes = {
+        '/metrics': (as_prometheus, PROMETHEUS_CONTENT_TYPE),
+        '/status.json': (as_json, JSON_CONTENT_TYPE),
+        '/json': (as_json, JSON_CONTENT_TYPE),
+    }
+
+    def do_GET(self):
+        route = self.routes.get(self.path.split('?', 1)[0])
+        if route is None:
+            self.send_error(404)
+            return
+        render, content_type = route
+        try:
+            body = render().encode('utf-8')
+        except Exception:
+            log.exception('failed to render %s', self.path)
+            self.send_error(500)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # unix socket clients have no address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, fmt, *args):
+        log.debug('metrics: %s', fmt % args)
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        socketserver.UnixStreamServer.server_bind(self)
+        os.chmod(self.server_address, 0o600)
+
+
+def make_server(socket_path=None, port=None):
+    """ build (but do not start) a metrics server for the unix socket or the localhost port """
+    if socket_path:
+        return ThreadingUnixHTTPServer(socket_path, MetricsRequestHandler)
+    return ThreadingHTTPServer(('127.0.0.1', int(port)), MetricsRequestHandler)
+
+
+def start():
+    """ start the metrics server in a background thread if hubble:status:metrics_socket or
+        hubble:status:metrics_port is configured (repeated calls are harmless)
+    """
+    global _SERVER
+    socket_path = get_hubble_status_opt('metrics_socket')
+    port = get_hubble_status_opt('metrics_port')
+    if not socket_path and not port:
+        return None
+    with _SERVER_LOCK:
+        if _SERVER is not None:
+            return _SERVER
+        try:
+            _SERVER = make_server(socket_path=socket_path, port=port)
+        except Exception:
+            log.exception('unable to start the metrics server on %s', socket_path or port)
+            return None
+        thread = threading.Thread(target=_SERVER.serve_forever, name='hubble-metrics')
+        thread.daemon = True
+        thread.start()
+        log.info('serving metrics on %s', socket_path or '127.0.0.1:{0}'.format(port))
+        return _SERVER
+
+
+def stop():
+    """ stop the metrics server (if it was started) """
+    global _SERVER
+    with _SERVER_LOCK:
+        if _SERVER is None:
+            return
+        _SERVER.shutdown()
+        _SERVER.server_close()
+        if isinstance(_SERVER, ThreadingUnixHTTPServer) and os.path.exists(_SERVER.server_address):
+            os.unlink(_SERVER.server_address)
+        _SERVER = None
@@ -119,7 +119,7 @@ class AuditRunner(hubblestack.module_runner.runner.Runner):
         for implementation in audit_data['implementations']:
             target = implementation['filter'].get('grains', '*')
 
-            if __mods__['match.compound'](target):
+            if self._context.mods['match.compound'](target):
                 return implementation
 
         log.debug('No target matched for audit_check_id: %s', audit_check_id)
@@ -192,9 +192,11 @@ class AuditRunner(hubblestack.module_runner.runner.Runner):
             raise HubbleCheckValidationError(
                 "Incorrect value provided for parameter 'check_eval_logic': %s" % check_eval_logic)
 
-        # Execute module validation of params
+        # Execute module validation of params, and compile the comparators
+        comparators = []
         for audit_check in audit_impl['items']:
             self._validate_module_params(audit_impl['module'], audit_id, audit_check)
+            comparators.append(hubblestack.module_runner.comparator.compile_args(audit_check['comparator']))
 
         # validate succeeded, lets execute it and prepare result dictionary
         audit_result['run_config']['items'] = []
@@ -204,12 +206,12 @@ class AuditRunner(hubblestack.module_runner.runner.Runner):
         # If check_eval_logic is 'or', any passed subcheck will result in success.
         overall_result = check_eval_logic == 'and'
         failure_reasons = []
-        for audit_check in audit_impl['items']:
+        for audit_check, comparator in zip(audit_impl['items'], comparators):
             mod_status, module_result_local = self._execute_module(audit_impl['module'], audit_id, audit_check,
                                                                    extra_args=result_list)
             # Invoke Comparator
             comparator_status, comparator_result = hubblestack.module_runner.comparator.run(
-                audit_id, audit_check['comparator'], module_result_local, mod_status)
+                audit_id, comparator, module_result_local, mod_status)
 
             audit_result_local = {}
             if comparator_status:
@@ -3,6 +3,14 @@
 An Orchestrator for Comparators
 This is used by Audit runners to initiate comparisons
 Also, if a specific comparator is mentioned in other comparator. This will be invoked.
+
+Runners compile a check's comparator args once (compile_args) before running
+them against module results. The returned CompiledArgs is the same dictionary
+(comparators read it as before), but it remembers its comparator command and
+carries a cache: comparators keep what they derive from their args there
+(compiled regexes, sets for exact matches, the args of the comparators they
+hand over to, ...) with cached(), so it is built once per check instead of on
+every comparison. Nested comparator args are compiled along with their parent.
 """
 
 import logging
@@ -34,7 +42,10 @@ def run(audit_id, args, module_result, module_status=True):
 
     global __comparator__
 
-    comparator_command_method_name = _find_comparator_command(args)
+    args = compile_args(args)
+    if args.command is None:
+        args.command = _find_comparator_command(args)
+    comparator_command_method_name = args.command
     if not comparator_command_method_name:
         # raise error when no matched command found
         raise HubbleCheckFailedError('Unknown comparator or command for: {0}'.format(args['type']))
@@ -60,3 +71,52 @@ def _find_comparator_command(args):
         if method_name in __comparator__:
             return method_name
     return None
+
+
+class CompiledArgs(dict):
+    """
+    Comparator args compiled by compile_args
+    """
+
+    def __init__(self, args):
+        super().__init__(args)
+        self.command = None
+        self.cache = {}
+
+
+def compile_args(args):
+    """
+    Compile comparator args (and the comparator args nested in them) once, so
+    that comparators can cache what they derive from them.
+    Args that are already compiled are returned as is.
+    """
+    if isinstance(args, CompiledArgs):
+        return args
+    return CompiledArgs(_compile_value(args))
+
+
+def _compile_value(value):
+    if isinstance(value, CompiledArgs):
+        return value
+    if isinstance(value, dict):
+        compiled = {key: _compile_value(item) for key, item in value.items()}
+        # a dictionary with a type is handed over to another comparator
+        return CompiledArgs(compiled) if 'type' in compiled else compiled
+    if isinstance(value, list):
+        return [_compile_value(item) for item in value]
+    return value
+
+
+def cached(args, key, build):
+    """
+    Return what build() derives from args: built once per compiled args, and on
+    every call for plain dictionaries
+    """
+    cache = getattr(args, 'cache', None)
+    if cache is None:
+        return build()
+    try:
+        return cache[key]
+    except KeyError:
+        value = cache[key] = build()
+        return value
@@ -56,7 +56,7 @@ class FdgRunner(Runner):
         if 'comparator' in block:
             # override module status with comparator status
             status, ret = hubblestack.module_runner.comparator.run(
-                block_id, block['comparator'], ret, status)
+                block_id, hubblestack.module_runner.comparator.compile_args(block['comparator']), ret, status)
 
         if 'return' in block:
             returner = block['return']
@@ -118,21 +118,22 @@ class FdgRunner(Runner):
         """
         Return data using the returner system
         """
-        # JIT load the returners, since most returns will be handled by the daemon
-        global __returners__
-        if not __returners__:
-            __returners__ = hubblestack.loader.returners(__opts__, __mods__)
+        ctx = self._context
+        returners = ctx.returners
+        if not returners:
+            # JIT load the returners, since most returns will be handled by the daemon
+            returners = hubblestack.loader.returners(ctx.loader_opts(), ctx.mods)
 
         returner += '.returner'
-        if returner not in __returners__:
+        if returner not in returners:
             log.error('Could not find %s returner.', returner)
             return False
         log.debug('Returning job data to %s', returner)
-        returner_ret = {'id': __grains__['id'],
-                        'jid': hubblestack.utils.jid.gen_jid(__opts__),
+        returner_ret = {'id': ctx.grains['id'],
+                        'jid': hubblestack.utils.jid.gen_jid(ctx.opts),
                         'fun': 'fdg.fdg',
                         'fun_args': [],
                         'return': data[0],
                         'return_status': data[1]}
-        __returners__[returner](returner_ret)
+        returners[returner](returner_ret)
         return True
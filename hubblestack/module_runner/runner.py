@@ -11,12 +11,11 @@ from packaging import version
 import hubblestack.module_runner.comparator
 
 import hubblestack.loader
+import hubblestack.runtime
 from hubblestack.exceptions import CommandExecutionError
 from hubblestack.exceptions import HubbleCheckValidationError
 
 log = logging.getLogger(__name__)
-__hmods__ = {}
-__comparator__ = {}
 
 
 class Caller:
@@ -34,8 +33,11 @@ class Runner(ABC):
 
     def __init__(self, caller):
         super().__init__()
-        # dictionary that will load modules
         self._caller = caller
+        # the hubblestack.runtime context captured by init_loader, and the
+        # audit modules loaded with it
+        self._context = None
+        self._hmods = {}
 
     @abstractmethod
     def _validate_yaml_dictionary(self, yaml_dict):
@@ -54,7 +56,7 @@ class Runner(ABC):
         Starting method for execution of a profile file
         """
         log.info('Start executing profile {0}'.format(file))
-        if not __hmods__:
+        if self._context is None:
             self.init_loader()
 
         # cache file
@@ -73,22 +75,26 @@ class Runner(ABC):
         return self._caller
 
     def init_loader(self):
+        """
+        Capture the current runtime context and load the hubble modules with it;
+        the runner uses that context until init_loader is called again
+        """
         log.info('Initializing loader for hubble modules')
-        global __hmods__
-        __hmods__ = hubblestack.loader.LazyLoader(hubblestack.loader._module_dirs(__opts__, 'audit'),
-                                           __opts__,
-                                           tag='audit',
-                                           pack={'__mods__': __mods__,
-                                                 '__grains__': __grains__})
+        ctx = self._context = hubblestack.runtime.current()
+        opts = ctx.loader_opts()
+        self._hmods = hubblestack.loader.LazyLoader(hubblestack.loader._module_dirs(opts, 'audit'),
+                                                    opts,
+                                                    tag='audit',
+                                                    pack={'__mods__': ctx.mods,
+                                                          '__grains__': ctx.grains})
 
         # Comparator can be needed in both Audit/FDG
-        global __comparator__
-        __comparator__ = hubblestack.loader.LazyLoader(hubblestack.loader._module_dirs(__opts__, 'comparators'),
-                                                __opts__,
-                                                tag='comparators',
-                                                pack={'__mods__': __mods__,
-                                                      '__grains__': __grains__})
-        hubblestack.module_runner.comparator.__comparator__ = __comparator__
+        hubblestack.module_runner.comparator.__comparator__ = hubblestack.loader.LazyLoader(
+            hubblestack.loader._module_dirs(opts, 'comparators'),
+            opts,
+            tag='comparators',
+            pack={'__mods__': ctx.mods,
+                  '__grains__': ctx.grains})
 
     ######################################################
     ################# Non-Public methods #################
@@ -103,7 +109,7 @@ class Runner(ABC):
                                         .format(profile_id))
 
         validate_param_method = '{0}.validate_params'.format(module_name)
-        __hmods__[validate_param_method](profile_id, module_args, {'chaining_args': chaining_args,
+        self._hmods[validate_param_method](profile_id, module_args, {'chaining_args': chaining_args,
                                                                    'caller': self._caller})
 
         # Comparators must exist in Audit
@@ -135,7 +141,7 @@ class Runner(ABC):
         Helper method to execute a Module's execute() method.
         """
         execute_method = '{0}.execute'.format(module_name)
-        return __hmods__[execute_method](profile_id, module_args, {'chaining_args': chaining_args,
+        return self._hmods[execute_method](profile_id, module_args, {'chaining_args': chaining_args,
                                                                    'extra_args': extra_args,
                                                                    'caller': self._caller})
 
@@ -144,7 +150,7 @@ class Runner(ABC):
         Helper method to execute a Module's get_filtered_params_to_log() method.
         """
         filtered_log_method = '{0}.get_filtered_params_to_log'.format(module_name)
-        return __hmods__[filtered_log_method](profile_id, module_args, {'chaining_args': chaining_args,
+        return self._hmods[filtered_log_method](profile_id, module_args, {'chaining_args': chaining_args,
                                                                    'extra_args': extra_args,
                                                                    'caller': self._caller})
 
@@ -153,7 +159,7 @@ class Runner(ABC):
         Cache file if path is salt://...
         """
         if file and file.startswith('salt://'):
-            return __mods__['cp.cache_file'](file)
+            return self._context.mods['cp.cache_file'](file)
         return file
 
     def _load_yaml(self, filepath, filename):
@@ -211,8 +217,8 @@ class Runner(ABC):
             >1.0 AND <10.0 AND >=2.0. OR >=4.0 AND <=5.0 OR ==6.0
             >1
         """
-        log.debug("Current hubble version: %s" % __grains__['hubble_version'])
-        current_version = version.parse(__grains__['hubble_version'])
+        log.debug("Current hubble version: %s" % self._context.grains['hubble_version'])
+        current_version = version.parse(self._context.grains['hubble_version'])
         version_str = yaml_dictionary_data.get('hubble_version', '').strip()
         if not version_str:
             log.debug("No hubble version provided for check id: %s Thus returning true for this check" % (profile_id))
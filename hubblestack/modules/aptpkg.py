@@ -22,6 +22,7 @@ import hubblestack.utils.data
 import hubblestack.utils.pkg
 import hubblestack.utils.systemd
 import hubblestack.utils.environment
+import hubblestack.utils.versions
 from hubblestack.exceptions import (
     CommandExecutionError
 )
@@ -224,15 +225,9 @@ def version_cmp(pkg1, pkg2, ignore_epoch=False):
         except Exception:
             # Try to use shell version in case of errors w/python bindings
             pass
+    # same ordering as dpkg --compare-versions, without running it
     try:
-        for oper, ret in (('lt', -1), ('eq', 0), ('gt', 1)):
-            cmd = ['dpkg', '--compare-versions', pkg1, oper, pkg2]
-            retcode = __mods__['cmd.retcode'](cmd,
-                                              output_loglevel='trace',
-                                              python_shell=False,
-                                              ignore_retcode=True)
-            if retcode == 0:
-                return ret
+        return hubblestack.utils.versions.deb_version_cmp(pkg1, pkg2)
     except Exception as exc:
         log.error(exc)
     return None
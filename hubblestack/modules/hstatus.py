@@ -56,13 +56,18 @@ def msg_counts(pat=MSG_COUNTS_PAT, emit_self=False, sourcetype=SOURCETYPE):
                 if emit_self or stype != sourcetype:
                     skip, rep = _get_reported(summary_repeat, now, key, val)
                     if not skip:
-                        ret.append({'stype': stype,
-                                    'bucket': val['bucket'],
-                                    'bucket_len': val['bucket_len'],
-                                    'reported': rep,
-                                    'event_count': val['count'],
-                                    'send_session_start': int(val['first_t']),
-                                    'send_session_end': int(math.ceil(val['last_t']))})
+                        event = {'stype': stype,
+                                 'bucket': val['bucket'],
+                                 'bucket_len': val['bucket_len'],
+                                 'reported': rep,
+                                 'event_count': val['count'],
+                                 'send_session_start': int(val['first_t']),
+                                 'send_session_end': int(math.ceil(val['last_t']))}
+                        for pct in hubblestack.status.PERCENTILES:
+                            pct_key = 'p{0}_dur'.format(pct)
+                            if val.get(pct_key) is not None:
+                                event[pct_key] = val[pct_key]
+                        ret.append(event)
     if ret:
         return {'time': now, 'sourcetype': sourcetype, 'events': ret}
     return None
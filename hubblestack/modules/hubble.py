@@ -15,6 +15,7 @@ Configuration:
 
 import os
 import sys
+import inspect
 import logging
 import traceback
 import yaml
@@ -281,21 +282,33 @@ def _run_audit(configs, tags, debug, labels, **kwargs):
     """
     results = {}
 
-    # compile list of tuples with profile name and profile data
-    data_list = _build_audit_data(configs, results)
+    # compile list of tuples with profile name and profile key
+    profiles = _build_audit_data(configs, results)
 
     if debug:
         log.debug('hubble.py configs:')
         log.debug(configs)
-        log.debug('hubble.py data_list:')
-        log.debug(data_list)
+        log.debug('hubble.py profiles:')
+        log.debug(profiles)
+
     # Run the audits
-    # This is currently pretty brute-force -- we just run all the modules we
-    # have available with the data list, so data will be processed multiple
-    # times. However, for the scale we're working at this should be fine.
-    # We can revisit if this ever becomes a big bottleneck
+    # Only the modules with data in the requested profiles are run, and each
+    # gets (a copy of) just the profile sections it declares in
+    # __nova_sections__. Modules that don't declare any get whole profiles.
+    available = set()
+    for _, key in profiles:
+        available.update(__nova__.__data__.sections(key))
 
     for key, func in __nova__.items():
+        sections = _nova_sections(func)
+        if sections is None:
+            data_list = [(name, __nova__.__data__[pkey]) for name, pkey in profiles]
+        elif available.isdisjoint(sections):
+            continue
+        else:
+            data_list = [(name, __nova__.__data__.get_sections(pkey, sections))
+                         for name, pkey in profiles
+                         if not __nova__.__data__.sections(pkey).isdisjoint(sections)]
         try:
             ret = func(data_list, tags, labels, **kwargs)
         except Exception:
@@ -321,7 +334,9 @@ def _run_audit(configs, tags, debug, labels, **kwargs):
             results[ret_key].extend(ret_val)
 
     # Inspect the data for compensating control data
-    processed_controls = _build_processed_controls(data_list, debug)
+    control_data = [(name, __nova__.__data__.get_sections(pkey, ('control',)))
+                    for name, pkey in profiles]
+    processed_controls = _build_processed_controls(control_data, debug)
 
     # Look through the failed results to find audits which match our control config
     failures_to_remove = _build_failures_to_remove(results, processed_controls)
@@ -343,16 +358,29 @@ def _no_yaml(filename):
     return filename
 
 
+def _nova_sections(func):
+    """
+    The profile sections (top level keys) the nova module providing func
+    reads, or None if it doesn't say
+    """
+    return getattr(inspect.unwrap(func), '__globals__', {}).get('__nova_sections__')
+
+
 def _build_audit_data(configs, results):
     """
-    Helper function that goes over each config and extract the audit data sets
-    that need to be run.
+    Helper function that goes over each config and finds the profiles that
+    need to be run. Returns a list of (profile name, __nova__.__data__ key)
     """
     to_run = set()
     for config in configs:
         found_for_config = False
         for key in __nova__.__data__:
             if _no_yaml(key).startswith(config):
+                try:
+                    __nova__.__data__.sections(key)
+                except KeyError:
+                    # broken yaml, see __nova__.__missing_data__
+                    continue
                 to_run.add(key)
                 found_for_config = True
         if not found_for_config:
@@ -361,7 +389,7 @@ def _build_audit_data(configs, results):
                 results['Errors'] = []
             results['Errors'].append(
                 {config: {'error': 'No matching profiles found for {0}'.format(config)}})
-    return [(_no_yaml(os.path.basename(key)), __nova__.__data__[key]) for key in to_run]
+    return [(_no_yaml(os.path.basename(key)), key) for key in to_run]
 
 
 def _build_processed_controls(data_list, debug):
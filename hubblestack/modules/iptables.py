@@ -30,6 +30,7 @@ import logging
 # Import python libs
 import os
 import re
+import socket
 import string
 import sys
 import uuid
@@ -39,6 +40,7 @@ import hubblestack.utils.args
 import hubblestack.utils.files
 import hubblestack.utils.path
 from hubblestack.exceptions import HubbleException
+from hubblestack.utils._compat import ipaddress
 
 log = logging.getLogger(__name__)
 
@@ -788,7 +790,7 @@ def save(filename=None, family="ipv4"):
     return out
 
 
-def check(table="filter", chain=None, rule=None, family="ipv4"):
+def check(table="filter", chain=None, rule=None, family="ipv4", snapshot=None):
     """
     Check for the existence of a rule in the table and chain
 
@@ -797,6 +799,10 @@ def check(table="filter", chain=None, rule=None, family="ipv4"):
         method of creating rules would be irritating at best, and we
         already have a parser that can handle it.
 
+    If a ``snapshot`` (see :py:func:`snapshot`) is given, the rule is looked
+    up in it instead of asking iptables, which avoids starting one or more
+    processes per check.
+
     CLI Example:
 
     .. code-block:: bash
@@ -813,6 +819,8 @@ def check(table="filter", chain=None, rule=None, family="ipv4"):
         return "Error: Chain needs to be specified"
     if not rule:
         return "Error: Rule needs to be specified"
+    if snapshot is not None:
+        return _check_snapshot(snapshot, table, chain, rule)
     ipt_cmd = _iptables_cmd(family)
 
     if _has_option("--check", family):
@@ -845,6 +853,323 @@ def check(table="filter", chain=None, rule=None, family="ipv4"):
     return out
 
 
+def snapshot(family="ipv4"):
+    """
+    Capture the running ruleset once (with ``iptables-save``) as an indexed
+    model that :py:func:`check` can evaluate rules against in memory:
+
+    .. code-block:: python
+
+        {'family': 'ipv4',
+         'tables': {'filter': {'INPUT': {'policy': 'DROP',
+                                         'rules': set(<canonical rules>)}}}}
+
+    Returns False if ``iptables-save`` produced nothing.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' iptables.snapshot
+
+        IPv6:
+        salt '*' iptables.snapshot family=ipv6
+    """
+    out = __mods__["cmd.run"]("{0}-save".format(_iptables_cmd(family)), output_loglevel="quiet")
+    if not out or "*" not in out:
+        return False
+    return _parse_snapshot(out, family=family)
+
+
+_BUILTIN_CHAINS = {
+    "filter": ("INPUT", "FORWARD", "OUTPUT"),
+    "nat": ("PREROUTING", "INPUT", "OUTPUT", "POSTROUTING"),
+    "mangle": ("PREROUTING", "INPUT", "FORWARD", "OUTPUT", "POSTROUTING"),
+    "raw": ("PREROUTING", "OUTPUT"),
+    "security": ("INPUT", "FORWARD", "OUTPUT"),
+}
+
+# long spellings of the options iptables-save always prints in short form
+_CANONICAL_OPTS = {
+    "--protocol": "-p",
+    "--proto": "-p",
+    "--source": "-s",
+    "--src": "-s",
+    "--destination": "-d",
+    "--dst": "-d",
+    "--in-interface": "-i",
+    "--out-interface": "-o",
+    "--fragment": "-f",
+    "--jump": "-j",
+    "--goto": "-g",
+    "--match": "-m",
+    "--append": "-A",
+}
+_CORE_OPTS = ("-p", "-s", "-d", "-i", "-o", "-f")
+
+# (match, option) aliases, mapped to what iptables-save prints
+_CANONICAL_MATCH_OPTS = {
+    ("tcp", "--destination-port"): "--dport",
+    ("tcp", "--source-port"): "--sport",
+    ("udp", "--destination-port"): "--dport",
+    ("udp", "--source-port"): "--sport",
+    ("sctp", "--destination-port"): "--dport",
+    ("sctp", "--source-port"): "--sport",
+    ("multiport", "--destination-ports"): "--dports",
+    ("multiport", "--source-ports"): "--sports",
+    # iptables-nft reports -m state as -m conntrack
+    ("state", "--state"): "--ctstate",
+}
+
+# options that load the protocol's match implicitly (-p tcp --dport 22 is
+# saved as -p tcp -m tcp --dport 22)
+_IMPLICIT_MATCH_OPTS = ("--dport", "--sport", "--destination-port", "--source-port",
+                        "--tcp-flags", "--syn", "--tcp-option", "--icmp-type",
+                        "--icmpv6-type", "--chunk-types")
+_PROTO_MATCHES = ("tcp", "udp", "udplite", "sctp", "dccp", "icmp", "icmp6")
+_PROTO_NAMES = {"6": "tcp", "17": "udp", "1": "icmp", "58": "ipv6-icmp",
+                "icmpv6": "ipv6-icmp", "icmp6": "ipv6-icmp", "132": "sctp"}
+
+_ICMP_TYPES = {
+    "echo-reply": "0", "pong": "0", "destination-unreachable": "3",
+    "network-unreachable": "3/0", "host-unreachable": "3/1",
+    "protocol-unreachable": "3/2", "port-unreachable": "3/3",
+    "fragmentation-needed": "3/4", "source-quench": "4", "redirect": "5",
+    "echo-request": "8", "ping": "8", "router-advertisement": "9",
+    "router-solicitation": "10", "time-exceeded": "11", "ttl-exceeded": "11",
+    "parameter-problem": "12", "timestamp-request": "13",
+    "timestamp-reply": "14",
+}
+_ICMPV6_TYPES = {
+    "destination-unreachable": "1", "no-route": "1/0",
+    "communication-prohibited": "1/1", "address-unreachable": "1/3",
+    "port-unreachable": "1/4", "packet-too-big": "2", "time-exceeded": "3",
+    "ttl-exceeded": "3", "parameter-problem": "4", "echo-request": "128",
+    "ping": "128", "echo-reply": "129", "pong": "129",
+    "router-solicitation": "133", "router-advertisement": "134",
+    "neighbour-solicitation": "135", "neighbor-solicitation": "135",
+    "neighbour-advertisement": "136", "neighbor-advertisement": "136",
+    "redirect": "137",
+}
+
+
+def _is_option(token):
+    return len(token) > 1 and token[0] == "-" and not token[1].isdigit()
+
+
+def _canonical_port(port, proto):
+    """
+    Port or port range as iptables-save prints it (numeric, both ends)
+    """
+    if ":" in port:
+        low, high = port.split(":", 1)
+        return "{0}:{1}".format(_canonical_port(low or "0", proto),
+                                _canonical_port(high or "65535", proto))
+    if port.isdigit():
+        return str(int(port))
+    try:
+        return str(socket.getservbyname(port, proto if proto in ("tcp", "udp") else "tcp"))
+    except (OSError, socket.error):
+        return port
+
+
+def _canonical_addresses(value, family):
+    ret = []
+    for addr in value.split(","):
+        try:
+            ret.append(str(ipaddress.ip_network(addr, strict=False)))
+        except ValueError:
+            ret.append(addr)
+    return ",".join(ret)
+
+
+def _canonical_values(module, opt, values, proto, family):
+    """
+    Normalize the arguments of a single option
+    """
+    if opt in ("-s", "-d"):
+        return tuple(_canonical_addresses(value, family) for value in values)
+    if opt == "-p":
+        return tuple(_PROTO_NAMES.get(value.lower(), value.lower()) for value in values)
+    if opt in ("--dport", "--sport"):
+        return tuple(_canonical_port(value, proto) for value in values)
+    if opt in ("--dports", "--sports", "--ports"):
+        return tuple(",".join(_canonical_port(port, proto) for port in value.split(","))
+                     for value in values)
+    if opt == "--icmp-type":
+        return tuple(_ICMP_TYPES.get(value, value) for value in values)
+    if opt == "--icmpv6-type":
+        return tuple(_ICMPV6_TYPES.get(value, value) for value in values)
+    if opt in ("--ctstate", "--ctstatus", "--tcp-flags"):
+        return tuple(",".join(sorted(value.upper().split(","))) for value in values)
+    return tuple(values)
+
+
+def _canonical_rule(rule, family="ipv4"):
+    """
+    Reduce a rule (as given to ``iptables -A CHAIN``, or a ``-A CHAIN ...``
+    line of iptables-save) to a hashable form that doesn't depend on option
+    spelling, implicit matches or the order of the matches, so a rule built
+    with :py:func:`build_rule` compares equal to the way iptables-save prints
+    it.
+
+    Returns None if the rule can't be parsed.
+    """
+    try:
+        tokens = hubblestack.utils.args.shlex_split(rule)
+    except ValueError:
+        return None
+    if tokens and re.match(r"^\[\d+:\d+\]$", tokens[0]):
+        tokens = tokens[1:]  # iptables-save -c counters
+    if len(tokens) > 1 and tokens[0] in ("-A", "--append"):
+        tokens = tokens[2:]
+
+    core = []
+    matches = []
+    current = None
+    target = None
+    target_opts = []
+    proto = None
+    idx = 0
+    while idx < len(tokens):
+        negate = False
+        if tokens[idx] == "!":
+            negate = True
+            idx += 1
+            if idx >= len(tokens):
+                return None
+        opt = tokens[idx]
+        if not _is_option(opt):
+            return None
+        idx += 1
+        values = []
+        while idx < len(tokens) and not _is_option(tokens[idx]) and tokens[idx] != "!":
+            values.append(tokens[idx])
+            idx += 1
+        if (not values and idx + 1 < len(tokens) and tokens[idx] == "!"
+                and not _is_option(tokens[idx + 1])):
+            # old style inversion: -s ! 1.2.3.4
+            negate = True
+            idx += 1
+            while idx < len(tokens) and not _is_option(tokens[idx]) and tokens[idx] != "!":
+                values.append(tokens[idx])
+                idx += 1
+
+        if opt == "--proto" and current is not None and current[0] == "policy":
+            pass
+        else:
+            opt = _CANONICAL_OPTS.get(opt, opt)
+
+        if opt == "-m":
+            if not values:
+                return None
+            # a module named twice (-m tcp ... -m tcp) is one match
+            current = None
+            for match in matches:
+                if match[0] == values[0]:
+                    current = match
+            if current is None:
+                current = (values[0], [])
+                matches.append(current)
+            continue
+        if opt in ("-j", "-g"):
+            if not values:
+                return None
+            target = (opt, values[0])
+            continue
+        if target is None and opt in _CORE_OPTS:
+            values = _canonical_values(None, opt, values, proto, family)
+            if opt == "-p":
+                proto = values[0] if values else None
+                if proto == "all" and not negate:
+                    continue
+            core.append((opt, negate, values))
+            continue
+        if target is not None:
+            target_opts.append((opt, negate, tuple(values)))
+            continue
+
+        if opt in _IMPLICIT_MATCH_OPTS and (current is None or current[0] not in _PROTO_MATCHES):
+            module = proto
+            if module in ("ipv6-icmp",):
+                module = "icmp6"
+            if module not in _PROTO_MATCHES:
+                return None
+            current = None
+            for match in matches:
+                if match[0] == module:
+                    current = match
+            if current is None:
+                current = (module, [])
+                matches.append(current)
+        if current is None:
+            core.append((opt, negate, tuple(values)))
+            continue
+        module = current[0]
+        if opt == "--syn":
+            opt, values = "--tcp-flags", ["FIN,SYN,RST,ACK", "SYN"]
+        opt = _CANONICAL_MATCH_OPTS.get((module, opt), opt)
+        current[1].append((opt, negate, _canonical_values(module, opt, values, proto, family)))
+
+    canonical_matches = []
+    for module, opts in matches:
+        if module == "state":
+            module = "conntrack"
+        canonical_matches.append((module, tuple(sorted(opts))))
+
+    if target is not None and target[1] == "REJECT":
+        if not [opt for opt in target_opts if opt[0] == "--reject-with"]:
+            default = "icmp6-port-unreachable" if family == "ipv6" else "icmp-port-unreachable"
+            target_opts.append(("--reject-with", False, (default,)))
+
+    return (tuple(sorted(core)),
+            tuple(sorted(canonical_matches)),
+            target,
+            tuple(sorted(target_opts)))
+
+
+def _parse_snapshot(text, family="ipv4"):
+    """
+    Parse iptables-save output into the model described in :py:func:`snapshot`
+    """
+    tables = {}
+    chains = {}
+    for line in text.splitlines():
+        line = hubblestack.utils.stringutils.to_unicode(line).strip()
+        if not line or line.startswith("#") or line == "COMMIT":
+            continue
+        if line.startswith("*"):
+            chains = tables.setdefault(line[1:], {})
+        elif line.startswith(":"):
+            comps = line[1:].split()
+            chains[comps[0]] = {"policy": comps[1] if len(comps) > 1 else "-",
+                                "rules": set()}
+        elif line.startswith("-A "):
+            comps = line.split(None, 2)
+            chain = chains.setdefault(comps[1], {"policy": "-", "rules": set()})
+            rest = comps[2] if len(comps) > 2 else ""
+            canonical = _canonical_rule(rest, family)
+            # rules we can't canonicalize can still match verbatim
+            chain["rules"].add(rest if canonical is None else canonical)
+    return {"family": family, "tables": tables}
+
+
+def _check_snapshot(snapshot, table, chain, rule):
+    """
+    :py:func:`check` against a :py:func:`snapshot`
+    """
+    chains = snapshot["tables"].get(table)
+    if chains is None or chain not in chains:
+        if chain in _BUILTIN_CHAINS.get(table, ()):
+            # table not loaded, its builtin chains are empty
+            return False
+        return "Error: Chain {0} does not exist in table {1}".format(chain, table)
+    canonical = _canonical_rule(rule, snapshot["family"])
+    if canonical is None:
+        return rule.strip() in chains[chain]["rules"]
+    return canonical in chains[chain]["rules"]
+
+
 def check_chain(table="filter", chain=None, family="ipv4"):
     """
     .. versionadded:: 2014.1.0
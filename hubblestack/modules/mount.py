@@ -1,10 +1,16 @@
 # -*- coding: utf-8 -*-
 """
 Hubble module to manage Unix mounts and the fstab file
+
+On Linux the active mounts are parsed once and kept until the kernel reports a
+change of the mount table (POLLPRI on /proc/self/mountinfo), so repeated
+``mount.active`` calls, e.g. from partition option checks, are dict lookups.
 """
+import copy
 import logging
 import os
 import re
+import select
 
 # Import hubble libs
 import hubblestack.utils.args
@@ -231,6 +237,81 @@ def _active_mounts_darwin(ret):
     return ret
 
 
+class _MountTable(object):
+    """
+    The parsed Linux mount table, indexed by mount point and by device, kept
+    until polling /proc/self/mountinfo reports a change (the kernel flags
+    POLLPRI|POLLERR on every open mountinfo after a mount or umount)
+    """
+
+    filename = "/proc/self/mountinfo"
+
+    def __init__(self):
+        self.fh = None
+        self.poller = None
+        self.tables = dict()  # extended -> (mounts by mount point, mount points by device)
+
+    def _changed(self):
+        if self.poller is None:
+            try:
+                self.fh = open(self.filename, "rb")
+                self.poller = select.poll()
+                self.poller.register(self.fh, select.POLLPRI | select.POLLERR)
+            except (AttributeError, OSError) as exc:
+                log.debug("not caching the mount table: %s", exc)
+                self.close()
+            return True
+        # polling also acknowledges the change
+        for _, events in self.poller.poll(0):
+            if events & (select.POLLPRI | select.POLLERR):
+                return True
+        return False
+
+    def get(self, extended, parse):
+        """
+        The (mounts, devices) of the current mount table; parse(ret) fills ret
+        with the mounts when the cached ones are out of date
+        """
+        if self._changed():
+            self.tables.clear()
+        if extended not in self.tables:
+            mounts = parse(dict())
+            devices = dict()
+            for name, info in mounts.items():
+                devices.setdefault(info.get("device"), list()).append(name)
+            if self.poller is None:
+                return mounts, devices
+            self.tables[extended] = (mounts, devices)
+        return self.tables[extended]
+
+    def close(self):
+        """ forget the table and stop polling """
+        if self.fh is not None:
+            self.fh.close()
+        self.fh = self.poller = None
+        self.tables.clear()
+
+
+_MOUNT_TABLE = _MountTable()
+
+
+def _active_linux(extended):
+    """
+    The (mounts, devices) of the Linux mount table, from the cache if the
+    mount table hasn't changed since it was parsed
+    """
+
+    def parse(ret):
+        if extended:
+            try:
+                return _active_mountinfo(ret)
+            except CommandExecutionError:
+                ret.clear()
+        return _active_mounts(ret)
+
+    return _MOUNT_TABLE.get(extended, parse)
+
+
 def _resolve_user_group_names(opts):
     """
     Resolve user and group names in related opts
@@ -272,13 +353,8 @@ def active(extended=False):
     elif __grains__["os"] in ["MacOS", "Darwin"]:
         _active_mounts_darwin(ret)
     else:
-        if extended:
-            try:
-                _active_mountinfo(ret)
-            except CommandExecutionError:
-                _active_mounts(ret)
-        else:
-            _active_mounts(ret)
+        # a copy, so callers can't modify the cached table
+        ret = copy.deepcopy(_active_linux(extended)[0])
     return ret
 
 
@@ -1572,6 +1648,21 @@ def is_mounted(name):
         return False
 
 
+def mounted_on(device):
+    """
+    List the mount points the device is mounted on
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' mount.mounted_on /dev/sda1
+    """
+    if __grains__["kernel"] == "Linux":
+        return list(_active_linux(False)[1].get(device, []))
+    return sorted(name for name, info in active().items() if info.get("device") == device)
+
+
 def read_mount_cache(name):
     """
     .. versionadded:: 2018.3.0
@@ -25,12 +25,11 @@ nebula_osquery:
 
 import collections
 import copy
-import fnmatch
+import functools
 import glob
 import json
 import logging
 import os
-import re
 import shutil
 import time
 from hashlib import md5
@@ -38,7 +37,10 @@ import yaml
 import zlib
 import traceback
 
+import hubblestack.utils.data
 import hubblestack.utils.files
+import hubblestack.utils.osquery_lib
+import hubblestack.utils.osquery_mask
 import hubblestack.utils.platform
 
 from hubblestack.exceptions import CommandExecutionError
@@ -53,6 +55,7 @@ hubble_status = HubbleStatus(__name__, 'top', 'queries', 'osqueryd_monitor', 'os
 
 __virtualname__ = 'nebula'
 __RESULT_LOG_OFFSET__ = {}
+_MASK_ENGINES = {}
 OSQUERYD_NEEDS_RESTART = False
 
 
@@ -66,7 +69,8 @@ def queries(query_group,
             verbose=False,
             report_version_with_day=True,
             topfile_for_mask=None,
-            mask_passwords=False):
+            mask_passwords=False,
+            stream_results=False):
     """
     Run the set of queries represented by ``query_group`` from the
     configuration in the file query_file
@@ -89,6 +93,14 @@ def queries(query_group,
         Defaults to False. If set to True, passwords mentioned in the
         return object are masked.
 
+    stream_results
+        Defaults to False. If set to True, osqueryi output is spooled to a
+        temp file and the ``data`` of each query is an iterable that parses
+        (and JSONIFYs and masks) one row at a time, so memory use doesn't grow
+        with the size of the result. Meant for scheduled runs, where the
+        returners iterate the rows into their batches; the data can't be
+        json dumped as is.
+
     CLI Examples:
 
     .. code-block:: bash
@@ -123,8 +135,10 @@ def queries(query_group,
 
     schedule_time = time.time()
 
+    stream_results = hubblestack.utils.data.is_true(stream_results)
+
     # run the osqueryi queries
-    success, timing, ret = _run_osquery_queries(query_data, verbose)
+    success, timing, ret = _run_osquery_queries(query_data, verbose, stream=stream_results)
 
     if success is False and hubblestack.utils.platform.is_windows():
         log.error('osquery does not run on windows versions earlier than Server 2008 and Windows 7')
@@ -187,9 +201,12 @@ def _build_baseline_osquery_data(report_version_with_day):
     return ret
 
 
-def _run_osqueryi_query(query, query_sql, timing, verbose):
+def _run_osqueryi_query(query, query_sql, timing, verbose, stream=False):
     """
     Run the osqueryi query in query_sql and return the result
+
+    With stream, the data is an OsqueryRows reading the spooled output rather
+    than a parsed list.
     """
     max_file_size = 104857600
     augeas_lenses = '/opt/osquery/lenses'
@@ -200,11 +217,18 @@ def _run_osqueryi_query(query, query_sql, timing, verbose):
           '--augeas_lenses', augeas_lenses, query_sql]
 
     time_start = time.time()
-    res = __mods__['cmd.run_all'](cmd, timeout=600)
+    if stream:
+        res = hubblestack.utils.osquery_lib.run_spooled(cmd, timeout=600)
+    else:
+        res = __mods__['cmd.run_all'](cmd, timeout=600)
     time_end = time.time()
     timing[query['query_name']] = time_end - time_start
     if res['retcode'] == 0:
-        query_ret['data'] = json.loads(res['stdout'])
+        if stream:
+            query_ret['data'] = hubblestack.utils.osquery_lib.OsqueryRows(res['spool'],
+                                                                         query['query_name'])
+        else:
+            query_ret['data'] = json.loads(res['stdout'])
     else:
         if 'Timed out' in res['stdout']:
             # this is really the best way to tell without getting fancy
@@ -220,7 +244,7 @@ def _run_osqueryi_query(query, query_sql, timing, verbose):
     return tmp
 
 
-def _run_osquery_queries(query_data, verbose):
+def _run_osquery_queries(query_data, verbose, stream=False):
     """
     Go over the query data in the osquery query file, run each query
     and return the aggregated results.
@@ -240,7 +264,7 @@ def _run_osquery_queries(query_data, verbose):
             continue
 
         # Run osquery query
-        query_ret = _run_osqueryi_query(query, query_sql, timing, verbose)
+        query_ret = _run_osqueryi_query(query, query_sql, timing, verbose, stream=stream)
         try:
             if query_ret['query_result']['result'] is False or \
                query_ret[name]['result'] is False:
@@ -255,21 +279,33 @@ def _run_osquery_queries(query_data, verbose):
 def _update_osquery_results(ret):
     """
     Go over the data in the results obtained by running osquery queries and update by JSONIFYing
-    Returns the updated version.
+    Returns the updated version. Streamed (OsqueryRows) data gets JSONIFYed row by row as
+    it's iterated.
     """
     for data in ret:
         for _query_name, query_ret in data.items():
             if 'data' not in query_ret:
                 continue
+            if isinstance(query_ret['data'], hubblestack.utils.osquery_lib.OsqueryRows):
+                query_ret['data'].transforms.append(_jsonify_row)
+                continue
             for result in query_ret['data']:
-                for key, value in result.items():
-                    if value and isinstance(value, str) and\
-                            value.startswith('__JSONIFY__'):
-                        result[key] = json.loads(value[len('__JSONIFY__'):])
+                _jsonify_row(result)
 
     return ret
 
 
+def _jsonify_row(result):
+    """
+    Load the __JSONIFY__ prefixed values of one result row in place
+    """
+    for key, value in result.items():
+        if value and isinstance(value, str) and\
+                value.startswith('__JSONIFY__'):
+            result[key] = json.loads(value[len('__JSONIFY__'):])
+    return result
+
+
 def _get_query_data(query_file):
     """
     Helper function that extracts the query data from the query file and returns it.
@@ -795,59 +831,29 @@ def _mask_object(object_to_be_masked, topfile):
         be ``ETCDCTL_READ_PASSWORD``. The attribute_to_mask would be ``value``.
         All dicts with ``variable_name`` in the list of blacklisted_patterns
         would have the value under their ``value`` key masked.
+
+    Streamed (OsqueryRows) query data isn't walked here; the mask is added to
+    its transforms and applied to each row as it's iterated.
     """
     try:
-        mask = {}
-        if topfile is None:
-            # We will maintain backward compatibility by keeping two versions of
-            # top files and mask files for now
-            # Once all hubble servers are updated, we can remove old version of
-            # top file and mask file
-            # Similar to what we have for nebula and nebula_v2 for older versions and
-            # newer versions of profiles
-            topfile = 'salt://hubblestack_nebula_v2/top_v2.mask'
-        mask_files = _get_top_data(topfile)
-        mask_files = ['salt://hubblestack_nebula_v2/' + mask_file.replace('.', '/') + '.yaml'
-                      for mask_file in mask_files]
-        if not mask_files:
-            mask_files = []
-        for mask_file in mask_files:
-            if 'salt://' in mask_file:
-                orig_fh = mask_file
-                mask_file = __mods__['cp.cache_file'](mask_file)
-            if not mask_file:
-                log.error('Could not find file %s.', orig_fh)
-                return None
-            if os.path.isfile(mask_file):
-                with open(mask_file, 'r') as yfile:
-                    f_data = yaml.safe_load(yfile)
-                    if not isinstance(f_data, dict):
-                        raise CommandExecutionError('File data is not formed as a dict {0}'
-                                                    .format(f_data))
-                    mask = _dict_update(mask, f_data, recursive_update=True, merge_lists=True)
-
-        log.debug('Masking data: %s', mask)
-
-        # Backwards compatibility with mask_by
-        mask_with = mask.get('mask_with', mask.get('mask_by', 'REDACTED'))
+        mask = _load_mask(topfile)
+        if mask is None:
+            return None
+        mask.reset_warnings()
 
         log.info("Total number of results to check for masking: %d", len(object_to_be_masked))
-        globbing_enabled = __opts__.get('enable_globbing_in_nebula_masking')
-
-        for blacklisted_object in mask.get('blacklisted_objects', []):
-            query_names = blacklisted_object['query_names']
-            column = blacklisted_object['column']  # Can be converted to list as well in future
-            perform_masking_kwargs = {'blacklisted_object': blacklisted_object,
-                                      'mask_with': mask_with,
-                                      'globbing_enabled': globbing_enabled}
-            if '*' in query_names:
-                # This means wildcard is specified and each event should be masked, if applicable
-                _mask_object_helper(object_to_be_masked, perform_masking_kwargs, column)
-            else:
-                # Perform masking on results of specific queries specified in 'query_names'
-                for query_name in query_names:
-                    _mask_object_helper(object_to_be_masked, perform_masking_kwargs,
-                                        column, query_name)
+        in_memory = []
+        for obj in object_to_be_masked:
+            streamed = False
+            for query_name, query_ret in obj.items():
+                if isinstance(query_ret, dict) and \
+                        isinstance(query_ret.get('data'), hubblestack.utils.osquery_lib.OsqueryRows):
+                    query_ret['data'].transforms.append(
+                        functools.partial(_mask_row, mask, query_name))
+                    streamed = True
+            if not streamed:
+                in_memory.append(obj)
+        mask.mask(in_memory)
 
     except Exception:
         log.exception('An error occured while masking the passwords.', exc_info=True)
@@ -856,277 +862,69 @@ def _mask_object(object_to_be_masked, topfile):
     return True
 
 
-def _mask_object_helper(object_to_be_masked, perform_masking_kwargs, column, query_name=None):
-    """
-    Helper function used to mask an object
-    """
-    for obj in object_to_be_masked:
-        if 'action' in obj:
-            # This means data is generated by osquery daemon
-            _mask_event_data(obj, query_name, column,
-                             perform_masking_kwargs['blacklisted_object'],
-                             perform_masking_kwargs['mask_with'],
-                             perform_masking_kwargs['globbing_enabled'])
-        else:
-            # This means data is generated by osquery interactive shell
-            kwargs = {'query_name': query_name, 'column': column,
-                      'perform_masking_kwargs': perform_masking_kwargs,
-                      'custom_args': {'should_break': True}}
-            if query_name:
-                # No log_error here, since we didn't reference a specific query
-                kwargs['custom_args']['log_error'] = True
-                data = obj.get(query_name, {'data': []})['data']
-                _mask_interactive_shell_data(data, kwargs)
-            else:
-                kwargs['custom_args']['log_error'] = False
-                for query_name, query_ret in obj.items():
-                    data = query_ret['data']
-                    _mask_interactive_shell_data(data, kwargs)
-
-
-def _mask_interactive_shell_data(data, kwargs):
-    """
-    Function that masks the data generated by an interactive osquery shell
-    """
-    for query_result in data:
-        status, _blacklisted_object, query_result = _mask_event_data_helper(
-            event_data=query_result, **kwargs)
-        if kwargs['custom_args']['log_error']:
-            # if the column in not present in one data-object, it will
-            # not be present in others as well. Break in that case.
-            # This will happen only if mask.yaml is malformed
-            if not status:
-                break
-
-
-def _mask_event_data(object_to_be_masked, query_name, column, blacklisted_object,
-                     mask_with, globbing_enabled):
-    """
-    This method is responsible for masking potential secrets in event data generated by
-    osquery daemon. This will handle logs format of both differential and snapshot types
-
-    Logs generated by 'osqueryi' would not reach here due checks in parent method
-
-    object_to_be_masked
-        data structure to mask recursively
-
-    query_name
-        Perform masking only if query name in 'object_to_be_masked' matches the 'query_name'
-
-    column
-        column in which masking is to be performed
-
-    blacklisted_object
-        the blacklisted_objects entry from the mask.yaml
-
-    mask_with
-        masked values are replaced with this string
-
-    globbing_enabled
-        enable globbing in specified blacklisted patterns of mask file
-    """
-    if not query_name:
-        query_name = object_to_be_masked['name']
-    perform_masking_kwargs = {'blacklisted_object': blacklisted_object,
-                              'mask_with': mask_with,
-                              'globbing_enabled': globbing_enabled}
-
-    if object_to_be_masked['action'] == 'snapshot' and query_name == object_to_be_masked['name']:
-        # This means we have event data of type 'snapshot'
-        for snap_object in object_to_be_masked['snapshot']:
-            status, blacklisted_object, snap_object = _mask_event_data_helper(
-                event_data=snap_object, query_name=query_name, column=column,
-                perform_masking_kwargs=perform_masking_kwargs,
-                custom_args={'should_break': True, 'log_error': True})
-            if not status:
-                break
-    elif query_name == object_to_be_masked['name']:
-        _status, _blacklisted_object, _q_result = _mask_event_data_helper(
-            event_data=object_to_be_masked['columns'], query_name=query_name, column=column,
-            perform_masking_kwargs=perform_masking_kwargs,
-            custom_args={'should_break': False, 'log_error': True})
-    else:
-        # Unable to match query_name
-        log.debug('Skipping masking, as event data is not for query: %s', query_name)
-
-
-def _custom_blacklisted_object(blacklisted_object, mask_column):
-    """
-    Construct custom blacklisted patterns based on custom_mask_key value of blacklisted_object
-    """
-    for column_field in mask_column:
-        try:
-            if 'variable_name' in column_field and 'value' in column_field and \
-                    column_field['variable_name'] == blacklisted_object['custom_mask_key']:
-                log.debug("Constructing custom blacklisted patterns based on \
-                          environment variable '%s'", blacklisted_object['custom_mask_key'])
-                blacklisted_object['custom_blacklist'] = [
-                    field.strip() for field in column_field['value'].replace(' ', ',').split(',')
-                    if field.strip() and field.strip() != blacklisted_object['custom_mask_key']]
-            else:
-                log.debug("Custom mask variable not set in environment. Custom mask key used: %s",
-                          blacklisted_object['custom_mask_key'])
-        except Exception as exc:
-            log.error("Failed to generate custom blacklisted patterns based on hubble mask key")
-            log.error("Got error: %s", exc)
-
-    return blacklisted_object
-
-
-def _mask_event_data_helper(event_data, query_name, column, perform_masking_kwargs, custom_args):
-    """
-    Helper function for _mask_event_data that masks secrets in event data
-    generated by osquery daemon taking into account the type - differential or snashot.
-
-    perform_masking_kwargs
-        Dictionary that acts as **kwargs for the _perform_masking function, holding
-        blacklisted_object, mask_with and globbing_enabled
-
-    custom_args
-        A dictionary containing:
-            'should_break' key with a True value if it should return when the column is not
-             found in event_data and False if it should not return on that branch
-            'log_error' key with a True value if it should log an error when the column is not
-            found in event_data and False if that is not considered an error
-    """
-    blacklisted_object = perform_masking_kwargs['blacklisted_object']
-    # Name of column that stores environment variables
-    custom_mask_column = blacklisted_object.get('custom_mask_column', '')
-    enable_local_masking = blacklisted_object.get('enable_local_masking', False)
-    if enable_local_masking is True and custom_mask_column and custom_mask_column in event_data:
-        log.debug("Checking if custom mask patterns are set in environment")
-        mask_column = event_data[custom_mask_column]
-        if mask_column and isinstance(mask_column, list):
-            blacklisted_object = _custom_blacklisted_object(blacklisted_object, mask_column)
-    if column not in event_data or \
-            (isinstance(event_data[column], str) and
-             event_data[column].strip() != ''):
-        if custom_args['log_error']:
-            log.error('masking data references a missing column %s in query %s',
-                      column, query_name)
-        if custom_args['should_break']:
-            return False, blacklisted_object, event_data
-    if isinstance(event_data[column], str):
-        # If column is of 'string' type, then replace pattern in-place
-        # No need for recursion here
-        value = event_data[column]
-        for pattern in blacklisted_object['blacklisted_patterns']:
-            value = re.sub(pattern + '()', r'\1' + perform_masking_kwargs['mask_with'] + r'\3',
-                           value)
-        event_data[column] = value
-    else:
-        _perform_masking(event_data[column], **perform_masking_kwargs)
-        blacklisted_object.pop('custom_blacklist', None)
-    return True, blacklisted_object, event_data
+def _load_mask(topfile):
+    """
+    Load the mask.yaml files matched in the mask ``topfile`` and compile them
+    into a hubblestack.utils.osquery_mask.MaskEngine. Engines are kept by the
+    hash of the files' content, so the yaml is only parsed and compiled again
+    when a mask file changes. Returns None if one of the files can't be found.
+    """
+    if topfile is None:
+        # We will maintain backward compatibility by keeping two versions of
+        # top files and mask files for now
+        # Once all hubble servers are updated, we can remove old version of
+        # top file and mask file
+        # Similar to what we have for nebula and nebula_v2 for older versions and
+        # newer versions of profiles
+        topfile = 'salt://hubblestack_nebula_v2/top_v2.mask'
+    mask_files = _get_top_data(topfile)
+    mask_files = ['salt://hubblestack_nebula_v2/' + mask_file.replace('.', '/') + '.yaml'
+                  for mask_file in mask_files]
+    if not mask_files:
+        mask_files = []
+    globbing_enabled = bool(__opts__.get('enable_globbing_in_nebula_masking'))
+    digest = md5(str(globbing_enabled).encode())
+    contents = []
+    for mask_file in mask_files:
+        if 'salt://' in mask_file:
+            orig_fh = mask_file
+            mask_file = __mods__['cp.cache_file'](mask_file)
+        if not mask_file:
+            log.error('Could not find file %s.', orig_fh)
+            return None
+        if os.path.isfile(mask_file):
+            with open(mask_file, 'rb') as yfile:
+                content = yfile.read()
+            digest.update(mask_file.encode('utf-8') + b'\0' + content + b'\0')
+            contents.append(content)
+    digest = digest.hexdigest()
+
+    engine = _MASK_ENGINES.get(digest)
+    if engine is None:
+        mask = {}
+        for content in contents:
+            f_data = yaml.safe_load(content)
+            if not isinstance(f_data, dict):
+                raise CommandExecutionError('File data is not formed as a dict {0}'
+                                            .format(f_data))
+            mask = _dict_update(mask, f_data, recursive_update=True, merge_lists=True)
+        log.debug('Masking data: %s', mask)
+        engine = hubblestack.utils.osquery_mask.compile_mask(mask, globbing_enabled)
+        if len(_MASK_ENGINES) >= 8:
+            _MASK_ENGINES.clear()
+        _MASK_ENGINES[digest] = engine
+    return engine
 
 
-def _perform_masking(object_to_mask, blacklisted_object, mask_with, globbing_enabled):
+def _mask_row(mask, query_name, row):
     """
-    This function is used as a wrapper to _recursively_mask_objects function.
-    It's main usage is to set 'blacklisted_patterns'.
-    If custom blacklisted patterns are present they will used.
-
-    Fallback to blacklisted_patterns specified in mask file if no custom hubble mask is provided.
-
-    object_to_mask
-        data structure to mask recursively
-
-    blacklisted_object
-        the blacklisted_objects entry from the mask.yaml
-
-    blacklisted_patterns
-        List of blacklisted patterns which will be used to identify if a field is to be masked
-
-    mask_with
-        masked values are replaced with this string
-
-    globbing_enabled
-        enable globbing in specified blacklisted patterns of mask file
+    Mask one streamed result row of ``query_name``; used as an OsqueryRows transform
     """
-    enable_local_masking = blacklisted_object.get('enable_local_masking', False)
-    enable_global_masking = blacklisted_object.get('enable_global_masking', False)
-    blacklisted_patterns = None
-
-    if enable_local_masking is True and enable_global_masking is True:
-        # For now, we will be performing masking based on global list as well as dynamic list
-        # present in process's environment variable
-        # If there's no noticeable performance impact then we will continue using both else
-        # switch to using either global blacklist or dynamic blacklist as specified by
-        # blacklisted_object['custom_mask_key'] in process's environment
-        if 'custom_blacklist' in blacklisted_object and blacklisted_object['custom_blacklist']:
-            if blacklisted_object.get('blacklisted_patterns', None):
-                blacklisted_patterns = blacklisted_object['blacklisted_patterns'] +\
-                                       blacklisted_object['custom_blacklist']
-                blacklisted_patterns = list(set(blacklisted_patterns))  # remove duplicates, if any
-                log.debug("Appending custom blacklisted patterns in global blacklist for masking")
-            else:
-                blacklisted_patterns = blacklisted_object['custom_blacklist']
-                log.debug("Local blacklist missing, using global blacklist for masking")
-        else:
-            if blacklisted_object.get('blacklisted_patterns', None):
-                blacklisted_patterns = blacklisted_object['blacklisted_patterns']
-                log.debug("No local blacklist found, using global blacklist only for masking")
-    elif enable_global_masking is True:
-        if blacklisted_object.get('blacklisted_patterns', None):
-            blacklisted_patterns = blacklisted_object['blacklisted_patterns']
-            log.debug("Only global masking is enabled.")
-    elif enable_local_masking is True:
-        if 'custom_blacklist' in blacklisted_object and blacklisted_object['custom_blacklist']:
-            blacklisted_patterns = blacklisted_object['custom_blacklist']
-            log.debug("Only local masking is enabled.")
-    else:
-        log.debug("Both global and local masking is disabled, skipping masking of results.")
-
-    if blacklisted_patterns:
-        _recursively_mask_objects(object_to_mask, blacklisted_object, blacklisted_patterns,
-                                  mask_with, globbing_enabled)
-
-
-def _recursively_mask_objects(object_to_mask, blacklisted_object, blacklisted_patterns,
-                              mask_with, globbing_enabled):
-    """
-    This function is used by ``_mask_object()`` to mask passwords contained in
-    an osquery data structure (formed as a list of dicts, usually). Since the
-    lists can sometimes be nested, recurse through the lists.
-
-    object_to_mask
-        data structure to mask recursively
-
-    blacklisted_object
-        the blacklisted_objects entry from the mask.yaml
-
-    blacklisted_patterns
-        List of blacklisted patterns which will be used to identify if a field is to be masked
-
-    mask_with
-        masked values are replaced with this string
-
-    globbing_enabled
-        enable globbing in specified blacklisted patterns of mask file
-    """
-    if isinstance(object_to_mask, list):
-        for child in object_to_mask:
-            log.debug("Recursing object %s", child)
-            _recursively_mask_objects(child, blacklisted_object, blacklisted_patterns,
-                                      mask_with, globbing_enabled)
-    elif globbing_enabled and blacklisted_object['attribute_to_check'] in object_to_mask:
-        mask = False
-        for blacklisted_pattern in blacklisted_patterns:
-            if fnmatch.fnmatch(object_to_mask[blacklisted_object['attribute_to_check']],
-                               blacklisted_pattern):
-                mask = True
-                log.info("Attribute %s will be masked.",
-                         object_to_mask[blacklisted_object['attribute_to_check']])
-                break
-        if mask:
-            for key in blacklisted_object['attributes_to_mask']:
-                if key in object_to_mask:
-                    object_to_mask[key] = mask_with
-    elif (not globbing_enabled) and blacklisted_object['attribute_to_check'] in object_to_mask and \
-            object_to_mask[blacklisted_object['attribute_to_check']] in blacklisted_patterns:
-        for key in blacklisted_object['attributes_to_mask']:
-            if key in object_to_mask:
-                object_to_mask[key] = mask_with
+    try:
+        mask.mask_row(query_name, row)
+    except Exception:
+        log.exception('An error occured while masking the passwords.', exc_info=True)
+    return row
 
 
 def _dict_update(dest, upd, recursive_update=True, merge_lists=False):
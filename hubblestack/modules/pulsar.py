@@ -927,6 +927,7 @@ def process(configfile='salt://hubblestack_pulsar/hubblestack_pulsar_config.yaml
     spam_dt = now_t - SPAM_TIME
     current_count = len(wm.watch_db)
     delta_c = current_count - initial_count
+    HubbleStatus.gauge('pulsar_watches', current_count)
 
     if dt.get() >= 0.1 or abs(delta_c)>0 or spam_dt >= 60:
         SPAM_TIME = now_t
@@ -92,48 +92,8 @@ def version_cmp(ver1, ver2, ignore_epoch=False):
                 log.debug('rpmUtils.miscutils.compareEVR is not available')
 
         if cmp_func is None:
-            if hubblestack.utils.path.which('rpmdev-vercmp'):
-                # rpmdev-vercmp always uses epochs, even when zero
-                def _ensure_epoch(ver):
-                    def _prepend(ver):
-                        return '0:{0}'.format(ver)
-
-                    try:
-                        if ':' not in ver:
-                            return _prepend(ver)
-                    except TypeError:
-                        return _prepend(ver)
-                    return ver
-
-                ver1 = _ensure_epoch(ver1)
-                ver2 = _ensure_epoch(ver2)
-                result = __mods__['cmd.run_all'](
-                    ['rpmdev-vercmp', ver1, ver2],
-                    python_shell=False,
-                    redirect_stderr=True,
-                    ignore_retcode=True)
-                # rpmdev-vercmp returns 0 on equal, 11 on greater-than, and
-                # 12 on less-than.
-                if result['retcode'] == 0:
-                    return 0
-                elif result['retcode'] == 11:
-                    return 1
-                elif result['retcode'] == 12:
-                    return -1
-                else:
-                    # We'll need to fall back to hubblestack.utils.versions.version_cmp()
-                    log.warning(
-                        'Failed to interpret results of rpmdev-vercmp output. '
-                        'This is probably a bug, and should be reported. '
-                        'Return code was %s. Output: %s',
-                        result['retcode'], result['stdout']
-                    )
-            else:
-                # We'll need to fall back to hubblestack.utils.versions.version_cmp()
-                log.warning(
-                    'rpmdevtools is not installed, please install it for '
-                    'more accurate version comparisons'
-                )
+            # rpmvercmp in process, rather than running rpmdev-vercmp
+            return hubblestack.utils.versions.rpm_version_cmp(ver1, ver2)
         else:
             # If one EVR is missing a release but not the other and they
             # otherwise would be equal, ignore the release. This can happen if
@@ -158,8 +118,5 @@ def version_cmp(ver1, ver2, ignore_epoch=False):
             ver1, ver2, exc
         )
 
-    # We would already have normalized the versions at the beginning of this
-    # function if ignore_epoch=True, so avoid unnecessary work and just pass
-    # False for this value.
-    return hubblestack.utils.versions.version_cmp(ver1, ver2, ignore_epoch=False)
+    return hubblestack.utils.versions.rpm_version_cmp(ver1, ver2)
 
@@ -0,0 +1,191 @@
+# -*- encoding: utf-8 -*-
+"""
+Shared HTTP delivery for the logstash, graylog and sumo returners
+
+Payloads are collected by an HTTPSender and posted in batches over a pooled
+requests.Session (one per endpoint, reused across returner runs):
+
+    batch_format: array
+        the batch is posted as a json array (logstash's json codec splits it)
+    batch_format: ndjson
+        the batch is posted as newline delimited json (sumo http sources)
+    batch_format: none
+        every payload is posted on its own (graylog gelf http)
+
+A batch is posted as soon as adding a payload would exceed batch_bytes.
+
+The server certificate is verified unless the returner's verify option (or
+its ssl option: http_input_server_ssl, indexer_ssl or gelfhttp_ssl) is False.
+
+If disk_queue is set to a directory, batches that can't be delivered
+(connection errors, timeouts, 5xx) are spilled to a hubblestack.hec.dq.DiskQueue
+there (bounded by disk_queue_size) and re-sent, oldest first, ahead of the
+next batch that goes through.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
+
+from hubblestack.hec.dq import DiskQueue, QueueCapacityError
+
+log = logging.getLogger(__name__)
+
+BATCH_FORMATS = ('array', 'ndjson', 'none')
+CONTENT_TYPES = {'array': 'application/json', 'ndjson': 'application/x-ndjson',
+                 'none': 'application/json'}
+DEFAULT_BATCH_BYTES = 100000
+DEFAULT_DISK_QUEUE_SIZE = 100 * 1024 * 1024
+POOL_SIZE = 4
+REPLAY_MAX = 100
+VERIFY_OPTS = ('verify', 'http_input_server_ssl', 'indexer_ssl', 'gelfhttp_ssl')
+
+_SESSIONS = dict()
+_SESSIONS_LOCK = threading.Lock()
+
+
+class DeliveryError(Exception):
+    """ a batch could not be delivered (and should be retried) """
+    pass
+
+
+def get_session(url, proxy=None):
+    """ return the pooled session for the scheme://host:port of url (and proxy) """
+    scheme, _, rest = url.partition('://')
+    key = (scheme, rest.split('/', 1)[0], json.dumps(proxy or {}, sort_keys=True), os.getpid())
+    with _SESSIONS_LOCK:
+        session = _SESSIONS.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            if proxy:
+                session.proxies.update(proxy)
+            _SESSIONS[key] = session
+        return session
+
+
+class HTTPSender(object):
+    """ batch payloads for one endpoint and post them over a pooled session
+
+        .. code-block:: python
+            sender = HTTPSender(url, user=opts['user'], password=opts['password'],
+                                timeout=opts['timeout'], batch_format='array')
+            for event in events:
+                sender.send(payload)
+            sender.flush()
+    """
+
+    def __init__(self, url, user=None, password=None, timeout=9.05, proxy=None,
+                 batch_format='array', batch_bytes=DEFAULT_BATCH_BYTES,
+                 disk_queue=None, disk_queue_size=DEFAULT_DISK_QUEUE_SIZE, verify=True):
+        if batch_format not in BATCH_FORMATS:
+            log.error('unknown batch_format %s, using "none"', batch_format)
+            batch_format = 'none'
+        self.url = url
+        self.auth = HTTPBasicAuth(user, password) if user or password else None
+        self.timeout = float(timeout) if timeout else None
+        self.session = get_session(url, proxy=proxy)
+        self.batch_format = batch_format
+        self.batch_bytes = int(batch_bytes or DEFAULT_BATCH_BYTES)
+        self.verify = verify
+        self.batch = list()
+        self.batch_len = 0
+        self.sent = self.queued = 0
+        self.queue = None
+        if disk_queue:
+            digest = hashlib.md5(url.encode('utf-8')).hexdigest()
+            self.queue = DiskQueue(os.path.join(disk_queue, digest), size=int(disk_queue_size))
+
+    def send(self, payload):
+        """ add a payload (a dict, or an already serialized json string) to the batch """
+        if not isinstance(payload, str):
+            payload = json.dumps(payload)
+        if self.batch_format == 'none':
+            self._deliver(payload)
+            return
+        if self.batch and self.batch_len + len(payload) + 1 > self.batch_bytes:
+            self.flush()
+        self.batch.append(payload)
+        self.batch_len += len(payload) + 1
+
+    def flush(self):
+        """ post the current batch """
+        if not self.batch:
+            return
+        if self.batch_format == 'ndjson':
+            body = '\n'.join(self.batch) + '\n'
+        else:
+            body = '[' + ','.join(self.batch) + ']'
+        self.batch = list()
+        self.batch_len = 0
+        self._deliver(body)
+
+    def _post(self, body):
+        try:
+            resp = self.session.post(self.url, data=body.encode('utf-8'), auth=self.auth,
+                                     timeout=self.timeout, verify=self.verify,
+                                     headers={'Content-Type': CONTENT_TYPES[self.batch_format]})
+        except requests.exceptions.RequestException as exc:
+            raise DeliveryError(str(exc))
+        if resp.status_code >= 500:
+            raise DeliveryError('{0} {1}'.format(resp.status_code, resp.reason))
+        if resp.status_code >= 400:
+            # the endpoint refuses this data; sending it again won't help
+            log.error('%s rejected %d bytes: %s %s', self.url, len(body), resp.status_code, resp.reason)
+        else:
+            self.sent += 1
+
+    def _deliver(self, body):
+        try:
+            self._replay()
+            self._post(body)
+        except DeliveryError as exc:
+            if self.queue is None:
+                log.error('failed to send %d bytes to %s: %s', len(body), self.url, exc)
+                return
+            try:
+                self.queue.put(body)
+                self.queued += 1
+                log.info('failed to send to %s (%s), queued %d bytes to disk', self.url, exc, len(body))
+            except QueueCapacityError:
+                log.error('failed to send %d bytes to %s (%s) and the disk queue is full',
+                          len(body), self.url, exc)
+
+    def _replay(self):
+        """ re-send spilled batches (oldest first) before anything new """
+        if self.queue is None:
+            return
+        for _ in range(REPLAY_MAX):
+            if self.queue.cn < 1:
+                break
+            item = self.queue.peek()
+            if item is None:
+                break
+            self._post(item[0])
+            self.queue.pop()
+
+
+def make_sender(url, opts, batch_format='array'):
+    """ build an HTTPSender for url from a returner's processed options
+        (user, password, timeout, proxy, batch_format, batch_bytes, disk_queue, disk_queue_size
+        and verify or the returner's ssl option)
+    """
+    verify = True
+    for key in VERIFY_OPTS:
+        if opts.get(key) is not None:
+            verify = opts[key]
+            break
+    return HTTPSender(url, user=opts.get('user'), password=opts.get('password'),
+                      timeout=opts.get('timeout', 9.05), proxy=opts.get('proxy'),
+                      batch_format=opts.get('batch_format') or batch_format,
+                      batch_bytes=opts.get('batch_bytes'), disk_queue=opts.get('disk_queue'),
+                      disk_queue_size=opts.get('disk_queue_size') or DEFAULT_DISK_QUEUE_SIZE,
+                      verify=verify)
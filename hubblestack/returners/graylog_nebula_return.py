@@ -18,13 +18,19 @@ hubblestack:
         sourcetype_pulsar: hubble_fim
         sourcetype_nova: hubble_audit
         gelfhttp: https://graylog-gelf-http-input-addr
+        batch_format: none
+        disk_queue: /var/cache/hubble/graylog-queue
+
+Messages are posted over a pooled connection (see
+hubblestack.returners.common.delivery). GELF http inputs take one message
+per request, so batch_format defaults to none; set disk_queue to keep
+undeliverable messages for later.
 
 """
 
 
 
-import json
-import requests
+from hubblestack.returners.common.delivery import make_sender
 
 
 def returner(ret):
@@ -52,6 +58,8 @@ def returner(ret):
                 break
 
     for opts in opts_list:
+        sender = make_sender('{}:{}/gelf'.format(opts['gelfhttp'], opts['port']), opts,
+                             batch_format='none')
         for query in ret['return']:
             for query_name, value in query.items():
                 for query_data in value['data']:
@@ -67,8 +75,8 @@ def returner(ret):
                                'short_message': 'hubblestack',
                                'hubblemsg': event}
 
-                    rdy = json.dumps(payload)
-                    requests.post('{}:{}/gelf'.format(opts['gelfhttp'], opts['port']), rdy)
+                    sender.send(payload)
+        sender.flush()
     return
 
 
@@ -131,4 +139,8 @@ def _process_opt(opt):
             'sourcetype': opt.get('sourcetype_nebula', 'hubble_osquery'),
             'gelfhttp_ssl': opt.get('gelfhttp_ssl', True),
             'proxy': opt.get('proxy', {}),
-            'timeout': opt.get('timeout', 9.05)}
+            'timeout': opt.get('timeout', 9.05),
+            'batch_format': opt.get('batch_format', 'none'),
+            'batch_bytes': opt.get('batch_bytes'),
+            'disk_queue': opt.get('disk_queue'),
+            'disk_queue_size': opt.get('disk_queue_size')}
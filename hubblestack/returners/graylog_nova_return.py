@@ -19,12 +19,19 @@ hubblestack:
         sourcetype_nova: hubble_audit
         http_event_collector_ssl_verify: True
         gelfhttp: https://graylog-gelf-http-input-addr
+        batch_format: none
+        disk_queue: /var/cache/hubble/graylog-queue
+
+Messages are posted over a pooled connection (see
+hubblestack.returners.common.delivery). GELF http inputs take one message
+per request, so batch_format defaults to none; set disk_queue to keep
+undeliverable messages for later.
 
 """
 
-import json
 import logging
-import requests
+
+from hubblestack.returners.common.delivery import make_sender
 
 log = logging.getLogger(__name__)
 
@@ -47,13 +54,15 @@ def returner(ret):
     args = _build_args(ret)
 
     for opts in opts_list:
+        sender = make_sender('{}:{}/gelf'.format(opts['gelfhttp'], opts['port']), opts,
+                             batch_format='none')
         # Failure data
         _publish_data(args=args, checks=data.get('Failure', []), check_result='Failure',
-                      cloud_details=cloud_details, opts=opts)
+                      cloud_details=cloud_details, opts=opts, sender=sender)
 
         # Success data
         _publish_data(args=args, checks=data.get('Success', []), check_result='Success',
-                      cloud_details=cloud_details, opts=opts)
+                      cloud_details=cloud_details, opts=opts, sender=sender)
 
         # Compliance data
         if data.get('Compliance', None):
@@ -61,7 +70,8 @@ def returner(ret):
             event = _generate_event(args=args, cloud_details=cloud_details,
                                     custom_fields=opts['custom_fields'], compliance=True)
             _publish_event(fqdn=args['fqdn'], sourcetype=opts['sourcetype'], event=event,
-                           gelfhttp=opts['gelfhttp'], port=opts['port'])
+                           sender=sender)
+        sender.flush()
 
     return
 
@@ -103,7 +113,11 @@ def _process_opt(opt):
             'sourcetype': opt.get('sourcetype_nova', 'hubble_audit'),
             'http_input_server_ssl': opt.get('gelfhttp_ssl', True),
             'proxy': opt.get('proxy', {}),
-            'timeout': opt.get('timeout', 9.05)}
+            'timeout': opt.get('timeout', 9.05),
+            'batch_format': opt.get('batch_format', 'none'),
+            'batch_bytes': opt.get('batch_bytes'),
+            'disk_queue': opt.get('disk_queue'),
+            'disk_queue_size': opt.get('disk_queue_size')}
 
 
 def _generate_event(args, cloud_details, custom_fields, compliance=False, data=None):
@@ -140,17 +154,16 @@ def _generate_event(args, cloud_details, custom_fields, compliance=False, data=N
     return event
 
 
-def _publish_event(fqdn, sourcetype, event, gelfhttp, port):
+def _publish_event(fqdn, sourcetype, event, sender):
     """
-    Helper function that builds the payload and publishes it to graylog using POST
+    Helper function that builds the payload and publishes it to graylog with the sender
     """
     payload = {'host': fqdn,
                '_sourcetype': sourcetype,
                'short_message': 'hubblestack',
                'hubblemsg': event}
 
-    rdy = json.dumps(payload)
-    requests.post('{}:{}/gelf'.format(gelfhttp, port), rdy)
+    sender.send(payload)
 
 
 def _build_args(ret):
@@ -176,7 +189,7 @@ def _build_args(ret):
             'fqdn_ip4': fqdn_ip4}
 
 
-def _publish_data(args, checks, check_result, cloud_details, opts):
+def _publish_data(args, checks, check_result, cloud_details, opts, sender):
     """
     Helper function that goes over the failure/success checks and publishes the event to the
     graylog server
@@ -188,4 +201,4 @@ def _publish_data(args, checks, check_result, cloud_details, opts):
         event = _generate_event(data=data, args=args, cloud_details=cloud_details,
                                 custom_fields=opts['custom_fields'])
         _publish_event(fqdn=args['fqdn'], sourcetype=opts['sourcetype'], event=event,
-                       gelfhttp=opts['gelfhttp'], port=opts['port'])
+                       sender=sender)
@@ -18,24 +18,28 @@ hubblestack:
         sourcetype_pulsar: hubble_fim
         sourcetype_nova: hubble_audit
         gelfhttp: https://graylog-gelf-http-input-addr
+        batch_format: none
+        disk_queue: /var/cache/hubble/graylog-queue
+
+Messages are posted over a pooled connection (see
+hubblestack.returners.common.delivery). GELF http inputs take one message
+per request, so batch_format defaults to none; set disk_queue to keep
+undeliverable messages for later.
 
 """
 from collections import defaultdict
 
-import json
 import os
-import requests
+
+import hubblestack.utils.data
+from hubblestack.returners.common.delivery import make_sender
 
 
 def _dedup_list(input_list):
     """
     Remove duplicates from a list
     """
-    deduped = []
-    for idx, item in enumerate(input_list):
-        if item not in input_list[idx + 1:]:
-            deduped.append(item)
-    return deduped
+    return hubblestack.utils.data.dedup_list(input_list)
 
 
 def returner(ret):
@@ -66,6 +70,8 @@ def returner(ret):
     alerts = _build_alerts(data)
 
     for opts in opts_list:
+        sender = make_sender('{}:{}/gelf'.format(opts['gelfhttp'], opts['port']), opts,
+                             batch_format='none')
         for alert in alerts:
             if 'change' in alert:  # Linux, normal pulsar
                 # The second half of the change will be '|IN_ISDIR' for directories
@@ -91,8 +97,8 @@ def returner(ret):
                        'short_message': 'hubblestack',
                        'hubblemsg': event}
 
-            rdy = json.dumps(payload)
-            requests.post('{}:{}/gelf'.format(opts['gelfhttp'], opts['port']), rdy)
+            sender.send(payload)
+        sender.flush()
     return
 
 
@@ -136,7 +142,11 @@ def _process_opt(opt):
             'sourcetype': opt.get('sourcetype_pulsar', 'hubble_fim'),
             'gelfhttp_ssl': opt.get('gelfhttp_ssl', True),
             'proxy': opt.get('proxy', {}),
-            'timeout': opt.get('timeout', 9.05)}
+            'timeout': opt.get('timeout', 9.05),
+            'batch_format': opt.get('batch_format', 'none'),
+            'batch_bytes': opt.get('batch_bytes'),
+            'disk_queue': opt.get('disk_queue'),
+            'disk_queue_size': opt.get('disk_queue_size')}
 
 
 def _build_linux_actions():
@@ -162,6 +172,9 @@ def _build_linux_actions():
     return actions
 
 
+LINUX_ACTIONS = _build_linux_actions()
+
+
 def _build_windows_actions():
     """
     Helper function that builds the actions defaultdict for Windows - win_pulsar
@@ -192,6 +205,9 @@ def _build_windows_actions():
     return actions
 
 
+WINDOWS_ACTIONS = _build_windows_actions()
+
+
 def _build_windows_event(alert, change):
     """"
     Helper function that builds the event dict on Windows hosts"
@@ -200,7 +216,7 @@ def _build_windows_event(alert, change):
         object_type = 'directory'
     else:
         object_type = 'file'
-    actions = _build_windows_actions()
+    actions = WINDOWS_ACTIONS
     event = {'action': actions[change],
              'change_type': 'filesystem',
              'object_category': object_type,
@@ -220,7 +236,7 @@ def _build_linux_event(alert, change):
     else:
         object_type = 'file'
 
-    actions = _build_linux_actions()
+    actions = LINUX_ACTIONS
     event = {'action': actions[change],
              'change_type': 'filesystem',
              'object_category': object_type,
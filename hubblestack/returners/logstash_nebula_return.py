@@ -21,11 +21,16 @@ plugin. Required config/pillar settings:
             custom_fields:
               - site
               - product_group
+            batch_format: array
+            batch_bytes: 100000
+            disk_queue: /var/cache/hubble/logstash-queue
+
+Events are posted in batches over a pooled connection (see
+hubblestack.returners.common.delivery); set batch_format to none to post
+them one at a time, or disk_queue to keep undeliverable batches for later.
 """
 
-import json
-import requests
-from requests.auth import HTTPBasicAuth
+from hubblestack.returners.common.delivery import make_sender
 
 
 def returner(ret):
@@ -53,6 +58,7 @@ def returner(ret):
                     fqdn_ip4 = ip4_addr
                     break
 
+        sender = make_sender('{}:{}/hubble/nebula'.format(opts['indexer'], opts['port']), opts)
         for query in ret['return']:
             for query_name, query_results in query.items():
                 for query_result in query_results['data']:
@@ -70,9 +76,8 @@ def returner(ret):
                                'sourcetype': opts['sourcetype'],
                                'event': event}
 
-                    rdy = json.dumps(payload)
-                    requests.post('{}:{}/hubble/nebula'.format(opts['indexer'], opts['port']), rdy,
-                                  auth=HTTPBasicAuth(opts['user'], opts['password']))
+                    sender.send(payload)
+        sender.flush()
     return
 
 
@@ -116,7 +121,11 @@ def _process_opt(opt):
             'sourcetype': opt.get('sourcetype_nebula', 'hubble_osquery'),
             'indexer_ssl': opt.get('indexer_ssl', True),
             'proxy': opt.get('proxy', {}),
-            'timeout': opt.get('timeout', 9.05)}
+            'timeout': opt.get('timeout', 9.05),
+            'batch_format': opt.get('batch_format', 'array'),
+            'batch_bytes': opt.get('batch_bytes'),
+            'disk_queue': opt.get('disk_queue'),
+            'disk_queue_size': opt.get('disk_queue_size')}
 
 
 def _generate_event(custom_fields, args, cloud_details, query_result):
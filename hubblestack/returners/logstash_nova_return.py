@@ -21,12 +21,18 @@ plugin. Required config/pillar settings:
             custom_fields:
               - site
               - product_group
+            batch_format: array
+            batch_bytes: 100000
+            disk_queue: /var/cache/hubble/logstash-queue
+
+Events are posted in batches over a pooled connection (see
+hubblestack.returners.common.delivery); set batch_format to none to post
+them one at a time, or disk_queue to keep undeliverable batches for later.
 """
 
-import json
 import logging
-import requests
-from requests.auth import HTTPBasicAuth
+
+from hubblestack.returners.common.delivery import make_sender
 
 log = logging.getLogger(__name__)
 
@@ -46,20 +52,22 @@ def returner(ret):
     cloud_details = __grains__.get('cloud_details', {})
 
     for opts in opts_list:
+        sender = make_sender('{}:{}/hubble/nova'.format(opts['indexer'], opts['port']), opts)
         # Failure data
         _publish_data(args=args, checks=data.get('Failure', []), check_result='Failure',
-                      cloud_details=cloud_details, opts=opts)
+                      cloud_details=cloud_details, opts=opts, sender=sender)
 
         # Success data
         _publish_data(args=args, checks=data.get('Success', []), check_result='Success',
-                      cloud_details=cloud_details, opts=opts)
+                      cloud_details=cloud_details, opts=opts, sender=sender)
 
         # Compliance data
         if data.get('Compliance', None):
             args['compliance_percentage'] = data['Compliance']
             event = _generate_event(args=args, cloud_details=cloud_details, compliance=True,
                                     custom_fields=opts['custom_fields'])
-            _publish_event(opts=opts, fqdn=args['fqdn'], event=event)
+            _publish_event(opts=opts, fqdn=args['fqdn'], event=event, sender=sender)
+        sender.flush()
 
     return
 
@@ -106,7 +114,11 @@ def _process_opt(opt):
             'sourcetype': opt.get('sourcetype_nova', 'hubble_audit'),
             'http_input_server_ssl': opt.get('indexer_ssl', True),
             'proxy': opt.get('proxy', {}),
-            'timeout': opt.get('timeout', 9.05)}
+            'timeout': opt.get('timeout', 9.05),
+            'batch_format': opt.get('batch_format', 'array'),
+            'batch_bytes': opt.get('batch_bytes'),
+            'disk_queue': opt.get('disk_queue'),
+            'disk_queue_size': opt.get('disk_queue_size')}
 
 
 def _build_args(ret):
@@ -165,7 +177,7 @@ def _generate_event(args, cloud_details, custom_fields, compliance=False, data=N
     return event
 
 
-def _publish_data(args, checks, check_result, cloud_details, opts):
+def _publish_data(args, checks, check_result, cloud_details, opts, sender):
     """
     Helper function that goes over the failure/success checks and publishes the event to logstash
     """
@@ -175,18 +187,16 @@ def _publish_data(args, checks, check_result, cloud_details, opts):
         args['check_id'] = check_id
         event = _generate_event(custom_fields=opts['custom_fields'], data=data, args=args,
                                 cloud_details=cloud_details)
-        _publish_event(opts, args['fqdn'], event)
+        _publish_event(opts, args['fqdn'], event, sender)
 
 
-def _publish_event(opts, fqdn, event):
+def _publish_event(opts, fqdn, event, sender):
     """
-    Helper function that builds the payload and publishes it to logstash using POST
+    Helper function that builds the payload and queues it in the sender's batch
     """
     payload = {'host': fqdn,
                'index': opts['index'],
                'sourcetype': opts['sourcetype'],
                'event': event}
 
-    rdy = json.dumps(payload)
-    requests.post('{}:{}/hubble/nova'.format(opts['indexer'], opts['port']), rdy,
-                  auth=HTTPBasicAuth(opts['user'], opts['password']))
+    sender.send(payload)
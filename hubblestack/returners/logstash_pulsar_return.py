@@ -21,24 +21,27 @@ plugin. Required config/pillar settings:
             custom_fields:
               - site
               - product_group
+            batch_format: array
+            batch_bytes: 100000
+            disk_queue: /var/cache/hubble/logstash-queue
+
+Events are posted in batches over a pooled connection (see
+hubblestack.returners.common.delivery); set batch_format to none to post
+them one at a time, or disk_queue to keep undeliverable batches for later.
 """
 from collections import defaultdict
 
 import os
-import json
-import requests
-from requests.auth import HTTPBasicAuth
+
+import hubblestack.utils.data
+from hubblestack.returners.common.delivery import make_sender
 
 
 def _dedup_list(input_list):
     """
     Remove duplicates from a list
     """
-    deduped = []
-    for idx, item in enumerate(input_list):
-        if item not in input_list[idx + 1:]:
-            deduped.append(item)
-    return deduped
+    return hubblestack.utils.data.dedup_list(input_list)
 
 
 def returner(ret):
@@ -66,6 +69,7 @@ def returner(ret):
     for opts in opts_list:
         # get the alerts
         alerts = _build_alerts(data)
+        sender = make_sender('{}:{}/hubble/pulsar'.format(opts['indexer'], opts['port']), opts)
         for alert in alerts:
             if 'change' in alert:  # Linux, normal pulsar
                 # The second half of the change will be '|IN_ISDIR' for directories
@@ -89,9 +93,8 @@ def returner(ret):
                        'sourcetype': opts['sourcetype'],
                        'event': event}
 
-            rdy = json.dumps(payload)
-            requests.post('{}:{}/hubble/pulsar'.format(opts['indexer'], opts['port']), rdy,
-                          auth=HTTPBasicAuth(opts['user'], opts['password']))
+            sender.send(payload)
+        sender.flush()
     return
 
 
@@ -136,7 +139,11 @@ def _process_opt(opt):
             'sourcetype': opt.get('sourcetype_pulsar', 'hubble_fim'),
             'indexer_ssl': opt.get('indexer_ssl', True),
             'proxy': opt.get('proxy', {}),
-            'timeout': opt.get('timeout', 9.05)}
+            'timeout': opt.get('timeout', 9.05),
+            'batch_format': opt.get('batch_format', 'array'),
+            'batch_bytes': opt.get('batch_bytes'),
+            'disk_queue': opt.get('disk_queue'),
+            'disk_queue_size': opt.get('disk_queue_size')}
 
 
 def _build_linux_actions():
@@ -162,6 +169,9 @@ def _build_linux_actions():
     return actions
 
 
+LINUX_ACTIONS = _build_linux_actions()
+
+
 def _build_windows_actions():
     """
     Helper function that builds the actions defaultdict for Windows - win_pulsar
@@ -192,6 +202,9 @@ def _build_windows_actions():
     return actions
 
 
+WINDOWS_ACTIONS = _build_windows_actions()
+
+
 def _build_windows_event(alert, change):
     """"
     Helper function that builds the event dict on Windows hosts"
@@ -200,7 +213,7 @@ def _build_windows_event(alert, change):
         object_type = 'directory'
     else:
         object_type = 'file'
-    actions = _build_windows_actions()
+    actions = WINDOWS_ACTIONS
 
     event = {'action': actions[change],
              'change_type': 'filesystem',
@@ -220,7 +233,7 @@ def _build_linux_event(alert, change):
         object_type = 'directory'
     else:
         object_type = 'file'
-    actions = _build_linux_actions()
+    actions = LINUX_ACTIONS
 
     event = {'action': actions[change],
              'change_type': 'filesystem',
@@ -38,13 +38,13 @@ gateway is not defined.
               - site
               - product_group
 """
-import socket
 
 # Imports for http event forwarder
 import json
 import logging
 
 from hubblestack.hec import http_event_collector, get_splunk_options, make_hec_args
+import hubblestack.utils.dns
 
 log = logging.getLogger(__name__)
 
@@ -145,7 +145,7 @@ def _build_args(ret):
     # Sometimes fqdn reports a value of localhost. If that happens, try another method.
     bad_fqdns = ['localhost', 'localhost.localdomain', 'localhost6.localdomain6']
     if fqdn in bad_fqdns:
-        new_fqdn = socket.gethostname()
+        new_fqdn = hubblestack.utils.dns.gethostname()
         if '.' not in new_fqdn or new_fqdn in bad_fqdns:
             new_fqdn = fqdn_ip4
         args['fqdn'] = new_fqdn
@@ -38,7 +38,6 @@ gateway is not defined.
               - site
               - product_group
 """
-import socket
 
 import json
 import logging
@@ -46,6 +45,7 @@ import time
 import copy
 from datetime import datetime
 from hubblestack.hec import http_event_collector, get_splunk_options, make_hec_args
+import hubblestack.utils.dns
 
 _MAX_CONTENT_BYTES = 100000
 HTTP_EVENT_COLLECTOR_DEBUG = False
@@ -170,7 +170,7 @@ def _build_args(ret):
     # Sometimes fqdn reports a value of localhost. If that happens, try another method.
     bad_fqdns = ['localhost', 'localhost.localdomain', 'localhost6.localdomain6']
     if fqdn in bad_fqdns:
-        new_fqdn = socket.gethostname()
+        new_fqdn = hubblestack.utils.dns.gethostname()
         if '.' not in new_fqdn or new_fqdn in bad_fqdns:
             new_fqdn = fqdn_ip4
         args['fqdn'] = new_fqdn
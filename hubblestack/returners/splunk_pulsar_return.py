@@ -38,7 +38,6 @@ gateway is not defined.
               - site
               - product_group
 """
-import socket
 
 # Imports for http event forwarder
 import json
@@ -46,6 +45,8 @@ import logging
 import os
 from collections import defaultdict
 from hubblestack.hec import http_event_collector, get_splunk_options, make_hec_args
+import hubblestack.utils.data
+import hubblestack.utils.dns
 
 log = logging.getLogger(__name__)
 
@@ -109,11 +110,7 @@ def _dedup_list(input_list):
     """
     Function that removes duplicates from a list
     """
-    deduped = []
-    for idx, item in enumerate(input_list):
-        if item not in input_list[idx + 1:]:
-            deduped.append(item)
-    return deduped
+    return hubblestack.utils.data.dedup_list(input_list)
 
 
 def _build_linux_actions():
@@ -139,6 +136,9 @@ def _build_linux_actions():
     return actions
 
 
+LINUX_ACTIONS = _build_linux_actions()
+
+
 def _build_windows_actions():
     """
     Helper function that builds the actions defaultdict for Windows - win_pulsar
@@ -175,6 +175,9 @@ def _build_windows_actions():
     return actions
 
 
+WINDOWS_ACTIONS = _build_windows_actions()
+
+
 def _build_windows_event(alert):
     """"
     Helper function that builds the event dict on Windows hosts"
@@ -188,7 +191,7 @@ def _build_windows_event(alert):
     else:
         change = alert['Reason']
         object_type = 'file'
-    actions = _build_windows_actions()
+    actions = WINDOWS_ACTIONS
     event = {}
     if alert.get('Accesses', None):
         event['action'] = actions[change]
@@ -230,7 +233,7 @@ def _build_linux_event(alert, change):
         object_type = 'directory'
     else:
         object_type = 'file'
-    actions = _build_linux_actions()
+    actions = LINUX_ACTIONS
 
     event = {'action': actions[change],
              'change_type': 'filesystem',
@@ -290,7 +293,7 @@ def _build_args(ret):
     # Sometimes fqdn reports a value of localhost. If that happens, try another method.
     bad_fqdns = ['localhost', 'localhost.localdomain', 'localhost6.localdomain6']
     if fqdn in bad_fqdns:
-        new_fqdn = socket.gethostname()
+        new_fqdn = hubblestack.utils.dns.gethostname()
         if '.' not in new_fqdn or new_fqdn in bad_fqdns:
             new_fqdn = fqdn_ip4
         args['fqdn'] = new_fqdn
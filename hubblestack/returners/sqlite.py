@@ -1,14 +1,44 @@
 # -*- coding: utf-8 -*-
 """
-Return hubble data to sqlite (intended for testing)
+Return hubble data to a local sqlite database
+
+The database is opened once per process in WAL mode and every return is
+written in a single transaction. Results are normalized so they can be
+queried per check, per query or per file:
+
+    jids
+        one row per return (jid, fun, fun_args, minion_id, time) and a
+        summary of any scalar fields (e.g., the audit Compliance)
+    audit
+        one row per audit/nova check result (check_id, result, data)
+    osquery
+        one row per osquery (nebula/osqueryd) result row (query_name, data)
+    fim
+        one row per pulsar event (path, change, data)
+    other
+        anything else, as one json blob per return
+
+Rows older than ``retention_days`` are deleted (and the space reclaimed)
+at most once every ``prune_interval`` seconds.
+
+.. code-block:: yaml
+
+    returner:
+      sqlite:
+        dumpster: /var/log/hubblestack/returns.sqlite
+        retention_days: 7
+        prune_interval: 3600
+
+The ``get_fun``, ``get_jid``, ``get_checks``, ``get_load`` and ``get_ret``
+functions read the results back.
 """
-from functools import wraps
 import json
 import logging
 import os
+import threading
+import time
 import hubblestack.returners
-
-IS_CONNECTED = False
+import hubblestack.utils.jid
 
 try:
     import sqlite3
@@ -19,8 +49,39 @@ except Exception:
 __virtualname__ = 'sqlite'
 
 log = logging.getLogger(__virtualname__)
-if HAS_SQLI:
-    version = [int(num) for num in sqlite3.sqlite_version.split('.')]
+
+SCHEMA_VERSION = 1
+SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS jids(jid TEXT PRIMARY KEY, fun TEXT, fun_args TEXT,
+        minion_id TEXT, time REAL NOT NULL, summary TEXT)''',
+    '''CREATE INDEX IF NOT EXISTS jids_fun_time ON jids(fun, time)''',
+    '''CREATE INDEX IF NOT EXISTS jids_time ON jids(time)''',
+    '''CREATE TABLE IF NOT EXISTS audit(jid TEXT NOT NULL, time REAL NOT NULL,
+        check_id TEXT, result TEXT, data TEXT)''',
+    '''CREATE INDEX IF NOT EXISTS audit_jid ON audit(jid)''',
+    '''CREATE INDEX IF NOT EXISTS audit_check_time ON audit(check_id, time)''',
+    '''CREATE INDEX IF NOT EXISTS audit_time ON audit(time)''',
+    '''CREATE TABLE IF NOT EXISTS osquery(jid TEXT NOT NULL, time REAL NOT NULL,
+        query_name TEXT, data TEXT)''',
+    '''CREATE INDEX IF NOT EXISTS osquery_jid ON osquery(jid)''',
+    '''CREATE INDEX IF NOT EXISTS osquery_query_time ON osquery(query_name, time)''',
+    '''CREATE INDEX IF NOT EXISTS osquery_time ON osquery(time)''',
+    '''CREATE TABLE IF NOT EXISTS fim(jid TEXT NOT NULL, time REAL NOT NULL,
+        path TEXT, change TEXT, data TEXT)''',
+    '''CREATE INDEX IF NOT EXISTS fim_jid ON fim(jid)''',
+    '''CREATE INDEX IF NOT EXISTS fim_path_time ON fim(path, time)''',
+    '''CREATE INDEX IF NOT EXISTS fim_time ON fim(time)''',
+    '''CREATE TABLE IF NOT EXISTS other(jid TEXT NOT NULL, time REAL NOT NULL, data TEXT)''',
+    '''CREATE INDEX IF NOT EXISTS other_jid ON other(jid)''',
+    '''CREATE INDEX IF NOT EXISTS other_time ON other(time)''',
+)
+RESULT_TABLES = ('audit', 'osquery', 'fim', 'other')
+AUDIT_RESULTS = ('Failure', 'Success', 'Controlled')
+
+_CONN = None
+_CONN_KEY = None
+_LAST_PRUNE = 0
+_LOCK = threading.RLock()
 
 
 def __virtual__():
@@ -40,9 +101,13 @@ def _get_options(ret=None):
     :return: options
     """
 
-    defaults = {'dumpster': '/var/log/hubblestack/returns.sqlite'}
+    defaults = {'dumpster': '/var/log/hubblestack/returns.sqlite',
+                'retention_days': 7,
+                'prune_interval': 3600}
 
-    attrs = {'dumpster': 'dumpster'}
+    attrs = {'dumpster': 'dumpster',
+             'retention_days': 'retention_days',
+             'prune_interval': 'prune_interval'}
 
     _options = hubblestack.returners.get_returner_options(__virtualname__,
                                                    ret,
@@ -54,170 +119,341 @@ def _get_options(ret=None):
     return _options
 
 
+def _connect(database):
+    """
+    Open the database, switch it to WAL mode and create the schema
+    """
+    dirname = os.path.dirname(database)
+    if dirname and not os.path.isdir(dirname):
+        log.debug('creating missing directory %s', dirname)
+        try:
+            os.makedirs(dirname, 0o755)
+        except OSError:
+            log.info('failed to create directory %s', dirname)
+    # autocommit mode; transactions are explicit (see _transaction)
+    conn = sqlite3.connect(database, isolation_level=None, check_same_thread=False)
+    # auto_vacuum only takes effect before the first table is created
+    conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    if conn.execute('PRAGMA user_version').fetchone()[0] < SCHEMA_VERSION:
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'ret'").fetchone():
+            # the blob-per-return layout of older versions: set it aside (ret_v0
+            # and jids_v0), it's up to the admin to export or drop it
+            log.warning('keeping the returns of the old sqlite returner layout in %s as the '
+                        'ret_v0 and jids_v0 tables', database)
+            conn.execute('BEGIN')
+            conn.execute('ALTER TABLE ret RENAME TO ret_v0')
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'jids'").fetchone():
+                conn.execute('ALTER TABLE jids RENAME TO jids_v0')
+            conn.execute('COMMIT')
+        for statement in SCHEMA:
+            conn.execute(statement)
+        conn.execute('PRAGMA user_version = {0}'.format(SCHEMA_VERSION))
+    return conn
+
+
 def _get_conn():
     """
-    Establish a connection (if not connected) and return it
+    Return the connection to the dumpster, opening it if this process
+    hasn't yet (or the dumpster option changed)
 
     :return: connection object or None
     """
-    global IS_CONNECTED
-    _options = _get_options()
-    conn = None
-
-    if not IS_CONNECTED:
-        database = _options.get('dumpster', 'hubble-returns-testing.db')
-        dir = os.path.dirname(database)
-
-        if dir and not os.path.isdir(dir):
-            log.debug('creating missing directory %s', dir)
-            try:
-                os.makedirs(dir, 0o755)
-            except OSError:
-                log.info('failed to create directory %s', dir)
+    global _CONN, _CONN_KEY
+    database = _get_options().get('dumpster')
+    key = (database, os.getpid())
+    with _LOCK:
+        if _CONN is not None and _CONN_KEY == key:
+            return _CONN
+        if _CONN is not None and _CONN_KEY[1] == key[1]:
+            _CONN.close()
+        _CONN = _CONN_KEY = None
         try:
-            conn = sqlite3.connect(_options.get('dumpster', 'hubble-returns-testing.db'))
-            IS_CONNECTED = True
+            _CONN = _connect(database)
+            _CONN_KEY = key
         except sqlite3.Error:
             log.exception('failed to connect to sqlite database %s', database)
+        return _CONN
 
-        log.debug('creating jid table')
-
-        conn.execute('''CREATE TABLE if not exists jids(jid TEXT PRIMARY KEY, id INT, load TEXT NOT NULL)''')
-        if version[0] >= 3 and version[1] >= 9:
-            conn.execute('''CREATE TABLE if not exists ret(
-            jid TEXT, id INT, fun TEXT, fun_args JSON,
-            return_data JSON, FOREIGN KEY(jid) REFERENCES jids(jid))''')
-        else:
-            conn.execute('''CREATE TABLE if not exists ret(
-            jid TEXT,id INT, fun TEXT, fun_args TEXT,
-            return_data TEXT,
-             FOREIGN KEY(jid) REFERENCES jids(jid))''')
-
-    return conn
 
-
-def _close_connection(conn):
+def _close_connection():
     '''
-    Close sqlite connection
+    Close the sqlite connection (if any)
     '''
+    global _CONN, _CONN_KEY
+    with _LOCK:
+        if _CONN is None:
+            log.debug('no sqlite connection to close')
+            return
+        log.debug('closing sqlite connection')
+        if _CONN_KEY[1] == os.getpid():
+            _CONN.close()
+        _CONN = _CONN_KEY = None
 
-    global IS_CONNECTED
 
-    if not IS_CONNECTED:
-        log.debug('no sqlite connection to close')
-        return
+def _dumps(obj):
+    return json.dumps(obj, default=str)
 
-    log.debug('closing sqlite connection')
-    conn.commit()
-    conn.close()
 
-    IS_CONNECTED = False
+def _loads(text):
+    if text is None:
+        return None
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
 
 
-def _open_close_conn(func):
-    '''
-    Decorator to open and close sqlite connection
-    '''
+def _is_osquery(data):
+    return isinstance(data, list) and bool(data) and all(
+        isinstance(item, dict) and all(isinstance(v, dict) for v in item.values())
+        for item in data)
 
-    @wraps(func)
-    def wrapper_func(*args, **kwargs):
-        kwargs['conn'] = _get_conn()
-        if not kwargs['conn']:
-            log.exception('failed to retrieve sqlite connection object')
-            return
-        results = func(*args, **kwargs)
-        _close_connection(kwargs['conn'])
-        return results
 
-    return wrapper_func
+def _is_fim_event(data):
+    return isinstance(data, dict) and 'path' in data and ('change' in data or 'Accesses' in data)
 
 
-@_open_close_conn
-def get_fun(fun, fun_args=None, conn=None, return_all=False):
+def _rows(ret, now):
+    """
+    Split one return into its jids row and the normalized result rows
+
+    :return: (jids row, {table: [rows]})
+    """
+    jid = str(ret.get('jid') or hubblestack.utils.jid.gen_jid({'unique_jid': True}))
+    data = ret.get('return')
+    rows = dict((table, list()) for table in RESULT_TABLES)
+    summary = None
+    if isinstance(data, dict) and any(isinstance(data.get(k), list) for k in AUDIT_RESULTS):
+        summary = dict((k, v) for k, v in data.items() if k not in AUDIT_RESULTS) or None
+        for result in AUDIT_RESULTS:
+            for check in data.get(result) or []:
+                if isinstance(check, dict) and len(check) == 1:
+                    check_id, check_data = list(check.items())[0]
+                else:
+                    check_id, check_data = None, check
+                rows['audit'].append((jid, now, check_id, result, _dumps(check_data)))
+    elif _is_osquery(data):
+        for query in data:
+            for query_name, query_results in query.items():
+                for row in query_results.get('data') or []:
+                    rows['osquery'].append((jid, now, query_name, _dumps(row)))
+    elif _is_fim_event(data) or (isinstance(data, list) and data and all(_is_fim_event(i) for i in data)):
+        for event in data if isinstance(data, list) else [data]:
+            change = event.get('change') or event.get('Accesses')
+            rows['fim'].append((jid, now, event.get('path'), str(change), _dumps(event)))
+    elif data is not None:
+        rows['other'].append((jid, now, _dumps(data)))
+    fun_args = ret.get('fun_args')
+    jid_row = (jid, ret.get('fun'), _dumps(fun_args) if fun_args is not None else None,
+               ret.get('id'), now, _dumps(summary) if summary is not None else None)
+    return jid_row, rows
+
+
+def _insert(conn, rets):
+    """
+    Write the returns in one transaction
+    """
+    now = time.time()
+    jid_rows = list()
+    rows = dict((table, list()) for table in RESULT_TABLES)
+    for ret in rets:
+        jid_row, ret_rows = _rows(ret, now)
+        jid_rows.append(jid_row)
+        for table, table_rows in ret_rows.items():
+            rows[table].extend(table_rows)
+    with _LOCK:
+        conn.execute('BEGIN')
+        try:
+            conn.executemany('INSERT OR REPLACE INTO jids(jid, fun, fun_args, minion_id, time, summary) '
+                             'VALUES (?, ?, ?, ?, ?, ?)', jid_rows)
+            conn.executemany('INSERT INTO audit(jid, time, check_id, result, data) '
+                             'VALUES (?, ?, ?, ?, ?)', rows['audit'])
+            conn.executemany('INSERT INTO osquery(jid, time, query_name, data) '
+                             'VALUES (?, ?, ?, ?)', rows['osquery'])
+            conn.executemany('INSERT INTO fim(jid, time, path, change, data) '
+                             'VALUES (?, ?, ?, ?, ?)', rows['fim'])
+            conn.executemany('INSERT INTO other(jid, time, data) VALUES (?, ?, ?)', rows['other'])
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+    log.debug('stored %d returns (%s)', len(jid_rows),
+              ', '.join('{0}={1}'.format(t, len(rows[t])) for t in RESULT_TABLES))
+
+
+def prune(retention_days=None, conn=None):
     '''
-    Returns load of last function called
-    Provide function arguments for a more granular return
-    Set return_all to True to return entire query result
+    Delete the results older than retention_days (default: the retention_days
+    option) and reclaim the space
+    '''
+    global _LAST_PRUNE
+    if retention_days is None:
+        retention_days = _get_options().get('retention_days')
+    if conn is None:
+        conn = _get_conn()
+    if conn is None or not retention_days:
+        return 0
+    cutoff = time.time() - float(retention_days) * 86400
+    removed = 0
+    with _LOCK:
+        conn.execute('BEGIN')
+        try:
+            for table in RESULT_TABLES + ('jids',):
+                removed += conn.execute('DELETE FROM {0} WHERE time < ?'.format(table),
+                                        (cutoff,)).rowcount
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        if removed:
+            conn.execute('PRAGMA incremental_vacuum')
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        _LAST_PRUNE = time.time()
+    log.debug('pruned %d rows older than %s days', removed, retention_days)
+    return removed
+
+
+def _maybe_prune(conn):
+    options = _get_options()
+    try:
+        interval = float(options.get('prune_interval') or 0)
+    except (TypeError, ValueError):
+        interval = 3600
+    if time.time() - _LAST_PRUNE >= interval:
+        prune(retention_days=options.get('retention_days'), conn=conn)
+
+
+def _query(sql, args=()):
     '''
+    Return the rows of a query (as dicts); the query runs under the lock the
+    writes take, so it doesn't share the connection with one
+    '''
+    conn = _get_conn()
+    if conn is None:
+        log.error('failed to retrieve sqlite connection object')
+        return []
+    with _LOCK:
+        cur = conn.execute(sql, args)
+        names = [d[0] for d in cur.description]
+        rows = cur.fetchall()
+    return [dict(zip(names, row)) for row in rows]
 
-    log.debug('sqlite3 returner get_func called')
-    cur = conn.cursor()
 
-    if fun_args:
-        log.debug(
-            'sqlite3 returner retrieving last job called with function: %s and arguments: %s', fun, fun_args)
-        cur.execute('''SELECT jid, id, fun, fun_args, return_data
-        FROM jids INNER JOIN ret ON jids.id = ret.id
-        WHERE fun_args = ? and fun = ? ORDER BY ret.id DESC ''', fun_args, fun)
+def _job(row):
+    return {'jid': row['jid'], 'fun': row['fun'], 'fun_args': _loads(row['fun_args']),
+            'id': row['minion_id'], 'time': row['time']}
 
 
-@_open_close_conn
-def get_ret(conn=None):
+def get_fun(fun, fun_args=None, limit=1, return_all=False):
     '''
-    Returns json of last job called
+    Returns the most recent jobs (newest first) of the function fun (up to limit)
+    Provide function arguments for a more granular return
+    Set return_all to True to return every stored job of fun
     '''
-
-    log.debug('sqlite3 returner retrieving last job called')
-    cur = conn.cursor()
-    cur.execute('''SELECT load FROM jids WHERE id = (SELECT MAX(id) FROM jids)''')
-    results = cur.fetchall()
-    return results
-
-
-@_open_close_conn
-def get_load(jid, conn=None):
+    log.debug('sqlite3 returner get_fun called')
+    sql = 'SELECT jid, fun, fun_args, minion_id, time FROM jids WHERE fun = ?'
+    args = [fun]
+    if fun_args is not None:
+        sql += ' AND fun_args = ?'
+        args.append(_dumps(fun_args))
+    sql += ' ORDER BY time DESC'
+    if not return_all:
+        sql += ' LIMIT ?'
+        args.append(int(limit))
+    return [_job(row) for row in _query(sql, args)]
+
+
+def get_jid(jid):
     '''
-    Gets load data from the jid specified
-    :returns load or None
+    Rebuild the return stored under jid (None if there isn't one)
     '''
-
     log.debug('sqlite3 returner retrieving data with jid %s', jid)
-    cur = conn.cursor()
-    cur.execute('''SELECT load FROM jids WHERE jid = ? ''', jid)
-
-    results = cur.fetchall()
-
-    if not results:
-        log.debug('failed to return load for jid %s', jid)
+    job = None
+    for row in _query('SELECT jid, fun, fun_args, minion_id, time, summary FROM jids '
+                      'WHERE jid = ?', (jid,)):
+        job = _job(row)
+        summary = _loads(row['summary'])
+    if job is None:
+        log.debug('failed to return data for jid %s', jid)
         return None
 
-    return results
-
-
-@_open_close_conn
-def _insert_helper(ret, conn=None):
-    log.debug('populating jids table with %s', ret.get('jid'))
-    conn.execute('''INSERT INTO  jids (id, jid, load)
-    VALUES((SELECT IFNULL(MAX(id), 0) + 1 FROM jids),?,?);''', (ret.get('jid'), ret.get('return')))
-
-    log.debug('populating ret table with jid %s'.ret.get('jid'))
-    conn.execute('''INSERT INTO  ret (id, jid, fun, fun_args, return_data)
-    VALUES((SELECT IFNULL(MAX(id), 0) + 1 FROM ret),?,?,?,?,?,?);''',
-                 (ret.get('jid'), ret.get('fun'), ret.get('fun_args'), ret.get('return')))
-
-
-def _insert(ret, conn=None):
-    # identify lists of events
-    list_of_events = False
-    if isinstance(ret, (list, tuple)):
-        num_events = sum([0 if isinstance(i, dict) else 1 for i in ret])
-        if num_events == 0:
-            list_of_events = True
-
-    # recursion
-    if list_of_events:
-        for item in ret:
-            _insert(item)
-        return
+    audit = None
+    for row in _query('SELECT check_id, result, data FROM audit WHERE jid = ? ORDER BY rowid', (jid,)):
+        if audit is None:
+            audit = dict((result, list()) for result in AUDIT_RESULTS)
+        data = _loads(row['data'])
+        audit[row['result']].append(data if row['check_id'] is None else {row['check_id']: data})
+    if audit is not None or summary is not None:
+        audit = audit or dict((result, list()) for result in AUDIT_RESULTS)
+        audit.update(summary or {})
+        job['return'] = audit
+        return job
+
+    queries = list()
+    for row in _query('SELECT query_name, data FROM osquery WHERE jid = ? ORDER BY rowid', (jid,)):
+        if not queries or row['query_name'] not in queries[-1]:
+            queries.append({row['query_name']: {'data': list()}})
+        queries[-1][row['query_name']]['data'].append(_loads(row['data']))
+    if queries:
+        job['return'] = queries
+        return job
+
+    events = [_loads(row['data']) for row in
+              _query('SELECT data FROM fim WHERE jid = ? ORDER BY rowid', (jid,))]
+    if events:
+        job['return'] = events
+        return job
+
+    for row in _query('SELECT data FROM other WHERE jid = ?', (jid,)):
+        job['return'] = _loads(row['data'])
+    return job
+
+
+def get_checks(check_id, result=None, since=None, limit=100):
+    '''
+    Returns the most recent results (newest first) of the audit check check_id
+    Optionally only those with the given result (Success, Failure, Controlled)
+    and/or newer than the since timestamp
+    '''
+    sql = 'SELECT jid, time, check_id, result, data FROM audit WHERE check_id = ?'
+    args = [check_id]
+    if result is not None:
+        sql += ' AND result = ?'
+        args.append(result)
+    if since is not None:
+        sql += ' AND time >= ?'
+        args.append(float(since))
+    sql += ' ORDER BY time DESC LIMIT ?'
+    args.append(int(limit))
+    ret = list()
+    for row in _query(sql, args):
+        row['data'] = _loads(row['data'])
+        ret.append(row)
+    return ret
+
+
+def get_ret():
+    '''
+    Returns the last job stored
+    '''
+    log.debug('sqlite3 returner retrieving last job called')
+    for row in _query('SELECT jid FROM jids ORDER BY time DESC LIMIT 1'):
+        return get_jid(row['jid'])
+    return None
 
-    for key in list(ret):
-        if not ret[key]:
-            ret.pop(key)
-        if version[0] >= 3 and version[1] >= 9:
-            if isinstance(ret.get(key), (list, tuple, dict)):
-                ret[key] = json.dumps(ret[key])
 
-    _insert_helper(ret, conn)
+def get_load(jid):
+    '''
+    Gets the job data (jid, fun, fun_args, id, time) of the jid specified
+    :returns load or None
+    '''
+    log.debug('sqlite3 returner retrieving load with jid %s', jid)
+    for row in _query('SELECT jid, fun, fun_args, minion_id, time FROM jids WHERE jid = ?', (jid,)):
+        return _job(row)
+    log.debug('failed to return load for jid %s', jid)
+    return None
 
 
 """
@@ -240,5 +476,18 @@ def _insert(ret, conn=None):
 def returner(ret):
     """
     The main returner function that sends ret data to sqlite
+    (a list of returns, e.g. batched pulsar events, is written in one transaction)
     """
-    _insert(ret)
+    rets = ret if isinstance(ret, (list, tuple)) else [ret]
+    rets = [item for item in rets if isinstance(item, dict)]
+    if not rets:
+        return
+    conn = _get_conn()
+    if conn is None:
+        log.error('failed to retrieve sqlite connection object')
+        return
+    try:
+        _insert(conn, rets)
+        _maybe_prune(conn)
+    except sqlite3.Error:
+        log.exception('failed to store returns in sqlite')
@@ -12,15 +12,22 @@ hubblestack:
     sumo:
       - proxy: {}
         timeout: 10
+        verify: True
         sumo_nebula_return: https://yoursumo.sumologic.com/endpointhere
         sumo_pulsar_return: https://yoursumo.sumologic.com/endpointhere
         sumo_nova_return: https://yoursumo.sumologic.com/endpointhere
+        batch_format: ndjson
+        batch_bytes: 100000
+        disk_queue: /var/cache/hubble/sumo-queue
 
+Events are posted as newline delimited batches over a pooled connection (see
+hubblestack.returners.common.delivery); set batch_format to none to post
+them one at a time, or disk_queue to keep undeliverable batches for later.
 """
 
-import json
 import logging
-import requests
+
+from hubblestack.returners.common.delivery import make_sender
 
 log = logging.getLogger(__name__)
 
@@ -39,7 +46,7 @@ def returner(ret):
     cloud_details = __grains__.get('cloud_details', {})
 
     for opts in opts_list:
-        sumo_nebula_return = opts['sumo_nebula_return']
+        sender = make_sender('{}/'.format(opts['sumo_nebula_return']), opts, batch_format='ndjson')
         for query in data:
             for query_name, query_results in query.items():
                 if 'data' not in query_results:
@@ -55,12 +62,8 @@ def returner(ret):
                                   'dest_fqdn': args['local_fqdn'],
                                   'system_uuid': __grains__.get('system_uuid')})
                     event.update(cloud_details)
-                    try:
-                        rdy = json.dumps(event)
-                        requests.post('{}/'.format(sumo_nebula_return), rdy)
-                    except Exception:
-                        log.error('Hit an exception trying to send to sumo! continuing')
-                        continue
+                    sender.send(event)
+        sender.flush()
     return
 
 
@@ -76,7 +79,12 @@ def _get_options():
         for opt in returner_opts:
             processed = {'sumo_nebula_return': opt.get('sumo_nebula_return'),
                          'proxy': opt.get('proxy', {}),
-                         'timeout': opt.get('timeout', 9.05)}
+                         'timeout': opt.get('timeout', 9.05),
+                         'verify': opt.get('verify', True),
+                         'batch_format': opt.get('batch_format', 'ndjson'),
+                         'batch_bytes': opt.get('batch_bytes'),
+                         'disk_queue': opt.get('disk_queue'),
+                         'disk_queue_size': opt.get('disk_queue_size')}
             sumo_opts.append(processed)
         return sumo_opts
     try:
@@ -12,16 +12,23 @@ hubblestack:
     sumo:
       - proxy: {}
         timeout: 10
+        verify: True
         sumo_nebula_return: https://yoursumo.sumologic.com/endpointhere
         sumo_pulsar_return: https://yoursumo.sumologic.com/endpointhere
         sumo_nova_return: https://yoursumo.sumologic.com/endpointhere
+        batch_format: ndjson
+        batch_bytes: 100000
+        disk_queue: /var/cache/hubble/sumo-queue
 
+Events are posted as newline delimited batches over a pooled connection (see
+hubblestack.returners.common.delivery); set batch_format to none to post
+them one at a time, or disk_queue to keep undeliverable batches for later.
 """
 
-import json
-import requests
 import logging
 
+from hubblestack.returners.common.delivery import make_sender
+
 log = logging.getLogger(__name__)
 
 
@@ -41,18 +48,19 @@ def returner(ret):
     cloud_details = __grains__.get('cloud_details', {})
 
     for opts in opts_list:
-        sumo_nova_return = opts['sumo_nova_return']
+        sender = make_sender('{}/'.format(opts['sumo_nova_return']), opts, batch_format='ndjson')
         # Failure checks
         _publish_data(args=args, checks=data.get('Failure', []), check_result='Failure',
-                      cloud_details=cloud_details, sumo_nova_return=sumo_nova_return)
+                      cloud_details=cloud_details, sender=sender)
         # Success checks
         _publish_data(args=args, checks=data.get('Success', []), check_result='Success',
-                      cloud_details=cloud_details, sumo_nova_return=sumo_nova_return)
+                      cloud_details=cloud_details, sender=sender)
         # Compliance check
         if data.get('Compliance', None):
             args['compliance_percentage'] = data['Compliance']
             event = _generate_event(args=args, cloud_details=cloud_details, compliance=True)
-            _publish_event(event=event, sumo_nova_return=sumo_nova_return)
+            _publish_event(event=event, sender=sender)
+        sender.flush()
 
     return
 
@@ -69,7 +77,12 @@ def _get_options():
         for opt in returner_opts:
             processed = {'sumo_nova_return': opt.get('sumo_nova_return'),
                          'proxy': opt.get('proxy', {}),
-                         'timeout': opt.get('timeout', 9.05)}
+                         'timeout': opt.get('timeout', 9.05),
+                         'verify': opt.get('verify', True),
+                         'batch_format': opt.get('batch_format', 'ndjson'),
+                         'batch_bytes': opt.get('batch_bytes'),
+                         'disk_queue': opt.get('disk_queue'),
+                         'disk_queue_size': opt.get('disk_queue_size')}
             sumo_opts.append(processed)
         return sumo_opts
     try:
@@ -109,15 +122,14 @@ def _generate_event(args, cloud_details, compliance=False, data=None):
     return event
 
 
-def _publish_event(event, sumo_nova_return):
+def _publish_event(event, sender):
     """
-    Publish the event to sumo
+    Publish the event to sumo (batched by the sender)
     """
-    rdy = json.dumps(event)
-    requests.post('{}/'.format(sumo_nova_return), rdy)
+    sender.send(event)
 
 
-def _publish_data(args, checks, check_result, cloud_details, sumo_nova_return):
+def _publish_data(args, checks, check_result, cloud_details, sender):
     """
     Helper function that goes over the failure/success checks and publishes the event to sumo
     """
@@ -126,7 +138,7 @@ def _publish_data(args, checks, check_result, cloud_details, sumo_nova_return):
         args['check_result'] = check_result
         args['check_id'] = check_id
         event = _generate_event(data=data, args=args, cloud_details=cloud_details)
-        _publish_event(event=event, sumo_nova_return=sumo_nova_return)
+        _publish_event(event=event, sender=sender)
 
 
 def _build_args(ret):
@@ -12,28 +12,32 @@ hubblestack:
     sumo:
       - proxy: {}
         timeout: 10
+        verify: True
         sumo_nebula_return: https://yoursumo.sumologic.com/endpointhere
         sumo_pulsar_return: https://yoursumo.sumologic.com/endpointhere
         sumo_nova_return: https://yoursumo.sumologic.com/endpointhere
+        batch_format: ndjson
+        batch_bytes: 100000
+        disk_queue: /var/cache/hubble/sumo-queue
 
+Events are posted as newline delimited batches over a pooled connection (see
+hubblestack.returners.common.delivery); set batch_format to none to post
+them one at a time, or disk_queue to keep undeliverable batches for later.
 """
 
 from collections import defaultdict
 
 import os
-import json
-import requests
+
+import hubblestack.utils.data
+from hubblestack.returners.common.delivery import make_sender
 
 
 def _dedup_list(input_list):
     """
     Remove duplicates from the input list
     """
-    deduped = []
-    for idx, item in enumerate(input_list):
-        if item not in input_list[idx + 1:]:
-            deduped.append(item)
-    return deduped
+    return hubblestack.utils.data.dedup_list(input_list)
 
 
 def returner(ret):
@@ -60,7 +64,7 @@ def returner(ret):
     cloud_details = __grains__.get('cloud_details', {})
 
     for opts in opts_list:
-        sumo_pulsar_return = opts['sumo_pulsar_return']
+        sender = make_sender('{}/'.format(opts['sumo_pulsar_return']), opts, batch_format='ndjson')
         for alert in alerts:
             if 'change' in alert:  # Linux, normal pulsar
                 # The second half of the change will be '|IN_ISDIR' for directories
@@ -76,8 +80,8 @@ def returner(ret):
                           'dest_ip': fqdn_ip4})
             event.update(cloud_details)
             # publish event
-            rdy = json.dumps(event)
-            requests.post('{}/'.format(sumo_pulsar_return), rdy)
+            sender.send(event)
+        sender.flush()
     return
 
 
@@ -93,7 +97,12 @@ def _get_options():
         for opt in returner_opts:
             processed = {'sumo_pulsar_return': opt.get('sumo_pulsar_return'),
                          'proxy': opt.get('proxy', {}),
-                         'timeout': opt.get('timeout', 9.05)}
+                         'timeout': opt.get('timeout', 9.05),
+                         'verify': opt.get('verify', True),
+                         'batch_format': opt.get('batch_format', 'ndjson'),
+                         'batch_bytes': opt.get('batch_bytes'),
+                         'disk_queue': opt.get('disk_queue'),
+                         'disk_queue_size': opt.get('disk_queue_size')}
             sumo_opts.append(processed)
         return sumo_opts
     try:
@@ -132,6 +141,9 @@ def _build_linux_actions():
     return actions
 
 
+LINUX_ACTIONS = _build_linux_actions()
+
+
 def _build_windows_actions():
     """
     Helper function that builds the actions defaultdict for Windows - win_pulsar
@@ -162,6 +174,9 @@ def _build_windows_actions():
     return actions
 
 
+WINDOWS_ACTIONS = _build_windows_actions()
+
+
 def _build_linux_event(alert, change):
     """
     Helper function that builds the event dict on Linux hosts
@@ -170,7 +185,7 @@ def _build_linux_event(alert, change):
         object_type = 'directory'
     else:
         object_type = 'file'
-    actions = _build_linux_actions()
+    actions = LINUX_ACTIONS
 
     event = {'action': actions[change], 'change_type': 'filesystem',
              'object_category': object_type, 'object_path': alert['path'],
@@ -203,7 +218,7 @@ def _build_windows_event(alert):
     else:
         object_type = 'file'
 
-    actions = _build_windows_actions()
+    actions = WINDOWS_ACTIONS
 
     event = {'action': actions[change], 'change_type': 'filesystem',
              'object_category': object_type, 'object_path': alert['Object Name'],
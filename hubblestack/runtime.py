@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+The daemon's runtime context
+
+Every refresh_grains builds a new RuntimeContext: the grains, opts and pillar
+of that refresh along with the utils, modules and returners loaders, and a
+generation number. It is published with one reference swap, so there's no
+moment at which some of it is old and some of it new.
+
+Jobs, runners and returners capture the context when they start and use it
+throughout:
+
+.. code-block:: python
+
+    ctx = hubblestack.runtime.current()
+    ret = ctx.mods[func](*args)
+    ctx.returners[returner]({'id': ctx.grains['id'], 'return': ret, ...})
+
+A refresh while the job runs publishes a new context; it doesn't change the one
+the job holds. Each context has its own (shallow) copy of the opts, with the
+schedule's jobs copied as well since the daemon keeps marking them, and its own
+grains and pillar; later refreshes never modify these, so treat them as
+read-only. The context's opts leave out the grains and pillar, which are
+attributes of their own; loader_opts() puts them back for building loaders.
+
+The utils, mods and returners are loader handles, not copies. A refresh that
+rebuilds the loaders (the default) gives the new context new loaders, and the
+job keeps the ones it started with. With ``incremental_loader_refresh`` the
+loaders are refreshed in place and shared by every generation, so a job sees
+modules reloaded while it runs.
+"""
+
+import threading
+
+_PUBLISH_LOCK = threading.Lock()
+
+
+class RuntimeContext(object):
+    """
+    The daemon's state as of one refresh: its attributes can't be reassigned
+    (see the module docstring for what is and isn't a copy)
+    """
+    __slots__ = ('generation', 'opts', 'grains', 'pillar', 'utils', 'mods', 'returners')
+
+    def __init__(self, generation=0, opts=None, grains=None, pillar=None, utils=None, mods=None,
+                 returners=None):
+        object.__setattr__(self, 'generation', generation)
+        for name, value in (('opts', opts), ('grains', grains), ('pillar', pillar),
+                            ('utils', utils), ('mods', mods), ('returners', returners)):
+            object.__setattr__(self, name, {} if value is None else value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('RuntimeContext is immutable; publish() a new one')
+
+    def __delattr__(self, name):
+        raise AttributeError('RuntimeContext is immutable; publish() a new one')
+
+    def loader_opts(self):
+        """
+        The opts with this context's grains and pillar, as the loaders expect them
+        """
+        return dict(self.opts, grains=self.grains, pillar=self.pillar)
+
+    def __repr__(self):
+        return '<RuntimeContext generation={0}>'.format(self.generation)
+
+
+_CURRENT = RuntimeContext()
+
+
+def current():
+    """
+    The latest published context; capture it once and keep using that one
+    """
+    return _CURRENT
+
+
+def publish(opts, grains, pillar=None, utils=None, mods=None, returners=None):
+    """
+    Make a new context (with the next generation number) the current one and
+    return it
+    """
+    global _CURRENT
+    with _PUBLISH_LOCK:
+        ctx = RuntimeContext(generation=_CURRENT.generation + 1, opts=opts, grains=grains,
+                             pillar=pillar, utils=utils, mods=mods, returners=returners)
+        _CURRENT = ctx
+    return ctx
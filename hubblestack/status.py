@@ -28,15 +28,22 @@ hubblestack.status options:
     hubble:status:good_time
         If any counter has advanced or updated in the last (default) 60s, then
         the status dump will report the status as "yes."
+
+    hubble:status:metrics_socket
+    hubble:status:metrics_port
+        Serve the status live on a Unix socket or 127.0.0.1 port (see hubblestack.metrics).
 """
 
 from functools import wraps
+import collections
 import time
 import json
 import signal
 import logging
 import os
 
+import hubblestack.runtime
+
 log = logging.getLogger(__name__)
 
 DEFAULTS = {
@@ -48,6 +55,13 @@ DEFAULTS = {
     'max_buckets': 3,
 }
 
+# durations are histogrammed in microseconds: exact below 2*HIST_SUB, then
+# HIST_SUB sub-buckets per power of two (ie, within 1/HIST_SUB of the true value)
+HIST_SUB_BITS = 3
+HIST_SUB = 1 << HIST_SUB_BITS
+HIST_MAX_EXP = 40 # 2**40µs is about 12 days; longer durations land in the last bin
+PERCENTILES = (50, 95, 99)
+
 
 def t_bucket(timestamp=None, bucket_len=None):
     """ convert a time into a bucket id """
@@ -61,7 +75,35 @@ def t_bucket(timestamp=None, bucket_len=None):
     return bucket
 
 
-__opts__ = dict()
+def hist_index(dur):
+    """ convert a duration (in seconds) into a log-linear histogram bin """
+    usec = int(dur * 1e6) if dur > 0 else 0
+    if usec < 2 * HIST_SUB:
+        return usec
+    exp = min(usec.bit_length() - 1, HIST_MAX_EXP)
+    sub = (usec >> (exp - HIST_SUB_BITS)) & (HIST_SUB - 1)
+    return (exp - HIST_SUB_BITS + 1) * HIST_SUB + sub
+
+
+def hist_value(idx):
+    """ convert a histogram bin back into a duration (in seconds, the middle of the bin) """
+    if idx < 2 * HIST_SUB:
+        return idx / 1e6
+    exp = idx // HIST_SUB + HIST_SUB_BITS - 1
+    sub = idx % HIST_SUB
+    width = 1 << (exp - HIST_SUB_BITS)
+    return ((HIST_SUB + sub) * width + width / 2.0) / 1e6
+
+
+def _max_buckets():
+    return max(1, int(get_hubble_status_opt('max_buckets')))
+
+
+def __getattr__(name):
+    # hubblestack.status.__opts__ (and __mods__) are those of the runtime context
+    if name in ('__opts__', '__mods__'):
+        return getattr(hubblestack.runtime.current(), name.strip('_'))
+    raise AttributeError('module {0} has no attribute {1}'.format(__name__, name))
 
 
 def get_hubble_status_opt(name, require_type=None):
@@ -72,9 +114,10 @@ def get_hubble_status_opt(name, require_type=None):
 
         Various defaults are defined in hubblestack.status.DEFAULTS
     """
+    ctx_opts = hubblestack.runtime.current().opts
     for hubble_status_loc in (('hubble_status', name), ('hubble', 'status', name),
                               ('hubble_status_' + name)):
-        opts = __opts__
+        opts = ctx_opts
         for k in hubble_status_loc:
             if isinstance(opts, dict):
                 opts = opts.get(k)
@@ -93,11 +136,12 @@ def get_hubble_status_opt(name, require_type=None):
 
 def get_hubble_or_salt_opt(name):
     """return the option specified by name found in __opts__ or __opts__['hubble'] """
-    if name in __opts__:
-        return __opts__[name]
-    if 'hubble' in __opts__:
-        if name in __opts__['hubble']:
-            return __opts__['hubble'][name]
+    opts = hubblestack.runtime.current().opts
+    if name in opts:
+        return opts[name]
+    if 'hubble' in opts:
+        if name in opts['hubble']:
+            return opts['hubble'][name]
     return None
 
 
@@ -115,11 +159,14 @@ class ResourceTimer(object):
         self.hubble_status = hubble_status
         self.hs_key = hs_key
 
+        self.stat_handle = None
+
     def __enter__(self):
-        self.hubble_status.mark(self.hs_key)
+        self.stat_handle = self.hubble_status.mark(self.hs_key)
+        return self.stat_handle
 
-    def __exit__(self):
-        self.hubble_status.fin(self.hs_key)
+    def __exit__(self, *_):
+        self.stat_handle.fin()
 
 
 class HubbleStatus(object):
@@ -132,6 +179,7 @@ class HubbleStatus(object):
         * dur: the time between mark(name) and fin(name)
         * ema_dt: an exponential moving average of dt
         * ema_dur: an exponential moving average of dur
+        * p50_dur, p95_dur, p99_dur: percentiles of dur (from a per-bucket histogram)
 
         The invocations are made most clear with a few examples.
 
@@ -174,10 +222,11 @@ class HubbleStatus(object):
     _signaled = False
     dat = dict()
     resources = list()
+    gauges = dict()
 
-    class Stat(object):
-        """ Data sample container for a named mark.
-            Stat objects have the following properties
+    class Bucket(object):
+        """ Data sample container for one time bucket of a named mark.
+            Bucket objects have the following properties
 
             * first_t: the first time the counter was marked
             * last_t: the last time the counter was marked
@@ -185,64 +234,53 @@ class HubbleStatus(object):
             * ema_dt: the average time between marks (updated at mark() time only)
             * dur: the duration of the last mark()/fin() cycle
             * ema_dur: the average duration between mark()/fin() cycles
+            * hist: a log-linear histogram of the mark()/fin() durations
+              (see hist_index()), used to report percentiles
         """
+        __slots__ = ('bucket', 'bucket_len', 'last_t', 'first_t', 'count', 'ema_dt',
+                     'dur', 'ema_dur', 'hist', 'reported')
 
         def __init__(self, t=None):
             self.bucket, self.bucket_len = t_bucket(timestamp=t)
-            self.next = None
             self.last_t = self.first_t = 0
             self.count = 0
             self.ema_dt = None
             self.dur = None
             self.ema_dur = None
+            self.hist = dict()
             # reported is used exclusively by modules/hstatus
             # cleared on every mark()
             self.reported = list()
 
-        def get_bucket(self, bucket, no_append=False):
-            """ find the bucket with the `bucket` id and return it or append it to the list of
-            buckets of the class """
-            bucket, _ = t_bucket(timestamp=bucket)
-            for i in self:
-                if i.bucket == bucket:
-                    return i
-            new_bucket = self.__class__(t=bucket)
-            if no_append:
-                return new_bucket
-            aux = self
-            while aux.next is not None:
-                aux = aux.next
-            aux.next = new_bucket
-            return new_bucket
-
-        def find_bucket(self, bucket):
-            """ return the bucket specified by the id `bucket` """
-            return self.get_bucket(bucket, no_append=True)
-
         @property
         def dt(self):
             """ a computed attribute: the time since the last mark() """
             return time.time() - self.last_t
 
-        @property
-        def buckets(self):
-            """ return a sorted set of the buckets """
-            ret = {self.bucket, }
-            if self.next is not None:
-                ret.update(self.next.buckets)
-            return sorted(ret)
-
-        def asdict(self, bucket=None):
-            """ return a copy of the various stat object properties
-                (optionally for the given bucket)
+        def percentile(self, pct):
+            """ estimate the pct-th percentile (0-100) of the durations recorded by fin()
+                (None if there are none)
             """
-            if bucket is not None:
-                self = self.find_bucket(bucket)
+            total = sum(self.hist.values())
+            if not total:
+                return None
+            rank = total * pct / 100.0
+            seen = 0
+            for idx in sorted(self.hist):
+                seen += self.hist[idx]
+                if seen >= rank:
+                    break
+            return hist_value(idx)
+
+        def asdict(self):
+            """ return a copy of the various stat object properties """
             ret = {'count': self.count, 'last_t': self.last_t,
                    'dt': self.dt, 'ema_dt': self.ema_dt, 'first_t': self.first_t,
                    'bucket': self.bucket, 'bucket_len': self.bucket_len}
             if self.dur is not None:
                 ret.update({'dur': self.dur, 'ema_dur': self.ema_dur})
+                for pct in PERCENTILES:
+                    ret['p{0}_dur'.format(pct)] = self.percentile(pct)
             return ret
 
         def mark(self, timestamp=None):
@@ -253,11 +291,7 @@ class HubbleStatus(object):
             """
             if timestamp is None:
                 timestamp = time.time()
-                self = self.get_bucket(timestamp)
             else:
-                if isinstance(timestamp, str):
-                    timestamp = int(timestamp)
-                self = self.get_bucket(timestamp)
                 if timestamp < self.first_t:
                     self.first_t = timestamp
                 if timestamp > self.last_t:
@@ -271,23 +305,122 @@ class HubbleStatus(object):
             self.reported = list()
             return self
 
-        def fin(self):
+        def fin(self, timestamp=None):
             """ mark a counter duration (ie, mark the time since the last mark,
-             and update the ema_dur)
+             and update the ema_dur and the duration histogram)
+
+                optional param "timestamp": when the duration ended (default: now)
 
                 NOTE: because the stats are bucketed (for searching purposes),
                  it's important to fin() the right stat object.
                  For this reason, mark() returns a stat object, which is the right one upon
                  which to call fin()
             """
-            self.dur = self.dt
+            self.dur = self.dt if timestamp is None else timestamp - self.last_t
             self.ema_dur = self.dur if self.ema_dur is None else 0.5 * self.ema_dur + 0.5 * self.dur
+            idx = hist_index(self.dur)
+            self.hist[idx] = self.hist.get(idx, 0) + 1
+
+    class Stat(object):
+        """ The time buckets of a named mark.
+
+            The buckets are kept oldest to newest in a ring (a deque bounded by
+            hubble:status:max_buckets) with an index by bucket id beside it, so
+            marking the current bucket, starting a new one and expiring the
+            oldest are all O(1) and the memory per counter is fixed.
+            (Marks within the current bucket don't consult the options at all,
+            so a changed bucket_len or max_buckets applies from the next bucket.)
+        """
+
+        def __init__(self, t=None):
+            self.ring = collections.deque(maxlen=_max_buckets())
+            self.index = dict()
+            if t is not None:
+                self.get_bucket(t)
+
+        def _resize(self, max_buckets):
+            """ apply a changed hubble:status:max_buckets (keeps the newest buckets) """
+            self.ring = collections.deque(self.ring, maxlen=max_buckets)
+            self.index = {b.bucket: b for b in self.ring}
+
+        def get_bucket(self, bucket, no_append=False):
+            """ find the bucket with the `bucket` id and return it or add it to the ring
+            of buckets (expiring the oldest bucket if the ring is full) """
+            bucket, _ = t_bucket(timestamp=bucket)
+            found = self.index.get(bucket)
+            if found is not None:
+                return found
+            new_bucket = HubbleStatus.Bucket(t=bucket)
+            if no_append:
+                return new_bucket
+            max_buckets = _max_buckets()
+            if max_buckets != self.ring.maxlen:
+                self._resize(max_buckets)
+            if not self.ring or bucket > self.ring[-1].bucket:
+                if len(self.ring) == self.ring.maxlen:
+                    del self.index[self.ring.popleft().bucket]
+                self.ring.append(new_bucket)
+            else:
+                # a mark() in the past; rare enough that we can afford to re-sort
+                ordered = sorted(list(self.ring) + [new_bucket], key=lambda x: x.bucket)
+                self.ring = collections.deque(ordered[-self.ring.maxlen:], maxlen=self.ring.maxlen)
+                self.index = {b.bucket: b for b in self.ring}
+                if bucket not in self.index:
+                    # older than anything we keep: counted, but immediately expired
+                    return new_bucket
+            self.index[bucket] = new_bucket
+            return new_bucket
+
+        def find_bucket(self, bucket):
+            """ return the bucket specified by the id `bucket` """
+            return self.get_bucket(bucket, no_append=True)
+
+        @property
+        def first_t(self):
+            """ the first time the counter was marked (among the buckets we still have) """
+            return self.ring[0].first_t if self.ring else 0
+
+        @property
+        def last_t(self):
+            """ the last time the counter was marked """
+            return self.ring[-1].last_t if self.ring else 0
+
+        @property
+        def dt(self):
+            """ a computed attribute: the time since the last mark() """
+            return time.time() - self.last_t
+
+        @property
+        def buckets(self):
+            """ return a sorted list of the buckets """
+            return [b.bucket for b in self.ring]
+
+        def asdict(self, bucket=None):
+            """ return a copy of the various stat object properties
+                for the given bucket (or the most recent bucket)
+            """
+            if bucket is not None:
+                return self.find_bucket(bucket).asdict()
+            if self.ring:
+                return self.ring[-1].asdict()
+            return HubbleStatus.Bucket().asdict()
+
+        def mark(self, timestamp=None):
+            """ mark a counter in the bucket for `timestamp` (default: now) and
+                return that bucket (the one to fin())
+            """
+            if timestamp is None:
+                timestamp = time.time()
+                bucket = self.ring[-1] if self.ring else None
+                if bucket is None or timestamp - bucket.bucket >= bucket.bucket_len:
+                    bucket = self.get_bucket(timestamp)
+                return bucket.mark()
+            if isinstance(timestamp, str):
+                timestamp = int(timestamp)
+            return self.get_bucket(timestamp).mark(timestamp=timestamp)
 
         def __iter__(self):
-            if self.next is not None:
-                for i in self.next:
-                    yield i
-            yield self
+            return iter(self.ring)
 
     def __init__(self, namespace, *resources):
         """ params:
@@ -336,35 +469,28 @@ class HubbleStatus(object):
                 '"{}" is not a resource of this HubbleStatus instance'.format(res_id))
         return res_id
 
-    def _check_depth(self, resource):
-        """ make sure we never have more than max_depth memory of past buckets """
-        max_depth = int(get_hubble_status_opt('max_buckets'))
-        resource = self._namespaced(resource)
-        node = self.dat[resource]
-        bucket_list = node.buckets
-        if len(bucket_list) > max_depth:
-            nb_list = sorted(node, key=lambda x: x.bucket)[-max_depth:]
-            for idx, nb_node in enumerate(nb_list[:-1]):
-                nb_node.next = nb_list[idx + 1]
-            nb_list[-1].next = None
-            self.dat[resource] = nb_list[0]
-
     def mark(self, resource, timestamp=None):
         """ mark the named resource `resource` — meaning increment the counters,
          update the last_t, etc """
         resource = self._checkmark(resource)
-        ret = self.dat[resource].mark(timestamp=timestamp)
-        self._check_depth(resource)
-        return ret
+        return self.dat[resource].mark(timestamp=timestamp)
 
     @classmethod
     def get_reported(cls, resource, bucket):
         """ return the reported list of the bucket `bucket` in the cls.dat[resource] """
-        n_bucket = cls.dat[resource].find_bucket(bucket)
-        if n_bucket:
+        bucket, _ = t_bucket(timestamp=bucket)
+        n_bucket = cls.dat[resource].index.get(bucket)
+        if n_bucket is not None:
             return n_bucket.reported
         return None
 
+    @classmethod
+    def gauge(cls, name, value):
+        """ record the current value of something that isn't a counter (e.g., a
+            queue depth); gauges are served by hubblestack.metrics
+        """
+        cls.gauges[name] = value
+
     @classmethod
     def buckets(cls, resource=None):
         """ return the sorted buckets for `resource`;
@@ -444,7 +570,8 @@ class HubbleStatus(object):
                   "hubblestack.daemon.schedule": {
                     "count": 186, "last_t": 1541773420.481246,
                     "dt": 0.2783069610595703, "ema_dt": 0.5015859371455758,
-                    "dur": 0.00010395050048828125, "ema_dur": 0.0003155270629760326
+                    "dur": 0.00010395050048828125, "ema_dur": 0.0003155270629760326,
+                    "p50_dur": 0.0001035, "p95_dur": 0.0004355, "p99_dur": 0.000499
                   },
                   …
                   "HEALTH": {
@@ -489,6 +616,9 @@ class HubbleStatus(object):
                 "dt": 'time since the last call of the counter',
                 "ema_dt": 'average time between calls',
                 "dur": 'duration of the last call',
+                "p50_dur": 'median duration of the calls in the current bucket',
+                "p95_dur": '95th percentile duration of the calls in the current bucket',
+                "p99_dur": '99th percentile duration of the calls in the current bucket',
                 "last_t": 'the last time the counter was called',
                 "first_t": 'the first time the counter was called',
             },
@@ -541,7 +671,7 @@ class HubbleStatus(object):
             hubble:status:dumpster options (see above).
         """
         try:
-            if __mods__['config.get']('splunklogging', False):
+            if hubblestack.runtime.current().mods['config.get']('splunklogging', False):
                 # lazy load to avoid circular import
                 import hubblestack.log
                 hubblestack.log.emit_to_splunk('Signal {0} detected'.format(signal.SIGUSR1),
@@ -595,13 +725,12 @@ class HubbleStatus(object):
 
 
 def _setup_for_testing():
-    global __opts__
     import hubblestack.daemon
     parsed_args = hubblestack.daemon.parse_args()
     import hubblestack.config
     parsed_args['configfile'] = config_file = '/etc/hubble/hubble'
-    __opts__ = hubblestack.config.get_config(config_file)
-    __opts__['conf_file'] = config_file
-    __opts__.update(parsed_args)
+    opts = hubblestack.config.get_config(config_file)
+    opts['conf_file'] = config_file
+    opts.update(parsed_args)
     import hubblestack.loader
-    __grains__ = hubblestack.loader.grains(__opts__)
+    hubblestack.runtime.publish(opts, hubblestack.loader.grains(opts))
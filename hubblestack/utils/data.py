@@ -5,6 +5,7 @@ and data structures.
 """
 
 import fnmatch
+import json
 import logging
 import re
 
@@ -460,6 +461,63 @@ def is_dictlist(data):
     return False
 
 
+def _freeze(data):
+    """
+    Convert data into something hashable (see canonical_key)
+    """
+    if isinstance(data, Mapping):
+        return ('dict', tuple(sorted(((_freeze(k), _freeze(v)) for k, v in data.items()),
+                                     key=repr)))
+    if isinstance(data, (list, tuple)):
+        return ('list', tuple(_freeze(x) for x in data))
+    if isinstance(data, (set, frozenset)):
+        return ('set', tuple(sorted((_freeze(x) for x in data), key=repr)))
+    return (type(data).__name__, repr(data))
+
+
+def _str_keys(data):
+    """
+    Whether every dict in data is keyed by strings only (json would turn
+    other keys into strings, so {1: x} and {'1': x} would collide)
+    """
+    if isinstance(data, Mapping):
+        return all(isinstance(k, str) for k in data) and all(_str_keys(v) for v in data.values())
+    if isinstance(data, (list, tuple)):
+        return all(_str_keys(x) for x in data)
+    return True
+
+
+def canonical_key(data):
+    """
+    Returns a hashable key for data (nested dicts/lists/scalars) such that
+    equal data gets equal keys, regardless of dict ordering. Unlike ``==``,
+    scalars of different types get different keys (1, 1.0 and True).
+    """
+    if _str_keys(data):
+        try:
+            return json.dumps(data, sort_keys=True, separators=(',', ':'))
+        except (TypeError, ValueError):
+            pass
+    return repr(_freeze(data))
+
+
+def dedup_list(input_list):
+    """
+    Returns input_list without duplicates, in a single pass. Like the
+    ``item not in input_list[idx + 1:]`` idiom this replaces, the last
+    occurrence of each item is kept (in its position).
+    """
+    seen = set()
+    deduped = []
+    for item in reversed(input_list):
+        key = canonical_key(item)
+        if key not in seen:
+            seen.add(key)
+            deduped.append(item)
+    deduped.reverse()
+    return deduped
+
+
 def compare_dicts(old=None, new=None):
     """
     Compare before and after results from various salt functions, returning a
@@ -14,6 +14,7 @@ dns.srv_name('ldap/tcp', 'example.com')
 # Import Python libs
 import base64
 import binascii
+import fnmatch
 import hashlib
 import itertools
 import logging
@@ -24,6 +25,8 @@ import socket
 import ssl
 import string
 import functools
+import threading
+import time
 
 import hubblestack.utils.files
 import hubblestack.utils.network
@@ -32,6 +35,18 @@ from hubblestack.utils._compat import ipaddress
 
 log = logging.getLogger(__name__)
 
+# interfaces that almost never have reverse DNS and can be numerous (one per
+# container): a starting point for resolvable_addresses()' skip_interfaces
+SKIP_INTERFACES = ('docker*', 'veth*', 'br-*', 'cni*', 'flannel*', 'cali*',
+                   'weave*', 'virbr*', 'lxcbr*', 'vnet*')
+
+# answers are cached for RESOLVER_TTL seconds, failures for RESOLVER_NEGATIVE_TTL
+RESOLVER_TTL = 300
+RESOLVER_NEGATIVE_TTL = 60
+
+_RESOLVER_CACHE = {}
+_RESOLVER_LOCK = threading.Lock()
+
 def parse_resolv(src='/etc/resolv.conf'):
     '''
     Parse a resolver configuration file (traditionally /etc/resolv.conf)
@@ -129,3 +144,181 @@ def parse_resolv(src='/etc/resolv.conf'):
         }
     except IOError:
         return {}
+
+
+def clear_resolver_cache():
+    '''
+    Forget every cached lookup
+    '''
+    with _RESOLVER_LOCK:
+        _RESOLVER_CACHE.clear()
+
+
+def _cache_get(key):
+    '''
+    Return (True, value) for an unexpired cache entry, (False, None) otherwise
+    '''
+    with _RESOLVER_LOCK:
+        entry = _RESOLVER_CACHE.get(key)
+        if entry is None:
+            return False, None
+        expires, value = entry
+        if expires < time.time():
+            del _RESOLVER_CACHE[key]
+            return False, None
+        return True, value
+
+
+def _cache_put(key, value, ttl=None, negative_ttl=None):
+    '''
+    Cache value under key; a None value is a negative answer and is kept for
+    negative_ttl seconds instead of ttl
+    '''
+    if value is None:
+        ttl = RESOLVER_NEGATIVE_TTL if negative_ttl is None else negative_ttl
+    elif ttl is None:
+        ttl = RESOLVER_TTL
+    if ttl > 0:
+        with _RESOLVER_LOCK:
+            _RESOLVER_CACHE[key] = (time.time() + ttl, value)
+
+
+def _reverse_lookup(ip_addr):
+    '''
+    Uncached reverse lookup of ip_addr, returns the fqdn or None
+    '''
+    err_message = 'An exception occurred resolving address \'%s\': %s'
+    try:
+        return socket.getfqdn(socket.gethostbyaddr(ip_addr)[0])
+    except socket.herror as err:
+        if err.errno == 0:
+            # No FQDN for this IP address, so we don't need to know this all the time.
+            log.debug('Unable to resolve address %s: %s', ip_addr, err)
+        else:
+            log.error(err_message, ip_addr, err)
+    except (socket.error, socket.gaierror, socket.timeout) as err:
+        log.error(err_message, ip_addr, err)
+    return None
+
+
+def reverse_lookup(ip_addr, ttl=None, negative_ttl=None):
+    '''
+    Return the fqdn for ip_addr (or None if it doesn't resolve), caching the
+    answer (or the lack of one)
+    '''
+    key = ('ptr', ip_addr)
+    found, value = _cache_get(key)
+    if found:
+        return value
+    value = _reverse_lookup(ip_addr)
+    _cache_put(key, value, ttl=ttl, negative_ttl=negative_ttl)
+    return value
+
+
+def reverse_lookup_many(addresses, timeout=None, workers=8, ttl=None, negative_ttl=None):
+    '''
+    Reverse resolve addresses on up to ``workers`` threads and return a dict
+    of address -> fqdn (None for the addresses that don't resolve).
+
+    Cached answers are used without a lookup. Lookups still running
+    ``timeout`` seconds after the call started are abandoned and their
+    addresses are missing from the result; the abandoned threads still cache
+    whatever they eventually get, so the next call can use it.
+    '''
+    ret = {}
+    pending = []
+    for ip_addr in addresses:
+        if ip_addr in ret or ip_addr in pending:
+            continue
+        found, value = _cache_get(('ptr', ip_addr))
+        if found:
+            ret[ip_addr] = value
+        else:
+            pending.append(ip_addr)
+    if not pending:
+        return ret
+
+    deadline = time.time() + timeout if timeout else None
+    cond = threading.Condition()
+    finished = {}
+
+    def _worker():
+        while True:
+            with cond:
+                if not pending or (deadline and time.time() >= deadline):
+                    return
+                ip_addr = pending.pop(0)
+            value = reverse_lookup(ip_addr, ttl=ttl, negative_ttl=negative_ttl)
+            with cond:
+                finished[ip_addr] = value
+                cond.notify()
+
+    total = len(pending)
+    threads = []
+    for idx in range(max(1, min(workers, total))):
+        thread = threading.Thread(target=_worker, name='reverse-dns:{0}'.format(idx))
+        thread.daemon = True
+        threads.append(thread)
+        thread.start()
+
+    with cond:
+        while len(finished) < total:
+            if not pending and not [t for t in threads if t.is_alive()]:
+                break
+            wait = None
+            if deadline:
+                wait = deadline - time.time()
+                if wait <= 0:
+                    log.error('Reverse DNS did not finish within %ss, %d of %d addresses unresolved',
+                              timeout, total - len(finished), total)
+                    break
+            cond.wait(wait)
+        ret.update(finished)
+    return ret
+
+
+def gethostname(ttl=None):
+    '''
+    socket.gethostname(), cached
+    '''
+    found, value = _cache_get(('hostname',))
+    if not found:
+        value = socket.gethostname()
+        _cache_put(('hostname',), value, ttl=ttl)
+    return value
+
+
+def resolvable_addresses(interface_data=None, skip_link_local=False,
+                         skip_interfaces=None):
+    '''
+    Return the non-loopback IPv4 and IPv6 addresses of the host worth reverse
+    resolving: link-local addresses are left out when skip_link_local is set
+    and so are interfaces whose name matches one of the skip_interfaces globs.
+    '''
+    if not isinstance(interface_data, dict):
+        interface_data = hubblestack.utils.network.interfaces()
+    skip_interfaces = skip_interfaces or ()
+    if isinstance(skip_interfaces, str):
+        skip_interfaces = [skip_interfaces]
+
+    def _keep(addr):
+        try:
+            return not ipaddress.ip_address(addr.get('address')).is_link_local
+        except ValueError:
+            return False
+
+    ifaces = {}
+    for name, info in interface_data.items():
+        if any(fnmatch.fnmatch(name, pat) for pat in skip_interfaces):
+            continue
+        info = dict(info)
+        if skip_link_local:
+            for proto in ('inet', 'inet6', 'secondary'):
+                if proto in info:
+                    info[proto] = [addr for addr in info[proto] if _keep(addr)]
+        ifaces[name] = info
+    addresses = hubblestack.utils.network.ip_addrs(include_loopback=False,
+                                                   interface_data=ifaces)
+    addresses.extend(hubblestack.utils.network.ip_addrs6(include_loopback=False,
+                                                         interface_data=ifaces))
+    return addresses
@@ -89,3 +89,63 @@ def dumps(obj, **kwargs):
     if "ensure_ascii" not in kwargs:
         kwargs["ensure_ascii"] = False
     return json_module.dumps(obj, **kwargs)  # future lint: blacklisted-function
+
+
+def iterload(fp, chunk_size=65536, **kwargs):
+    """
+    Yield the elements of the json array in the (text mode) file ``fp`` one
+    at a time, reading ``chunk_size`` characters at a time, so a huge array
+    never has to be held in memory at once. The keyword arguments go to
+    json.JSONDecoder.
+
+    Raises ValueError if the file doesn't hold a json array.
+    """
+    decoder = kwargs.pop("_json_module", json).JSONDecoder(**kwargs)
+    buf = ""
+    pos = 0
+    eof = False
+    started = False
+
+    def _more(buf, pos, size):
+        dat = fp.read(size)
+        return buf[pos:] + dat, 0, not dat
+
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n":
+            pos += 1
+        if pos >= len(buf):
+            if eof:
+                raise ValueError("unexpected end of json array")
+            buf, pos, eof = _more(buf, pos, chunk_size)
+            continue
+        if not started:
+            if buf[pos] != "[":
+                raise ValueError("expected a json array, found {0!r}".format(buf[pos]))
+            started = True
+            pos += 1
+            want_value = True
+            continue
+        if buf[pos] == "]":
+            return
+        if not want_value:
+            if buf[pos] != ",":
+                raise ValueError("expected ',' or ']' in json array, found {0!r}".format(buf[pos]))
+            pos += 1
+            want_value = True
+            continue
+        try:
+            obj, end = decoder.raw_decode(buf, pos)
+        except ValueError:
+            if eof:
+                raise
+            # the element doesn't fit in what we've read yet; read at least as
+            # much again so long elements don't get re-parsed once per chunk
+            buf, pos, eof = _more(buf, pos, max(chunk_size, len(buf) - pos))
+            continue
+        if not eof and (end >= len(buf) or buf[end] not in ",] \t\r\n"):
+            # a number cut off by the chunk boundary ("1" of "1.5") still parses
+            buf, pos, eof = _more(buf, pos, chunk_size)
+            continue
+        want_value = False
+        pos = end
+        yield obj
@@ -9,6 +9,7 @@ import re
 import logging
 import subprocess
 import socket
+import struct
 import platform
 
 from hubblestack.utils.versions import LooseVersion
@@ -146,7 +147,14 @@ def win_interfaces():
 def linux_interfaces():
     """
     Obtain interface information for *NIX/BSD variants
+
+    On Linux the links and addresses are dumped over netlink (see
+    _interfaces_netlink); ``ip`` or ``ifconfig`` are only run where that
+    isn't available.
     """
+    ifaces = _interfaces_netlink()
+    if ifaces is not None:
+        return ifaces
     ifaces = dict()
     ip_path = hubblestack.utils.path.which('ip')
     ifconfig_path = None if ip_path else hubblestack.utils.path.which('ifconfig')
@@ -269,6 +277,194 @@ def _interfaces_ip(out):
     return ret
 
 
+NETLINK_ROUTE = 0
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+RTM_NEWLINK = 16
+RTM_GETLINK = 18
+RTM_NEWADDR = 20
+RTM_GETADDR = 22
+IFLA_ADDRESS = 1
+IFLA_IFNAME = 3
+IFLA_LINK = 5
+IFLA_LINK_NETNSID = 37
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+IFA_LABEL = 3
+IFA_BROADCAST = 4
+IFA_FLAGS = 8
+IFA_F_SECONDARY = 0x1
+IFF_UP = 0x1
+NLMSGHDR = struct.Struct('=IHHII')
+IFINFOMSG = struct.Struct('=BxHiII')
+IFADDRMSG = struct.Struct('=BBBBI')
+RTATTR = struct.Struct('=HH')
+
+# scope names as ip prints them (/etc/iproute2/rt_scopes)
+RT_SCOPES = {0: 'global', 200: 'site', 253: 'link', 254: 'host', 255: 'nowhere'}
+# link types whose hardware address ip prints as an ip address: ipip, sit,
+# gre and ip6tnl, ip6gre
+ARPHRD_IP_TUNNELS = {768: socket.AF_INET, 776: socket.AF_INET, 778: socket.AF_INET,
+                     769: socket.AF_INET6, 823: socket.AF_INET6}
+
+
+def _parse_rtattrs(data, offset):
+    """
+    Return the netlink route attributes in data (from offset) as a dict of
+    attribute type => payload bytes
+    """
+    attrs = dict()
+    while offset + RTATTR.size <= len(data):
+        length, type_ = RTATTR.unpack_from(data, offset)
+        if length < RTATTR.size:
+            break
+        attrs[type_] = data[offset + RTATTR.size:offset + length]
+        offset += (length + 3) & ~3
+    return attrs
+
+
+def _parse_netlink_messages(data):
+    """
+    Yield the (type, payload) of the netlink messages in one datagram
+    """
+    offset = 0
+    while offset + NLMSGHDR.size <= len(data):
+        length, type_, _flags, _seq, _pid = NLMSGHDR.unpack_from(data, offset)
+        if length < NLMSGHDR.size:
+            break
+        yield type_, data[offset + NLMSGHDR.size:offset + length]
+        offset += (length + 3) & ~3
+
+
+def _netlink_dump(sock, request_type, reply_type, header, seq):
+    """
+    Send a dump request (header is its packed ifinfomsg/ifaddrmsg) and return
+    the (header tuple, attrs dict) of every reply, in kernel order.
+    """
+    struct_ = IFINFOMSG if reply_type == RTM_NEWLINK else IFADDRMSG
+    sock.sendto(NLMSGHDR.pack(NLMSGHDR.size + len(header), request_type,
+                              NLM_F_REQUEST | NLM_F_DUMP, seq, 0) + header, (0, 0))
+    ret = list()
+    while True:
+        data = sock.recv(65536)
+        if not data:
+            raise OSError('netlink socket closed during a dump')
+        for type_, payload in _parse_netlink_messages(data):
+            if type_ == NLMSG_DONE:
+                return ret
+            if type_ == NLMSG_ERROR:
+                error = struct.unpack_from('=i', payload)[0]
+                raise OSError(-error, os.strerror(-error))
+            if type_ == reply_type:
+                ret.append((struct_.unpack_from(payload), _parse_rtattrs(payload, struct_.size)))
+
+
+def _format_hwaddr(link_type, address):
+    """
+    Format a link layer address the way ip prints it
+    """
+    family = ARPHRD_IP_TUNNELS.get(link_type)
+    if family:
+        try:
+            return socket.inet_ntop(family, address)
+        except ValueError:
+            pass
+    return ':'.join('{0:02x}'.format(byte) for byte in bytearray(address))
+
+
+def _interfaces_netlink():
+    """
+    Return the same dictionary as _interfaces_ip, built from netlink link
+    and address dumps (RTM_GETLINK, RTM_GETADDR) instead of running and
+    parsing ``ip link show`` and ``ip addr show``.
+
+    Returns None where netlink isn't available (not Linux, or the socket is
+    refused), so the caller can fall back to ip/ifconfig.
+    """
+    if not hasattr(socket, 'AF_NETLINK'):
+        return None
+    try:
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+        try:
+            sock.bind((0, 0))
+            links = _netlink_dump(sock, RTM_GETLINK, RTM_NEWLINK,
+                                  IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0), 1)
+            addrs = _netlink_dump(sock, RTM_GETADDR, RTM_NEWADDR,
+                                  IFADDRMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0), 2)
+        finally:
+            sock.close()
+    except (OSError, ValueError, struct.error) as exc:
+        log.debug('Unable to list interfaces over netlink, using ip/ifconfig: %s', exc)
+        return None
+
+    names = dict()
+    for (_family, _type, ifindex, _flags, _change), attrs in links:
+        if IFLA_IFNAME in attrs:
+            names[ifindex] = attrs[IFLA_IFNAME].rstrip(b'\0').decode()
+
+    ret = dict()
+    for (_family, link_type, ifindex, flags, _change), attrs in links:
+        if ifindex not in names:
+            continue
+        data = dict()
+        data['up'] = bool(flags & IFF_UP)
+        if IFLA_LINK in attrs:
+            iflink = struct.unpack_from('=i', attrs[IFLA_LINK])[0]
+            if not iflink:
+                data['parent'] = 'NONE'
+            elif IFLA_LINK_NETNSID in attrs:
+                # the parent is in another network namespace
+                data['parent'] = 'if{0}'.format(iflink)
+            else:
+                data['parent'] = names.get(iflink, 'if{0}'.format(iflink))
+        if attrs.get(IFLA_ADDRESS):
+            data['hwaddr'] = _format_hwaddr(link_type, attrs[IFLA_ADDRESS])
+        ret[names[ifindex]] = data
+
+    for (family, prefixlen, flags, scope, ifindex), attrs in addrs:
+        if family not in (socket.AF_INET, socket.AF_INET6) or ifindex not in names:
+            continue
+        data = ret[names[ifindex]]
+        local = attrs.get(IFA_LOCAL, attrs.get(IFA_ADDRESS))
+        if local is None:
+            continue
+        if IFA_FLAGS in attrs:
+            flags = struct.unpack_from('=I', attrs[IFA_FLAGS])[0]
+        address = socket.inet_ntop(family, local)
+        # ip prints "local peer address/prefixlen" for point to point
+        # addresses, which _interfaces_ip reads as an int 32 prefix
+        peer = attrs.get(IFA_ADDRESS, local) != local
+        if family == socket.AF_INET:
+            netmask = cidr_to_ipv4_netmask(32 if peer else prefixlen)
+            broadcast = socket.inet_ntop(family, attrs[IFA_BROADCAST]) if IFA_BROADCAST in attrs else None
+            label = attrs[IFA_LABEL].rstrip(b'\0').decode() if IFA_LABEL in attrs else names[ifindex]
+            # for inet6, this flag is IFA_F_TEMPORARY (printed as temporary)
+            if flags & IFA_F_SECONDARY:
+                data.setdefault('secondary', list()).append({
+                    'type': 'inet',
+                    'address': address,
+                    'netmask': netmask,
+                    'broadcast': broadcast,
+                    'label': label,
+                })
+            else:
+                data.setdefault('inet', list()).append({
+                    'address': address,
+                    'netmask': netmask,
+                    'broadcast': broadcast,
+                    'label': label,
+                })
+        else:
+            data.setdefault('inet6', list()).append({
+                'address': address,
+                'prefixlen': 32 if peer else str(prefixlen),
+                'scope': RT_SCOPES.get(scope, str(scope)),
+            })
+    return ret
+
+
 def _interfaces_ifconfig(out):
     """
     Uses ifconfig to return a dictionary of interfaces with various information
@@ -2,9 +2,13 @@
 HubbleStack osquery lib. Can be used to execute osquery queries from Hubble code
 Author - Mudit Agarwal (muagarwa@adobe.com)
 """
+import codecs
 import logging
 import os
+import subprocess
+import tempfile
 import hubblestack.modules.cmdmod
+import hubblestack.utils.json
 import json
 
 __mods__ = {'cmd.run': hubblestack.modules.cmdmod._run_quiet,
@@ -39,3 +43,94 @@ def query(query_sql='', osquery_path='/opt/osquery/osqueryi', args=None, max_fil
   except Exception as e:
     log.exception('An exception occurred while executing query {0} - {1}'.format(query_sql, e))
     return None
+
+
+def run_spooled(cmd, timeout=600):
+    """
+    Run an osqueryi command with its stdout spooled to an anonymous temp file
+    instead of read into memory.
+
+    Returns a dict shaped like cmd.run_all's (retcode, stdout, stderr) plus
+    ``spool``, the temp file holding the output (None unless retcode is 0).
+    ``stdout`` only carries the 'Timed out' notice when the timeout hits.
+    """
+    ret = {'retcode': 1, 'stdout': '', 'stderr': '', 'spool': None}
+    spool = tempfile.TemporaryFile()
+    with tempfile.TemporaryFile() as err:
+        try:
+            proc = subprocess.Popen([str(arg) for arg in cmd], stdout=spool, stderr=err)
+        except OSError as exc:
+            spool.close()
+            ret['stderr'] = str(exc)
+            return ret
+        try:
+            ret['retcode'] = proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+            ret['stdout'] = 'Timed out after {0} seconds'.format(timeout)
+        err.seek(0)
+        ret['stderr'] = err.read(65536).decode('utf-8', 'replace')
+    if ret['retcode'] == 0:
+        ret['spool'] = spool
+    else:
+        spool.close()
+    return ret
+
+
+class _SpoolReader(object):
+    """ a text reader over a binary spool that keeps its own offset, so
+        several readers can walk the same spool at once """
+
+    def __init__(self, spool):
+        self.spool = spool
+        self.offset = 0
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+    def read(self, size):
+        while True:
+            self.spool.seek(self.offset)
+            dat = self.spool.read(size)
+            self.offset += len(dat)
+            text = self.decoder.decode(dat, final=not dat)
+            if text or not dat:
+                return text
+
+
+class OsqueryRows(object):
+    """
+    The rows of one osqueryi --json result, parsed lazily from the spooled
+    output (see run_spooled). Iterating yields one row at a time with the
+    ``transforms`` (callables taking and returning a row) applied, so a
+    returner can batch the rows out without the whole result ever being in
+    memory. Every iteration re-reads the spool, so the same result can go to
+    several returners.
+    """
+    chunk_size = 65536
+
+    def __init__(self, spool, query_name=None):
+        self.spool = spool
+        self.query_name = query_name
+        self.transforms = list()
+
+    def __iter__(self):
+        try:
+            for row in hubblestack.utils.json.iterload(_SpoolReader(self.spool),
+                                                       chunk_size=self.chunk_size):
+                for transform in self.transforms:
+                    row = transform(row)
+                yield row
+        except ValueError as exc:
+            log.error('malformed osqueryi output for query %s: %s', self.query_name, exc)
+
+    def __bool__(self):
+        head = _SpoolReader(self.spool).read(256).lstrip()
+        return head.startswith('[') and not head[1:].lstrip().startswith(']')
+
+    def __repr__(self):
+        self.spool.seek(0, os.SEEK_END)
+        return '<OsqueryRows {0} ({1} bytes)>'.format(self.query_name, self.spool.tell())
+
+    def close(self):
+        """ drop the spooled output """
+        self.spool.close()
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+Compiled masking rules for nebula (osquery) results
+
+compile_mask() turns the merged mask.yaml data (see
+hubblestack.modules.nebula_osquery._mask_object for the format) into a
+MaskEngine once; masking is then a single pass over each result row:
+
+    * the rules that apply to a query are looked up by query name (and cached),
+      instead of every blacklisted_object walking every result
+    * the blacklisted_patterns of a rule become one combined regex (globbing)
+      or a set lookup (exact names), instead of an fnmatch per pattern per value
+    * custom (local) blacklists are built per row from the row's own
+      environment and their matchers are cached by pattern list
+"""
+
+import fnmatch
+import functools
+import logging
+import os
+import re
+
+log = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=256)
+def compile_matcher(patterns, globbing_enabled):
+    """
+    Return a function telling whether a value matches any of ``patterns``
+    (a tuple), or None if there are no patterns.
+
+    With globbing the patterns are fnmatch globs, all translated into one
+    alternation; otherwise values must equal one of them.
+    """
+    if not patterns:
+        return None
+    if globbing_enabled:
+        regex = re.compile('|'.join(fnmatch.translate(os.path.normcase(pattern))
+                                    for pattern in patterns))
+
+        def _match(value):
+            return isinstance(value, str) and regex.match(os.path.normcase(value)) is not None
+        return _match
+    names = frozenset(pattern for pattern in patterns if isinstance(pattern, str))
+
+    def _match(value):
+        try:
+            return value in names
+        except TypeError:
+            return False
+    return _match
+
+
+class MaskRule(object):
+    """ one compiled blacklisted_objects entry """
+
+    def __init__(self, blacklisted_object, mask_with, globbing_enabled):
+        self.query_names = blacklisted_object['query_names']
+        self.wildcard = '*' in self.query_names
+        self.column = blacklisted_object['column']
+        self.attribute_to_check = blacklisted_object.get('attribute_to_check')
+        self.attributes_to_mask = tuple(blacklisted_object.get('attributes_to_mask') or ())
+        self.patterns = tuple(blacklisted_object.get('blacklisted_patterns') or ())
+        self.local = blacklisted_object.get('enable_local_masking', False) is True
+        self.global_ = blacklisted_object.get('enable_global_masking', False) is True
+        self.custom_mask_column = blacklisted_object.get('custom_mask_column', '')
+        self.custom_mask_key = blacklisted_object.get('custom_mask_key')
+        self.globbing_enabled = bool(globbing_enabled)
+        self.mask_with = mask_with
+        self.matcher = compile_matcher(self.patterns, self.globbing_enabled) if self.global_ else None
+        self._regexes = None
+
+    @property
+    def regexes(self):
+        """ the blacklisted_patterns as regexes, for columns holding a plain string """
+        if self._regexes is None:
+            self._regexes = list()
+            for pattern in self.patterns:
+                try:
+                    self._regexes.append(re.compile(pattern + '()'))
+                except re.error as exc:
+                    log.error('skipping bad masking regex %s: %s', pattern, exc)
+        return self._regexes
+
+    def _custom_patterns(self, row):
+        """
+        The custom blacklist set in the row's environment under custom_mask_key
+        """
+        mask_column = row.get(self.custom_mask_column)
+        if not mask_column or not isinstance(mask_column, list):
+            return None
+        custom = None
+        for field in mask_column:
+            if isinstance(field, dict) and field.get('variable_name') == self.custom_mask_key \
+                    and isinstance(field.get('value'), str):
+                custom = [pattern.strip() for pattern in field['value'].replace(' ', ',').split(',')
+                          if pattern.strip() and pattern.strip() != self.custom_mask_key]
+        return custom
+
+    def matcher_for(self, row):
+        """ the matcher to use on this row (custom blacklists vary row by row) """
+        if self.local and self.custom_mask_column and self.custom_mask_key:
+            custom = self._custom_patterns(row)
+            if custom:
+                patterns = custom
+                if self.global_ and self.patterns:
+                    patterns = sorted(set(self.patterns) | set(custom))
+                return compile_matcher(tuple(patterns), self.globbing_enabled)
+        return self.matcher
+
+    def apply(self, row, mask_strings=False):
+        """
+        Mask the rule's column of one row in place. String columns are only
+        regex masked when mask_strings is set (osqueryd differential rows).
+
+        Returns False if the row doesn't have the column.
+        """
+        if not isinstance(row, dict) or self.column not in row:
+            return False
+        value = row[self.column]
+        if isinstance(value, str):
+            if mask_strings:
+                template = r'\1' + self.mask_with + r'\3'
+                for regex in self.regexes:
+                    try:
+                        value = regex.sub(template, value)
+                    except re.error as exc:
+                        log.error('masking regex %s failed: %s', regex.pattern, exc)
+                row[self.column] = value
+            return True
+        matcher = self.matcher_for(row)
+        if matcher is None or not self.attribute_to_check:
+            return True
+        stack = [value]
+        while stack:
+            obj = stack.pop()
+            if isinstance(obj, list):
+                stack.extend(obj)
+            elif isinstance(obj, dict) and self.attribute_to_check in obj \
+                    and matcher(obj[self.attribute_to_check]):
+                log.debug('Attribute %s will be masked.', obj[self.attribute_to_check])
+                for key in self.attributes_to_mask:
+                    if key in obj:
+                        obj[key] = self.mask_with
+        return True
+
+
+class MaskEngine(object):
+    """
+    The compiled mask for a set of mask.yaml files
+
+    .. code-block:: python
+
+        engine = compile_mask(mask_data, globbing_enabled=False)
+        engine.mask(results)                  # nebula.queries style results
+        engine.mask_row('running_procs', row) # one row
+    """
+
+    def __init__(self, rules, mask_with):
+        self.rules = rules
+        self.mask_with = mask_with
+        self.wildcard_rules = tuple(rule for rule in rules if rule.wildcard)
+        self.by_query = dict()
+        for rule in rules:
+            for query_name in rule.query_names:
+                if query_name != '*':
+                    self.by_query[query_name] = None
+        for query_name in self.by_query:
+            self.by_query[query_name] = tuple(rule for rule in rules
+                                              if rule.wildcard or query_name in rule.query_names)
+        self.warned = set()
+
+    def reset_warnings(self):
+        """ forget the missing columns already logged, so each masking run reports them once """
+        self.warned.clear()
+
+    def rules_for(self, query_name):
+        """ the rules applying to query_name, in mask file order """
+        return self.by_query.get(query_name, self.wildcard_rules)
+
+    def mask_row(self, query_name, row, mask_strings=False):
+        """ mask one result row of query_name in place """
+        for rule in self.rules_for(query_name):
+            if not rule.apply(row, mask_strings=mask_strings) and not rule.wildcard \
+                    and (query_name, rule.column) not in self.warned:
+                self.warned.add((query_name, rule.column))
+                log.error('masking data references a missing column %s in query %s',
+                          rule.column, query_name)
+        return row
+
+    def mask_event(self, event):
+        """ mask one osqueryd log event (snapshot or differential) in place """
+        query_name = event.get('name')
+        if event.get('action') == 'snapshot':
+            for row in event.get('snapshot') or []:
+                self.mask_row(query_name, row)
+        elif isinstance(event.get('columns'), dict):
+            self.mask_row(query_name, event['columns'], mask_strings=True)
+        return event
+
+    def mask(self, results):
+        """
+        mask a list of results in place: osqueryd events, or
+        ``{query_name: {'data': [rows]}}`` dicts from osqueryi
+        """
+        if not self.rules:
+            return results
+        for obj in results:
+            if not isinstance(obj, dict):
+                continue
+            if 'action' in obj:
+                self.mask_event(obj)
+                continue
+            for query_name, query_ret in obj.items():
+                if not isinstance(query_ret, dict) or not self.rules_for(query_name):
+                    continue
+                for row in query_ret.get('data') or []:
+                    self.mask_row(query_name, row)
+        return results
+
+
+def compile_mask(mask, globbing_enabled=False):
+    """
+    Compile the merged mask.yaml data into a MaskEngine
+    """
+    # Backwards compatibility with mask_by
+    mask_with = mask.get('mask_with', mask.get('mask_by', 'REDACTED'))
+    rules = list()
+    for blacklisted_object in mask.get('blacklisted_objects') or []:
+        try:
+            rules.append(MaskRule(blacklisted_object, mask_with, globbing_enabled))
+        except (KeyError, TypeError) as exc:
+            log.error('skipping malformed blacklisted_objects entry %s: %s', blacklisted_object, exc)
+    return MaskEngine(rules, mask_with)
@@ -122,7 +122,7 @@ def version_to_evr(verstring):
     idx_e = verstring.find(':')
     if idx_e != -1:
         try:
-            epoch = six.text_type(int(verstring[:idx_e]))
+            epoch = str(int(verstring[:idx_e]))
         except ValueError:
             # look, garbage in the epoch field, how fun, kill it
             epoch = '0'  # this is our fallback, deal
@@ -15,6 +15,7 @@ except ImportError:
     HAS_REQUESTS = False  # pylint: disable=W0612
 
 import os
+import threading
 import hubblestack.utils.aws
 import hubblestack.utils.files
 import hubblestack.utils.hashutils
@@ -26,7 +27,30 @@ from hubblestack.exceptions import CommandExecutionError
 
 log = logging.getLogger(__name__)
 
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+
+def get_session(pool_size=10):
+    """
+    Return a requests.Session (created on first use) to share between
+    threads running queries, so they reuse pooled connections
+    """
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            _SESSION = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+            _SESSION.mount('http://', adapter)
+            _SESSION.mount('https://', adapter)
+        return _SESSION
+
+
 def thirty_second_memoize(f):
+    """
+    Memoize f's results for thirty seconds, keyed by its arguments; the
+    wrapper's cache_clear() forgets them (like functools.lru_cache's)
+    """
     memo = dict()
     def inner(*a, **kw):
         k = '-'.join([ str(x) for x in a ] + [ str(kw[x]) for x in sorted(kw) ])
@@ -40,6 +64,7 @@ def thirty_second_memoize(f):
         v = f(*a, **kw)
         memo[k] = (v,now)
         return v
+    inner.cache_clear = memo.clear
     return inner
 
 @thirty_second_memoize
@@ -48,7 +73,7 @@ def query(key, keyid, method='GET', params=None, headers=None,
           path='', return_bin=False, action=None, local_file=None,
           verify_ssl=True, full_headers=False, kms_keyid=None,
           location=None, role_arn=None, chunk_size=16384, path_style=False,
-          https_enable=True):
+          https_enable=True, session=None):
     """
     Perform a query against an S3-like API. This function requires that a
     secret key and the id for that key are passed in. For instance:
@@ -96,6 +121,9 @@ def query(key, keyid, method='GET', params=None, headers=None,
 
     If region is not specified, an attempt to fetch the region from EC2 IAM
     metadata service will be made. Failing that, default is us-east-1
+
+    A requests.Session (see get_session) may be passed as ``session`` to reuse
+    its connections.
     """
     if not HAS_REQUESTS:
         log.error('There was an error: requests is required for s3 access')
@@ -171,28 +199,28 @@ def query(key, keyid, method='GET', params=None, headers=None,
             if local_file:
                 fh = hubblestack.utils.files.fopen(local_file, 'rb')  # pylint: disable=resource-leakage
                 data = fh.read()  # pylint: disable=resource-leakage
-            result = requests.request(method,
-                                      requesturl,
-                                      headers=headers,
-                                      data=data,
-                                      verify=verify_ssl,
-                                      stream=True,
-                                      timeout=300)
+            result = (session or requests).request(method,
+                                                   requesturl,
+                                                   headers=headers,
+                                                   data=data,
+                                                   verify=verify_ssl,
+                                                   stream=True,
+                                                   timeout=300)
         elif method == 'GET' and local_file and not return_bin:
-            result = requests.request(method,
-                                      requesturl,
-                                      headers=headers,
-                                      data=data,
-                                      verify=verify_ssl,
-                                      stream=True,
-                                      timeout=300)
+            result = (session or requests).request(method,
+                                                   requesturl,
+                                                   headers=headers,
+                                                   data=data,
+                                                   verify=verify_ssl,
+                                                   stream=True,
+                                                   timeout=300)
         else:
-            result = requests.request(method,
-                                      requesturl,
-                                      headers=headers,
-                                      data=data,
-                                      verify=verify_ssl,
-                                      timeout=300)
+            result = (session or requests).request(method,
+                                                   requesturl,
+                                                   headers=headers,
+                                                   data=data,
+                                                   verify=verify_ssl,
+                                                   timeout=300)
     finally:
         if fh is not None:
             fh.close()
@@ -61,6 +61,8 @@ from cryptography.hazmat.primitives.asymmetric import rsa
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives.serialization import load_pem_private_key
 
+import hubblestack.runtime
+
 MANIFEST_RE = re.compile(r'^\s*(?P<digest>[0-9a-fA-F]+)\s+(?P<fname>.+)$')
 log = logging.getLogger(__name__)
 
@@ -142,7 +144,7 @@ class Options(object):
             pass
         try:
             default = getattr(self.Defaults, name)
-            return __mods__['config.get']('repo_signing:{}'.format(name), default)
+            return hubblestack.runtime.current().mods['config.get']('repo_signing:{}'.format(name), default)
         except AttributeError:
             raise
 
@@ -12,8 +12,10 @@
 '''
 
 # Import Python libs
+import functools
 import logging
 import numbers
+import re
 import sys
 import warnings
 from distutils.version import LooseVersion as _LooseVersion
@@ -77,3 +79,168 @@ def version_cmp(pkg1, pkg2, ignore_epoch=False):
         log.exception(exc)
     return None
 
+
+# Package version ordering, in process: dpkg's epoch:upstream-revision
+# comparison and rpm's rpmvercmp. Each version string is parsed once (cached)
+# into a key tuple that sorts the way dpkg/rpm order the versions, so
+# comparing an installed version to thousands of candidates (OVAL, vulners
+# data) is a tuple comparison instead of a dpkg/rpmdev-vercmp subprocess.
+
+_DEB_PART = re.compile(r'([^0-9]*)([0-9]*)')
+_RPM_SEGMENT = re.compile(r'~|\^|[0-9]+|[a-zA-Z]+')
+# the end of a version part; see _deb_part_key and _rpm_key
+_DEB_END = ((0,), 0)
+_RPM_END = (1,)
+
+
+def _deb_char_order(char):
+    """
+    The weight dpkg gives a character of a non-digit part: ~ sorts before
+    everything (even the end of the part), then letters, then the rest
+    """
+    if char == '~':
+        return -1
+    if char.isalpha() and char.isascii():
+        return ord(char)
+    return ord(char) + 256
+
+
+def _deb_part_key(part):
+    """
+    Key of an upstream version or revision: the (non-digit, digit) runs
+    dpkg's verrevcmp walks, as (tuple of char weights + end, int)
+    """
+    key = list()
+    for nondigits, digits in _DEB_PART.findall(part):
+        if not nondigits and not digits:
+            continue
+        key.append((tuple(_deb_char_order(char) for char in nondigits) + (0,), int(digits or 0)))
+    # a missing run compares as an empty one: drop those at the end and
+    # close the key so that shorter keys don't win just for being shorter
+    while key and key[-1] == _DEB_END:
+        key.pop()
+    key.append(_DEB_END)
+    return tuple(key)
+
+
+@functools.lru_cache(maxsize=16384)
+def deb_version_key(version):
+    """
+    Return a key tuple ordering Debian versions ([epoch:]upstream[-revision])
+    the way ``dpkg --compare-versions`` does
+    """
+    version = str(version).strip()
+    epoch, sep, rest = version.partition(':')
+    if not sep:
+        epoch, rest = '0', version
+    upstream, sep, revision = rest.rpartition('-')
+    if not sep:
+        upstream, revision = rest, ''
+    try:
+        epoch = int(epoch or 0)
+    except ValueError:
+        epoch = 0
+    return (epoch, _deb_part_key(upstream), _deb_part_key(revision))
+
+
+def _rpm_key(part):
+    """
+    Key of a version or release following rpmvercmp: separators are
+    skipped, ~ sorts before the end of the string, ^ after it (but before
+    any segment), and numeric segments are newer than alphabetic ones
+    """
+    key = list()
+    for segment in _RPM_SEGMENT.findall(part):
+        if segment == '~':
+            key.append((0,))
+        elif segment == '^':
+            key.append((2,))
+        elif segment.isdigit():
+            key.append((3, 1, int(segment)))
+        else:
+            key.append((3, 0, segment))
+    key.append(_RPM_END)
+    return tuple(key)
+
+
+@functools.lru_cache(maxsize=16384)
+def rpm_version_key(version):
+    """
+    Return the (epoch, version key, release key) of an rpm [epoch:]version[-release]
+    string; the release key is None when there is no release, so that
+    rpm_version_cmp can ignore it like rpm.labelCompare callers do
+    """
+    version = str(version).strip()
+    epoch, sep, rest = version.partition(':')
+    if not sep:
+        epoch, rest = '0', version
+    ver, sep, release = rest.partition('-')
+    try:
+        epoch = int(epoch or 0)
+    except ValueError:
+        epoch = 0
+    return (epoch, _rpm_key(ver), _rpm_key(release) if sep else None)
+
+
+def _cmp(key1, key2):
+    return (key1 > key2) - (key1 < key2)
+
+
+def deb_version_cmp(ver1, ver2):
+    """
+    Compare two Debian versions; -1, 0 or 1 like ``dpkg --compare-versions``
+    """
+    return _cmp(deb_version_key(ver1), deb_version_key(ver2))
+
+
+def rpm_version_cmp(ver1, ver2):
+    """
+    Compare two rpm EVR strings; -1, 0 or 1 like rpm.labelCompare. If one
+    of them has no release (3.2 vs 3.2-1), the releases are ignored.
+    """
+    key1 = rpm_version_key(ver1)
+    key2 = rpm_version_key(ver2)
+    if key1[2] is None or key2[2] is None:
+        return _cmp(key1[:2], key2[:2])
+    return _cmp(key1, key2)
+
+
+VERSION_CMP_FORMATS = {'deb': deb_version_cmp, 'rpm': rpm_version_cmp}
+OS_FAMILY_FORMATS = {'debian': 'deb', 'redhat': 'rpm', 'suse': 'rpm'}
+
+
+def version_format(os_family):
+    """
+    The package version format (deb, rpm, or None) of an os_family grain
+    """
+    return OS_FAMILY_FORMATS.get(str(os_family or '').lower())
+
+
+def compare_many(installed, candidates, fmt=None, ignore_epoch=False):
+    """
+    Compare every candidate version to the installed one. Returns a list
+    with, for each candidate, 1 if it is newer than installed, 0 if it is
+    the same version and -1 if it is older (None if it couldn't be compared).
+
+    fmt is 'deb' or 'rpm' (see version_format); any other value falls back
+    to version_cmp (LooseVersion).
+
+    .. code-block:: python
+
+        compare_many('1.0.2g-1ubuntu4.15', ['1.0.2g-1ubuntu4.16', '1.0.1'], fmt='deb')
+        # [1, -1]
+    """
+    if ignore_epoch:
+        installed = str(installed).split(':', 1)[-1]
+        candidates = [str(candidate).split(':', 1)[-1] for candidate in candidates]
+    cmp_func = VERSION_CMP_FORMATS.get(fmt)
+    if cmp_func is None:
+        return [version_cmp(candidate, installed) for candidate in candidates]
+    ret = list()
+    for candidate in candidates:
+        try:
+            ret.append(cmp_func(candidate, installed))
+        except Exception as exc:
+            log.error('Unable to compare version %s to %s: %s', candidate, installed, exc)
+            ret.append(None)
+    return ret
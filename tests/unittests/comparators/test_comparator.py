@@ -95,3 +95,61 @@ class TestComparatorMatch(TestCase):
         with pytest.raises(HubbleCheckFailedError) as exception:
             status, result = comparator.run('test', args, module_result, module_status)
             pytest.fail('Should not have come here')
+
+
+class TestCompiledArgs(TestCase):
+    """
+    Unit tests for comparator args compilation
+    """
+    def setUp(self):
+        from hubblestack.comparators import dict as dict_comparator
+        from hubblestack.comparators import list as list_comparator
+        from hubblestack.comparators import string as string_comparator
+        comparator.__comparator__ = {
+            'dict.match': dict_comparator.match,
+            'dict.match_any': dict_comparator.match_any,
+            'list.match_any': list_comparator.match_any,
+            'list.match_all': list_comparator.match_all,
+            'list.filter_compare': list_comparator.filter_compare,
+            'string.match': string_comparator.match,
+        }
+
+    def test_compile_args(self):
+        args = comparator.compile_args({
+            'type': 'list',
+            'match_any': [{'name': {'type': 'string', 'match': '^ab', 'is_regex': True}}, 'xyz']
+        })
+        self.assertIs(comparator.compile_args(args), args)
+        self.assertIsInstance(args['match_any'][0]['name'], comparator.CompiledArgs)
+        self.assertEqual(args['match_any'][1], 'xyz')
+
+        built = []
+        self.assertEqual(comparator.cached(args, 'key', lambda: built.append(1) or 'value'), 'value')
+        self.assertEqual(comparator.cached(args, 'key', lambda: built.append(1) or 'value'), 'value')
+        self.assertEqual(built, [1])
+        self.assertEqual(comparator.cached({}, 'key', lambda: 'value'), 'value')
+
+    def test_run_compiled(self):
+        args = comparator.compile_args({
+            'type': 'list',
+            'match_any': [{'name': {'type': 'string', 'match': '^ab', 'is_regex': True}}, 'xyz']
+        })
+        self.assertTrue(comparator.run('test', args, ['abc'])[0])
+        self.assertTrue(comparator.run('test', args, ['ijk', 'xyz'])[0])
+        self.assertFalse(comparator.run('test', args, ['ijk', 'bab'])[0])
+        self.assertEqual(args.command, 'list.match_any')
+        # the nested string comparator was compiled once, and reused
+        string_args = args['match_any'][0]['name']
+        self.assertEqual(list(string_args.cache), ['match'])
+
+        args = comparator.compile_args({'type': 'list', 'match_all': ['a', 'b']})
+        self.assertTrue(comparator.run('test', args, ['c', 'b', 'a'])[0])
+        self.assertFalse(comparator.run('test', args, ['b', 'c'])[0])
+        args = comparator.compile_args({'type': 'list', 'match_all': [{'name': 'c'}]})
+        self.assertTrue(comparator.run('test', args, [{'name': 'a'}, {'name': 'c', 'uid': 0}])[0])
+
+        args = comparator.compile_args({'type': 'list', 'filter_compare': {
+            'filter': {'name': {'type': 'string', 'match': 'a.', 'is_regex': True}},
+            'compare': {'match_all': [{'name': 'ab'}]}}})
+        self.assertTrue(comparator.run('test', args, [{'name': 'ab'}, {'name': 'xy'}])[0])
+        self.assertFalse(comparator.run('test', args, [{'name': 'ac'}, {'name': 'xy'}])[0])
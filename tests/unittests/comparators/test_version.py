@@ -1,4 +1,5 @@
 from unittest import TestCase
+from unittest.mock import patch
 
 from hubblestack.comparators import version as version_comparator
 
@@ -125,4 +126,35 @@ class TestVersionMatchAny(TestCase):
             '4.28.0-1.el7'
         ]}
         status, result = version_comparator.match_any("test-1", result_to_compare, args)
-        self.assertFalse(status)
\ No newline at end of file
+        self.assertFalse(status)
+
+    def test_match_format(self):
+        """
+        Package version ordering
+        """
+        args = {"format": "deb", "match_any": ['< 1.0~rc1', '>= 1:0.9']}
+        status, result = version_comparator.match_any("test-1", '1.0', args)
+        self.assertFalse(status)
+        args = {"format": "deb", "match": '> 1.0~rc1'}
+        status, result = version_comparator.match("test-1", '1.0', args)
+        self.assertTrue(status)
+        args = {"format": "rpm", "match": '< 1.0^git1'}
+        status, result = version_comparator.match("test-1", '1.0', args)
+        self.assertTrue(status)
+
+    def test_match_format_opt_in(self):
+        """
+        Package version ordering only applies with a format, whatever the os_family
+        """
+        with patch.object(version_comparator, '__grains__', {'os_family': 'RedHat'}, create=True):
+            status, result = version_comparator.match("test-1", '4.28.0-1.el7', {"match": '> 4.28.0'})
+            self.assertTrue(status)
+            status, result = version_comparator.match("test-1", '4.28.0-1.el7', {"match": '== 4.28.0'})
+            self.assertFalse(status)
+            # rpm ignores the release when one side has none
+            args = {"format": "rpm", "match": '== 4.28.0'}
+            status, result = version_comparator.match("test-1", '4.28.0-1.el7', args)
+            self.assertTrue(status)
+            args = {"format": "rpm", "match": '> 4.28.0'}
+            status, result = version_comparator.match("test-1", '4.28.0-1.el7', args)
+            self.assertFalse(status)
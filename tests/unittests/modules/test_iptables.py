@@ -630,3 +630,95 @@ class IptablesTestCase(TestCase, LoaderModuleMockMixin):
                 self.assertTrue(
                     iptables.flush(table="filter", chain="INPUT", family="ipv4")
                 )
+
+    # 'snapshot' function tests: 2
+
+    def test_snapshot(self):
+        """
+        Test if it parses iptables-save output into an indexed ruleset
+        """
+        with open("tests/unittests/resources/iptables-save.txt") as fh:
+            save = fh.read()
+        with patch.dict(iptables.__mods__, {"cmd.run": MagicMock(return_value=save)}):
+            snap = iptables.snapshot(family="ipv4")
+        self.assertEqual(sorted(snap["tables"]), ["filter", "mangle", "nat", "raw"])
+        self.assertEqual(snap["tables"]["filter"]["INPUT"]["policy"], "DROP")
+        self.assertEqual(len(snap["tables"]["filter"]["f2b-sshd"]["rules"]), 701)
+
+        with patch.dict(iptables.__mods__, {"cmd.run": MagicMock(return_value="")}):
+            self.assertFalse(iptables.snapshot(family="ipv4"))
+
+    def test_check_snapshot(self):
+        """
+        Test if it checks rules against a snapshot without running iptables
+        """
+        with open("tests/unittests/resources/iptables-save.txt") as fh:
+            snap = iptables._parse_snapshot(fh.read(), family="ipv4")
+        mock_cmd = MagicMock()
+        with patch.dict(iptables.__mods__, {"cmd.run": mock_cmd}):
+            for rule, present in (
+                ("-m state --state ESTABLISHED,RELATED -j ACCEPT", True),
+                ("--protocol tcp --dport ssh -m state --state NEW --jump ACCEPT", True),
+                ('-p tcp -m multiport --dports http,443 -m comment --comment "web traffic" -j ACCEPT', True),
+                ("-p icmp --icmp-type echo-request -m limit --limit 5/sec -j ACCEPT", True),
+                ("-p tcp -m tcp -m tcp --dport 22 -m state --state NEW -j ACCEPT", True),
+                ("-p tcp --dport 22 -m tcp -m conntrack --ctstate NEW -j ACCEPT", True),
+                ("-p tcp --dport 23 -j ACCEPT", False),
+                ("-s 10.0.0.0/24 -p tcp --dport 1024 -j ACCEPT", False),
+            ):
+                self.assertEqual(
+                    iptables.check(table="filter", chain="INPUT", rule=rule,
+                                   family="ipv4", snapshot=snap),
+                    present, rule
+                )
+            self.assertTrue(
+                iptables.check(table="nat", chain="POSTROUTING",
+                               rule="--source 172.17.0.0/16 ! --out-interface docker0 -j MASQUERADE",
+                               snapshot=snap)
+            )
+            self.assertFalse(
+                iptables.check(table="security", chain="INPUT", rule="-j ACCEPT", snapshot=snap)
+            )
+            self.assertEqual(
+                iptables.check(table="filter", chain="NOPE", rule="-j ACCEPT", snapshot=snap),
+                "Error: Chain NOPE does not exist in table filter",
+            )
+        mock_cmd.assert_not_called()
+
+    def test_check_snapshot_matches_check(self):
+        """
+        Test if checking against a snapshot agrees with asking iptables -C
+        """
+        with open("tests/unittests/resources/iptables-save.txt") as fh:
+            save = fh.read()
+        snap = iptables._parse_snapshot(save, family="ipv4")
+        rules = []
+        table = None
+        for line in save.splitlines():
+            if line.startswith("*"):
+                table = line[1:].strip()
+            elif line.startswith("-A "):
+                _, chain, rule = line.split(None, 2)
+                rules.append((table, chain, rule))
+        saved = set("{0} -A {1} {2}".format(*rule) for rule in rules)
+
+        def cmd_run(cmd, **kwargs):
+            # <ipt> -t <table> -C <chain> <rule>
+            _, _, table, _, chain, rule = cmd.split(None, 5)
+            if "{0} -A {1} {2}".format(table, chain, rule) in saved:
+                return ""
+            return "iptables: Bad rule (does a matching rule exist in that chain?)."
+
+        rules = rules[::10]
+        rules += [(t, c, r.replace("-j ", "-m comment --comment absent -j ", 1))
+                  for t, c, r in rules]
+        with patch.object(iptables, "_has_option", MagicMock(return_value=True)), \
+                patch.object(iptables, "_iptables_cmd", MagicMock(return_value="iptables")), \
+                patch.dict(iptables.__mods__, {"cmd.run": cmd_run}):
+            for table, chain, rule in rules:
+                self.assertEqual(
+                    iptables.check(table=table, chain=chain, rule=rule,
+                                   family="ipv4", snapshot=snap) is True,
+                    iptables.check(table=table, chain=chain, rule=rule, family="ipv4") is True,
+                    rule,
+                )
@@ -0,0 +1,90 @@
+# coding: utf-8
+
+import base64
+import hashlib
+import os
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import hubblestack.fileserver.azurefs as azurefs
+
+class FakeBlobService(object):
+    def __init__(self, blobs):
+        self.blobs = blobs # name -> content
+        self.etags = {name: '"0x1"' for name in blobs}
+        self.downloads = list()
+        self.lock = threading.Lock()
+
+    def list_blobs(self, container_name):
+        ret = list()
+        for name, data in sorted(self.blobs.items()):
+            md5 = base64.b64encode(hashlib.md5(data).digest()).decode()
+            ret.append(SimpleNamespace(name=name, properties=SimpleNamespace(
+                etag=self.etags[name], last_modified='2020-01-01 00:00:00+00:00',
+                content_length=len(data), content_settings=SimpleNamespace(content_md5=md5))))
+        return ret
+
+    def get_blob_to_path(self, container_name, blob_name, file_path):
+        with self.lock:
+            self.downloads.append(blob_name)
+        with open(file_path, 'wb') as fh:
+            fh.write(self.blobs[blob_name])
+
+@pytest.fixture
+def azure(tmp_path, monkeypatch):
+    opts = {'cachedir': str(tmp_path), 'hash_type': 'sha256', 'azurefs_sync_workers': 4,
+            'delete_inaccessible_azure_containers': False,
+            'azurefs': [{'account_name': 'acct', 'container_name': 'hubble', 'saltenv': 'base'}]}
+    service = FakeBlobService({'top.nebula': b'nebula', 'hubblestack_nova_profiles/cis.yaml': b'cis',
+                               'hubblestack_nova_profiles/misc.yaml': b'misc'})
+    monkeypatch.setattr(azurefs, '__opts__', opts, raising=False)
+    monkeypatch.setattr(azurefs, '_get_container_service', lambda container: service)
+    monkeypatch.setattr(azurefs, '_MANIFESTS', dict())
+    return SimpleNamespace(opts=opts, service=service,
+                           path=azurefs._get_container_path(opts['azurefs'][0]))
+
+def test_sync(azure):
+    azurefs.update()
+    assert sorted(azure.service.downloads) == sorted(azure.service.blobs)
+    with open(os.path.join(azure.path, 'hubblestack_nova_profiles', 'cis.yaml'), 'rb') as fh:
+        assert fh.read() == b'cis'
+    assert sorted(azurefs.file_list({'saltenv': 'base'})) == sorted(azure.service.blobs)
+
+    # nothing changed: nothing is downloaded, even with the manifest only on disk
+    azure.service.downloads[:] = []
+    azurefs._MANIFESTS.clear()
+    azurefs.update()
+    assert azure.service.downloads == []
+
+    # a changed blob and a deleted one
+    azure.service.blobs['top.nebula'] = b'nebula2'
+    azure.service.etags['top.nebula'] = '"0x2"'
+    del azure.service.blobs['hubblestack_nova_profiles/misc.yaml']
+    azurefs.update()
+    assert azure.service.downloads == ['top.nebula']
+    assert not os.path.exists(os.path.join(azure.path, 'hubblestack_nova_profiles', 'misc.yaml'))
+    assert 'hubblestack_nova_profiles/misc.yaml' not in azurefs._get_manifest(azure.path)
+
+    # a new etag on unchanged content is settled by the md5, not a download
+    azure.service.downloads[:] = []
+    azure.service.etags['top.nebula'] = '"0x3"'
+    azurefs.update()
+    assert azure.service.downloads == []
+
+def test_file_hash(azure):
+    azurefs.update()
+    fnd = {'path': os.path.join(azure.path, 'top.nebula'), 'rel': 'top.nebula'}
+    load = {'path': 'top.nebula', 'saltenv': 'base'}
+    assert azurefs.file_hash(load, fnd) == {'hash_type': 'sha256',
+                                            'hsum': hashlib.sha256(b'nebula').hexdigest()}
+    entry = azurefs._get_manifest(azure.path)['top.nebula']
+    assert entry['hsum'] == {'sha256': hashlib.sha256(b'nebula').hexdigest()}
+    azure.opts['hash_type'] = 'md5'
+    assert azurefs.file_hash(load, fnd)['hsum'] == hashlib.md5(b'nebula').hexdigest()
+
+    # a locally modified copy isn't served from the manifest
+    with open(fnd['path'], 'wb') as fh:
+        fh.write(b'changed')
+    assert azurefs.file_hash(load, fnd)['hsum'] == hashlib.md5(b'changed').hexdigest()
@@ -101,6 +101,32 @@ def test_bucket_len():
         assert c == N
         assert len(buckets) == N/B + 1
 
+def test_hist_bins():
+    last = -1
+    for usec in list(range(100)) + [ 2**e + d for e in range(7, 30) for d in (0, 1, 2**(e-1)) ]:
+        idx = hubblestack.status.hist_index(usec / 1e6)
+        assert idx >= last
+        last = idx
+        # log-linear: the middle of the bin is within 1/HIST_SUB of the value
+        assert hubblestack.status.hist_value(idx) == pytest.approx(usec / 1e6,
+            rel=1.0/hubblestack.status.HIST_SUB, abs=1e-6)
+
+def test_percentiles():
+    with HubbleStatusContext('test1') as hubble_status:
+        handle = hubble_status.mark('test1')
+        for i in range(1, 101):
+            handle.dur = i / 1000.0
+            idx = hubblestack.status.hist_index(handle.dur)
+            handle.hist[idx] = handle.hist.get(idx, 0) + 1
+        with hubble_status.resource_timer('test1') as again:
+            assert again is handle
+
+        short_status = hubble_status.short()['x.test1']
+        assert short_status['p50_dur'] == pytest.approx(0.050, rel=0.13)
+        assert short_status['p95_dur'] == pytest.approx(0.095, rel=0.13)
+        assert short_status['p99_dur'] == pytest.approx(0.099, rel=0.13)
+        assert sum(handle.hist.values()) == 101
+        assert 'p99_dur' in hubble_status.stats()['x.test1']
 
 
 class HubbleStatusContext(object):
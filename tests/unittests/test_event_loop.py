@@ -0,0 +1,59 @@
+# coding: utf-8
+
+import os
+import threading
+import time
+
+import pytest
+
+import hubblestack.daemon
+import hubblestack.loader
+import hubblestack.runtime
+
+class Stop(BaseException):
+    pass
+
+class FakeWatchManager(object):
+    def __init__(self, fd):
+        self.fd = fd
+    def get_fd(self):
+        return self.fd
+
+class FakeNotifier(object):
+    def __init__(self, fd):
+        self._watch_manager = FakeWatchManager(fd)
+
+def test_inotify_wakes_pulsar(monkeypatch):
+    rfd, wfd = os.pipe()
+    calls = list()
+    def process():
+        calls.append(time.time())
+        os.read(rfd, 4096)
+        return []
+    def save_snapshots():
+        if calls:
+            raise Stop()
+    opts = {'schedule': {'pulsar': {'function': 'pulsar.process', 'seconds': 3600},
+                         'audit': {'function': 'hubble.audit', 'seconds': 7200}},
+            'fileserver_update_frequency': 43200, 'grains_refresh_frequency': 3600,
+            'daemonize': False, 'log_level': 'info', 'pulsar_coalesce_window': 0.05}
+    monkeypatch.setattr(hubblestack.daemon, '__opts__', opts)
+    monkeypatch.setattr(hubblestack.runtime, '_CURRENT', hubblestack.runtime.current())
+    hubblestack.runtime.publish(opts, {'id': 'host1'}, mods={'pulsar.process': process,
+                                                             'hubble.audit': lambda: None})
+    monkeypatch.setattr(hubblestack.daemon, '__context__', {'pulsar.notifier': FakeNotifier(rfd)},
+                        raising=False)
+    monkeypatch.setattr(hubblestack.loader, 'save_snapshots', save_snapshots)
+
+    start = time.time()
+    threading.Timer(0.2, os.write, (wfd, b'x')).start()
+    try:
+        with pytest.raises(Stop):
+            hubblestack.daemon._event_loop(None, start, start)
+    finally:
+        os.close(rfd)
+        os.close(wfd)
+    # pulsar ran as soon as the (coalesced) event arrived, not an hour later
+    assert len(calls) == 1
+    assert 0.2 <= calls[0] - start < 5
+    assert opts['schedule']['audit']['next_run'] > start + 7000
@@ -0,0 +1,81 @@
+# coding: utf-8
+
+import os
+
+import pytest
+
+import hubblestack.fileserver
+import hubblestack.fileserver.roots as roots
+import hubblestack.utils.path
+
+def test_file_index(tmp_path):
+    opts = {'cachedir': str(tmp_path)}
+    index = hubblestack.fileserver.FileIndex(opts, 'roots')
+    assert not index.has_env('base')
+    changes = index.update('base', {'top.nebula': 1.0, 'profiles/b.yaml': 2.0, 'profiles/a/c.yaml': 3.0},
+                           dirs=['empty'])
+    assert changes == {'added': ['profiles/a/c.yaml', 'profiles/b.yaml', 'top.nebula'],
+                       'removed': [], 'changed': []}
+    index.save()
+
+    # another process (or the next start) reads it back from disk
+    index = hubblestack.fileserver.FileIndex(opts, 'roots')
+    assert index.has_env('base')
+    assert index.file_list('base') == ['profiles/a/c.yaml', 'profiles/b.yaml', 'top.nebula']
+    assert index.dir_list('base') == ['empty', 'profiles', 'profiles/a']
+    assert index.file_list('base', prefix='profiles/a/') == ['profiles/a/c.yaml']
+    assert index.dir_list('base', prefix='prof') == ['profiles', 'profiles/a']
+    assert index.has_file('base', 'profiles/b.yaml')
+    assert not index.has_file('base', 'profiles')
+    assert index.has_dir('base', 'profiles/')
+    assert index.stamp('base', 'top.nebula') == 1.0
+
+    changes = index.update('base', {'top.nebula': 4.0, 'profiles/b.yaml': 2.0})
+    assert changes == {'added': [], 'removed': ['profiles/a/c.yaml'], 'changed': ['top.nebula']}
+    index.update('dev', {'x': 'etag'})
+    index.prune(['dev'])
+    index.save()
+    index = hubblestack.fileserver.FileIndex(opts, 'roots')
+    assert not index.has_env('base')
+    assert index.file_list('dev') == ['x']
+
+@pytest.fixture
+def file_roots(tmp_path, monkeypatch):
+    root = tmp_path / 'roots'
+    (root / 'profiles' / 'empty').mkdir(parents=True)
+    (root / 'top.nebula').write_text('top')
+    (root / 'profiles' / 'cis.yaml').write_text('cis')
+    opts = {'cachedir': str(tmp_path / 'cache'), 'file_roots': {'base': [str(root)]},
+            'fileserver_followsymlinks': True, 'fileserver_ignoresymlinks': False,
+            'file_ignore_regex': None, 'file_ignore_glob': None, 'fileserver_list_cache_time': 20}
+    monkeypatch.setattr(roots, '__opts__', opts, raising=False)
+    monkeypatch.setattr(hubblestack.fileserver, '_FILE_INDEXES', dict())
+    monkeypatch.setattr(roots, '_INDEX_REFRESHED', 0)
+    return root
+
+def test_roots_index(file_roots, monkeypatch):
+    roots.update()
+    with monkeypatch.context() as mpc:
+        # served from the index: no walking until the next update
+        mpc.setattr(hubblestack.utils.path, 'os_walk', None)
+        assert roots.file_list({'saltenv': 'base'}) == ['profiles/cis.yaml', 'top.nebula']
+        assert roots.dir_list({'saltenv': 'base'}) == ['profiles', 'profiles/empty']
+        assert roots.file_list({'saltenv': 'base', 'prefix': 'profiles'}) == ['profiles/cis.yaml']
+
+    os.unlink(str(file_roots / 'top.nebula'))
+    monkeypatch.setattr(hubblestack.fileserver, '_FILE_INDEXES', dict())
+    roots.update()
+    assert roots.file_list({'saltenv': 'base'}) == ['profiles/cis.yaml']
+
+def test_roots_index_ttl(file_roots):
+    roots.update()
+    assert roots.file_list({'saltenv': 'base'}) == ['profiles/cis.yaml', 'top.nebula']
+
+    # within fileserver_list_cache_time of the last walk the index is served as is
+    (file_roots / 'new.yaml').write_text('new')
+    assert roots.file_list({'saltenv': 'base'}) == ['profiles/cis.yaml', 'top.nebula']
+
+    # after that, listings rewalk the roots without waiting for the next update
+    roots.__opts__['fileserver_list_cache_time'] = 0
+    os.unlink(str(file_roots / 'top.nebula'))
+    assert roots.file_list({'saltenv': 'base'}) == ['new.yaml', 'profiles/cis.yaml']
@@ -2,6 +2,7 @@
 # coding: utf-8
 
 import os
+import time
 import pytest
 
 import hubblestack.loader as L
@@ -34,3 +35,295 @@ def test_can_find_hubblestack_module_file(module_dirs):
 
 def test_can_find_hubblestack_module(__mods__):
     assert 'pulsar.canary' in __mods__
+
+VIRTUAL_MOD = '''
+__virtualname__ = 'refreshme'
+
+LOADS = []
+
+def __virtual__():
+    LOADS.append(__grains__.get('kernel'))
+    if __grains__.get('kernel') == 'Linux':
+        return __virtualname__
+    return False, 'not linux'
+
+def kernel():
+    return __grains__['kernel']
+
+def opt():
+    return __opts__.get('refreshme_opt')
+'''
+
+@pytest.fixture
+def refresh_loader(tmpdir):
+    mod_file = tmpdir.join('refreshme_mod.py')
+    mod_file.write(VIRTUAL_MOD)
+    opts = {'grains': {'kernel': 'Linux', 'os': 'Arch'}, 'refreshme_opt': 1,
+            'optimization_order': [0, 1, 2]}
+    loader = L.LazyLoader([str(tmpdir)], opts, tag='module', virtual_funcs=[])
+    return loader, mod_file
+
+def test_refresh_pack_keeps_modules(refresh_loader):
+    loader, _ = refresh_loader
+    assert loader['refreshme.kernel']() == 'Linux'
+    mod = loader.module_state['refreshme_mod']['mod']
+
+    # an unrelated grain changes: the module is kept, but sees the new values
+    stale = loader.refresh_pack({'grains': {'kernel': 'Linux', 'os': 'Gentoo'},
+                                 'refreshme_opt': 2, 'optimization_order': [0, 1, 2]})
+    assert stale == []
+    assert mod.LOADS == ['Linux']
+    assert loader['refreshme.opt']() == 2
+    assert loader['refreshme.kernel']() == 'Linux'
+
+def test_refresh_pack_reevaluates_virtual(refresh_loader):
+    loader, _ = refresh_loader
+    assert loader['refreshme.kernel']() == 'Linux'
+
+    stale = loader.refresh_pack({'grains': {'kernel': 'Windows'}, 'optimization_order': [0, 1, 2]})
+    assert stale == ['refreshme_mod']
+    assert 'refreshme.kernel' not in loader
+    assert loader.missing_modules['refreshme_mod'] == 'not linux'
+
+    stale = loader.refresh_pack({'grains': {'kernel': 'Linux'}, 'optimization_order': [0, 1, 2]})
+    assert stale == ['refreshme_mod']
+    assert loader['refreshme.kernel']() == 'Linux'
+
+def test_refresh_pack_reloads_changed_files(refresh_loader):
+    loader, mod_file = refresh_loader
+    assert loader['refreshme.kernel']() == 'Linux'
+
+    mod_file.write(VIRTUAL_MOD + '\ndef added():\n    return True\n')
+    st = os.stat(str(mod_file))
+    os.utime(str(mod_file), (st.st_atime, st.st_mtime + 10))
+    stale = loader.refresh_pack({'grains': {'kernel': 'Linux'}, 'optimization_order': [0, 1, 2]})
+    assert stale == ['refreshme_mod']
+    assert loader['refreshme.added']() is True
+
+SNAPSHOT_MODS = {
+    'snap_yes.py': '''
+def __virtual__():
+    return True
+
+def ping():
+    return True
+''',
+    'snap_no.py': '''
+import os
+with open(os.path.join(os.path.dirname(__file__), 'imports.log'), 'a') as fh:
+    fh.write('snap_no\\n')
+
+def __virtual__():
+    if __grains__.get('kernel') == 'Windows':
+        return True
+    return False, 'windows only'
+
+def ping():
+    return True
+''',
+}
+
+@pytest.fixture
+def snapshot_dirs(tmpdir):
+    mod_dir = tmpdir.mkdir('modules')
+    for fname, src in SNAPSHOT_MODS.items():
+        mod_dir.join(fname).write(src)
+    cachedir = tmpdir.mkdir('cache')
+    return str(mod_dir), str(cachedir)
+
+def _snapshot_loader(mod_dir, cachedir, kernel='Linux'):
+    opts = {'grains': {'kernel': kernel}, 'cachedir': cachedir, 'loader_snapshot': True,
+            'optimization_order': [0, 1, 2]}
+    return L.LazyLoader([mod_dir], opts, tag='module')
+
+def _imports(mod_dir):
+    try:
+        with open(os.path.join(mod_dir, 'imports.log')) as fh:
+            return fh.read().split()
+    except IOError:
+        return []
+
+def test_loader_snapshot_skips_virtual_false(snapshot_dirs):
+    mod_dir, cachedir = snapshot_dirs
+
+    loader = _snapshot_loader(mod_dir, cachedir)
+    assert sorted(loader) == ['snap_yes.ping']
+    assert _imports(mod_dir) == ['snap_no']
+    L.save_snapshots()
+    assert os.listdir(os.path.join(cachedir, 'loader_snapshot'))
+
+    # second "startup": the file mapping comes from the snapshot and snap_no is
+    # known not to load, so it is never imported
+    loader = _snapshot_loader(mod_dir, cachedir)
+    loader._refresh_file_mapping = None
+    assert sorted(loader) == ['snap_yes.ping']
+    assert loader.missing_modules['snap_no'] == 'windows only'
+    assert _imports(mod_dir) == ['snap_no']
+
+def test_loader_snapshot_invalidated_by_grains(snapshot_dirs):
+    mod_dir, cachedir = snapshot_dirs
+
+    assert 'snap_no.ping' not in _snapshot_loader(mod_dir, cachedir)
+    L.save_snapshots()
+
+    loader = _snapshot_loader(mod_dir, cachedir, kernel='Windows')
+    assert loader['snap_no.ping']() is True
+    assert _imports(mod_dir) == ['snap_no', 'snap_no']
+
+def test_loader_snapshot_invalidated_by_new_files(snapshot_dirs):
+    mod_dir, cachedir = snapshot_dirs
+
+    assert sorted(_snapshot_loader(mod_dir, cachedir)) == ['snap_yes.ping']
+    L.save_snapshots()
+
+    with open(os.path.join(mod_dir, 'snap_new.py'), 'w') as fh:
+        fh.write('def pong():\n    return True\n')
+    st = os.stat(mod_dir)
+    os.utime(mod_dir, (st.st_atime, st.st_mtime + 10))
+    assert sorted(_snapshot_loader(mod_dir, cachedir)) == ['snap_new.pong', 'snap_yes.ping']
+
+TIERED_GRAINS = '''
+import os
+import time
+
+__grain_tiers__ = {'hardware': 'static', 'network': 'slow'}
+
+def _count(name):
+    with open(os.path.join(os.path.dirname(__file__), name + '.count'), 'a') as fh:
+        fh.write('x')
+
+def hardware():
+    _count('hardware')
+    return {'cpus': 4}
+
+def network():
+    _count('network')
+    return {'fqdns': ['a.example.com']}
+
+def clock():
+    _count('clock')
+    return {'now': time.time()}
+
+def hung():
+    time.sleep(5)
+    return {'hung': True}
+
+def dependent(grains):
+    return {'cpus_seen': grains.get('cpus')}
+
+def dependent_too(grains):
+    return {'cpus_seen_too': grains.get('cpus_seen')}
+
+def slow_dependent(grains):
+    time.sleep(5)
+    return {'slow_dependent': True}
+'''
+
+@pytest.fixture
+def tiered_grains(tmpdir, monkeypatch):
+    grains_dir = tmpdir.mkdir('grains')
+    grains_dir.join('tiered.py').write(TIERED_GRAINS)
+    cachedir = tmpdir.mkdir('cache')
+    opts = {'cachedir': str(cachedir), 'grains_timeout': 0.5, 'optimization_order': [0, 1, 2]}
+    monkeypatch.setattr(L, 'grain_funcs',
+        lambda opts, proxy=None: L.LazyLoader([str(grains_dir)], opts, tag='grains'))
+    monkeypatch.setattr(L, '_SLOW_GRAINS', {})
+    monkeypatch.setattr(L, '_STATIC_GRAINS', None)
+
+    def counts():
+        ret = {}
+        for name in ('hardware', 'network', 'clock'):
+            fname = grains_dir.join(name + '.count')
+            ret[name] = len(fname.read()) if fname.check() else 0
+        return ret
+    return opts, counts
+
+def test_grain_tiers(tiered_grains, monkeypatch):
+    opts, counts = tiered_grains
+
+    t0 = time.time()
+    grains = L.grains(dict(opts))
+    assert time.time() - t0 < 3 # hung() was abandoned
+    assert 'hung' not in grains
+    assert 'slow_dependent' not in grains
+    assert grains['cpus'] == 4
+    assert grains['cpus_seen'] == 4
+    # grain functions taking grains see the grains of the ones before them
+    assert grains['cpus_seen_too'] == 4
+    assert grains['fqdns'] == ['a.example.com']
+    assert counts() == {'hardware': 1, 'network': 1, 'clock': 1}
+    # each grain's own duration, not the phase's (hung() held it up for 0.5s)
+    clock_stat = L.HSS.dat[L.HSS._namespaced('grain.tiered.clock')]
+    assert clock_stat.ring[-1].dur < 0.4
+
+    L.grains(dict(opts))
+    assert counts() == {'hardware': 1, 'network': 1, 'clock': 2}
+
+    # a new process reads the static grains back from the cache, slow grains
+    # are computed again
+    monkeypatch.setattr(L, '_SLOW_GRAINS', {})
+    monkeypatch.setattr(L, '_STATIC_GRAINS', None)
+    assert L.grains(dict(opts))['cpus'] == 4
+    assert counts() == {'hardware': 1, 'network': 2, 'clock': 3}
+
+    L.grains(dict(opts), force_refresh=True)
+    assert counts() == {'hardware': 2, 'network': 3, 'clock': 4}
+
+def test_run_grain_funcs_concurrently():
+    def _sleeper(amount):
+        time.sleep(amount)
+        return {'slept': amount}
+    def _broken():
+        raise Exception('broken grain')
+
+    calls = [('s{0}'.format(i), _sleeper, {'amount': 0.3}) for i in range(4)]
+    calls.append(('broken', _broken, {}))
+    t0 = time.time()
+    results = L._run_grain_funcs(calls, workers=8, timeout=5)
+    assert time.time() - t0 < 1
+    assert sorted(results) == ['s0', 's1', 's2', 's3']
+    assert results['s0'][0] == {'slept': 0.3}
+    _, start, end = results['s0']
+    assert 0.3 <= end - start < 0.9
+
+def test_run_grain_funcs_serial_timeout():
+    def _sleeper(amount):
+        time.sleep(amount)
+        return {'slept': amount}
+    calls = [('slow', _sleeper, {'amount': 5}), ('fast', dict, {'a': 1})]
+    t0 = time.time()
+    results = L._run_grain_funcs(calls, workers=1, timeout=0.3)
+    assert time.time() - t0 < 2
+    assert list(results) == ['fast']
+
+def test_nova_profiles_load_lazily_and_cache(tmpdir, monkeypatch):
+    profile_dir = tmpdir.mkdir('profiles')
+    profile_dir.mkdir('cis').join('one.yaml').write('stat:\n  a: 1\ngrep:\n  b: 2\n')
+    profile_dir.join('broken.yaml').write('stat: [\n')
+    loads = list()
+    real_safe_load = L.yaml.safe_load
+    def _safe_load(fh):
+        loads.append(fh.name)
+        return real_safe_load(fh)
+    monkeypatch.setattr(L.yaml, 'safe_load', _safe_load)
+
+    missing = dict()
+    profiles = L.NovaProfiles([str(profile_dir)], missing=missing)
+    assert sorted(profiles) == ['/broken.yaml', '/cis/one.yaml']
+    assert loads == []
+
+    assert profiles.sections('/cis/one.yaml') == {'stat', 'grep'}
+    assert profiles.get_sections('/cis/one.yaml', ('stat', 'pkg')) == {'stat': {'a': 1}}
+    profiles['/cis/one.yaml']['stat']['a'] = 'changed' # items are copies
+    assert L.NovaProfiles([str(profile_dir)])['/cis/one.yaml']['stat']['a'] == 1
+    assert len(loads) == 1
+
+    with pytest.raises(KeyError):
+        profiles.sections('/broken.yaml')
+    assert '/broken.yaml' in missing
+
+    one = profile_dir.join('cis', 'one.yaml')
+    one.write('pkg:\n  c: 3\n')
+    st = os.stat(str(one))
+    os.utime(str(one), (st.st_atime, st.st_mtime + 10))
+    assert profiles.sections('/cis/one.yaml') == {'pkg'}
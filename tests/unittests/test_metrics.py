@@ -0,0 +1,80 @@
+# coding: utf-8
+
+import json
+import socket
+from types import SimpleNamespace
+
+import pytest
+
+import hubblestack.metrics
+import hubblestack.runtime
+import hubblestack.status
+from hubblestack.hec.obj import HEC, OutageInfo
+
+@pytest.fixture
+def hubble_status(monkeypatch):
+    monkeypatch.setattr(hubblestack.status.HubbleStatus, 'dat', dict())
+    monkeypatch.setattr(hubblestack.status.HubbleStatus, 'gauges', dict())
+    monkeypatch.setattr(HEC, 'fails', {'https://hec:8088': 12})
+    monkeypatch.setattr(HEC, 'outages', {'https://hec:8088': OutageInfo()})
+    monkeypatch.setattr(HEC, 'queues', dict())
+    # hec2 is configured but hasn't failed (or been tried) yet
+    servers = [ SimpleNamespace(uri='https://hec:8088'), SimpleNamespace(uri='https://hec2:8088') ]
+    monkeypatch.setattr(HEC, 'flushers', {'queue': SimpleNamespace(server_uri=servers)})
+    hs = hubblestack.status.HubbleStatus('x', 'job')
+    hs.mark('job').fin()
+    hs.gauge('pulsar_watches', 42)
+    return hs
+
+def test_prometheus(hubble_status):
+    text = hubblestack.metrics.as_prometheus()
+    lines = text.splitlines()
+    assert '# TYPE hubble_status_count gauge' in lines
+    assert 'hubble_status_count{resource="x.job"} 1.0' in lines
+    assert any(l.startswith('hubble_status_dur_quantile_seconds{quantile="0.99",resource="x.job"} ')
+               for l in lines)
+    assert 'hubble_alive{state="yes"} 1.0' in lines
+    assert 'hubble_pulsar_watches 42.0' in lines
+    assert 'hubble_hec_fails{uri="https://hec:8088"} 12.0' in lines
+    assert 'hubble_hec_outage{uri="https://hec:8088"} 1.0' in lines
+    assert 'hubble_hec_fails{uri="https://hec2:8088"} 0.0' in lines
+    assert 'hubble_hec_outage{uri="https://hec2:8088"} 0.0' in lines
+
+def test_nothing_marked(monkeypatch):
+    monkeypatch.setattr(hubblestack.status.HubbleStatus, 'dat', dict())
+    stats = hubblestack.metrics.collect()
+    assert set(stats) == {'GAUGES', 'HEC'}
+    assert hubblestack.metrics.as_prometheus(stats)
+
+def _get(path, sock_path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(sock_path)
+    sock.sendall('GET {0} HTTP/1.0\r\n\r\n'.format(path).encode())
+    resp = b''
+    while True:
+        dat = sock.recv(4096)
+        if not dat:
+            break
+        resp += dat
+    sock.close()
+    head, body = resp.decode().split('\r\n\r\n', 1)
+    return head.split('\r\n')[0], body
+
+def test_unix_socket_server(hubble_status, tmp_path, monkeypatch):
+    sock_path = str(tmp_path / 'metrics.sock')
+    monkeypatch.setattr(hubblestack.runtime, '_CURRENT', hubblestack.runtime.current())
+    hubblestack.runtime.publish({'hubble_status': {'metrics_socket': sock_path}}, {})
+    server = hubblestack.metrics.start()
+    try:
+        assert server is not None
+        assert hubblestack.metrics.start() is server
+        status, body = _get('/metrics', sock_path)
+        assert status.endswith('200 OK')
+        assert 'hubble_status_count{resource="x.job"} 1.0' in body
+        status, body = _get('/status.json', sock_path)
+        assert json.loads(body)['GAUGES'] == {'pulsar_watches': 42}
+        status, _ = _get('/nope', sock_path)
+        assert ' 404 ' in status
+    finally:
+        hubblestack.metrics.stop()
+    assert not (tmp_path / 'metrics.sock').exists()
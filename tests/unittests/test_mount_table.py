@@ -0,0 +1,49 @@
+# coding: utf-8
+
+import select
+
+import pytest
+
+import hubblestack.modules.mount as mount
+
+class FakePoller(object):
+    def __init__(self):
+        self.events = list()
+    def poll(self, timeout):
+        events, self.events = self.events, list()
+        return events
+
+@pytest.fixture
+def parses(monkeypatch):
+    calls = list()
+    def _active_mounts(ret):
+        calls.append(1)
+        ret['/tmp'] = {'device': 'tmpfs', 'fstype': 'tmpfs', 'opts': ['rw', 'nosuid', 'nodev']}
+        ret['/var/tmp'] = {'device': 'tmpfs', 'fstype': 'tmpfs', 'opts': ['rw']}
+        return ret
+    monkeypatch.setattr(mount, '__grains__', {'os': 'CentOS', 'kernel': 'Linux'}, raising=False)
+    monkeypatch.setattr(mount, '_active_mounts', _active_mounts)
+    monkeypatch.setattr(mount, '_MOUNT_TABLE', mount._MountTable())
+    yield calls
+    mount._MOUNT_TABLE.close()
+
+def test_parsed_once(parses):
+    assert mount.active()['/tmp']['opts'] == ['rw', 'nosuid', 'nodev']
+    # callers get copies of the cached table
+    mount.active()['/tmp']['opts'].append('noexec')
+    assert mount.active()['/tmp']['opts'] == ['rw', 'nosuid', 'nodev']
+    assert mount.mounted_on('tmpfs') == ['/tmp', '/var/tmp']
+    assert mount.mounted_on('/dev/sda1') == []
+    assert len(parses) == 1
+
+def test_mount_table_changed(parses):
+    mount.active()
+    assert mount._MOUNT_TABLE.poller is not None
+    poller = mount._MOUNT_TABLE.poller = FakePoller()
+    poller.events = [(mount._MOUNT_TABLE.fh.fileno(), select.POLLIN)]
+    mount.active()
+    assert len(parses) == 1
+    poller.events = [(mount._MOUNT_TABLE.fh.fileno(), select.POLLIN | select.POLLPRI | select.POLLERR)]
+    mount.active()
+    mount.active()
+    assert len(parses) == 2
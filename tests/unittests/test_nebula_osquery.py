@@ -68,3 +68,44 @@ class TestNebula():
         assert 'data' in os_info[0]['os_info']
         assert 'version' in os_info[0]['os_info']['data'][0]
         assert __grains__['os'] in os_info[0]['os_info']['data'][0]['name']
+
+def test_streamed_results(tmp_path, monkeypatch):
+    import hubblestack.modules.nebula_osquery as nebula
+    from hubblestack.utils.osquery_lib import OsqueryRows
+    from hubblestack.utils.osquery_mask import compile_mask
+    rows = [{'pid': str(i), 'name': 'proc{0}'.format(i),
+             'environment': '__JSONIFY__' + json.dumps([{'variable_name': 'DB_PASSWORD', 'value': 'hunter2'},
+                                                        {'variable_name': 'HOME', 'value': '/root'}])}
+            for i in range(500)]
+    out = tmp_path / 'out.json'
+    out.write_text(json.dumps(rows, indent=2))
+    osqueryi = tmp_path / 'osqueryi'
+    osqueryi.write_text('#!/bin/sh\ncat {0}\n'.format(out))
+    osqueryi.chmod(0o755)
+    monkeypatch.setattr(nebula, '__grains__', {'osquerybinpath': str(osqueryi)}, raising=False)
+    monkeypatch.setattr(nebula, '__opts__', {}, raising=False)
+    monkeypatch.setattr(OsqueryRows, 'chunk_size', 1000)
+    mask = compile_mask({'mask_with': 'MASKED', 'blacklisted_objects': [
+        {'query_names': ['running_procs'], 'column': 'environment', 'attribute_to_check': 'variable_name',
+         'attributes_to_mask': ['value'], 'blacklisted_patterns': ['DB_PASSWORD'],
+         'enable_global_masking': True}]})
+    monkeypatch.setattr(nebula, '_load_mask', lambda topfile: mask)
+
+    success, _timing, ret = nebula._run_osquery_queries(
+        {'running_procs': {'query': 'select * from processes'}}, False, stream=True)
+    assert success
+    ret = nebula._update_osquery_results(ret)
+    nebula._mask_object(ret, None)
+    data = ret[0]['running_procs']['data']
+    assert isinstance(data, OsqueryRows) and data
+    for _ in range(2): # re-iterable, one pass per returner
+        got = list(data)
+        assert [r['pid'] for r in got] == [r['pid'] for r in rows]
+        assert got[7]['environment'] == [{'variable_name': 'DB_PASSWORD', 'value': 'MASKED'},
+                                         {'variable_name': 'HOME', 'value': '/root'}]
+
+    out.write_text('[\n\n]\n')
+    _success, _timing, ret = nebula._run_osquery_queries(
+        {'running_procs': {'query': 'select * from processes'}}, False, stream=True)
+    assert not ret[0]['running_procs']['data']
+    assert list(ret[0]['running_procs']['data']) == []
@@ -0,0 +1,97 @@
+# coding: utf-8
+
+import os
+
+import pytest
+
+import hubblestack.files.hubblestack_nova.oval_scanner as oval_scanner
+
+OVAL = b'''<?xml version="1.0" encoding="UTF-8"?>
+<oval_definitions xmlns="http://oval.mitre.org/XMLSchema/oval-definitions-5"
+    xmlns:oval="http://oval.mitre.org/XMLSchema/oval-common-5"
+    xmlns:linux-def="http://oval.mitre.org/XMLSchema/oval-definitions-5#linux">
+  <generator><oval:product_name>test</oval:product_name></generator>
+  <definitions>
+    <definition class="patch" id="oval:def:1" version="1">
+      <metadata>
+        <title>RHSA-2020:0001: openssl security update (Important)</title>
+        <reference ref_id="RHSA-2020:0001" ref_url="https://access.redhat.com/errata/RHSA-2020:0001" source="RHSA"/>
+        <reference ref_id="CVE-2020-1" ref_url="https://access.redhat.com/security/cve/CVE-2020-1" source="CVE"/>
+        <advisory><severity>Important</severity><ref>https://example.com/adv</ref></advisory>
+      </metadata>
+      <criteria operator="AND">
+        <criterion comment="openssl is earlier than 1:1.0.2k-19.el7" test_ref="oval:tst:1"/>
+        <criteria operator="OR">
+          <criterion comment="libs are earlier than 1.2" test_ref="oval:tst:2"/>
+        </criteria>
+      </criteria>
+    </definition>
+    <definition class="patch" id="oval:def:2" version="1">
+      <metadata><title>kernel update</title></metadata>
+      <criteria><criterion comment="kernel" test_ref="oval:tst:3"/></criteria>
+    </definition>
+  </definitions>
+  <tests>
+    <linux-def:rpminfo_test check="at least one" comment="openssl" id="oval:tst:1" version="1">
+      <linux-def:object object_ref="oval:obj:1"/><linux-def:state state_ref="oval:ste:1"/>
+    </linux-def:rpminfo_test>
+    <linux-def:rpminfo_test check="at least one" comment="libs" id="oval:tst:2" version="1">
+      <linux-def:object object_ref="oval:obj:2"/><linux-def:state state_ref="oval:ste:2"/>
+    </linux-def:rpminfo_test>
+    <linux-def:rpminfo_test check="at least one" comment="kernel" id="oval:tst:3" version="1">
+      <linux-def:object object_ref="oval:obj:3"/>
+    </linux-def:rpminfo_test>
+  </tests>
+  <objects>
+    <linux-def:rpminfo_object id="oval:obj:1" version="1"><linux-def:name>openssl</linux-def:name></linux-def:rpminfo_object>
+    <linux-def:rpminfo_object id="oval:obj:2" version="1"><linux-def:name var_ref="oval:var:1"/></linux-def:rpminfo_object>
+    <linux-def:rpminfo_object id="oval:obj:3" version="1"><linux-def:name>kernel</linux-def:name></linux-def:rpminfo_object>
+  </objects>
+  <states>
+    <linux-def:rpminfo_state id="oval:ste:1" version="1"><linux-def:evr datatype="evr_string" operation="less than">1:1.0.2k-19.el7</linux-def:evr></linux-def:rpminfo_state>
+    <linux-def:rpminfo_state id="oval:ste:2" version="1"><linux-def:evr datatype="evr_string" operation="less than">1.2</linux-def:evr></linux-def:rpminfo_state>
+  </states>
+  <variables>
+    <constant_variable comment="libs" datatype="string" id="oval:var:1" version="1"><value>libfoo</value><value>libbar</value></constant_variable>
+  </variables>
+</oval_definitions>
+'''
+
+VULNS = {'oval:def:1': {
+    'title': 'RHSA-2020:0001: openssl security update (Important)',
+    'rhsa': {'RHSA-2020:0001': 'https://access.redhat.com/errata/RHSA-2020:0001'},
+    'cve': [{'CVE-2020-1': 'https://access.redhat.com/security/cve/CVE-2020-1'}],
+    'severity': 'Important', 'advisories': ['https://example.com/adv'],
+    'pkg': [{'name': 'openssl', 'version': '1:1.0.2k-19.el7'},
+            {'name': 'libfoo', 'version': '1.2'}, {'name': 'libbar', 'version': '1.2'}]}}
+
+@pytest.fixture
+def oval_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(oval_scanner, '__opts__', {'cachedir': str(tmp_path / 'cache')}, raising=False)
+    path = tmp_path / 'com.redhat.rhsa-RHEL7.xml'
+    path.write_bytes(OVAL)
+    return path
+
+def test_parse_oval(oval_file):
+    # the definition without a state has no packages and is left out
+    assert oval_scanner.parse_oval(str(oval_file)) == VULNS
+
+def test_get_vulns_cached(oval_file, monkeypatch):
+    get_vulns = lambda: oval_scanner.get_vulns('redhat', '7', None, None, None, str(oval_file))
+    assert get_vulns() == VULNS
+    cache_dir = os.path.join(oval_scanner.__opts__['cachedir'], 'oval')
+    assert len(os.listdir(cache_dir)) == 1
+
+    with monkeypatch.context() as mpc:
+        mpc.setattr(oval_scanner, 'parse_oval', None)
+        assert get_vulns() == VULNS
+
+    # a new version of the source is parsed again and replaces the old cache
+    oval_file.write_bytes(OVAL.replace(b'1:1.0.2k-19.el7', b'1:1.0.2k-20.el7'))
+    assert get_vulns()['oval:def:1']['pkg'][0] == {'name': 'openssl', 'version': '1:1.0.2k-20.el7'}
+    assert len(os.listdir(cache_dir)) == 1
+
+def test_filter_vulns():
+    vulns = oval_scanner.filter_vulns(VULNS, {'libbar': '1.1', 'bash': '4.2'})
+    assert vulns['oval:def:1']['pkg'] == [{'name': 'libbar', 'version': '1.2'}]
+    assert oval_scanner.filter_vulns(VULNS, {'bash': '4.2'}) == {}
@@ -554,3 +554,29 @@ class TestReadfile():
         assert status == True
         # encoded Foobar
         assert ret == 'Rm9vYmFy'
+
+    def test_config_ParsedOnce_ReturnsCopies(self, tmp_path, monkeypatch):
+        """
+        Test that a file is parsed once per set of arguments, and again when it changes
+        """
+        config_file = tmp_path / 'sshd_config'
+        config_file.write_text("PermitRootLogin no\nProtocol 2\n# comment\n")
+        config_file = str(config_file)
+        parses = []
+        lines_as_dict = hubblestack.fdg.readfile._lines_as_dict
+        monkeypatch.setattr(hubblestack.fdg.readfile, '_PARSED', dict())
+        monkeypatch.setattr(hubblestack.fdg.readfile, '_lines_as_dict',
+                            lambda *args: parses.append(args) or lines_as_dict(*args))
+        for _ in range(3):
+            status, ret = hubblestack.fdg.readfile.config(config_file, ignore_pattern='#', dictsep=' ')
+            assert status and ret == {'PermitRootLogin': 'no', 'Protocol': '2'}
+            ret['Protocol'] = '1'
+        assert len(parses) == 1
+        hubblestack.fdg.readfile.config(config_file, pattern='Protocol', dictsep=' ')
+        assert len(parses) == 2
+
+        with open(config_file, 'a') as cfile:
+            cfile.write("X11Forwarding no\n")
+        status, ret = hubblestack.fdg.readfile.config(config_file, ignore_pattern='#', dictsep=' ')
+        assert ret == {'PermitRootLogin': 'no', 'Protocol': '2', 'X11Forwarding': 'no'}
+        assert len(parses) == 3
@@ -0,0 +1,90 @@
+# coding: utf-8
+
+import json
+import http.server
+import threading
+
+import pytest
+
+from hubblestack.returners.common.delivery import HTTPSender, make_sender
+
+class Collector(http.server.BaseHTTPRequestHandler):
+    status = 200
+    requests = list()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        Collector.requests.append((self.path, self.headers['Content-Type'], body.decode()))
+        self.send_response(Collector.status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *_a):
+        pass
+
+@pytest.fixture
+def endpoint():
+    Collector.requests = list()
+    Collector.status = 200
+    server = http.server.HTTPServer(('127.0.0.1', 0), Collector)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield 'http://127.0.0.1:{0}'.format(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+def test_array_batches(endpoint):
+    sender = HTTPSender(endpoint + '/hubble/nebula', batch_format='array', batch_bytes=80, timeout=5)
+    for i in range(5):
+        sender.send({'event': i, 'pad': 'x' * 10})
+    sender.flush()
+    events = [ e['event'] for path, ctype, body in Collector.requests for e in json.loads(body) ]
+    assert events == [0, 1, 2, 3, 4]
+    assert 1 < len(Collector.requests) < 5
+    assert all(r[0] == '/hubble/nebula' and r[1] == 'application/json' for r in Collector.requests)
+
+def test_ndjson_and_none(endpoint):
+    sender = make_sender(endpoint + '/', {'timeout': 5}, batch_format='ndjson')
+    sender.send({'a': 1})
+    sender.send('{"a": 2}')
+    sender.flush()
+    assert Collector.requests == [('/', 'application/x-ndjson', '{"a": 1}\n{"a": 2}\n')]
+
+    sender = make_sender(endpoint + '/gelf', {'timeout': 5, 'batch_format': 'none'})
+    sender.send({'b': 1})
+    sender.send({'b': 2})
+    assert [ json.loads(r[2]) for r in Collector.requests[1:] ] == [{'b': 1}, {'b': 2}]
+
+def test_disk_queue_during_outage(endpoint, tmp_path):
+    sender = HTTPSender(endpoint + '/', batch_format='ndjson', timeout=5, disk_queue=str(tmp_path))
+    Collector.status = 503
+    sender.send({'c': 1})
+    sender.flush()
+    assert sender.queued == 1 and sender.queue.cn == 1
+
+    Collector.status = 200
+    sender.send({'c': 2})
+    sender.flush()
+    bodies = [ r[2] for r in Collector.requests if r[2] ]
+    assert bodies[-2:] == ['{"c": 1}\n', '{"c": 2}\n']
+    assert sender.queue.cn == 0
+
+def test_verify_options(endpoint, monkeypatch):
+    assert make_sender(endpoint + '/', {}).verify is True
+    assert make_sender(endpoint + '/', {'verify': False}).verify is False
+    assert make_sender(endpoint + '/', {'http_input_server_ssl': False}).verify is False
+    assert make_sender(endpoint + '/', {'indexer_ssl': False}).verify is False
+    assert make_sender(endpoint + '/', {'gelfhttp_ssl': False, 'verify': None}).verify is False
+    assert make_sender(endpoint + '/', {'verify': '/etc/ssl/ca.pem', 'indexer_ssl': True}).verify == '/etc/ssl/ca.pem'
+
+    sender = make_sender(endpoint + '/', {'timeout': 5, 'indexer_ssl': False})
+    posted = list()
+    post = sender.session.post
+    def _post(*a, **kw):
+        posted.append(kw['verify'])
+        return post(*a, **kw)
+    monkeypatch.setattr(sender.session, 'post', _post)
+    sender.send({'d': 1})
+    sender.flush()
+    assert posted == [False]
@@ -0,0 +1,131 @@
+# coding: utf-8
+
+import threading
+
+import pytest
+
+import hubblestack.daemon
+import hubblestack.loader
+import hubblestack.log
+import hubblestack.runtime
+import hubblestack.utils.stdrec
+
+GRAINS = {'id': 'host1', 'fqdn': 'host1.example.com', 'local_ip4': '10.0.0.1', 'ipv4': ['10.0.0.1'],
+          'system_uuid': 'uuid1'}
+
+@pytest.fixture(autouse=True)
+def runtime(monkeypatch):
+    # whatever the tests publish is forgotten afterwards
+    monkeypatch.setattr(hubblestack.runtime, '_CURRENT', hubblestack.runtime.current())
+
+def test_publish():
+    before = hubblestack.runtime.current()
+    ctx = hubblestack.runtime.publish({'id': 'host1'}, GRAINS)
+    assert hubblestack.runtime.current() is ctx
+    assert ctx.generation == before.generation + 1
+    assert ctx.grains is GRAINS and ctx.mods == {} and ctx.returners == {}
+    with pytest.raises(AttributeError):
+        ctx.grains = {}
+    assert hubblestack.runtime.publish({}, {}).generation == ctx.generation + 1
+
+def test_refresh_during_job(monkeypatch):
+    returned = []
+
+    def make_returner(name):
+        return lambda ret: returned.append((name, ret['id'], ret['return']))
+
+    def long_job():
+        # a refresh happens while the job runs
+        hubblestack.runtime.publish({'id': 'host2', 'log_level': 'info'}, dict(GRAINS, id='host2'),
+                                    mods={'test.job': long_job},
+                                    returners={'test.returner': make_returner('new')})
+        return hubblestack.utils.stdrec.std_info(ctx)['minion_id']
+
+    ctx = hubblestack.runtime.publish({'id': 'host1', 'log_level': 'info'}, GRAINS,
+                                      mods={'test.job': long_job},
+                                      returners={'test.returner': make_returner('old')})
+    hubblestack.daemon._execute_function({}, 'test.job', ['test'], [], {})
+    # the job returned through the returners, with the grains, of its start
+    assert returned == [('old', 'host1', 'host1')]
+    assert hubblestack.runtime.current().grains['id'] == 'host2'
+
+@pytest.fixture
+def daemon_state(monkeypatch):
+    """ a daemon whose refresh_grains builds fake loaders """
+    loads = []
+
+    def make_loader(kind):
+        def _loader(*args, **kwargs):
+            loader = {'config.get': lambda *args: False}
+            loads.append((kind, loader))
+            return loader
+        return _loader
+
+    opts = {'id': 'host1', 'log_level': 'info', 'schedule': {'job': {'function': 'test.job'}}}
+    monkeypatch.setattr(hubblestack.daemon, '__opts__', opts)
+    for name in ('__grains__', '__utils__', '__mods__', '__returners__', '__pillar__'):
+        monkeypatch.setattr(hubblestack.daemon, name, {}, raising=False)
+    monkeypatch.setattr(hubblestack.daemon, '__context__', {}, raising=False)
+    monkeypatch.setattr(hubblestack.loader, 'grains',
+                        lambda opts, **kwargs: dict(GRAINS, id='host{0}'.format(len(loads) // 3 + 1)))
+    for kind in ('utils', 'modules', 'returners'):
+        monkeypatch.setattr(hubblestack.loader, kind, make_loader(kind))
+    monkeypatch.setattr(hubblestack.daemon.HSS, 'start_sigusr1_signal_handler', lambda: None)
+    monkeypatch.setattr(hubblestack.log, 'refresh_handler_std_info', lambda: None)
+    return opts, loads
+
+def test_refresh_loaders_during_job(daemon_state, monkeypatch):
+    opts, loads = daemon_state
+    returned = []
+
+    def job():
+        ctx = hubblestack.runtime.current()
+        hubblestack.daemon.refresh_grains()
+        # the daemon's own opts keep changing
+        opts['schedule']['job']['last_run'] = 1
+        assert hubblestack.runtime.current().mods is not ctx.mods
+        return dict(ctx.opts['schedule']['job'])
+
+    hubblestack.daemon.refresh_grains(initial=True)
+    ctx = hubblestack.runtime.current()
+    # the grains aren't copied into the context's opts, but loaders get them
+    assert 'grains' not in ctx.opts and ctx.grains is opts['grains']
+    assert ctx.loader_opts()['grains'] is ctx.grains
+    ctx.mods['test.job'] = job
+    ctx.returners['test.returner'] = lambda ret: returned.append((ret['id'], ret['return']))
+    hubblestack.daemon._execute_function({}, 'test.job', ['test'], [], {})
+    # the job ran with, and returned through, the loaders and opts of its start
+    assert returned == [('host1', {'function': 'test.job'})]
+    assert hubblestack.runtime.current().grains['id'] == 'host2'
+    assert len(loads) == 6
+
+    # refreshed in place, the loaders are shared by the generations
+    opts['incremental_loader_refresh'] = True
+    refreshed = []
+    monkeypatch.setattr(hubblestack.daemon, '_refresh_loaders', lambda: refreshed.append(1))
+    before = hubblestack.runtime.current()
+    hubblestack.daemon.refresh_grains()
+    after = hubblestack.runtime.current()
+    assert refreshed and len(loads) == 6
+    assert after.mods is before.mods and after.opts is not before.opts
+
+def test_concurrent_refresh():
+    started, stop = threading.Event(), threading.Event()
+    seen = []
+
+    def job():
+        ctx = hubblestack.runtime.current()
+        started.set()
+        while not stop.is_set():
+            seen.append((ctx.generation, hubblestack.utils.stdrec.std_info(ctx)['minion_id'],
+                         ctx.opts['id']))
+
+    first = hubblestack.runtime.publish({'id': 'gen1'}, dict(GRAINS, id='gen1'))
+    thread = threading.Thread(target=job)
+    thread.start()
+    started.wait(5)
+    for i in range(2, 50):
+        hubblestack.runtime.publish({'id': 'gen{0}'.format(i)}, dict(GRAINS, id='gen{0}'.format(i)))
+    stop.set()
+    thread.join(5)
+    assert seen and set(seen) == {(first.generation, 'gen1', 'gen1')}
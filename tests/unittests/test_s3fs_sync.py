@@ -0,0 +1,103 @@
+# coding: utf-8
+
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import urlparse, unquote
+
+import pytest
+
+import hubblestack.fileserver.s3fs as hs_s3fs
+import hubblestack.utils.s3
+
+class StubS3(BaseHTTPRequestHandler):
+    """ just enough of the S3 path-style list/GET protocol """
+    objects = dict()
+    requests = list()
+    page_size = 3
+
+    def log_message(self, *a):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        bucket, _, key = url.path.lstrip('/').partition('/')
+        key = unquote(key)
+        self.requests.append(('GET', key or 'LIST'))
+        if not key:
+            marker = dict(p.split('=', 1) for p in url.query.split('&') if '=' in p).get('marker', '')
+            keys = sorted(k for k in self.objects if k > unquote(marker))
+            page = keys[:self.page_size]
+            body = '<ListBucketResult><Name>{0}</Name><IsTruncated>{1}</IsTruncated>'.format(
+                bucket, 'true' if len(keys) > len(page) else 'false')
+            for k in page:
+                body += ('<Contents><Key>{0}</Key><LastModified>2020-01-01T00:00:00.000Z</LastModified>'
+                         '<ETag>"{1}"</ETag><Size>{2}</Size></Contents>').format(
+                             k, hashlib.md5(self.objects[k]).hexdigest(), len(self.objects[k]))
+            body = (body + '</ListBucketResult>').encode()
+        elif key in self.objects:
+            body = self.objects[key]
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.requests.append(('HEAD', self.path))
+        self.send_response(405)
+        self.end_headers()
+
+@pytest.fixture
+def stub_s3(tmp_path, monkeypatch):
+    StubS3.objects = {'base/top.nova': b'base:\n  "*":\n    - cis\n'}
+    StubS3.objects.update(('base/cis/check{0}.yaml'.format(i), 'check: {0}\n'.format(i).encode())
+                          for i in range(10))
+    StubS3.requests = list()
+    server = HTTPServer(('127.0.0.1', 0), StubS3)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    opts = {'cachedir': str(tmp_path), 's3.buckets': ['hubble'], 's3.keyid': 'AKIDEXAMPLE',
+            's3.key': 'secret', 's3.location': 'us-east-1', 's3.path_style': True,
+            's3.https_enable': False, 's3.cache_expire': 0, 's3.sync_workers': 4,
+            's3.service_url': '127.0.0.1:{0}'.format(server.server_port),
+            'file_ignore_regex': None, 'file_ignore_glob': None}
+    monkeypatch.setattr(hs_s3fs, '__opts__', opts, raising=False)
+    monkeypatch.setattr(hs_s3fs, '__utils__', {'s3.query': hubblestack.utils.s3.query}, raising=False)
+    monkeypatch.setattr(hs_s3fs, '_SYNC_INDEX', {'mtime': None, 'index': None})
+    hubblestack.utils.s3.query.cache_clear()
+    yield tmp_path
+    hubblestack.utils.s3.query.cache_clear()
+    server.shutdown()
+
+def _gets(kind='GET'):
+    return [key for method, key in StubS3.requests if method == kind and key != 'LIST']
+
+def test_sync(stub_s3):
+    hs_s3fs.update()
+    assert sorted(_gets()) == sorted(StubS3.objects)
+    assert StubS3.requests.count(('GET', 'LIST')) == 4 # 11 objects, 3 per page
+    cached = stub_s3 / 's3cache' / 'base' / 'hubble' / 'base' / 'cis' / 'check7.yaml'
+    assert cached.read_bytes() == b'check: 7\n'
+    assert (stub_s3 / 's3cache' / 'sync_index.cache').exists()
+
+    # nothing changed: no HEADs, no GETs, and the index answers file_hash
+    StubS3.requests = list()
+    hubblestack.utils.s3.query.cache_clear()
+    hs_s3fs.update()
+    assert _gets() == [] and _gets('HEAD') == []
+    fnd = {'bucket': 'hubble', 'path': 'base/cis/check7.yaml'}
+    assert hs_s3fs.file_hash({'saltenv': 'base'}, fnd)['hsum'] == hashlib.md5(b'check: 7\n').hexdigest()
+
+    # one object changed upstream, one local copy was tampered with
+    StubS3.objects['base/cis/check3.yaml'] = b'check: three\n'
+    (stub_s3 / 's3cache' / 'base' / 'hubble' / 'base' / 'cis' / 'check5.yaml').write_bytes(b'nope\n')
+    StubS3.requests = list()
+    hubblestack.utils.s3.query.cache_clear()
+    hs_s3fs.update()
+    assert sorted(_gets()) == ['base/cis/check3.yaml', 'base/cis/check5.yaml']
+    assert (stub_s3 / 's3cache' / 'base' / 'hubble' / 'base' / 'cis' / 'check5.yaml').read_bytes() == b'check: 5\n'
@@ -0,0 +1,66 @@
+# coding: utf-8
+
+import logging
+import threading
+
+import pytest
+
+import hubblestack.log.splunk
+import hubblestack.runtime
+
+class FakeHEC(object):
+    def __init__(self):
+        self.batches = list()
+        self.pending = list()
+        self.flushed = threading.Event()
+
+    def batchEvent(self, payload, eventtime='', no_queue=False):
+        self.pending.append(payload)
+
+    def flushBatch(self):
+        self.batches.append(self.pending)
+        self.pending = list()
+        self.flushed.set()
+
+@pytest.fixture
+def handler(monkeypatch):
+    monkeypatch.setattr(hubblestack.runtime, '_CURRENT', hubblestack.runtime.current())
+    hubblestack.runtime.publish({'splunk_log_queue_size': 5, 'splunk_log_batch_size': 3,
+                                 'splunk_log_flush_interval': 0.2}, {})
+    monkeypatch.setattr(hubblestack.log.splunk, 'get_splunk_options', lambda: [])
+    h = hubblestack.log.splunk.SplunkHandler()
+    hec = FakeHEC()
+    h.endpoint_list.append([hec, {'minion_id': 'test'}, {'index': 'hubble'}])
+    yield h, hec
+    h.close()
+
+def _record(msg, name='hubblestack.test'):
+    record = logging.LogRecord(name, logging.ERROR, __file__, 1, msg, (), None)
+    record.message = record.getMessage()
+    return record
+
+def test_splunk_handler_batches_in_background(handler):
+    h, hec = handler
+    for i in range(3):
+        assert h.emit(_record('msg{0}'.format(i)))
+    assert hec.flushed.wait(5)
+    messages = [ p['event']['message'] for p in hec.batches[0] ]
+    assert messages == ['msg0', 'msg1', 'msg2']
+    assert hec.batches[0][0]['event']['minion_id'] == 'test'
+    assert hec.batches[0][0]['index'] == 'hubble'
+
+def test_splunk_handler_filters_loops(handler):
+    h, hec = handler
+    assert h.emit(_record('nope', name='hubblestack.hec.obj')) is False
+    assert h.queue.qsize() == 0
+
+def test_splunk_handler_drops_on_overflow_and_drains_on_close(handler):
+    h, hec = handler
+    h._start_flusher = lambda: None # no flusher, so the queue fills up
+    for i in range(7):
+        h.emit(_record('msg{0}'.format(i)))
+    assert h.dropped == 2
+    h.close()
+    messages = [ p['event']['message'] for b in hec.batches for p in b ]
+    assert messages == ['msg0', 'msg1', 'msg2', 'msg3', 'msg4']
+    assert h.dropped == 0 and h.sent == 5
@@ -0,0 +1,99 @@
+# coding: utf-8
+
+import time
+
+import pytest
+
+import hubblestack.returners.sqlite as sqlite_ret
+
+AUDIT = {'fun': 'hubble.audit', 'fun_args': ['cve.scan-v2'], 'id': 'hostname.here',
+         'jid': '20180117091736565184',
+         'return': {'Compliance': '50%',
+                    'Failure': [{'ruby2.3-2.3.3-2~16.04.5': 'Ruby vulnerabilities'}],
+                    'Success': [{'CIS-1.1': {'description': 'tmp is a partition', 'tag': 'CIS-1.1'}}]}}
+
+NEBULA = {'fun': 'nebula.queries', 'fun_args': ['day'], 'id': 'hostname.here', 'jid': '20180117091736565185',
+          'return': [{'os_info': {'data': [{'name': 'Ubuntu'}]}},
+                     {'users': {'data': [{'user': 'root'}, {'user': 'bin'}]}}]}
+
+PULSAR = [{'fun': 'pulsar.process', 'id': 'hostname.here', 'jid': '20180117091736565186',
+           'return': [{'path': '/etc/passwd', 'change': 'IN_MODIFY', 'name': 'passwd'}]},
+          {'fun': 'pulsar.process', 'id': 'hostname.here', 'jid': '20180117091736565186',
+           'return': {'path': '/etc', 'change': 'IN_CREATE|IN_ISDIR', 'name': 'etc'}}]
+
+@pytest.fixture
+def dumpster(tmp_path, monkeypatch):
+    path = str(tmp_path / 'returns.sqlite')
+    options = {'dumpster': path, 'retention_days': 7, 'prune_interval': 3600}
+    monkeypatch.setattr(sqlite_ret, '_get_options', lambda ret=None: options)
+    yield options
+    sqlite_ret._close_connection()
+
+def test_store_and_query(dumpster):
+    sqlite_ret.returner(AUDIT)
+    sqlite_ret.returner(NEBULA)
+    sqlite_ret.returner(PULSAR)
+
+    conn = sqlite_ret._get_conn()
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    assert conn is sqlite_ret._get_conn()
+
+    assert sqlite_ret.get_jid(AUDIT['jid'])['return'] == dict(AUDIT['return'], Controlled=[])
+    assert sqlite_ret.get_jid(NEBULA['jid'])['return'] == NEBULA['return']
+    assert [e['path'] for e in sqlite_ret.get_jid(PULSAR[0]['jid'])['return']] == ['/etc/passwd', '/etc']
+    assert sqlite_ret.get_jid('nope') is None
+
+    jobs = sqlite_ret.get_fun('hubble.audit', fun_args=['cve.scan-v2'])
+    assert [j['jid'] for j in jobs] == [AUDIT['jid']]
+    assert sqlite_ret.get_fun('hubble.audit', fun_args=['other']) == []
+    assert sqlite_ret.get_load(NEBULA['jid'])['fun'] == 'nebula.queries'
+    assert sqlite_ret.get_ret()['jid'] == PULSAR[0]['jid']
+
+    checks = sqlite_ret.get_checks('CIS-1.1')
+    assert [(c['result'], c['data']['tag']) for c in checks] == [('Success', 'CIS-1.1')]
+    assert sqlite_ret.get_checks('CIS-1.1', result='Failure') == []
+
+def test_retention(dumpster):
+    sqlite_ret.returner(AUDIT)
+    conn = sqlite_ret._get_conn()
+    conn.execute('UPDATE audit SET time = ?', (time.time() - 8 * 86400,))
+    conn.execute('UPDATE jids SET time = ?', (time.time() - 8 * 86400,))
+    sqlite_ret.returner(NEBULA) # within the prune_interval: nothing pruned
+    assert sqlite_ret.get_jid(AUDIT['jid']) is not None
+    assert sqlite_ret.prune() == 3
+    assert sqlite_ret.get_jid(AUDIT['jid']) is None
+    assert sqlite_ret.get_jid(NEBULA['jid']) is not None
+
+def test_upgrade_keeps_old_returns(dumpster):
+    import sqlite3
+    conn = sqlite3.connect(dumpster['dumpster'])
+    conn.execute('CREATE TABLE jids(jid TEXT PRIMARY KEY, id INT, load TEXT NOT NULL)')
+    conn.execute('CREATE TABLE ret(jid TEXT, id INT, fun TEXT, fun_args TEXT, return_data TEXT)')
+    conn.execute("INSERT INTO ret VALUES ('1', 1, 'hubble.audit', '[]', '{}')")
+    conn.commit()
+    conn.close()
+
+    sqlite_ret.returner(AUDIT)
+    conn = sqlite_ret._get_conn()
+    assert conn.execute('SELECT fun FROM ret_v0').fetchall() == [('hubble.audit',)]
+    assert conn.execute('SELECT count(*) FROM jids_v0').fetchone()[0] == 0
+    assert sqlite_ret.get_jid(AUDIT['jid'])['fun'] == 'hubble.audit'
+
+def test_returns_without_jid(dumpster):
+    sqlite_ret.returner([{'fun': 'test.one', 'return': 1}, {'fun': 'test.two', 'return': 2}])
+    jobs = sqlite_ret.get_fun('test.one') + sqlite_ret.get_fun('test.two')
+    assert len({job['jid'] for job in jobs}) == 2
+    assert [sqlite_ret.get_jid(job['jid'])['return'] for job in jobs] == [1, 2]
+
+def test_query_takes_the_lock(dumpster, monkeypatch):
+    sqlite_ret.returner(AUDIT)
+    held = []
+    class Lock(object):
+        def __enter__(self):
+            held.append(True)
+        def __exit__(self, *args):
+            held.append(False)
+    monkeypatch.setattr(sqlite_ret, '_LOCK', Lock())
+    assert sqlite_ret.get_load(AUDIT['jid'])['jid'] == AUDIT['jid']
+    # once for the (cached) connection, once for the query itself
+    assert held == [True, False, True, False]
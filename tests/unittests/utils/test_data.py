@@ -529,3 +529,29 @@ class DataTestCase(TestCase):
         assert hubblestack.utils.data.subdict_match(data, "a:b:*:j:k")
         assert hubblestack.utils.data.subdict_match(data, "a:b:*:*:k")
         assert hubblestack.utils.data.subdict_match(data, "a:b:*:*:*")
+
+    def test_dedup_list(self):
+        '''
+        Test dedup_list: the last of each equal item is kept, dict ordering doesn't matter
+        '''
+        events = [{'path': '/etc/a', 'change': 'IN_MODIFY', 'stats': {'size': 1, 'mode': 420}},
+                  {'path': '/etc/b', 'change': 'IN_MODIFY'},
+                  {'stats': {'mode': 420, 'size': 1}, 'change': 'IN_MODIFY', 'path': '/etc/a'},
+                  {'path': '/etc/c', 'change': {1: 'odd', 'key': 'types'}},
+                  {'path': '/etc/c', 'change': {'key': 'types', 1: 'odd'}}]
+        expected = [x for i, x in enumerate(events) if x not in events[i + 1:]]
+        self.assertEqual(hubblestack.utils.data.dedup_list(events), expected)
+        self.assertEqual(hubblestack.utils.data.dedup_list(events), [events[1], events[2], events[4]])
+        self.assertEqual(hubblestack.utils.data.dedup_list([]), [])
+
+    def test_canonical_key(self):
+        '''
+        Test canonical_key: dict ordering doesn't matter, key and value types do
+        '''
+        key = hubblestack.utils.data.canonical_key
+        self.assertEqual(key({'a': 1, 'b': [{'c': 2, 'd': 3}]}), key({'b': [{'d': 3, 'c': 2}], 'a': 1}))
+        self.assertEqual(key({1: 'x', 'y': 2}), key({'y': 2, 1: 'x'}))
+        self.assertNotEqual(key({1: 'x'}), key({'1': 'x'}))
+        self.assertNotEqual(key([{'a': {1: 'x'}}]), key([{'a': {'1': 'x'}}]))
+        self.assertNotEqual(key({'a': 1}), key({'a': 1.0}))
+        self.assertNotEqual(key({'a': 1}), key({'a': True}))
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+import socket
+import threading
+import time
+
+from tests.support.unit import TestCase
+from tests.support.mock import patch
+
+import hubblestack.utils.dns as dns
+
+INTERFACES = {
+    'lo': {'up': True, 'inet': [{'address': '127.0.0.1'}],
+           'inet6': [{'address': '::1'}]},
+    'eth0': {'up': True, 'inet': [{'address': '10.10.10.56'}],
+             'inet6': [{'address': 'fe80::e23f:49ff:fe85:6aaf'}]},
+    'docker0': {'up': True, 'inet': [{'address': '172.17.0.1'}]},
+    'eth1': {'up': True, 'inet': [{'address': '169.254.3.4'}]},
+    'veth1a2b3c': {'up': True, 'inet6': [{'address': 'fe80::1'}]},
+}
+
+NAMES = {'10.10.10.56': 'host.example.com', '2001:db8::56': 'host6.example.com'}
+
+
+def fake_gethostbyaddr(ip_addr):
+    if ip_addr in NAMES:
+        return NAMES[ip_addr], [], [ip_addr]
+    raise socket.herror(0, 'no name')
+
+
+class ResolverTestCase(TestCase):
+
+    def setUp(self):
+        dns.clear_resolver_cache()
+
+    def tearDown(self):
+        dns.clear_resolver_cache()
+
+    def test_resolvable_addresses(self):
+        self.assertEqual(dns.resolvable_addresses(interface_data=INTERFACES,
+                                                  skip_link_local=True,
+                                                  skip_interfaces=dns.SKIP_INTERFACES),
+                         ['10.10.10.56'])
+        self.assertEqual(dns.resolvable_addresses(interface_data=INTERFACES,
+                                                  skip_link_local=True),
+                         ['10.10.10.56', '172.17.0.1'])
+        ipv4_only = dict((k, v) for k, v in INTERFACES.items() if k in ('eth1', 'docker0'))
+        # nothing is skipped by default
+        self.assertEqual(dns.resolvable_addresses(interface_data=ipv4_only),
+                         ['169.254.3.4', '172.17.0.1'])
+
+    def test_reverse_lookup_caches_answers_and_failures(self):
+        with patch('socket.gethostbyaddr', side_effect=fake_gethostbyaddr) as gethostbyaddr, \
+                patch('socket.getfqdn', side_effect=lambda name: name):
+            for _ in range(3):
+                self.assertEqual(dns.reverse_lookup('10.10.10.56'), 'host.example.com')
+                self.assertEqual(dns.reverse_lookup('10.10.10.57'), None)
+            self.assertEqual(gethostbyaddr.call_count, 2)
+
+            # an expired negative answer is looked up again
+            dns.reverse_lookup('10.10.10.58', negative_ttl=-1)
+            dns.reverse_lookup('10.10.10.58', negative_ttl=-1)
+            self.assertEqual(gethostbyaddr.call_count, 4)
+
+    def test_reverse_lookup_many(self):
+        addresses = ['10.10.10.56', '2001:db8::56', '10.10.10.57', '10.10.10.56']
+        with patch('socket.gethostbyaddr', side_effect=fake_gethostbyaddr) as gethostbyaddr, \
+                patch('socket.getfqdn', side_effect=lambda name: name):
+            ret = dns.reverse_lookup_many(addresses, timeout=5, workers=4)
+            self.assertEqual(ret, {'10.10.10.56': 'host.example.com',
+                                   '2001:db8::56': 'host6.example.com',
+                                   '10.10.10.57': None})
+            self.assertEqual(gethostbyaddr.call_count, 3)
+            self.assertEqual(dns.reverse_lookup_many(addresses, timeout=5), ret)
+            self.assertEqual(gethostbyaddr.call_count, 3)
+
+    def test_reverse_lookup_many_deadline(self):
+        release = threading.Event()
+
+        def slow_gethostbyaddr(ip_addr):
+            if ip_addr == '10.0.0.2':
+                release.wait(10)
+            return fake_gethostbyaddr(ip_addr)
+
+        with patch('socket.gethostbyaddr', side_effect=slow_gethostbyaddr), \
+                patch('socket.getfqdn', side_effect=lambda name: name):
+            start = time.time()
+            ret = dns.reverse_lookup_many(['10.10.10.56', '10.0.0.2'], timeout=0.5, workers=2)
+            self.assertLess(time.time() - start, 5)
+            self.assertEqual(ret, {'10.10.10.56': 'host.example.com'})
+            release.set()
+
+    def test_gethostname_cached(self):
+        with patch('socket.gethostname', return_value='myhost') as gethostname:
+            self.assertEqual(dns.gethostname(), 'myhost')
+            self.assertEqual(dns.gethostname(), 'myhost')
+            self.assertEqual(gethostname.call_count, 1)
@@ -4,6 +4,7 @@ Tests for hubblestack.utils.json
 """
 # Import Python libs
 
+import io
 import textwrap
 import hubblestack.utils.files
 import hubblestack.utils.json
@@ -86,3 +87,17 @@ class JSONTestCase(TestCase):
             ret = hubblestack.utils.json.loads(hubblestack.utils.stringutils.to_unicode(fp_.read()))
             # Loading should be equal to the original data
             self.assertEqual(ret, self.data)
+
+    def test_iterload(self):
+        """
+        Test reading the elements of an array a few characters at a time
+        """
+        items = [self.data, 1.5e10, "]", [], 12345, None]
+        text = hubblestack.utils.json.dumps(items, indent=2)
+        for chunk_size in (1, 3, 4096):
+            ret = list(hubblestack.utils.json.iterload(io.StringIO(text), chunk_size=chunk_size))
+            self.assertEqual(ret, items)
+        self.assertEqual(list(hubblestack.utils.json.iterload(io.StringIO(" [ ]\n"))), [])
+        for bad in ("{}", "[1", "[1 2]"):
+            with self.assertRaises(ValueError):
+                list(hubblestack.utils.json.iterload(io.StringIO(bad), chunk_size=1))
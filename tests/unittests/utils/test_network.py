@@ -2,6 +2,8 @@
 
 import logging
 import socket
+import struct
+import subprocess
 import textwrap
 
 from tests.support.unit import skipIf
@@ -17,6 +19,7 @@ from tests.support.mock import (
 
 # Import salt libs
 import hubblestack.utils.network as network
+import hubblestack.utils.path
 import hubblestack.exceptions
 from hubblestack.utils._compat import ipaddress
 
@@ -272,3 +275,58 @@ class NetworkTestCase(TestCase):
                                                   'scope': 'vioif0'}],
                                       'up': True}}
         )
+
+    @skipIf(not hasattr(socket, 'AF_NETLINK') or not hubblestack.utils.path.which('ip'),
+            'netlink or ip not available')
+    def test_interfaces_netlink_parity(self):
+        out = subprocess.check_output('ip link show; ip addr show', shell=True)
+        self.assertEqual(network._interfaces_netlink(),
+                         network._interfaces_ip(out.decode()))
+
+    def test_interfaces_netlink(self):
+        def _attrs(*attrs):
+            return dict(attrs)
+        links = [((0, 772, 1, 0x49, 0), _attrs((3, b'lo\0'), (1, b'\0' * 6))),
+                 ((0, 1, 4, 0x1003, 0), _attrs((3, b'eth0\0'), (1, b'\x02\xfc\0\0\0\x01'))),
+                 ((0, 1, 5, 0x1002, 0), _attrs((3, b'veth0\0'), (5, struct.pack('=i', 9)),
+                                               (37, struct.pack('=i', 0)))),
+                 ((0, 776, 6, 0x80, 0), _attrs((3, b'sit0\0'), (5, struct.pack('=i', 0)),
+                                               (1, b'\0' * 4))),
+                 ((0, 1, 7, 0x1003, 0), _attrs((3, b'eth0.5\0'), (5, struct.pack('=i', 4))))]
+        addrs = [((socket.AF_INET, 24, 0x80, 0, 4),
+                  _attrs((1, socket.inet_aton('10.0.0.5')), (2, socket.inet_aton('10.0.0.5')),
+                         (4, socket.inet_aton('10.0.0.255')), (3, b'eth0\0'))),
+                 ((socket.AF_INET, 24, 0x81, 0, 4),
+                  _attrs((1, socket.inet_aton('10.0.0.6')), (2, socket.inet_aton('10.0.0.6')),
+                         (3, b'eth0:1\0'))),
+                 ((socket.AF_INET, 32, 0x80, 0, 7),
+                  _attrs((1, socket.inet_aton('10.1.0.2')), (2, socket.inet_aton('10.1.0.1')),
+                         (3, b'eth0.5\0'))),
+                 ((socket.AF_INET6, 64, 0x80, 253, 4),
+                  _attrs((1, socket.inet_pton(socket.AF_INET6, 'fe80::fc:ff:fe00:1')),
+                         (8, struct.pack('=I', 0x80))))]
+
+        def _dump(sock, request_type, reply_type, header, seq):
+            return links if request_type == network.RTM_GETLINK else addrs
+        with patch('socket.socket'), patch.object(network, '_netlink_dump', _dump):
+            interfaces = network._interfaces_netlink()
+        self.assertEqual(interfaces,
+                         {'lo': {'up': True, 'hwaddr': '00:00:00:00:00:00'},
+                          'eth0': {'up': True, 'hwaddr': '02:fc:00:00:00:01',
+                                   'inet': [{'address': '10.0.0.5', 'netmask': '255.255.255.0',
+                                             'broadcast': '10.0.0.255', 'label': 'eth0'}],
+                                   'secondary': [{'type': 'inet', 'address': '10.0.0.6',
+                                                  'netmask': '255.255.255.0', 'broadcast': None,
+                                                  'label': 'eth0:1'}],
+                                   'inet6': [{'address': 'fe80::fc:ff:fe00:1', 'prefixlen': '64',
+                                              'scope': 'link'}]},
+                          'veth0': {'up': False, 'parent': 'if9'},
+                          'sit0': {'up': False, 'parent': 'NONE', 'hwaddr': '0.0.0.0'},
+                          'eth0.5': {'up': True, 'parent': 'eth0',
+                                     'inet': [{'address': '10.1.0.1', 'netmask': '255.255.255.255',
+                                               'broadcast': None, 'label': 'eth0.5'}]}})
+
+    def test_linux_interfaces_fallback(self):
+        with patch.object(network, '_netlink_dump', MagicMock(side_effect=OSError(13, 'denied'))), \
+                patch('hubblestack.utils.path.which', MagicMock(return_value=None)):
+            self.assertEqual(network.linux_interfaces(), {})
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+from hubblestack.utils.osquery_mask import compile_mask
+
+def _env(**kw):
+    return [{'variable_name': k, 'value': v} for k, v in kw.items()]
+
+MASK = {'mask_with': 'MASKED', 'blacklisted_objects': [
+    {'query_names': ['running_procs', 'listening_procs'], 'column': 'environment',
+     'attribute_to_check': 'variable_name', 'attributes_to_mask': ['value'],
+     'custom_mask_column': 'environment', 'custom_mask_key': '__hubble_mask__',
+     'blacklisted_patterns': ['ETCDCTL_*', '*PASSWORD*'],
+     'enable_global_masking': True, 'enable_local_masking': True},
+    {'query_names': ['*'], 'column': 'cmdline', 'attribute_to_check': 'arg',
+     'attributes_to_mask': ['val'], 'blacklisted_patterns': ['--token'],
+     'enable_global_masking': True}]}
+
+def test_glob_and_custom_masks():
+    engine = compile_mask(MASK, globbing_enabled=True)
+    row = {'environment': _env(ETCDCTL_READ=1, DB_PASSWORD='x', HOME='/root', MY_KEY='k',
+                               __hubble_mask__='MY_KEY, OTHER'),
+           'cmdline': [[{'arg': '--token', 'val': 's3cret'}], {'arg': '--name', 'val': 'n'}]}
+    engine.mask([{'running_procs': {'data': [row]}}, {'users': {'data': [{'user': 'root'}]}}])
+    assert [e['value'] for e in row['environment']] == ['MASKED', 'MASKED', '/root', 'MASKED',
+                                                        'MY_KEY, OTHER']
+    assert row['cmdline'] == [[{'arg': '--token', 'val': 'MASKED'}], {'arg': '--name', 'val': 'n'}]
+
+    # the custom blacklist only applies to the row that sets it
+    row = {'environment': _env(MY_KEY='k', DB_PASSWORD='x')}
+    engine.mask_row('listening_procs', row)
+    assert [e['value'] for e in row['environment']] == ['k', 'MASKED']
+
+    # unlisted queries only get the wildcard rules
+    row = {'environment': _env(DB_PASSWORD='x')}
+    engine.mask_row('other', row)
+    assert row['environment'][0]['value'] == 'x'
+
+def test_exact_masks_and_events():
+    engine = compile_mask(MASK, globbing_enabled=False)
+    row = {'environment': _env(ETCDCTL_READ=1, PASSWORD='x', __PASSWORD__='y')}
+    engine.mask_row('running_procs', row)
+    assert [e['value'] for e in row['environment']] == [1, 'x', 'y']
+
+    engine = compile_mask(dict(MASK, blacklisted_objects=[dict(MASK['blacklisted_objects'][0],
+        blacklisted_patterns=['PASSWORD', r'(pw=)(\w+)(\b)'])]))
+    events = [{'name': 'running_procs', 'action': 'snapshot',
+               'snapshot': [{'environment': _env(PASSWORD='x')}, {'environment': _env(HOME='/')}]},
+              {'name': 'running_procs', 'action': 'added', 'columns': {'environment': 'pw=abc HOME=/'}},
+              {'name': 'running_procs', 'action': 'added', 'columns': {'pid': '1'}}]
+    engine.mask(events)
+    assert events[0]['snapshot'][0]['environment'][0]['value'] == 'MASKED'
+    assert events[0]['snapshot'][1]['environment'][0]['value'] == '/'
+    assert events[1]['columns']['environment'] == 'pw=MASKED HOME=/'
+
+def test_missing_column_warnings(caplog):
+    engine = compile_mask(MASK)
+    with caplog.at_level(logging.ERROR):
+        engine.mask_row('running_procs', {'pid': 1})
+        engine.mask_row('running_procs', {'pid': 2})
+        assert len(caplog.records) == 1
+        engine.reset_warnings()
+        engine.mask_row('running_procs', {'pid': 3})
+        assert len(caplog.records) == 2
@@ -42,3 +42,155 @@ class VersionTestCase(TestCase):
                              'cmp(%s, %s) should be %s, got %s' %
                              (v1, v2, wanted, res))
 
+class PackageVersionCmpTestCase(TestCase):
+
+    def test_deb_version_cmp(self):
+        # checked against dpkg --compare-versions
+        versions = (('1.0', '1.0', 0),
+                    ('1.0', '1.0-0', 0),
+                    ('1.0', '1.00', 0),
+                    ('0:1.0', '1.0', 0),
+                    ('1:0.9', '1.0', 1),
+                    ('1.0~rc1', '1.0', -1),
+                    ('1.0~rc1-1', '1.0~rc1', 1),
+                    ('1~~', '1~~a', -1),
+                    ('1~~a', '1~', -1),
+                    ('1~', '1', -1),
+                    ('1', '1.0', -1),
+                    ('1.0+b1', '1.0', 1),
+                    ('1.0a', '1.0', 1),
+                    ('1.0a', '1.0+b1', -1),
+                    ('1.0-1', '1.0-1~bpo1', 1),
+                    ('1.0-1ubuntu1', '1.0-1ubuntu1.1', -1),
+                    ('1.0-1build1', '1.0-1ubuntu1', -1),
+                    ('1.0-1+deb9u1', '1.0-1+deb9u1a', -1),
+                    ('2.30-0ubuntu1~16.04', '2.30-0ubuntu1', -1),
+                    ('1.2a~b', '1.2a', -1),
+                    ('1.2+~', '1.2+', -1),
+                    ('1.0.0~', '1.0.0', -1),
+                    ('1.0.0.', '1.0.0+', 1),
+                    ('1.0.0-0.1', '1.0.0', 1),
+                    ('009', '9', 0),
+                    ('a1', '1a', 1),
+                    ('ab-c-d', 'abc', 1),
+                    ('1.0.2g-1ubuntu4.15', '1.0.2g-1ubuntu4.16', -1))
+        for v1, v2, wanted in versions:
+            self.assertEqual(hubblestack.utils.versions.deb_version_cmp(v1, v2), wanted,
+                             'cmp(%s, %s) should be %s' % (v1, v2, wanted))
+            self.assertEqual(hubblestack.utils.versions.deb_version_cmp(v2, v1), -wanted,
+                             'cmp(%s, %s) should be %s' % (v2, v1, -wanted))
+
+    def test_rpm_version_cmp(self):
+        # rpm's rpmvercmp test vectors
+        versions = (
+                    ('1.0', '1.0', 0),
+                    ('1.0', '2.0', -1),
+                    ('2.0', '1.0', 1),
+                    ('2.0.1', '2.0.1', 0),
+                    ('2.0', '2.0.1', -1),
+                    ('2.0.1', '2.0', 1),
+                    ('2.0.1a', '2.0.1a', 0),
+                    ('2.0.1a', '2.0.1', 1),
+                    ('2.0.1', '2.0.1a', -1),
+                    ('5.5p1', '5.5p1', 0),
+                    ('5.5p1', '5.5p2', -1),
+                    ('5.5p2', '5.5p1', 1),
+                    ('5.5p10', '5.5p10', 0),
+                    ('5.5p1', '5.5p10', -1),
+                    ('5.5p10', '5.5p1', 1),
+                    ('10xyz', '10.1xyz', -1),
+                    ('10.1xyz', '10xyz', 1),
+                    ('xyz10', 'xyz10', 0),
+                    ('xyz10', 'xyz10.1', -1),
+                    ('xyz10.1', 'xyz10', 1),
+                    ('xyz.4', 'xyz.4', 0),
+                    ('xyz.4', '8', -1),
+                    ('8', 'xyz.4', 1),
+                    ('xyz.4', '2', -1),
+                    ('2', 'xyz.4', 1),
+                    ('5.5p2', '5.6p1', -1),
+                    ('5.6p1', '5.5p2', 1),
+                    ('5.6p1', '6.5p1', -1),
+                    ('6.5p1', '5.6p1', 1),
+                    ('6.0.rc1', '6.0', 1),
+                    ('6.0', '6.0.rc1', -1),
+                    ('10b2', '10a1', 1),
+                    ('10a2', '10b2', -1),
+                    ('1.0aa', '1.0aa', 0),
+                    ('1.0a', '1.0aa', -1),
+                    ('1.0aa', '1.0a', 1),
+                    ('10.0001', '10.0001', 0),
+                    ('10.0001', '10.1', 0),
+                    ('10.1', '10.0001', 0),
+                    ('10.0001', '10.0039', -1),
+                    ('10.0039', '10.0001', 1),
+                    ('4.999.9', '5.0', -1),
+                    ('5.0', '4.999.9', 1),
+                    ('20101121', '20101121', 0),
+                    ('20101121', '20101122', -1),
+                    ('20101122', '20101121', 1),
+                    ('2_0', '2_0', 0),
+                    ('2.0', '2_0', 0),
+                    ('2_0', '2.0', 0),
+                    ('a', 'a', 0),
+                    ('a+', 'a+', 0),
+                    ('a+', 'a_', 0),
+                    ('a_', 'a+', 0),
+                    ('+a', '+a', 0),
+                    ('+a', '_a', 0),
+                    ('_a', '+a', 0),
+                    ('+_', '+_', 0),
+                    ('_+', '+_', 0),
+                    ('_+', '_', 0),
+                    ('+', '_', 0),
+                    ('_', '+', 0),
+                    ('1.0~rc1', '1.0~rc1', 0),
+                    ('1.0~rc1', '1.0', -1),
+                    ('1.0', '1.0~rc1', 1),
+                    ('1.0~rc1', '1.0~rc2', -1),
+                    ('1.0~rc2', '1.0~rc1', 1),
+                    ('1.0~rc1~git123', '1.0~rc1~git123', 0),
+                    ('1.0~rc1~git123', '1.0~rc1', -1),
+                    ('1.0~rc1', '1.0~rc1~git123', 1),
+                    ('1.0^', '1.0^', 0),
+                    ('1.0^', '1.0', 1),
+                    ('1.0', '1.0^', -1),
+                    ('1.0^git1', '1.0^git1', 0),
+                    ('1.0^git1', '1.0', 1),
+                    ('1.0', '1.0^git1', -1),
+                    ('1.0^git1', '1.0^git2', -1),
+                    ('1.0^git2', '1.0^git1', 1),
+                    ('1.0^git1', '1.01', -1),
+                    ('1.01', '1.0^git1', 1),
+                    ('1.0^20160101', '1.0^20160101', 0),
+                    ('1.0^20160101', '1.0.1', -1),
+                    ('1.0.1', '1.0^20160101', 1),
+                    ('1.0^20160101^git1', '1.0^20160101^git1', 0),
+                    ('1.0^20160102', '1.0^20160101^git1', 1),
+                    ('1.0^20160101^git1', '1.0^20160102', -1),
+                    ('1.0~rc1^git1', '1.0~rc1^git1', 0),
+                    ('1.0~rc1^git1', '1.0~rc1', 1),
+                    ('1.0~rc1', '1.0~rc1^git1', -1),
+                    ('1.0^git1~pre', '1.0^git1~pre', 0),
+                    ('1.0^git1', '1.0^git1~pre', 1),
+                    ('1.0^git1~pre', '1.0^git1', -1))
+        for v1, v2, wanted in versions:
+            self.assertEqual(hubblestack.utils.versions.rpm_version_cmp(v1, v2), wanted,
+                             'cmp(%s, %s) should be %s' % (v1, v2, wanted))
+        # epochs, releases; a missing release is ignored
+        self.assertEqual(hubblestack.utils.versions.rpm_version_cmp('1:1.0-1', '2.0-1'), 1)
+        self.assertEqual(hubblestack.utils.versions.rpm_version_cmp('0:1.0.2k-19.el7', '1.0.2k-16.el7'), 1)
+        self.assertEqual(hubblestack.utils.versions.rpm_version_cmp('3.2', '3.2-1'), 0)
+        self.assertEqual(hubblestack.utils.versions.rpm_version_cmp('3.10.0-514.el7', '3.10.0-514.6.1.el7'), -1)
+
+    def test_compare_many(self):
+        compare_many = hubblestack.utils.versions.compare_many
+        self.assertEqual(compare_many('1.0.2g-1ubuntu4.15', ['1.0.2g-1ubuntu4.16', '1.0.2g-1ubuntu4.15',
+                                                             '1.0.1', '1:0.1'], fmt='deb'),
+                         [1, 0, -1, 1])
+        self.assertEqual(compare_many('1.0-1.el7', ['1.0-1.el7_2', '1.0~beta-9.el7'], fmt='rpm'), [1, -1])
+        self.assertEqual(compare_many('1:1.0', ['2:0.1', '2.0'], fmt='rpm', ignore_epoch=True), [-1, 1])
+        self.assertEqual(compare_many('3.10.0-514.el7', ['3.10.0-514.6.1.el7']), [-1])
+        self.assertEqual(hubblestack.utils.versions.version_format('Debian'), 'deb')
+        self.assertEqual(hubblestack.utils.versions.version_format('RedHat'), 'rpm')
+        self.assertEqual(hubblestack.utils.versions.version_format(None), None)